@@ -5,15 +5,12 @@ AB Electronics UK ADC DAC Pi Analogue to Digital / Digital to Analogue Converter
 ================================================
 
 Based on the Microchip MCP3202 and MCP4822
+
+Requires py-spidev to be installed
 """
 
 from __future__ import absolute_import, division, print_function, \
                                                     unicode_literals
-try:
-    import spidev
-except ImportError:
-    raise ImportError(
-        "spidev not found.")
 
 
 class ADCDACPi(object):
@@ -24,17 +21,6 @@ class ADCDACPi(object):
     # variables
     __adc_ref_voltage = 3.3  # reference voltage for the ADC chip.
 
-    # Define SPI bus and init
-    spiADC = spidev.SpiDev()
-    spiADC.open(0, 0)
-    spiADC.max_speed_hz = 1100000
-
-    spiDAC = spidev.SpiDev()
-    spiDAC.open(0, 1)
-    spiDAC.max_speed_hz = 20000000
-
-    dac_tx = [0, 0]
-
     # Max DAC output voltage. Depends on the gain factor
     # The following table is in the form <gain factor>:<max voltage>
 
@@ -43,8 +29,65 @@ class ADCDACPi(object):
         2: 3.3  # This is the voltage of the 3.3V rail
     }
 
+    # Local methods
+    @staticmethod
+    def __open_spi(bus, cs, speed):
+        """
+        Internal method for opening an SPI device.  spidev is imported when
+        the first SPI device is opened.
+
+        :param bus: SPI bus number
+        :type bus: int
+        :param cs: chip select
+        :type cs: int
+        :param speed: SPI clock speed in Hz
+        :type speed: int
+        :return: open SPI device
+        :rtype: SpiDev
+        :raises ImportError: spidev not found
+        """
+        try:
+            import spidev
+        except ImportError:
+            raise ImportError(
+                "spidev not found.")
+        spi = spidev.SpiDev()
+        spi.open(bus, cs)
+        spi.max_speed_hz = speed
+        return spi
+
+    @property
+    def spiADC(self):
+        """
+        SPI device for the ADC.  The device is opened on first use.
+
+        :return: SPI device
+        :rtype: SpiDev
+        """
+        if self.__spi_adc is None:
+            self.__spi_adc = self.__open_spi(self.__spi_bus, self.__adc_cs,
+                                             self.__adc_speed)
+            self.__adc_opened = True
+        return self.__spi_adc
+
+    @property
+    def spiDAC(self):
+        """
+        SPI device for the DAC.  The device is opened on first use.
+
+        :return: SPI device
+        :rtype: SpiDev
+        """
+        if self.__spi_dac is None:
+            self.__spi_dac = self.__open_spi(self.__spi_bus, self.__dac_cs,
+                                             self.__dac_speed)
+            self.__dac_opened = True
+        return self.__spi_dac
+
     # Public methods
-    def __init__(self, gain_factor=1):
+    def __init__(self, gain_factor=1, adc_spi=None, dac_spi=None,
+                 spi_bus=0, adc_cs=0, dac_cs=1,
+                 adc_speed=1100000, dac_speed=20000000):
         """
         Class Constructor - Initialise the DAC
 
@@ -54,8 +97,35 @@ class ADCDACPi(object):
            Where G is the gain factor, Vref (for this chip) is 2.048 and
            D is the 12-bit digital value, defaults to 1
         :type gain_factor: int, optional
+        :param adc_spi: SpiDev compatible object for the ADC such as
+                        simulator.FakeSpiDev, defaults to SPI 0, chip select 0
+        :type adc_spi: SpiDev, optional
+        :param dac_spi: SpiDev compatible object for the DAC such as
+                        simulator.FakeSpiDev, defaults to SPI 0, chip select 1
+        :type dac_spi: SpiDev, optional
+        :param spi_bus: SPI bus number, defaults to 0
+        :type spi_bus: int, optional
+        :param adc_cs: chip select for the ADC, defaults to 0
+        :type adc_cs: int, optional
+        :param dac_cs: chip select for the DAC, defaults to 1
+        :type dac_cs: int, optional
+        :param adc_speed: ADC SPI clock speed in Hz, defaults to 1100000
+        :type adc_speed: int, optional
+        :param dac_speed: DAC SPI clock speed in Hz, defaults to 20000000
+        :type dac_speed: int, optional
         :raises ValueError: DAC __init__: Invalid gain factor. Must be 1 or 2
         """
+        # the SPI devices are opened when they are first used
+        self.__spi_bus = spi_bus
+        self.__adc_cs = adc_cs
+        self.__dac_cs = dac_cs
+        self.__adc_speed = adc_speed
+        self.__dac_speed = dac_speed
+        self.__spi_adc = adc_spi
+        self.__spi_dac = dac_spi
+        self.__adc_opened = False
+        self.__dac_opened = False
+        self.dac_tx = [0, 0]
         if (gain_factor != 1) and (gain_factor != 2):
             raise ValueError('DAC __init__: Invalid gain factor. \
                             Must be 1 or 2')
@@ -63,6 +133,27 @@ class ADCDACPi(object):
             self.gain = gain_factor
             self.max_dac_voltage = self.__dacMaxOutput__[self.gain]
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the SPI devices opened by this object.  SpiDev objects passed
+        to the constructor are not closed.  The devices are opened again if
+        the object is used after it has been closed.
+        """
+        if self.__adc_opened:
+            self.__spi_adc.close()
+            self.__spi_adc = None
+            self.__adc_opened = False
+        if self.__dac_opened:
+            self.__spi_dac.close()
+            self.__spi_dac = None
+            self.__dac_opened = False
+
     def read_adc_voltage(self, channel, mode):
         """
         [summary]
@@ -47,15 +47,35 @@ Requires smbus2 or python smbus to be installed
 """
 
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
+    from abelectronics import profiling as _profiling
 except ImportError:
+    _i2cbus = None  # class file copied without the abelectronics package
+    _profiling = None
+import time
+from contextlib import nullcontext
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
     try:
-        from smbus import SMBus
+        from smbus2 import SMBus
     except ImportError:
-        raise ImportError("python3-smbus or smbus2 not found")
-import re
-import platform
-import time
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python3-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class Error(Exception):
@@ -90,7 +110,6 @@ class ADCPi(object):
     __conversion_mode = 1  # Conversion Mode
     __pga = float(1.0)  # current PGA setting
     __lsb = float(0.000015625)  # default LSB value for 18 bit
-    __signbit = 0  # stores the sign bit for the sampled value
 
     # create a byte array and fill it with initial values to define the size
     __adc_reading = bytearray([0, 0, 0, 0])
@@ -107,6 +126,7 @@ class ADCPi(object):
         :return: I2C bus number
         :rtype: int
         """
+        import re
         for line in open('/proc/cpuinfo').readlines():
             model = re.match('(.*?)\\s*:\\s*(.*)', line)
             if model:
@@ -124,14 +144,24 @@ class ADCPi(object):
         """
         Internal method for getting an instance of the i2c bus
 
-        :param bus: I2C bus number.  If the value is None, the class will
-                    try to find the i2c bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None, the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: i2c bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the i2c bus
         """
 
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        # Use an SMBus compatible object directly
+        if bus is not None and not isinstance(bus, int):
+            return bus
+
         # Use the provided bus number if available
         if bus is not None:
             i2c_bus = bus
@@ -147,7 +177,8 @@ class ADCPi(object):
                 "bpi-iot-ros-ai": 0,  # Banana Pi BPI M2 Zero Raspbian
             }
 
-            # Get device name
+            # Get device name, platform is only imported to detect the bus
+            import platform
             device = platform.uname()[1]
 
             # Get the bus number from the map or detect for Raspberry Pi
@@ -159,13 +190,43 @@ class ADCPi(object):
                 i2c_bus = 1  # Default to bus 1 for unknown devices
 
         try:
-            return SMBus(i2c_bus)
+            return _open_smbus(i2c_bus)
         except FileNotFoundError:
             raise FileNotFoundError("Bus not found. Check that you have selected the correct I2C bus.")
         except IOError as err:
             raise IOError(f"I/O error: {err}")
 
 
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the I2C bus
+
+        :param bus: I2C bus for the target device
+        :type bus: SMBus
+        :param address: I2C address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
+
+    def __device_locks(self):
+        """
+        Internal method for getting the locks for both devices in address
+        order.  Methods that hold both locks take them in this order so two
+        objects created with the addresses swapped can not deadlock.
+
+        :return: lock for the lower address and lock for the higher address
+        :rtype: tuple
+        """
+        if self.__adc1_address <= self.__adc2_address:
+            return self.__adc1_lock, self.__adc2_lock
+        return self.__adc2_lock, self.__adc1_lock
+
     @staticmethod
     def __update_byte(byte, mask, value):
         """
@@ -237,11 +298,12 @@ class ADCPi(object):
         :raises ValueError: address2 out of range 0x68 to 0x6F
         :param mode: bit rate, defaults to 18
         :type mode: int, optional
-        :param bus: I2C bus number.  If no value is set, the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set, the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
         """
-        self.__bus = self.__get_smbus(bus)
         if 0x68 <= address <= 0x6F:
             self.__adc1_address = address
         else:
@@ -251,6 +313,9 @@ class ADCPi(object):
             self.__adc2_address = address2
         else:
             raise ValueError('address2 out of range 0x68 to 0x6F')
+        self.__bus = self.__get_smbus(bus)
+        self.__adc1_lock = self.__get_lock(self.__bus, self.__adc1_address)
+        self.__adc2_lock = self.__get_lock(self.__bus, self.__adc2_address)
         self.set_bit_mode(mode)
 
     def set_i2c_address1(self, address):
@@ -263,6 +328,7 @@ class ADCPi(object):
         """
         if 0x68 <= address <= 0x6F:
             self.__adc1_address = address
+            self.__adc1_lock = self.__get_lock(self.__bus, address)
         else:
             raise ValueError('address out of range 0x68 to 0x6F')
 
@@ -276,6 +342,7 @@ class ADCPi(object):
         """
         if 0x68 <= address <= 0x6F:
             self.__adc2_address = address
+            self.__adc2_lock = self.__get_lock(self.__bus, address)
         else:
             raise ValueError('address out of range 0x68 to 0x6F')
 
@@ -322,10 +389,12 @@ class ADCPi(object):
         if channel < 1 or channel > 8:
             raise ValueError('read_voltage: channel out of range (1 to 8 allowed)')
 
-        raw = self.read_raw(channel)
-        voltage = float(0.0)
-        if not self.__signbit:
-            voltage = (raw * (self.__lsb / self.__pga)) * 2.471
+        lock = self.__adc1_lock if channel <= 4 else self.__adc2_lock
+        with lock:
+            raw = self.read_raw(channel)
+            voltage = float(0.0)
+            if raw >= 0:  # negative readings are returned as 0 V
+                voltage = (raw * (self.__lsb / self.__pga)) * 2.471
 
         return float(voltage)
 
@@ -348,91 +417,115 @@ class ADCPi(object):
         if channel < 1 or channel > 8:
             raise ValueError('read_raw: channel out of range (1 to 8 allowed)')
 
-        low = 0
-
-        # get the config and i2c address for the selected channel
-        self.__set_channel(channel)
-        if channel <= 4:
-            config = self.__adc1_conf
-            address = self.__adc1_address
-        else:
-            config = self.__adc2_conf
-            address = self.__adc2_address
-
-        # if the conversion mode is set to one-shot, update the ready bit to 1
-        if self.__conversion_mode == 0:
-            config = config | (1 << 7)
-            self.__bus.write_byte(address, config)
-            config = config & ~(1 << 7)  # reset the ready bit to 0
-
-        # determine a reasonable amount of time to wait for the conversion
-        seconds_per_sample = 0.26666  # default for 18 bits
-
-        if self.__bit_mode == 16:
-            seconds_per_sample = 0.06666
-        elif self.__bit_mode == 14:
-            seconds_per_sample = 0.01666
-        elif self.__bit_mode == 12:
-            seconds_per_sample = 0.00416
-        timeout_time = time.monotonic() + (100 * seconds_per_sample)
-
-        # keep reading the ADC data until the conversion result is ready
-        while True:
-            __adc_reading = self.__bus.read_i2c_block_data(address, config, 4)
-            if self.__bit_mode == 18:
-                high = __adc_reading[0]
-                mid = __adc_reading[1]
-                low = __adc_reading[2]
-                cmd_byte = __adc_reading[3]
-            else:
-                high = __adc_reading[0]
-                mid = __adc_reading[1]
-                cmd_byte = __adc_reading[2]
-            # check if bit 7 of the command byte is 0.
-            if (cmd_byte & (1 << 7)) == 0:
-                break
-            elif time.monotonic() > timeout_time:
-                msg = 'read_raw: channel %i conversion timed out' % channel
-                raise ADCTimeoutError(msg)
-            else:
-                time.sleep(0.00001)  # sleep for 10 microseconds
-
-        self.__signbit = False
-        raw = 0
-        # extract the returned bytes and combine them in the correct order
-        if self.__bit_mode == 18:
-            raw = ((high & 0x03) << 16) | (mid << 8) | low
-            self.__signbit = bool(raw & (1 << 17))
-            if raw <= 131071:
-                raw = raw
-            else:
-                raw = raw - 262144
-
-        elif self.__bit_mode == 16:
-            raw = (high << 8) | mid
-            self.__signbit = bool(raw & (1 << 15))
-            if raw <= 32767:
-                raw = raw
+        # spans for each phase are recorded when profiling is enabled
+        profiler = _profiling.profiler if _profiling is not None else None
+        if profiler is not None:
+            phase_start = profiler.clock()
+
+        lock = self.__adc1_lock if channel <= 4 else self.__adc2_lock
+        with lock:
+            if profiler is not None:
+                phase_start = profiler.record("ADCPi.read_raw:lock",
+                                              phase_start)
+            low = 0
+
+            # get the config and i2c address for the selected channel
+            self.__set_channel(channel)
+            if channel <= 4:
+                config = self.__adc1_conf
+                address = self.__adc1_address
             else:
-                raw = raw - 65536
-
-        elif self.__bit_mode == 14:
-            raw = ((high & 0b00111111) << 8) | mid
-            self.__signbit = bool(raw & (1 << 13))
-            if raw <= 8191:
-                raw = raw
-            else:
-                raw = raw - 16384
-
-        elif self.__bit_mode == 12:
-            raw = ((high & 0x0f) << 8) | mid
-            self.__signbit = bool(raw & (1 << 11))
-            if raw <= 2047:
-                raw = raw
-            else:
-                raw = raw - 4096
-
-        return raw
+                config = self.__adc2_conf
+                address = self.__adc2_address
+
+            # if the conversion mode is set to one-shot, update the ready bit to 1
+            if self.__conversion_mode == 0:
+                config = config | (1 << 7)
+                self.__bus.write_byte(address, config)
+                config = config & ~(1 << 7)  # reset the ready bit to 0
+
+            if profiler is not None:
+                phase_start = profiler.record("ADCPi.read_raw:config",
+                                              phase_start)
+
+            # determine a reasonable amount of time to wait for the conversion
+            seconds_per_sample = 0.26666  # default for 18 bits
+
+            if self.__bit_mode == 16:
+                seconds_per_sample = 0.06666
+            elif self.__bit_mode == 14:
+                seconds_per_sample = 0.01666
+            elif self.__bit_mode == 12:
+                seconds_per_sample = 0.00416
+            start_time = time.monotonic()
+            timeout_time = start_time + (100 * seconds_per_sample)
+
+            # keep reading the ADC data until the conversion result is ready
+            while True:
+                __adc_reading = self.__bus.read_i2c_block_data(address, config, 4)
+                if self.__bit_mode == 18:
+                    high = __adc_reading[0]
+                    mid = __adc_reading[1]
+                    low = __adc_reading[2]
+                    cmd_byte = __adc_reading[3]
+                else:
+                    high = __adc_reading[0]
+                    mid = __adc_reading[1]
+                    cmd_byte = __adc_reading[2]
+                # check if bit 7 of the command byte is 0.
+                if (cmd_byte & (1 << 7)) == 0:
+                    break
+                elif time.monotonic() > timeout_time:
+                    # shared bus handles have instrumentation when enabled
+                    instrumentation = getattr(self.__bus, "instrumentation", None)
+                    if instrumentation is not None:
+                        instrumentation.record_timeout(self.__bus.bus, address)
+                    msg = 'read_raw: channel %i conversion timed out' % channel
+                    raise ADCTimeoutError(msg)
+                else:
+                    time.sleep(0.00001)  # sleep for 10 microseconds
+
+            instrumentation = getattr(self.__bus, "instrumentation", None)
+            if instrumentation is not None:
+                instrumentation.record_conversion(
+                    self.__bus.bus, address, time.monotonic() - start_time)
+            if profiler is not None:
+                phase_start = profiler.record("ADCPi.read_raw:conversion",
+                                              phase_start)
+
+            raw = 0
+            # extract the returned bytes and combine them in the correct order
+            if self.__bit_mode == 18:
+                raw = ((high & 0x03) << 16) | (mid << 8) | low
+                if raw <= 131071:
+                    raw = raw
+                else:
+                    raw = raw - 262144
+
+            elif self.__bit_mode == 16:
+                raw = (high << 8) | mid
+                if raw <= 32767:
+                    raw = raw
+                else:
+                    raw = raw - 65536
+
+            elif self.__bit_mode == 14:
+                raw = ((high & 0b00111111) << 8) | mid
+                if raw <= 8191:
+                    raw = raw
+                else:
+                    raw = raw - 16384
+
+            elif self.__bit_mode == 12:
+                raw = ((high & 0x0f) << 8) | mid
+                if raw <= 2047:
+                    raw = raw
+                else:
+                    raw = raw - 4096
+
+            if profiler is not None:
+                profiler.record("ADCPi.read_raw:decode", phase_start)
+            return raw
 
     def set_pga(self, gain: int):
         """
@@ -455,17 +548,19 @@ class ADCPi(object):
         if gain not in gain_config:
             raise ValueError('set_pga: gain out of range')
 
-        # Get configuration bits and PGA value for the requested gain
-        config_bits = gain_config[gain]["bits"]
-        self.__pga = gain_config[gain]["pga_value"]
+        first, second = self.__device_locks()
+        with first, second:
+            # Get configuration bits and PGA value for the requested gain
+            config_bits = gain_config[gain]["bits"]
+            self.__pga = gain_config[gain]["pga_value"]
 
-        # Update configuration registers for both ADCs
-        self.__adc1_conf = self.__update_byte(self.__adc1_conf, 0xFC, config_bits)
-        self.__adc2_conf = self.__update_byte(self.__adc2_conf, 0xFC, config_bits)
+            # Update configuration registers for both ADCs
+            self.__adc1_conf = self.__update_byte(self.__adc1_conf, 0xFC, config_bits)
+            self.__adc2_conf = self.__update_byte(self.__adc2_conf, 0xFC, config_bits)
 
-        # Write updated configurations to the ADCs
-        self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
-        self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
+            # Write updated configurations to the ADCs
+            self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
+            self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
 
 
     def set_bit_rate(self, rate: int):
@@ -498,15 +593,17 @@ class ADCPi(object):
         if mode not in mode_config:
             raise ValueError('set_bit_mode: mode out of range')
 
-        config = mode_config[mode]
-        self.__adc1_conf = self.__update_byte(self.__adc1_conf, bit_mode_mask, config["config_bits"])
-        self.__adc2_conf = self.__update_byte(self.__adc2_conf, bit_mode_mask, config["config_bits"])
-        self.__bit_mode = mode
-        self.__lsb = config["lsb"]
+        first, second = self.__device_locks()
+        with first, second:
+            config = mode_config[mode]
+            self.__adc1_conf = self.__update_byte(self.__adc1_conf, bit_mode_mask, config["config_bits"])
+            self.__adc2_conf = self.__update_byte(self.__adc2_conf, bit_mode_mask, config["config_bits"])
+            self.__bit_mode = mode
+            self.__lsb = config["lsb"]
 
-        # Update both ADCs with the new configuration
-        self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
-        self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
+            # Update both ADCs with the new configuration
+            self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
+            self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
 
     def set_conversion_mode(self, mode: int):
         """
@@ -523,19 +620,40 @@ class ADCPi(object):
         conversion_bit_mask = 0xEF  # Bit 4 mask
         continuous_mode_bit = 0x10  # Bit 4 = 1
 
-        if mode == one_shot_mode:
-            # Set bit 4 to 0 for one-shot mode
-            self.__adc1_conf = self.__update_byte(self.__adc1_conf, conversion_bit_mask, 0x00)
-            self.__adc2_conf = self.__update_byte(self.__adc2_conf, conversion_bit_mask, 0x00)
-            self.__conversion_mode = one_shot_mode
-        elif mode == continuous_mode:
-            # Set bit 4 to 1 for continuous mode
-            self.__adc1_conf = self.__update_byte(self.__adc1_conf, conversion_bit_mask, continuous_mode_bit)
-            self.__adc2_conf = self.__update_byte(self.__adc2_conf, conversion_bit_mask, continuous_mode_bit)
-            self.__conversion_mode = continuous_mode
-        else:
-            raise ValueError('set_conversion_mode: mode out of range')
+        first, second = self.__device_locks()
+        with first, second:
+            if mode == one_shot_mode:
+                # Set bit 4 to 0 for one-shot mode
+                self.__adc1_conf = self.__update_byte(self.__adc1_conf, conversion_bit_mask, 0x00)
+                self.__adc2_conf = self.__update_byte(self.__adc2_conf, conversion_bit_mask, 0x00)
+                self.__conversion_mode = one_shot_mode
+            elif mode == continuous_mode:
+                # Set bit 4 to 1 for continuous mode
+                self.__adc1_conf = self.__update_byte(self.__adc1_conf, conversion_bit_mask, continuous_mode_bit)
+                self.__adc2_conf = self.__update_byte(self.__adc2_conf, conversion_bit_mask, continuous_mode_bit)
+                self.__conversion_mode = continuous_mode
+            else:
+                raise ValueError('set_conversion_mode: mode out of range')
+
+            # Write the updated configuration to both ADCs
+            self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
+            self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
 
-        # Write the updated configuration to both ADCs
-        self.__bus.write_byte(self.__adc1_address, self.__adc1_conf)
-        self.__bus.write_byte(self.__adc2_address, self.__adc2_conf)
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
@@ -35,6 +35,11 @@ except ImportError:
         raise ImportError(
             "Failed to import library from parent folder")
 
+try:
+    from abelectronics import i2cbus
+except ImportError:
+    i2cbus = None
+
 
 def adc_thread_function(adc, ch1, ch2, ch3, ch4, thread_queue):
     t1 = adc.read_voltage(ch1)
@@ -119,6 +124,11 @@ def main():
     Main program function
     """
 
+    # enable the bus and device locks so the two threads can share the
+    # ADC Pi.  Locking must be enabled before the ADCPi object is created.
+    if i2cbus is not None:
+        i2cbus.set_locking(True)
+
     # create an instance of the ADCPi class
     adc = ADCPi(0x68, 0x69, 12)
 
@@ -4,6 +4,7 @@
 AB Electronics UK Expander Pi
 
 Requires smbus2 or python smbus to be installed
+The ADC and DAC classes require spidev to be installed
 
 ================================================
 """
@@ -11,19 +12,10 @@ from __future__ import absolute_import, division, print_function, \
     unicode_literals
 
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
 except ImportError:
-    try:
-        from smbus import SMBus
-    except ImportError:
-        raise ImportError("python-smbus or smbus2 not found")
-try:
-    import spidev
-except ImportError:
-    raise ImportError(
-        "spidev not found.")
-import re
-import platform
+    _i2cbus = None  # class file copied without the abelectronics package
+from contextlib import nullcontext
 import datetime
 
 """
@@ -31,6 +23,28 @@ Private Classes
 """
 
 
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
+    try:
+        from smbus2 import SMBus
+    except ImportError:
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python-smbus or smbus2 not found")
+    return SMBus(bus)
+
+
 class _ABEHelpers:
     """
     Local Functions used across all Expander Pi classes
@@ -60,18 +74,30 @@ class _ABEHelpers:
         """
         Internal method for getting an instance of the I2C bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: I2C bus for target device
         :rtype: SMBus
         :raises IOError: Could not open the I2C bus
         """
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c__bus = 1
         if bus is not None:
             i2c__bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -105,9 +131,44 @@ class _ABEHelpers:
                                 i2c__bus = 1  # later models
                             break
         try:
-            return SMBus(i2c__bus)
+            return _open_smbus(i2c__bus)
         except IOError:
-            raise 'Could not open the I2C bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def get_spidev():
+        """
+        Internal method for creating an SpiDev object.  spidev is imported
+        when the first ADC or DAC object is created so the IO and RTC
+        classes can be used without spidev.
+
+        :return: SpiDev object
+        :rtype: SpiDev
+        :raises ImportError: spidev not found
+        """
+        try:
+            import spidev
+        except ImportError:
+            raise ImportError(
+                "spidev not found.")
+        return spidev.SpiDev()
+
+    @staticmethod
+    def get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the I2C bus
+
+        :param bus: I2C bus for the target device
+        :type bus: SMBus
+        :param address: I2C address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
 
 """
@@ -125,13 +186,21 @@ class ADC:
 
     __spiADC = None
 
-    def __init__(self):
+    def __init__(self, spi=None):
         """
         Define SPI bus and init
+
+        :param spi: SpiDev compatible object such as simulator.FakeSpiDev.
+                    If no value is set the class will open SPI bus 0,
+                    chip select 0, defaults to None
+        :type spi: SpiDev, optional
         """
-        self.__spiADC = spidev.SpiDev()
-        self.__spiADC.open(0, 0)
-        self.__spiADC.max_speed_hz = 1000000
+        if spi is not None:
+            self.__spiADC = spi
+        else:
+            self.__spiADC = _ABEHelpers.get_spidev()
+            self.__spiADC.open(0, 0)
+            self.__spiADC.max_speed_hz = 1000000
 
     # public methods
 
@@ -233,7 +302,7 @@ class DAC:
     __max_dac_voltage = 2.048
 
     # public methods
-    def __init__(self, gainFactor=1):
+    def __init__(self, gainFactor=1, spi=None):
         """
         Class Constructor - Define SPI bus and init
 
@@ -243,13 +312,20 @@ class DAC:
            Where G is the gain factor, Vref (for this chip) is 2.048 and
            D is the 12-bit digital value, defaults to 1
         :type gainFactor: int, optional
+        :param spi: SpiDev compatible object such as simulator.FakeSpiDev.
+                    If no value is set the class will open SPI bus 0,
+                    chip select 1, defaults to None
+        :type spi: SpiDev, optional
         :raises ValueError: DAC __init__: Invalid gain factor. Must be 1 or 2
         """
 
         # Define SPI bus and init
-        self.__spiDAC = spidev.SpiDev()
-        self.__spiDAC.open(0, 1)
-        self.__spiDAC.max_speed_hz = 20000000
+        if spi is not None:
+            self.__spiDAC = spi
+        else:
+            self.__spiDAC = _ABEHelpers.get_spidev()
+            self.__spiDAC.open(0, 1)
+            self.__spiDAC.max_speed_hz = 20000000
 
         if (gainFactor != 1) and (gainFactor != 2):
             raise ValueError('DAC __init__: Invalid gain factor. \
@@ -386,6 +462,14 @@ class IO:
     OLATA = 0x14  # output latches A
     OLATB = 0x15  # output latches B
 
+    # registers written by set_registers, in the order they are written.
+    # The output latches are written before the directions so pins that
+    # become outputs start at the saved level.
+    __RESTORE_ORDER = ((IOCON,), (OLATA, OLATB), (IPOLA, IPOLB),
+                       (GPPUA, GPPUB), (GPINTENA, GPINTENB),
+                       (DEFVALA, DEFVALB), (INTCONA, INTCONB),
+                       (IODIRA, IODIRB))
+
     __io_address = 0x20  # I2C address
 
     # initial configuration - see IOCON page in the MCP23017 datasheet for
@@ -402,19 +486,23 @@ class IO:
                            ports are not inverted.
                            False = device state unaltered. Defaults to True
         :type initialise: bool, optional
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
         """
         self.__helper = _ABEHelpers()
         self.__bus = self.__helper.get_smbus(bus)
+        self.__lock = self.__helper.get_lock(self.__bus, self.__io_address)
         self.__bus.write_byte_data(self.__io_address, self.IOCON,
                                    self.__io_config)
 
         if initialise is True:
-            self.__bus.write_word_data(self.__io_address, self.IODIRA, 0xFFFF)
+            # IODIRA to IPOLB are consecutive registers
+            self.__bus.write_i2c_block_data(self.__io_address, self.IODIRA,
+                                            [0xFF, 0xFF, 0x00, 0x00])
             self.__bus.write_word_data(self.__io_address, self.GPPUA, 0x0000)
-            self.__bus.write_word_data(self.__io_address, self.IPOLA, 0x0000)
         return
 
     # local methods
@@ -484,9 +572,10 @@ class IO:
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        current_value = self.__bus.read_byte_data(self.__io_address, reg)
-        new_value = self.__update_byte(current_value, pin, value)
-        self.__bus.write_byte_data(self.__io_address, reg, new_value)
+        with self.__lock:
+            current_value = self.__bus.read_byte_data(self.__io_address, reg)
+            new_value = self.__update_byte(current_value, pin, value)
+            self.__bus.write_byte_data(self.__io_address, reg, new_value)
 
         return
 
@@ -544,6 +633,22 @@ class IO:
             self.__bus.write_byte_data(self.__io_address, b_register, value)
         return
 
+    def __read_registers(self, registers):
+        """
+        Internal method for reading several device registers.  The reads
+        are sent as one i2c_rdwr call when combined reads are enabled with
+        abelectronics.i2cbus.set_combined_reads.
+
+        :param registers: register numbers
+        :type registers: list
+        :return: value of each register
+        :rtype: list
+        """
+        if _i2cbus is not None:
+            return _i2cbus.read_registers(self.__bus, self.__io_address, registers)
+        return [self.__bus.read_byte_data(self.__io_address, register)
+                for register in registers]
+
     def __get_port(self, port, a_register, b_register):
         """
         Internal method for getting the value of a device register
@@ -904,14 +1009,15 @@ class IO:
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
+        with self.__lock:
+            conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
 
-        if value == 0:
-            conf = self.__update_byte(conf, 6, 0)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
-        if value == 1:
-            conf = self.__update_byte(conf, 6, 1)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 0:
+                conf = self.__update_byte(conf, 6, 0)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 1:
+                conf = self.__update_byte(conf, 6, 1)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
         return
 
     def set_interrupt_polarity(self, value):
@@ -926,14 +1032,15 @@ class IO:
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
+        with self.__lock:
+            conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
 
-        if value == 0:
-            conf = self.__update_byte(conf, 1, 0)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
-        if value == 1:
-            conf = self.__update_byte(conf, 1, 1)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 0:
+                conf = self.__update_byte(conf, 1, 0)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 1:
+                conf = self.__update_byte(conf, 1, 1)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
 
         return
 
@@ -1089,7 +1196,15 @@ class IO:
         :return: interrupt status for the selected port
         :rtype: int
         """
-        return self.__get_port(port, self.INTFA, self.INTFB)
+        value = self.__get_port(port, self.INTFA, self.INTFB)
+        if value:
+            # shared bus handles have instrumentation when enabled
+            instrumentation = getattr(self.__bus, "instrumentation", None)
+            if instrumentation is not None:
+                instrumentation.record_interrupts(self.__bus.bus,
+                                                  self.__io_address, port,
+                                                  bin(value).count("1"))
+        return value
 
     def read_interrupt_capture(self, port):
         """
@@ -1108,10 +1223,96 @@ class IO:
         """
         Reset the interrupts A and B to 0
         """
-        self.read_interrupt_capture(0)
-        self.read_interrupt_capture(1)
+        self.__read_registers([self.INTCAPA, self.INTCAPB])
         return
 
+    def __read_configuration(self):
+        """
+        Internal method for reading the registers from IODIRA to GPPUB in
+        one block read and the output latches in a word read.  The block
+        read only returns consecutive registers when IOCON.SEQOP is 0, as
+        set by this class.
+
+        :return: register values
+        :rtype: dict
+        """
+        values = self.__bus.read_i2c_block_data(self.__io_address,
+                                                self.IODIRA, self.GPPUB + 1)
+        registers = dict(enumerate(values))
+        latches = self.__bus.read_word_data(self.__io_address, self.OLATA)
+        registers[self.OLATA] = latches & 0xFF
+        registers[self.OLATB] = latches >> 8
+        return registers
+
+    def get_registers(self):
+        """
+        Read the configuration and output registers.  GPIO, INTF and INTCAP
+        are not read as reading the port clears the interrupts.  Save the
+        result with abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        with self.__lock:
+            registers = self.__read_configuration()
+        for register in (self.IOCON + 1, self.INTFA, self.INTFB):
+            registers.pop(register, None)
+        return registers
+
+    def set_registers(self, registers):
+        """
+        Restore registers saved with get_registers.  Only the registers with
+        a different value are written, register pairs in one transaction,
+        so outputs that are already set do not change.  When IOCON changes
+        every register is written.
+
+        :param registers: register values keyed by register number
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        written = 0
+        with self.__lock:
+            current = self.__read_configuration()
+            if self.IOCON in registers and \
+                    registers[self.IOCON] != current[self.IOCON]:
+                # the registers were read with a different configuration
+                current = {}
+            for group in self.__RESTORE_ORDER:
+                changed = [register for register in group
+                           if register in registers and
+                           registers[register] != current.get(register)]
+                if len(changed) == 2:
+                    self.__bus.write_word_data(
+                        self.__io_address, group[0],
+                        registers[group[0]] | (registers[group[1]] << 8))
+                elif changed:
+                    self.__bus.write_byte_data(self.__io_address, changed[0],
+                                               registers[changed[0]])
+                written += len(changed)
+            if self.IOCON in registers:
+                self.__io_config = registers[self.IOCON]
+        return written
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
+
 
 class RTC:
     """
@@ -1140,15 +1341,31 @@ class RTC:
 
     # local methods
 
-    def __init__(self, bus=None):
+    def __init__(self, bus=None, warm_start=False):
         """
         Initialise the RTC module
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
+        :param warm_start: True = read the control register first and only
+                           write it if it does not already have the
+                           setting, defaults to False
+        :type warm_start: bool, optional
         """
         self.__helper = _ABEHelpers()
         self.__bus = self.__helper.get_smbus(bus)
+        self.__lock = self.__helper.get_lock(self.__bus, self.__rtc_address)
+        if warm_start is True:
+            with self.__lock:
+                try:
+                    control = self.__bus.read_byte_data(self.__rtc_address,
+                                                        self.CONTROL)
+                except IOError:
+                    control = None
+                if control == self.__rtc_config:
+                    return
         self.__bus.write_byte_data(
             self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
@@ -1240,10 +1457,11 @@ class RTC:
         Enable the output pin
         """
 
-        self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 7, 1)
-        self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 4, 1)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 7, 1)
+            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 4, 1)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def disable_output(self):
@@ -1251,10 +1469,11 @@ class RTC:
         Disable the output pin
         """
 
-        self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 7, 0)
-        self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 4, 0)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 7, 0)
+            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 4, 0)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def set_frequency(self, frequency):
@@ -1265,20 +1484,21 @@ class RTC:
         :type frequency: int
         """
 
-        if frequency == 1:
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 0)
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 0)
-        if frequency == 2:
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 1)
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 0)
-        if frequency == 3:
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 0)
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 1)
-        if frequency == 4:
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 1)
-            self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 1)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            if frequency == 1:
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 0)
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 0)
+            if frequency == 2:
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 1)
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 0)
+            if frequency == 3:
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 0)
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 1)
+            if frequency == 4:
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 0, 1)
+                self.__rtc_config = self.__helper.update_byte(self.__rtc_config, 1, 1)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def write_memory(self, address, valuearray):
@@ -1331,3 +1551,83 @@ class RTC:
                                 length exceeds 0x3F')
         else:
             raise ValueError('read_memory: address out of range')
+
+    def get_registers(self):
+        """
+        Read the time, control and RAM registers, 0x00 to 0x3F.  Save the
+        result with abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        registers = {}
+        with self.__lock:
+            for start in (0x00, 0x20):
+                registers.update(enumerate(self.__bus.read_i2c_block_data(
+                    self.__rtc_address, start, 32), start))
+        return registers
+
+    def set_registers(self, registers):
+        """
+        Restore the control register and RAM saved with get_registers.
+        Only the registers with a different value are written, consecutive
+        registers in one transaction.  The time registers are not restored,
+        use set_date to set the time.
+
+        :param registers: register values keyed by register number
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        written = 0
+        with self.__lock:
+            if self.CONTROL in registers:
+                control = registers[self.CONTROL] & 0xFF
+                if self.__bus.read_byte_data(self.__rtc_address,
+                                             self.CONTROL) != control:
+                    self.__bus.write_byte_data(self.__rtc_address,
+                                               self.CONTROL, control)
+                    written += 1
+                self.__rtc_config = control
+            memory = sorted(register for register in registers
+                            if 0x08 <= register <= 0x3F)
+            if memory:
+                current = []
+                while len(current) < memory[-1] - memory[0] + 1:
+                    current += self.__bus.read_i2c_block_data(
+                        self.__rtc_address, memory[0] + len(current),
+                        min(32, memory[-1] - memory[0] + 1 - len(current)))
+                changed = [register for register in memory
+                           if registers[register] & 0xFF !=
+                           current[register - memory[0]]]
+                start = 0
+                for i in range(1, len(changed) + 1):
+                    if i == len(changed) or \
+                            changed[i] != changed[i - 1] + 1 or \
+                            i - start == 32:
+                        self.__bus.write_i2c_block_data(
+                            self.__rtc_address, changed[start],
+                            [registers[register] & 0xFF
+                             for register in changed[start:i]])
+                        start = i
+                written += len(changed)
+        return written
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
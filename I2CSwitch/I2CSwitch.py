@@ -4,20 +4,58 @@
 AB Electronics UK I2CSwitch - 4 Channel I2C Switch
 
 Requires smbus2 or python smbus to be installed
+The reset pin requires RPi.GPIO
 ================================================
 """
 
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
 except ImportError:
+    _i2cbus = None  # class file copied without the abelectronics package
+import time
+from contextlib import nullcontext
+
+GPIO = None  # RPi.GPIO is imported when the first I2CSwitch is created
+
+
+def _import_gpio():
+    """
+    Internal method for importing RPi.GPIO when it is first needed so the
+    module can be imported on computers without GPIO pins
+
+    :return: RPi.GPIO module or None if RPi.GPIO can not be used
+    :rtype: module
+    """
+    global GPIO
+    if GPIO is None:
+        try:
+            import RPi.GPIO as gpio
+        except (ImportError, RuntimeError):
+            return None  # not installed or not running on a Raspberry Pi
+        GPIO = gpio
+    return GPIO
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
     try:
-        from smbus import SMBus
+        from smbus2 import SMBus
     except ImportError:
-        raise ImportError("python-smbus or smbus2 not found")
-import re
-import time
-import platform
-import RPi.GPIO as GPIO
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class I2CSwitch(object):
@@ -39,18 +77,30 @@ class I2CSwitch(object):
         """
         Internal method for getting an instance of the i2c bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: I2C bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the i2c bus
         """
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c__bus = 1
         if bus is not None:
             i2c__bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -87,9 +137,26 @@ class I2CSwitch(object):
                                 i2c__bus = 1  # later models
                             break
         try:
-            return SMBus(i2c__bus)
+            return _open_smbus(i2c__bus)
         except IOError:
-            raise 'Could not open the I2C bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the I2C bus
+
+        :param bus: I2C bus for the target device
+        :type bus: SMBus
+        :param address: I2C address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
     @staticmethod
     def __check_bit(byte, bit):
@@ -133,26 +200,19 @@ class I2CSwitch(object):
 
         :param value: value to write
         :type value: int
-        :return: IOError
-        :rtype: IOError
+        :raises IOError: Could not write to the I2C bus
         """
-        try:
-            self.__bus.write_byte(self.__address, value)
-        except IOError as err:
-            return err
+        self.__bus.write_byte(self.__address, value)
 
     def __read(self):
         """
         Internal method for reading data from the I2C bus
 
-        :return: IOError
-        :rtype: IOError
+        :return: control register value
+        :rtype: int
+        :raises IOError: Could not read from the I2C bus
         """
-        try:
-            result = self.__bus.read_byte(self.__address)
-            return result
-        except IOError as err:
-            return err
+        return self.__bus.read_byte(self.__address)
 
     # public methods
 
@@ -162,13 +222,19 @@ class I2CSwitch(object):
 
         :param address: device i2c address, defaults to 0x70
         :type address: int, optional
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
         """
         self.__address = address
         self.__bus = self.__get_smbus(bus)
+        self.__lock = self.__get_lock(self.__bus, self.__address)
         self.__write(self.__ctl)
+        if _import_gpio() is None:
+            return  # reset() needs RPi.GPIO
+
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BOARD)
         GPIO.setup(self.__RESETPIN, GPIO.OUT)
@@ -185,9 +251,10 @@ class I2CSwitch(object):
         if channel < 1 or channel > 4:
             raise ValueError('set_channel: channel out of range (1 to 4)')
         else:
-            self.__ctl = 0
-            self.__ctl = self.__update_byte(self.__ctl, channel - 1, 1)
-            self.__write(self.__ctl)
+            with self.__lock:
+                self.__ctl = 0
+                self.__ctl = self.__update_byte(self.__ctl, channel - 1, 1)
+                self.__write(self.__ctl)
 
     def set_channel_state(self, channel, state):
         """
@@ -205,11 +272,12 @@ class I2CSwitch(object):
         if type(state) is not bool:
             raise ValueError('set_channel: state out of range (True or False)')
         else:
-            if state is True:
-                self.__ctl = self.__update_byte(self.__ctl, channel - 1, 1)
-            else:
-                self.__ctl = self.__update_byte(self.__ctl, channel - 1, 0)
-            self.__write(self.__ctl)
+            with self.__lock:
+                if state is True:
+                    self.__ctl = self.__update_byte(self.__ctl, channel - 1, 1)
+                else:
+                    self.__ctl = self.__update_byte(self.__ctl, channel - 1, 0)
+                self.__write(self.__ctl)
 
     def get_channel_state(self, channel):
         """
@@ -239,6 +307,8 @@ class I2CSwitch(object):
 
         :raises ValueError: Failed to write to GPIO pin
         """
+        if GPIO is None:
+            raise IOError("Failed to write to GPIO pin: RPi.GPIO not found")
         try:
             GPIO.output(self.__RESETPIN, False)
             # wait 1 millisecond before setting the pin high again
@@ -248,3 +318,22 @@ class I2CSwitch(object):
             time.sleep(0.001)
         except IOError as err:
             raise IOError("Failed to write to GPIO pin: " + err)
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
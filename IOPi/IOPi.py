@@ -13,14 +13,34 @@ When writing to or reading from a bus or port the least significant bit
 represents the lowest numbered pin on the selected port.
 """
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
+    from abelectronics import profiling as _profiling
 except ImportError:
+    _i2cbus = None  # class file copied without the abelectronics package
+    _profiling = None
+from contextlib import nullcontext
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
     try:
-        from smbus import SMBus
+        from smbus2 import SMBus
     except ImportError:
-        raise ImportError("python-smbus or smbus2 not found")
-import re
-import platform
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class IOPi(object):
@@ -85,6 +105,14 @@ class IOPi(object):
     OLATA = 0x14  # output latches A
     OLATB = 0x15  # output latches B
 
+    # registers written by set_registers, in the order they are written.
+    # The output latches are written before the directions so pins that
+    # become outputs start at the saved level.
+    __RESTORE_ORDER = ((IOCON,), (OLATA, OLATB), (IPOLA, IPOLB),
+                       (GPPUA, GPPUB), (GPINTENA, GPINTENB),
+                       (DEFVALA, DEFVALB), (INTCONA, INTCONB),
+                       (IODIRA, IODIRB))
+
     # variables
     __io_address = 0x20  # I2C address
     # initial configuration
@@ -92,7 +120,7 @@ class IOPi(object):
     __conf = 0x02
     __bus = None
 
-    def __init__(self, address, initialise=True, bus=None):
+    def __init__(self, address, initialise=True, bus=None, warm_start=False):
         """
         IOPi object initialisation
 
@@ -102,9 +130,17 @@ class IOPi(object):
                            ports are not inverted.
                            False = device state unaltered., defaults to True
         :type initialise: bool, optional
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
+        :param warm_start: True = read the configuration registers first and
+                           only write the registers that do not already
+                           have the settings, so creating the object again
+                           does not disturb a running device,
+                           defaults to False
+        :type warm_start: bool, optional
         """
 
         if address < 0x20 or address > 0x27:
@@ -114,12 +150,26 @@ class IOPi(object):
 
         self.__io_address = address
         self.__bus = self.__get_smbus(bus)
+        self.__lock = self.__get_lock(self.__bus, self.__io_address)
+
+        if warm_start is True:
+            settings = {self.IOCON: self.__conf}
+            if initialise is True:
+                settings.update({self.IODIRA: 0xFF, self.IODIRB: 0xFF,
+                                 self.IPOLA: 0x00, self.IPOLB: 0x00,
+                                 self.GPPUA: 0x00, self.GPPUB: 0x00})
+            # registers that already have the settings are not written
+            with self.__lock:
+                self.__write_changed(self.__read_configuration(), settings)
+            return
+
         self.__bus.write_byte_data(self.__io_address, self.IOCON, self.__conf)
 
         if initialise is True:
-            self.__bus.write_word_data(self.__io_address, self.IODIRA, 0xFFFF)
+            # IODIRA to IPOLB are consecutive registers
+            self.__bus.write_i2c_block_data(self.__io_address, self.IODIRA,
+                                            [0xFF, 0xFF, 0x00, 0x00])
             self.__bus.write_word_data(self.__io_address, self.GPPUA, 0x0000)
-            self.__bus.write_word_data(self.__io_address, self.IPOLA, 0x0000)
         return
 
     # local methods
@@ -128,19 +178,31 @@ class IOPi(object):
         """
         Internal method for getting an instance of the i2c bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: i2c bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the i2c bus
         """
 
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c__bus = 1
         if bus is not None:
             i2c__bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -177,9 +239,26 @@ class IOPi(object):
                                 i2c__bus = 1  # later models
                             break
         try:
-            return SMBus(i2c__bus)
+            return _open_smbus(i2c__bus)
         except IOError:
-            raise 'Could not open the I2C bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the i2c bus
+
+        :param bus: i2c bus for the target device
+        :type bus: SMBus
+        :param address: i2c address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
     @staticmethod
     def __check_bit(byte, bit):
@@ -247,9 +326,23 @@ class IOPi(object):
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        current_value = self.__bus.read_byte_data(self.__io_address, reg)
-        new_value = self.__update_byte(current_value, pin, value)
-        self.__bus.write_byte_data(self.__io_address, reg, new_value)
+        # spans for each phase are recorded when profiling is enabled
+        profiler = _profiling.profiler if _profiling is not None else None
+        if profiler is not None:
+            phase_start = profiler.clock()
+
+        with self.__lock:
+            if profiler is not None:
+                phase_start = profiler.record("IOPi.__set_pin:lock",
+                                              phase_start)
+            current_value = self.__bus.read_byte_data(self.__io_address, reg)
+            if profiler is not None:
+                phase_start = profiler.record("IOPi.__set_pin:read",
+                                              phase_start)
+            new_value = self.__update_byte(current_value, pin, value)
+            self.__bus.write_byte_data(self.__io_address, reg, new_value)
+            if profiler is not None:
+                profiler.record("IOPi.__set_pin:write", phase_start)
 
         return
 
@@ -307,6 +400,70 @@ class IOPi(object):
             self.__bus.write_byte_data(self.__io_address, b_register, value)
         return
 
+    def __read_registers(self, registers):
+        """
+        Internal method for reading several device registers.  The reads
+        are sent as one i2c_rdwr call when combined reads are enabled with
+        abelectronics.i2cbus.set_combined_reads.
+
+        :param registers: register numbers
+        :type registers: list
+        :return: value of each register
+        :rtype: list
+        """
+        if _i2cbus is not None:
+            return _i2cbus.read_registers(self.__bus, self.__io_address, registers)
+        return [self.__bus.read_byte_data(self.__io_address, register)
+                for register in registers]
+
+    def __read_configuration(self):
+        """
+        Internal method for reading the registers from IODIRA to GPPUB in
+        one block read.  The block read only returns consecutive registers
+        when IOCON.SEQOP is 0, so the values should only be used when the
+        IOCON value matches the configuration set by this class.
+
+        :return: register values
+        :rtype: dict
+        """
+        values = self.__bus.read_i2c_block_data(self.__io_address,
+                                                self.IODIRA, self.GPPUB + 1)
+        return dict(enumerate(values))
+
+    def __write_changed(self, current, registers):
+        """
+        Internal method for writing the registers that do not already have
+        the new value.  Register pairs are written in one transaction.  When
+        IOCON changes every register is written as the current values were
+        read with a different configuration.
+
+        :param current: register values read from the device
+        :type current: dict
+        :param registers: new register values
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        if self.IOCON in registers and \
+                registers[self.IOCON] != current.get(self.IOCON):
+            current = {}
+        written = 0
+        for group in self.__RESTORE_ORDER:
+            changed = [register for register in group
+                       if register in registers and
+                       registers[register] != current.get(register)]
+            if len(changed) == 2:
+                self.__bus.write_word_data(
+                    self.__io_address, group[0],
+                    registers[group[0]] | (registers[group[1]] << 8))
+            elif changed:
+                self.__bus.write_byte_data(self.__io_address, changed[0],
+                                           registers[changed[0]])
+            written += len(changed)
+        if self.IOCON in registers:
+            self.__conf = registers[self.IOCON]
+        return written
+
     def __get_port(self, port, a_register, b_register):
         """
         Internal method for getting the value of a device register
@@ -667,14 +824,15 @@ class IOPi(object):
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
+        with self.__lock:
+            conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
 
-        if value == 0:
-            conf = self.__update_byte(conf, 6, 0)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
-        if value == 1:
-            conf = self.__update_byte(self.__conf, 6, 1)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 0:
+                conf = self.__update_byte(conf, 6, 0)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 1:
+                conf = self.__update_byte(self.__conf, 6, 1)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
         return
 
     def set_interrupt_polarity(self, value):
@@ -689,14 +847,15 @@ class IOPi(object):
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
+        with self.__lock:
+            conf = self.__bus.read_byte_data(self.__io_address, self.IOCON)
 
-        if value == 0:
-            conf = self.__update_byte(conf, 1, 0)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
-        if value == 1:
-            conf = self.__update_byte(self.__conf, 1, 1)
-            self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 0:
+                conf = self.__update_byte(conf, 1, 0)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
+            if value == 1:
+                conf = self.__update_byte(self.__conf, 1, 1)
+                self.__bus.write_byte_data(self.__io_address, self.IOCON, conf)
 
         return
 
@@ -852,7 +1011,15 @@ class IOPi(object):
         :return: interrupt status for the selected port
         :rtype: int
         """
-        return self.__get_port(port, self.INTFA, self.INTFB)
+        value = self.__get_port(port, self.INTFA, self.INTFB)
+        if value:
+            # shared bus handles have instrumentation when enabled
+            instrumentation = getattr(self.__bus, "instrumentation", None)
+            if instrumentation is not None:
+                instrumentation.record_interrupts(self.__bus.bus,
+                                                  self.__io_address, port,
+                                                  bin(value).count("1"))
+        return value
 
     def read_interrupt_capture(self, port):
         """
@@ -871,6 +1038,64 @@ class IOPi(object):
         """
         Reset the interrupts A and B to 0
         """
-        self.read_interrupt_capture(0)
-        self.read_interrupt_capture(1)
+        self.__read_registers([self.INTCAPA, self.INTCAPB])
         return
+
+    def get_registers(self):
+        """
+        Read the configuration and output registers.  IODIRA to GPPUB are
+        read in one block read and the output latches in a second read.
+        GPIO, INTF and INTCAP are not read as reading the port clears the
+        interrupts.  Save the result with abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        with self.__lock:
+            registers = self.__read_configuration()
+            latches = self.__bus.read_word_data(self.__io_address, self.OLATA)
+        registers[self.OLATA] = latches & 0xFF
+        registers[self.OLATB] = latches >> 8
+        for register in (self.IOCON + 1, self.INTFA, self.INTFB):
+            registers.pop(register, None)
+        return registers
+
+    def set_registers(self, registers):
+        """
+        Restore registers saved with get_registers.  The registers are read
+        in one block read and only the registers with a different value are
+        written, so outputs that are already set do not change.
+
+        :param registers: register values keyed by register number
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        registers = dict((register, registers[register])
+                         for group in self.__RESTORE_ORDER
+                         for register in group if register in registers)
+        with self.__lock:
+            current = self.__read_configuration()
+            latches = self.__bus.read_word_data(self.__io_address, self.OLATA)
+            current[self.OLATA] = latches & 0xFF
+            current[self.OLATB] = latches >> 8
+            return self.__write_changed(current, registers)
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
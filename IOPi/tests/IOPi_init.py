@@ -32,9 +32,8 @@ W 0x20 0xA0 0x02
 10ms delay
 
 W 0x20 0xA0 0x02
-W 0x20 0x00 0xFF 0xFF
+W 0x20 0x00 0xFF 0xFF 0x00 0x00
 W 0x20 0x0C 0x00 0x00
-W 0x20 0x02 0x00 0x00
 
 """
 from __future__ import absolute_import, division, print_function, \
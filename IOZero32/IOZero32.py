@@ -13,14 +13,32 @@ When writing to or reading from a bus or port the least significant bit
 represents the lowest numbered pin on the selected port.
 """
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
 except ImportError:
+    _i2cbus = None  # class file copied without the abelectronics package
+from contextlib import nullcontext
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
     try:
-        from smbus import SMBus
+        from smbus2 import SMBus
     except ImportError:
-        raise ImportError("python-smbus or smbus2 not found")
-import re
-import platform
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class IOZero32(object):
@@ -41,6 +59,12 @@ class IOZero32(object):
     CONFIGPORT0 = 0x06  # Command byte Configuration port 0
     CONFIGPORT1 = 0x07  # Command byte Configuration port 1
 
+    # register pairs written by set_registers, in the order they are
+    # written.  The outputs are written before the directions so pins that
+    # become outputs start at the saved level.
+    __RESTORE_ORDER = ((OUTPUTPORT0, OUTPUTPORT1), (INVERTPORT0, INVERTPORT1),
+                       (CONFIGPORT0, CONFIGPORT1))
+
     # variables
     __io_address = 0x20  # I2C address
     __bus = None
@@ -51,9 +75,11 @@ class IOZero32(object):
 
         :param address: i2c address for the target device, 0x20 to 0x27
         :type address: int       
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
         """
 
         if address < 0x20 or address > 0x27:
@@ -61,6 +87,7 @@ class IOZero32(object):
 
         self.__io_address = address
         self.__bus = self.__get_smbus(bus)
+        self.__lock = self.__get_lock(self.__bus, self.__io_address)
 
         return
 
@@ -70,18 +97,30 @@ class IOZero32(object):
         """
         Internal method for getting an instance of the i2c bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: I2C bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the i2c bus
         """
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c__bus = 1
         if bus is not None:
             i2c__bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -118,9 +157,26 @@ class IOZero32(object):
                                 i2c__bus = 1  # later models
                             break
         try:
-            return SMBus(i2c__bus)
+            return _open_smbus(i2c__bus)
         except IOError:
-            raise 'Could not open the i2c bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the i2c bus
+
+        :param bus: i2c bus for the target device
+        :type bus: SMBus
+        :param address: i2c address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
     @staticmethod
     def __check_bit(byte, bit):
@@ -188,9 +244,10 @@ class IOZero32(object):
         if value < 0 or value > 1:
             raise ValueError("value out of range: 0 or 1")
 
-        current_value = self.__bus.read_byte_data(self.__io_address, reg)
-        new_value = self.__update_byte(current_value, pin, value)
-        self.__bus.write_byte_data(self.__io_address, reg, new_value)
+        with self.__lock:
+            current_value = self.__bus.read_byte_data(self.__io_address, reg)
+            new_value = self.__update_byte(current_value, pin, value)
+            self.__bus.write_byte_data(self.__io_address, reg, new_value)
 
         return
 
@@ -516,3 +573,79 @@ class IOZero32(object):
         :rtype: int
         """
         return self.__bus.read_word_data(self.__io_address, self.INVERTPORT0)
+
+    def __read_configuration(self):
+        """
+        Internal method for reading the output, polarity inversion and
+        configuration registers.  The PCA9535 register pointer only moves
+        between the two registers of a pair, so each pair is read with one
+        word read.
+
+        :return: register values
+        :rtype: dict
+        """
+        registers = {}
+        for low, high in self.__RESTORE_ORDER:
+            value = self.__bus.read_word_data(self.__io_address, low)
+            registers[low] = value & 0xFF
+            registers[high] = value >> 8
+        return registers
+
+    def get_registers(self):
+        """
+        Read the output, polarity inversion and configuration registers.
+        The input ports are not read as reading them clears the interrupt.
+        Save the result with abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        with self.__lock:
+            return self.__read_configuration()
+
+    def set_registers(self, registers):
+        """
+        Restore registers saved with get_registers.  Only the registers with
+        a different value are written, register pairs in one transaction, so
+        outputs that are already set do not change.
+
+        :param registers: register values keyed by register number
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        written = 0
+        with self.__lock:
+            current = self.__read_configuration()
+            for group in self.__RESTORE_ORDER:
+                changed = [register for register in group
+                           if register in registers and
+                           registers[register] != current[register]]
+                if len(changed) == 2:
+                    self.__bus.write_word_data(
+                        self.__io_address, group[0],
+                        registers[group[0]] | (registers[group[1]] << 8))
+                elif changed:
+                    self.__bus.write_byte_data(self.__io_address, changed[0],
+                                               registers[changed[0]])
+                written += len(changed)
+        return written
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
@@ -7,15 +7,33 @@ Requires smbus2 or python smbus to be installed
 ================================================
 """
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
 except ImportError:
+    _i2cbus = None  # class file copied without the abelectronics package
+from contextlib import nullcontext
+import datetime
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
     try:
-        from smbus import SMBus
+        from smbus2 import SMBus
     except ImportError:
-        raise ImportError("python3-smbus or smbus2 not found")
-import re
-import platform
-import datetime
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python3-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class RTC:
@@ -51,18 +69,30 @@ class RTC:
         """
         Internal method for getting an instance of the I2C bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: I2C bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the I2C bus
         """
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c_bus = 1
         if bus is not None:
             i2c_bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -99,9 +129,26 @@ class RTC:
                                 i2c_bus = 1  # later models
                             break
         try:
-            return SMBus(i2c_bus)
+            return _open_smbus(i2c_bus)
         except IOError:
-            raise 'Could not open the I2C bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the I2C bus
+
+        :param bus: I2C bus for the target device
+        :type bus: SMBus
+        :param address: I2C address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
     @staticmethod
     def __update_byte(byte, bit, value):
@@ -168,16 +215,45 @@ class RTC:
 
     # public methods
 
-    def __init__(self, bus=None):
+    def __init__(self, bus=None, initialise=True, warm_start=False):
         """
         Initialise the RTC module
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
+        :param initialise: True = square-wave output disabled and the
+                           output pin set low.
+                           False = control register left unchanged.
+                           defaults to True
+        :type initialise: bool, optional
+        :param warm_start: True = read the control register first and only
+                           write it if it does not already have the
+                           setting, defaults to False
+        :type warm_start: bool, optional
+        :raises ValueError: initialise must be bool
         """
+        if type(initialise) is not bool:
+            raise ValueError("__init__ initialise must be bool: True or False")
         self.__bus = self.__get_smbus(bus)
-        self.__bus.write_byte_data(self.__rtc_address, self.CONTROL,
-                                   self.__rtc_config)
+        self.__lock = self.__get_lock(self.__bus, self.__rtc_address)
+        if initialise is False:
+            return
+        if warm_start is not True:
+            self.__bus.write_byte_data(self.__rtc_address, self.CONTROL,
+                                       self.__rtc_config)
+            return
+        # only write the control register if it is not already set
+        with self.__lock:
+            try:
+                control = self.__bus.read_byte_data(self.__rtc_address,
+                                                    self.CONTROL)
+            except IOError:
+                control = None
+            if control != self.__rtc_config:
+                self.__bus.write_byte_data(self.__rtc_address, self.CONTROL,
+                                           self.__rtc_config)
         return
 
     def set_date(self, date):
@@ -223,10 +299,11 @@ class RTC:
         Enable the output pin
         """
 
-        self.__rtc_config = self.__update_byte(self.__rtc_config, 7, 1)
-        self.__rtc_config = self.__update_byte(self.__rtc_config, 4, 1)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            self.__rtc_config = self.__update_byte(self.__rtc_config, 7, 1)
+            self.__rtc_config = self.__update_byte(self.__rtc_config, 4, 1)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def disable_output(self):
@@ -234,10 +311,11 @@ class RTC:
         Disable the output pin
         """
 
-        self.__rtc_config = self.__update_byte(self.__rtc_config, 7, 0)
-        self.__rtc_config = self.__update_byte(self.__rtc_config, 4, 0)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            self.__rtc_config = self.__update_byte(self.__rtc_config, 7, 0)
+            self.__rtc_config = self.__update_byte(self.__rtc_config, 4, 0)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def set_frequency(self, frequency):
@@ -248,20 +326,21 @@ class RTC:
         :type frequency: int
         """
 
-        if frequency == 1:
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 0)
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 0)
-        if frequency == 2:
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 1)
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 0)
-        if frequency == 3:
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 0)
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 1)
-        if frequency == 4:
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 1)
-            self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 1)
-        self.__bus.write_byte_data(
-            self.__rtc_address, self.CONTROL, self.__rtc_config)
+        with self.__lock:
+            if frequency == 1:
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 0)
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 0)
+            if frequency == 2:
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 1)
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 0)
+            if frequency == 3:
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 0)
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 1)
+            if frequency == 4:
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 0, 1)
+                self.__rtc_config = self.__update_byte(self.__rtc_config, 1, 1)
+            self.__bus.write_byte_data(
+                self.__rtc_address, self.CONTROL, self.__rtc_config)
         return
 
     def write_memory(self, address, valuearray):
@@ -314,3 +393,83 @@ class RTC:
                                 length exceeds 0x3F')
         else:
             raise ValueError('read_memory: address out of range')
+
+    def get_registers(self):
+        """
+        Read the time, control and RAM registers, 0x00 to 0x3F.  Save the
+        result with abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        registers = {}
+        with self.__lock:
+            for start in (0x00, 0x20):
+                registers.update(enumerate(self.__bus.read_i2c_block_data(
+                    self.__rtc_address, start, 32), start))
+        return registers
+
+    def set_registers(self, registers):
+        """
+        Restore the control register and RAM saved with get_registers.
+        Only the registers with a different value are written, consecutive
+        registers in one transaction.  The time registers are not restored,
+        use set_date to set the time.
+
+        :param registers: register values keyed by register number
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        written = 0
+        with self.__lock:
+            if self.CONTROL in registers:
+                control = registers[self.CONTROL] & 0xFF
+                if self.__bus.read_byte_data(self.__rtc_address,
+                                             self.CONTROL) != control:
+                    self.__bus.write_byte_data(self.__rtc_address,
+                                               self.CONTROL, control)
+                    written += 1
+                self.__rtc_config = control
+            memory = sorted(register for register in registers
+                            if 0x08 <= register <= 0x3F)
+            if memory:
+                current = []
+                while len(current) < memory[-1] - memory[0] + 1:
+                    current += self.__bus.read_i2c_block_data(
+                        self.__rtc_address, memory[0] + len(current),
+                        min(32, memory[-1] - memory[0] + 1 - len(current)))
+                changed = [register for register in memory
+                           if registers[register] & 0xFF !=
+                           current[register - memory[0]]]
+                start = 0
+                for i in range(1, len(changed) + 1):
+                    if i == len(changed) or \
+                            changed[i] != changed[i - 1] + 1 or \
+                            i - start == 32:
+                        self.__bus.write_i2c_block_data(
+                            self.__rtc_address, changed[start],
+                            [registers[register] & 0xFF
+                             for register in changed[start:i]])
+                        start = i
+                written += len(changed)
+        return written
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
@@ -4,21 +4,61 @@
 AB Electronics UK ServoPi 16-Channel PWM Servo Driver
 
 Requires smbus2 or python smbus to be installed
+The output enable pin requires RPi.GPIO
 ================================================
 """
 
 try:
-    from smbus2 import SMBus
+    from abelectronics import i2cbus as _i2cbus
+    from abelectronics import profiling as _profiling
 except ImportError:
-    try:
-        from smbus import SMBus
-    except ImportError:
-        raise ImportError("python3-smbus or smbus2 not found")
-import re
+    _i2cbus = None  # class file copied without the abelectronics package
+    _profiling = None
 import time
 import math
-import platform
-import RPi.GPIO as GPIO
+from contextlib import nullcontext
+
+GPIO = None  # RPi.GPIO is imported when the first PWM object is created
+
+
+def _import_gpio():
+    """
+    Internal method for importing RPi.GPIO when it is first needed so the
+    module can be imported on computers without GPIO pins
+
+    :return: RPi.GPIO module or None if RPi.GPIO can not be used
+    :rtype: module
+    """
+    global GPIO
+    if GPIO is None:
+        try:
+            import RPi.GPIO as gpio
+        except (ImportError, RuntimeError):
+            return None  # not installed or not running on a Raspberry Pi
+        GPIO = gpio
+    return GPIO
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus.  smbus2 or python smbus is
+    imported when the first bus is opened, so importing the class does not
+    load it.
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
+    try:
+        from smbus2 import SMBus
+    except ImportError:
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python3-smbus or smbus2 not found")
+    return SMBus(bus)
 
 
 class PWM(object):
@@ -45,6 +85,7 @@ class PWM(object):
 
     # Define mode bits
     __MODE1_EXTCLK = 6  # use external clock
+    __MODE1_AI = 5  # register auto-increment
     __MODE1_SLEEP = 4  # sleep mode
     __MODE1_ALLCALL = 0  # all call address
 
@@ -54,7 +95,7 @@ class PWM(object):
     __MODE2_OUTNE1 = 0  # output mode when not enabled
 
     # Local variables
-    __mode1_default = 0x00
+    __mode1_default = 0x20  # auto-increment on for block writes
     __mode2_default = 0x0C
     __oe_pin = 7
     __address = 0x40
@@ -66,18 +107,30 @@ class PWM(object):
         """
         Internal method for getting an instance of the I2C bus
 
-        :param bus: I2C bus number.  If the value is None the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If the value is None the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus
         :return: I2C bus for the target device
         :rtype: SMBus
         :raises IOError: Could not open the I2C bus
         """
+        if _i2cbus is not None:
+            # shared bus handle with the bus number detected once per process
+            return _i2cbus.get_smbus(bus)
+
+        if bus is not None and not isinstance(bus, int):
+            return bus  # use the SMBus compatible object directly
+
         i2c__bus = 1
         if bus is not None:
             i2c__bus = bus
         else:
             # detect the device that is being used
+            # imported here as they are only needed to detect the bus
+            import platform
+            import re
             device = platform.uname()[1]
 
             if device == "orangepione":  # orange pi one
@@ -114,9 +167,26 @@ class PWM(object):
                                 i2c__bus = 1  # later models
                             break
         try:
-            return SMBus(i2c__bus)
+            return _open_smbus(i2c__bus)
         except IOError:
-            raise 'Could not open the i2c bus'
+            raise IOError('Could not open the I2C bus')
+
+    @staticmethod
+    def __get_lock(bus, address):
+        """
+        Internal method for getting the lock for a device on the I2C bus
+
+        :param bus: I2C bus for the target device
+        :type bus: SMBus
+        :param address: I2C address for the target device
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled in abelectronics.i2cbus
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if _i2cbus is not None:
+            return _i2cbus.device_lock(bus, address)
+        return nullcontext()
 
     @staticmethod
     def __check_bit(byte, bit):
@@ -139,45 +209,151 @@ class PWM(object):
         """
         Internal method for writing data to the I2C bus
 
+        :param reg: register
+        :type reg: int
         :param value: value to write
         :type value: int
-        :return: IOError
-        :rtype: IOError
+        :raises IOError: Could not write to the I2C bus
         """
-        try:
-            self.__bus.write_byte_data(self.__address, reg, value)
-        except IOError as err:
-            return err
+        self.__bus.write_byte_data(self.__address, reg, value)
+
+    def __write_block(self, reg, values):
+        """
+        Internal method for writing to consecutive registers in one
+        I2C transaction.  Needs the MODE1 auto-increment bit to be set.
+
+        :param reg: first register
+        :type reg: int
+        :param values: values to write
+        :type values: list
+        :raises IOError: Could not write to the I2C bus
+        """
+        self.__bus.write_i2c_block_data(self.__address, reg, values)
+
+    def __read_registers(self, registers):
+        """
+        Internal method for reading several device registers.  The reads
+        are sent as one i2c_rdwr call when combined reads are enabled with
+        abelectronics.i2cbus.set_combined_reads.
+
+        :param registers: register numbers
+        :type registers: list
+        :return: value of each register
+        :rtype: list
+        :raises IOError: Could not read from the I2C bus
+        """
+        if _i2cbus is not None:
+            return _i2cbus.read_registers(self.__bus, self.__address, registers)
+        return [self.__bus.read_byte_data(self.__address, register)
+                for register in registers]
+
+    def __read_block(self, reg, length):
+        """
+        Internal method for reading consecutive registers.  The registers
+        are read in one i2c_rdwr call when combined reads are enabled with
+        abelectronics.i2cbus.set_combined_reads, otherwise in block reads
+        of up to 32 bytes.  Needs the MODE1 auto-increment bit to be set.
+
+        :param reg: first register
+        :type reg: int
+        :param length: number of registers
+        :type length: int
+        :return: value of each register
+        :rtype: list
+        :raises IOError: Could not read from the I2C bus
+        """
+        if _i2cbus is not None:
+            return _i2cbus.read_block(self.__bus, self.__address, reg, length)
+        values = []
+        while len(values) < length:
+            values += self.__bus.read_i2c_block_data(
+                self.__address, reg + len(values), min(32, length - len(values)))
+        return values
+
+    def __write_prescaler(self, value):
+        """
+        Internal method for setting the prescaler.  The prescaler can only
+        be written in sleep mode so the device is put to sleep and restarted.
+        With warm_start the device is not restarted when the prescaler
+        already has the value.
+
+        :param value: 3 to 255
+        :type value: int
+        """
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            if self.__warm_start is True and \
+                    self.__read(self.__PRE_SCALE) == value:
+                return
+            new_mode = (old_mode & 0x7F) | 0x10
+            self.__write(self.__MODE1, new_mode)
+            self.__write(self.__PRE_SCALE, value)
+            self.__write(self.__MODE1, old_mode)
+            # the writes are deferred when the bus is a WriteQueue, send
+            # them before waiting for the oscillator to restart
+            flush = getattr(self.__bus, "flush", None)
+            if flush is not None:
+                flush()
+            time.sleep(0.005)
+            self.__write(self.__MODE1, old_mode | 0x80)
 
     def __read(self, reg):
         """
         Internal method for reading data from the I2C bus
 
-        :return: IOError
-        :rtype: IOError
+        :param reg: register
+        :type reg: int
+        :return: register value
+        :rtype: int
+        :raises IOError: Could not read from the I2C bus
         """
-        try:
-            result = self.__bus.read_byte_data(self.__address, reg)
-            return result
-        except IOError as err:
-            return err
+        return self.__bus.read_byte_data(self.__address, reg)
 
     # public methods
 
-    def __init__(self, address=0x40, bus=None):
+    def __init__(self, address=0x40, bus=None, warm_start=False):
         """
         init object with I2C address, default is 0x40 for ServoPi board
 
         :param address: device I2C address, defaults to 0x40
         :type address: int, optional
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the I2C bus automatically using the device name
-        :type bus: int, optional
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the I2C bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
+        :param warm_start: True = read the mode registers first and only
+                           write the registers that do not already have the
+                           settings, and only restart the oscillator in
+                           set_pwm_freq when the prescaler changes, so
+                           creating the object again does not disturb a
+                           running device, defaults to False
+        :type warm_start: bool, optional
         """
         self.__address = address
         self.__bus = self.__get_smbus(bus)
-        self.__write(self.__MODE1, self.__mode1_default)
-        self.__write(self.__MODE2, self.__mode2_default)
+        self.__lock = self.__get_lock(self.__bus, self.__address)
+        self.__warm_start = warm_start
+        if warm_start is True:
+            # the mode registers are only written if they are not already
+            # set so creating the object again does not disturb the outputs
+            with self.__lock:
+                try:
+                    mode1, mode2 = self.__read_registers([self.__MODE1,
+                                                          self.__MODE2])
+                    mode1 &= 0x7F  # RESTART
+                except IOError:
+                    mode1 = mode2 = None
+                if mode1 != self.__mode1_default:
+                    self.__write(self.__MODE1, self.__mode1_default)
+                if mode2 != self.__mode2_default:
+                    self.__write(self.__MODE2, self.__mode2_default)
+        else:
+            self.__write(self.__MODE1, self.__mode1_default)
+            self.__write(self.__MODE2, self.__mode2_default)
+        if _import_gpio() is None:
+            return  # the OE pin can not be used without RPi.GPIO
+
         GPIO.setwarnings(False)
 
         mode = GPIO.getmode()  # Check if the GPIO mode has been set
@@ -212,13 +388,7 @@ class PWM(object):
         scale_value -= 1.0
         pre_scaler = math.floor(scale_value + 0.5)
         pre_scaler = pre_scaler + calibration
-        old_mode = self.__read(self.__MODE1)
-        new_mode = (old_mode & 0x7F) | 0x10
-        self.__write(self.__MODE1, new_mode)
-        self.__write(self.__PRE_SCALE, int(pre_scaler))
-        self.__write(self.__MODE1, old_mode)
-        time.sleep(0.005)
-        self.__write(self.__MODE1, old_mode | 0x80)
+        self.__write_prescaler(int(pre_scaler))
 
     def set_pwm(self, channel, on_time, off_time):
         """
@@ -250,13 +420,9 @@ class PWM(object):
 
         channel = channel - 1
 
-        self.__write(self.__LED0_ON_L + 4 * channel,
-                     on_time & 0xFF)
-        self.__write(self.__LED0_ON_H + 4 * channel, on_time >> 8)
-        self.__write(self.__LED0_OFF_L + 4 * channel,
-                     off_time & 0xFF)
-        self.__write(self.__LED0_OFF_H + 4 * channel,
-                     off_time >> 8)
+        self.__write_block(self.__LED0_ON_L + 4 * channel,
+                           [on_time & 0xFF, on_time >> 8,
+                            off_time & 0xFF, off_time >> 8])
 
     def set_pwm_on_time(self, channel, on_time):
         """
@@ -277,9 +443,8 @@ class PWM(object):
 
         channel = channel - 1
 
-        self.__write(self.__LED0_ON_L + 4 * channel,
-                     on_time & 0xFF)
-        self.__write(self.__LED0_ON_H + 4 * channel, on_time >> 8)
+        self.__write_block(self.__LED0_ON_L + 4 * channel,
+                           [on_time & 0xFF, on_time >> 8])
 
     def set_pwm_off_time(self, channel, off_time):
         """
@@ -300,10 +465,8 @@ class PWM(object):
 
         channel = channel - 1
 
-        self.__write(self.__LED0_OFF_L + 4 * channel,
-                     off_time & 0xFF)
-        self.__write(self.__LED0_OFF_H + 4 * channel,
-                     off_time >> 8)
+        self.__write_block(self.__LED0_OFF_L + 4 * channel,
+                           [off_time & 0xFF, off_time >> 8])
 
     def get_pwm_on_time(self, channel):
         """
@@ -319,8 +482,10 @@ class PWM(object):
             raise ValueError('get_pwm_on_time: channel out of range')
 
         channel = channel - 1
-        low_byte = self.__read(self.__LED0_ON_L + 4 * channel)
-        high_byte = self.__read(self.__LED0_ON_H + 4 * channel)
+        with self.__lock:
+            low_byte, high_byte = self.__read_registers(
+                [self.__LED0_ON_L + 4 * channel,
+                 self.__LED0_ON_H + 4 * channel])
         value = low_byte | high_byte << 8
 
         return value
@@ -339,8 +504,10 @@ class PWM(object):
             raise ValueError('get_pwm_off_time: channel out of range')
 
         channel = channel - 1
-        low_byte = self.__read(self.__LED0_OFF_L + 4 * channel)
-        high_byte = self.__read(self.__LED0_OFF_H + 4 * channel)
+        with self.__lock:
+            low_byte, high_byte = self.__read_registers(
+                [self.__LED0_OFF_L + 4 * channel,
+                 self.__LED0_OFF_H + 4 * channel])
         value = low_byte | high_byte << 8
 
         return value
@@ -368,10 +535,9 @@ class PWM(object):
             raise ValueError('set_all_pwm: on_time + off_time must not \
                              exceed 4095')
 
-        self.__write(self.__ALL_LED_ON_L, on_time & 0xFF)
-        self.__write(self.__ALL_LED_ON_H, on_time >> 8)
-        self.__write(self.__ALL_LED_OFF_L, off_time & 0xFF)
-        self.__write(self.__ALL_LED_OFF_H, off_time >> 8)
+        self.__write_block(self.__ALL_LED_ON_L,
+                           [on_time & 0xFF, on_time >> 8,
+                            off_time & 0xFF, off_time >> 8])
 
     def output_disable(self):
         """
@@ -379,6 +545,8 @@ class PWM(object):
 
         :raises IOError: Failed to write to GPIO pin
         """
+        if GPIO is None:
+            raise IOError("Failed to write to GPIO pin: RPi.GPIO not found")
         try:
             GPIO.output(self.__oe_pin, True)
         except IOError:
@@ -390,6 +558,8 @@ class PWM(object):
 
         :raises IOError: Failed to write to GPIO pin
         """
+        if GPIO is None:
+            raise IOError("Failed to write to GPIO pin: RPi.GPIO not found")
         try:
             GPIO.output(self.__oe_pin, False)
         except IOError:
@@ -402,42 +572,47 @@ class PWM(object):
         :param i2caddress: I2C address for the All Call function
         :type i2caddress: int
         """
-        old_mode = self.__read(self.__MODE1)
-        new_mode = old_mode | (1 << self.__MODE1_ALLCALL)
-        self.__write(self.__MODE1, new_mode)
-        self.__write(self.__ALLCALLADR, i2caddress << 1)
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            new_mode = old_mode | (1 << self.__MODE1_ALLCALL)
+            self.__write(self.__MODE1, new_mode)
+            self.__write(self.__ALLCALLADR, i2caddress << 1)
 
     def enable_allcall_address(self):
         """
         Enable the I2C address for the All Call function
         """
-        old_mode = self.__read(self.__MODE1)
-        new_mode = old_mode | (1 << self.__MODE1_ALLCALL)
-        self.__write(self.__MODE1, new_mode)
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            new_mode = old_mode | (1 << self.__MODE1_ALLCALL)
+            self.__write(self.__MODE1, new_mode)
 
     def disable_allcall_address(self):
         """
         Disable the I2C address for the All Call function
         """
-        old_mode = self.__read(self.__MODE1)
-        new_mode = old_mode & ~(1 << self.__MODE1_ALLCALL)
-        self.__write(self.__MODE1, new_mode)
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            new_mode = old_mode & ~(1 << self.__MODE1_ALLCALL)
+            self.__write(self.__MODE1, new_mode)
 
     def sleep(self):
         """
         Put the device into a sleep state
         """
-        old_mode = self.__read(self.__MODE1)
-        new_mode = old_mode | (1 << self.__MODE1_SLEEP)
-        self.__write(self.__MODE1, new_mode)
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            new_mode = old_mode | (1 << self.__MODE1_SLEEP)
+            self.__write(self.__MODE1, new_mode)
 
     def wake(self):
         """
         Wake the device from its sleep state
         """
-        old_mode = self.__read(self.__MODE1)
-        new_mode = old_mode & ~(1 << self.__MODE1_SLEEP)
-        self.__write(self.__MODE1, new_mode)
+        with self.__lock:
+            old_mode = self.__read(self.__MODE1)
+            new_mode = old_mode & ~(1 << self.__MODE1_SLEEP)
+            self.__write(self.__MODE1, new_mode)
 
     def is_sleeping(self):
         """
@@ -459,14 +634,102 @@ class PWM(object):
         :param state: True = inverted, False = non-inverted
         :type state: bool
         """
-        if state is True:
-            old_mode = self.__read(self.__MODE2)
-            new_mode = old_mode | (1 << self.__MODE2_INVRT)
-            self.__write(self.__MODE2, new_mode)
-        else:
-            old_mode = self.__read(self.__MODE2)
-            new_mode = old_mode & ~(1 << self.__MODE2_INVRT)
-            self.__write(self.__MODE2, new_mode)
+        with self.__lock:
+            if state is True:
+                old_mode = self.__read(self.__MODE2)
+                new_mode = old_mode | (1 << self.__MODE2_INVRT)
+                self.__write(self.__MODE2, new_mode)
+            else:
+                old_mode = self.__read(self.__MODE2)
+                new_mode = old_mode & ~(1 << self.__MODE2_INVRT)
+                self.__write(self.__MODE2, new_mode)
+
+    def get_registers(self):
+        """
+        Read the mode, address and channel registers, MODE1 to LED15_OFF_H,
+        in one block read and the prescaler.  Save the result with
+        abelectronics.snapshot.
+
+        :return: register values keyed by register number
+        :rtype: dict
+        """
+        with self.__lock:
+            registers = dict(enumerate(self.__read_block(
+                self.__MODE1, self.__LED0_ON_L + 64)))
+            registers[self.__PRE_SCALE] = self.__bus.read_byte_data(
+                self.__address, self.__PRE_SCALE)
+        return registers
+
+    def set_registers(self, registers):
+        """
+        Restore registers saved with get_registers.  The registers are read
+        in one block read and only the registers with a different value are
+        written, consecutive registers in one transaction, so channels that
+        are already set do not change.  The prescaler is written first and
+        MODE1 last, always with the auto-increment bit set.
+
+        :param registers: register values keyed by register number, any of
+                          MODE1 to LED15_OFF_H and the prescaler
+        :type registers: dict
+        :return: number of registers written
+        :rtype: int
+        """
+        last = self.__LED0_ON_L + 63
+        block = sorted(register for register in registers
+                       if self.__MODE2 <= register <= last)
+        written = 0
+        with self.__lock:
+            if self.__PRE_SCALE in registers:
+                if self.__read(self.__PRE_SCALE) != \
+                        registers[self.__PRE_SCALE]:
+                    self.__write_prescaler(registers[self.__PRE_SCALE])
+                    written += 1
+            if block:
+                current = self.__read_block(block[0],
+                                            block[-1] - block[0] + 1)
+                changed = [register for register in block
+                           if registers[register] !=
+                           current[register - block[0]]]
+                # runs of consecutive registers of up to 32 bytes
+                start = 0
+                for i in range(1, len(changed) + 1):
+                    if i == len(changed) or \
+                            changed[i] != changed[i - 1] + 1 or \
+                            i - start == 32:
+                        self.__write_block(
+                            changed[start],
+                            [registers[register] & 0xFF
+                             for register in changed[start:i]])
+                        start = i
+                written += len(changed)
+            if self.__MODE1 in registers:
+                # auto-increment stays on for the block writes, a snapshot
+                # from a device set up without it must not turn it off
+                mode1 = (registers[self.__MODE1] & 0x7F) | \
+                    self.__mode1_default
+                if self.__read(self.__MODE1) & 0x7F != mode1:
+                    self.__write(self.__MODE1, mode1)
+                    written += 1
+        return written
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__bus
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        if self.__bus is not None:
+            if _i2cbus is not None:
+                _i2cbus.release_smbus(self.__bus)
+            self.__bus = None
 
 
 class Servo(object):
@@ -480,22 +743,34 @@ class Servo(object):
     __use_offset = False
     __offset = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
     __frequency = 50
+    __warm_start = False
+    __LED0_ON_L = 0x06
 
     # local methods
 
     def __refresh_channels(self):
         """
-        Internal method for refreshing the servo positions
+        Internal method for refreshing the servo positions.  With
+        warm_start only the channels that are not already at their
+        positions are written.
         """
+        registers = {}
         for i in range(0, 16):
-            if self.__position == 0:
-                self.__pwm.set_pwm(i+1, 0, 0)
+            if self.__use_offset is True:
+                on_time = self.__offset[i]
             else:
-                if self.__use_offset is True:
-                    self.__pwm.set_pwm(i+1, self.__offset[i],
-                                       self.__position[i] + self.__offset[i])
-                else:
-                    self.__pwm.set_pwm(i+1, 0, self.__position[i])
+                on_time = 0
+            off_time = self.__position[i] + on_time
+            if self.__warm_start is not True:
+                self.__pwm.set_pwm(i + 1, on_time, off_time)
+                continue
+            channel = self.__LED0_ON_L + 4 * i
+            registers[channel] = on_time & 0xFF
+            registers[channel + 1] = on_time >> 8
+            registers[channel + 2] = off_time & 0xFF
+            registers[channel + 3] = off_time >> 8
+        if registers:
+            self.__pwm.set_registers(registers)
 
     def __calculate_offsets(self):
         """
@@ -506,14 +781,15 @@ class Servo(object):
         for i in range(0, 16):
             x = x + self.__high_position[i]
             if x > 4095 - self.__high_position[i]:
-                x = self.__high_position[0] / 2
+                x = self.__high_position[0] // 2
             self.__offset[i] = x
         self.__refresh_channels()
 
     # public methods
 
     def __init__(self, address=0x40, low_limit=1.0,
-                 high_limit=2.0, reset=True, bus=None):
+                 high_limit=2.0, reset=True, bus=None, frequency=50,
+                 warm_start=False):
         """
         Initialise the Servo object
 
@@ -529,23 +805,39 @@ class Servo(object):
                       False = keep existing servo positions and frequency.
                       defaults to True
         :type reset: bool, optional
-        :param bus: I2C bus number.  If no value is set the class will try to
-                    find the i2c bus automatically using the device name
-        :type bus: int, optional
-        """
-
-        self.__pwm = PWM(address, bus)
+        :param bus: I2C bus number or an SMBus compatible object such as
+                    simulator.FakeSMBus.  If no value is set the class
+                    will try to find the i2c bus automatically using the
+                    device name
+        :type bus: int or SMBus, optional
+        :param frequency: PWM frequency in Hz set when reset is True,
+                          defaults to 50
+        :type frequency: int, optional
+        :param warm_start: True = only write the mode registers, prescaler
+                           and channels that do not already have the
+                           settings, so creating the object again does not
+                           disturb running servos, defaults to False
+        :type warm_start: bool, optional
+        """
+
+        self.__warm_start = warm_start
+        self.__pwm = PWM(address, bus, warm_start)
         self.set_low_limit(low_limit)
         self.set_high_limit(high_limit)
 
         if reset is True:
-            self.set_frequency(50)
+            self.set_frequency(frequency)
             self.__calculate_offsets()  # reset the offset values
         else:
             # get the on and off times from the pwm controller
+            registers = self.__pwm.get_registers()
             for i in range(0, 16):
-                self.__offset[i] = self.__pwm.get_pwm_on_time(i + 1)
-                self.__position[i] = self.__pwm.get_pwm_off_time(i + 1) - self.__offset[i]
+                channel = self.__LED0_ON_L + 4 * i
+                self.__offset[i] = registers[channel] | \
+                    registers[channel + 1] << 8
+                self.__position[i] = (registers[channel + 2] |
+                                      registers[channel + 3] << 8) - \
+                    self.__offset[i]
 
     def move(self, channel, position, steps=250):
         """
@@ -570,6 +862,11 @@ class Servo(object):
         if steps < 0 or steps > 4095:
             raise ValueError('move: steps out of range')
 
+        # spans for each phase are recorded when profiling is enabled
+        profiler = _profiling.profiler if _profiling is not None else None
+        if profiler is not None:
+            phase_start = profiler.clock()
+
         if 0 <= position <= steps:
             high = float(self.__high_position[channel - 1])
             low = float(self.__low_position[channel - 1])
@@ -579,12 +876,19 @@ class Servo(object):
 
             self.__position[channel - 1] = pwm_value
 
+            if profiler is not None:
+                phase_start = profiler.record("Servo.move:convert",
+                                              phase_start)
+
             if self.__use_offset:
                 self.__pwm.set_pwm(channel, self.__offset[channel - 1],
                                    pwm_value + self.__offset[channel - 1])
 
             else:
                 self.__pwm.set_pwm(channel, 0, pwm_value)
+
+            if profiler is not None:
+                profiler.record("Servo.move:write", phase_start)
         else:
             raise ValueError('move: position out of range')
 
@@ -753,3 +1057,19 @@ class Servo(object):
         Check the sleep status of the device
         """
         return self.__pwm.is_sleeping()
+
+    def get_bus(self):
+        """
+        Get the I2C bus used by the board
+
+        :return: shared I2C bus handle, None after close is called
+        :rtype: abelectronics.i2cbus.SharedSMBus
+        """
+        return self.__pwm.get_bus()
+
+    def close(self):
+        """
+        Release the I2C bus.  The bus is closed when no other board
+        objects are using it.
+        """
+        self.__pwm.close()
@@ -0,0 +1,58 @@
+"""
+================================================
+AB Electronics UK Python Libraries
+
+Shared tools used across the AB Electronics UK expansion board libraries.
+================================================
+
+The board classes and the library modules can be used from this package.
+Each one is imported the first time it is used, so a program that only
+uses the IO Pi does not import the ADC, SPI or GPIO code:
+
+    import abelectronics
+
+    bus = abelectronics.IOPi(0x20)
+    boards = abelectronics.rig.load("rig.json")
+"""
+import importlib
+
+# driver module and class for each board class
+_BOARDS = {
+    "ADCDACPi": ("ADCDACPi", "ADCDACPi"),
+    "ADCDifferentialPi": ("ADCDifferentialPi", "ADCDifferentialPi"),
+    "ADCPi": ("ADCPi", "ADCPi"),
+    "I2CSwitch": ("I2CSwitch", "I2CSwitch"),
+    "IOPi": ("IOPi", "IOPi"),
+    "IOZero32": ("IOZero32", "IOZero32"),
+    "PWM": ("ServoPi", "PWM"),
+    "RTC": ("RTCPi", "RTC"),
+    "Servo": ("ServoPi", "Servo"),
+}
+
+# driver packages with more than one class
+_PACKAGES = ("ExpanderPi",)
+
+_MODULES = ("aio", "benchmark", "cli", "daemon", "i2cbus", "instrumentation",
+            "metrics", "profiling", "rawi2c", "recording", "remote", "retry",
+            "rig", "samplering", "scanner", "scheduler", "simulator",
+            "snapshot", "writequeue")
+
+
+def __getattr__(name):
+    if name in _BOARDS:
+        module_name, class_name = _BOARDS[name]
+        value = getattr(importlib.import_module(module_name), class_name)
+    elif name in _PACKAGES:
+        value = importlib.import_module(name)
+    elif name in _MODULES:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+    globals()[name] = value  # later lookups do not call __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_BOARDS) | set(_PACKAGES) |
+                  set(_MODULES))
@@ -0,0 +1,8 @@
+"""
+Run the abelectronics command line tool with python3 -m abelectronics
+"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
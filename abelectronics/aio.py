@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK asyncio Interface
+
+Runs board methods on worker threads so coroutines can use the boards
+without blocking the event loop.
+================================================
+
+Wrap a board object with AsyncBoard and await its methods.  Each board has
+its own worker thread, which runs the calls for that board one at a time
+in the order they were made.  Boards on the same I2C bus take turns on the
+bus for each I2C transaction through the bus lock, which AsyncBoard enables
+on the board's bus, so an IO Pi carries on while an ADC Pi on the same bus
+waits for an 18-bit conversion.
+
+With abelectronics.i2cbus.set_scheduling enabled the transactions of each
+board are sent at the priority given to AsyncBoard.
+
+Example:
+
+    import asyncio
+    from abelectronics import aio
+    from ADCPi import ADCPi
+
+    async def main():
+        adc = aio.AsyncBoard(ADCPi(0x68, 0x69, 18))
+        print(await adc.read_voltage(1))
+        await adc.close()
+
+    asyncio.run(main())
+"""
+import asyncio
+import concurrent.futures
+import functools
+import queue
+import threading
+
+from . import scheduler
+from .i2cbus import SharedSMBus
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+class BusWorker(object):
+    """
+    Worker thread that runs the calls for one board, or for a group of
+    boards that share a key, in the order they were submitted.
+    """
+
+    def __init__(self, key, priority=None):
+        """
+        :param key: worker identifier, used to name the thread
+        :type key: tuple
+        :param priority: bus scheduler priority for the calls,
+                         None = scheduler.NORMAL, defaults to None
+        :type priority: int, optional
+        """
+        self.key = key
+        self.priority = priority
+        self.references = 0
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(
+            target=self.__run,
+            name="abelectronics-" + "-".join(str(part) for part in key))
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __run(self):
+        """
+        Internal method that runs the submitted calls until stop is called
+        """
+        if self.priority is not None:
+            scheduler.set_thread_priority(self.priority)
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            future, function, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as err:
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+
+    @property
+    def thread(self):
+        """
+        :return: worker thread
+        :rtype: threading.Thread
+        """
+        return self.__thread
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue a call on the worker thread
+
+        :param function: function to call
+        :type function: callable
+        :return: future for the result of the call
+        :rtype: concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        self.__queue.put((future, function, args, kwargs))
+        return future
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Run a call on the worker thread and wait for the result without
+        blocking the event loop
+
+        :param function: function to call
+        :type function: callable
+        :return: result of the call
+        """
+        return await asyncio.wrap_future(
+            self.submit(function, *args, **kwargs))
+
+    def stop(self, wait=True):
+        """
+        Stop the worker thread after the queued calls have finished
+
+        :param wait: True = wait for the thread to finish, defaults to True
+        :type wait: bool, optional
+        """
+        self.__queue.put(None)
+        if wait and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+
+def get_worker(key, priority=None):
+    """
+    Get the worker thread for a key, starting it if needed.  Each call
+    adds a reference to the worker, removed with release_worker.
+
+    :param key: worker identifier
+    :type key: tuple
+    :param priority: bus scheduler priority for a new worker,
+                     defaults to None
+    :type priority: int, optional
+    :return: worker
+    :rtype: BusWorker
+    """
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None:
+            worker = _workers[key] = BusWorker(key, priority)
+        worker.references += 1
+        return worker
+
+
+def release_worker(worker):
+    """
+    Release a worker returned by get_worker.  The worker thread stops after
+    its queued calls when the last reference is released.
+
+    :param worker: worker
+    :type worker: BusWorker
+    """
+    with _workers_lock:
+        if worker.references == 0:
+            return
+        worker.references -= 1
+        if worker.references > 0:
+            return
+        if _workers.get(worker.key) is worker:
+            del _workers[worker.key]
+    worker.stop(wait=False)
+
+
+def bus_key(board):
+    """
+    Find the bus used by a board object from its get_bus method
+
+    :param board: board object
+    :type board: object
+    :return: bus identifier, ("i2c", bus number) for I2C boards that
+             opened the bus by number, ("i2c", id) for I2C boards using an
+             SMBus object supplied by the caller or ("board", id) for boards
+             without a shared I2C bus, such as the SPI boards
+    :rtype: tuple
+    """
+    get_bus = getattr(board, "get_bus", None)
+    bus = get_bus() if callable(get_bus) else None
+    if isinstance(bus, SharedSMBus):
+        if bus.owner:
+            return ("i2c", bus.bus)
+        return ("i2c", id(bus.smbus))  # SMBus object supplied by the caller
+    return ("board", id(board))
+
+
+def _call(level, function, *args, **kwargs):
+    """
+    Internal method for running a call at a bus scheduler priority
+    """
+    with scheduler.priority(level):
+        return function(*args, **kwargs)
+
+
+def shutdown():
+    """
+    Stop every worker thread
+    """
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
+
+
+class AsyncBoard(object):
+    """
+    asyncio wrapper for a board object.  Each method of the board is
+    available as a coroutine that runs on the worker thread for the board.
+    Other attributes are returned unchanged.
+    """
+
+    def __init__(self, board, key=None, priority=None):
+        """
+        :param board: board object such as IOPi, ADCPi or Servo
+        :type board: object
+        :param key: worker identifier, boards with the same key share one
+                    worker thread, defaults to bus_key(board) so the boards
+                    on a bus share the worker for the bus
+        :type key: tuple, optional
+        :param priority: bus scheduler priority for the calls such as
+                         abelectronics.scheduler.REALTIME,
+                         defaults to NORMAL
+        :type priority: int, optional
+        :raises ValueError: key is not the bus key and the board uses a
+                            shared I2C bus without locking
+        """
+        self.board = board
+        self.priority = priority
+        default = bus_key(board)
+        if key is not None and key != default and default[0] == "i2c" and \
+                not board.get_bus().locking:
+            raise ValueError("a board with its own worker needs the bus "
+                             "lock, call abelectronics.i2cbus.set_locking("
+                             "True) before creating the board")
+        self.worker = get_worker(key or default)
+        self.__released = False
+
+    def __getattr__(self, name):
+        attribute = getattr(self.board, name)
+        if not callable(attribute):
+            return attribute
+        worker = self.worker
+        level = self.priority
+
+        @functools.wraps(attribute)
+        async def method(*args, **kwargs):
+            if level is None:
+                return await worker.run(attribute, *args, **kwargs)
+            return await worker.run(_call, level, attribute, *args, **kwargs)
+        setattr(self, name, method)
+        return method
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the board on the worker thread if the board has a close method
+        and release the worker
+        """
+        close = getattr(self.board, "close", None)
+        try:
+            if close is not None:
+                await self.worker.run(close)
+        finally:
+            if not self.__released:
+                self.__released = True
+                release_worker(self.worker)
@@ -0,0 +1,641 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Driver Benchmarks
+
+Measures the public methods of the board classes on simulated devices or
+on the boards in a rig configuration file.
+================================================
+
+For each method the benchmark reports:
+
+calls/sec             - calls per second, measured over the duration
+transactions/call     - I2C or SPI transactions for each call
+bytes/call            - bytes written and read on the bus for each call
+
+The simulated ADCs complete their conversions immediately so the results
+measure the time spent in the library.  The transaction and byte counts
+are the same as on the hardware.
+
+run_rig measures the methods of the boards created by abelectronics.rig
+on the real devices.  The transactions are counted with the bus
+instrumentation.  Only the methods that read from the devices are run
+unless writes is True, as the other methods change the outputs.  Reading
+the IO Pi ports clears any pending interrupts.
+
+Example:
+
+    from abelectronics import benchmark
+
+    results = benchmark.run_cases(boards=["IOPi"], duration=0.1)
+    benchmark.write_table(results, sys.stdout)
+
+or from the command line:
+
+    abelectronics bench --board IOPi
+    abelectronics bench --rig rig.json
+"""
+import argparse
+import csv
+import datetime
+import json
+import platform
+import sys
+import time
+
+from . import i2cbus
+from .simulator import FakeSMBus, FakeSpiDev, MCP3424, MCP23017, PCA9535, \
+    PCA9685, DS1307, PCA9546A, MCP3208, MCP3202, MCP4822
+from ADCPi import ADCPi
+from ADCDifferentialPi import ADCDifferentialPi
+from ADCDACPi import ADCDACPi
+import ExpanderPi
+from I2CSwitch import I2CSwitch
+from IOPi import IOPi
+from IOZero32 import IOZero32
+from RTCPi import RTC
+from ServoPi import PWM, Servo
+
+
+def i2c_board(create, *devices):
+    """
+    Create a board object on a simulated I2C bus
+
+    :param create: function called with the bus that creates the board
+    :type create: callable
+    :return: board object and the buses to count
+    :rtype: tuple
+    """
+    smbus = FakeSMBus(1, devices=list(devices))
+    return create(smbus), [smbus]
+
+
+def adcdacpi():
+    """
+    Create an ADCDACPi object on simulated SPI devices
+    """
+    adc = FakeSpiDev(MCP3202())
+    dac = FakeSpiDev(MCP4822())
+    return ADCDACPi(1, adc, dac), [adc, dac]
+
+
+def expanderpi_adc():
+    """
+    Create an Expander Pi ADC object on a simulated SPI device
+    """
+    spi = FakeSpiDev(MCP3208())
+    return ExpanderPi.ADC(spi), [spi]
+
+
+def expanderpi_dac():
+    """
+    Create an Expander Pi DAC object on a simulated SPI device
+    """
+    spi = FakeSpiDev(MCP4822())
+    return ExpanderPi.DAC(1, spi), [spi]
+
+
+# board name: function that returns the board object and the buses
+BOARDS = {
+    "ADCPi": lambda: i2c_board(
+        lambda bus: ADCPi(0x68, 0x69, 12, bus),
+        MCP3424(0x68, 0), MCP3424(0x69, 0)),
+    "ADCDifferentialPi": lambda: i2c_board(
+        lambda bus: ADCDifferentialPi(0x68, 0x69, 12, bus),
+        MCP3424(0x68, 0), MCP3424(0x69, 0)),
+    "ADCDACPi": adcdacpi,
+    "ExpanderPi.ADC": expanderpi_adc,
+    "ExpanderPi.DAC": expanderpi_dac,
+    "ExpanderPi.IO": lambda: i2c_board(
+        lambda bus: ExpanderPi.IO(True, bus), MCP23017(0x20)),
+    "ExpanderPi.RTC": lambda: i2c_board(
+        lambda bus: ExpanderPi.RTC(bus), DS1307(0x68)),
+    "I2CSwitch": lambda: i2c_board(
+        lambda bus: I2CSwitch(0x70, bus), PCA9546A(0x70)),
+    "IOPi": lambda: i2c_board(
+        lambda bus: IOPi(0x20, True, bus), MCP23017(0x20)),
+    "IOZero32": lambda: i2c_board(
+        lambda bus: IOZero32(0x20, bus), PCA9535(0x20)),
+    "RTCPi": lambda: i2c_board(lambda bus: RTC(bus), DS1307(0x68)),
+    "ServoPi.PWM": lambda: i2c_board(
+        lambda bus: PWM(0x40, bus), PCA9685(0x40)),
+    "ServoPi.Servo": lambda: i2c_board(
+        lambda bus: Servo(0x40, bus=bus), PCA9685(0x40)),
+}
+
+# board name, method, arguments
+_IO_CASES = (
+    ("set_pin_direction", (1, 0)),
+    ("get_pin_direction", (1,)),
+    ("set_port_direction", (0, 0x00)),
+    ("get_port_direction", (0,)),
+    ("set_bus_direction", (0x0000,)),
+    ("get_bus_direction", ()),
+    ("set_pin_pullup", (1, 1)),
+    ("get_pin_pullup", (1,)),
+    ("set_port_pullups", (0, 0xFF)),
+    ("get_port_pullups", (0,)),
+    ("set_bus_pullups", (0xFFFF,)),
+    ("get_bus_pullups", ()),
+    ("write_pin", (1, 1)),
+    ("write_port", (0, 0x55)),
+    ("write_bus", (0x55AA,)),
+    ("read_pin", (1,)),
+    ("read_port", (0,)),
+    ("read_bus", ()),
+    ("invert_pin", (1, 0)),
+    ("get_pin_polarity", (1,)),
+    ("invert_port", (0, 0x00)),
+    ("get_port_polarity", (0,)),
+    ("invert_bus", (0x0000,)),
+    ("get_bus_polarity", ()),
+    ("mirror_interrupts", (1,)),
+    ("set_interrupt_polarity", (1,)),
+    ("get_interrupt_polarity", ()),
+    ("set_interrupt_type", (0, 0x00)),
+    ("get_interrupt_type", (0,)),
+    ("set_interrupt_defaults", (0, 0x00)),
+    ("get_interrupt_defaults", (0,)),
+    ("set_interrupt_on_pin", (1, 1)),
+    ("get_interrupt_on_pin", (1,)),
+    ("set_interrupt_on_port", (0, 0xFF)),
+    ("get_interrupt_on_port", (0,)),
+    ("set_interrupt_on_bus", (0xFFFF,)),
+    ("get_interrupt_on_bus", ()),
+    ("read_interrupt_status", (0,)),
+    ("read_interrupt_capture", (0,)),
+    ("reset_interrupts", ()),
+)
+
+_IOZERO32_CASES = (
+    ("set_pin_direction", (1, 0)),
+    ("get_pin_direction", (1,)),
+    ("set_port_direction", (0, 0x00)),
+    ("get_port_direction", (0,)),
+    ("set_bus_direction", (0x0000,)),
+    ("get_bus_direction", ()),
+    ("write_pin", (1, 1)),
+    ("write_port", (0, 0x55)),
+    ("write_bus", (0x55AA,)),
+    ("read_pin", (1,)),
+    ("read_port", (0,)),
+    ("read_bus", ()),
+    ("set_pin_polarity", (1, 0)),
+    ("get_pin_polarity", (1,)),
+    ("set_port_polarity", (0, 0x00)),
+    ("get_port_polarity", (0,)),
+    ("set_bus_polarity", (0x0000,)),
+    ("get_bus_polarity", ()),
+)
+
+_ADC_CASES = (
+    ("read_voltage", (1,)),
+    ("read_raw", (1,)),
+    ("read_raw", (5,)),
+    ("set_pga", (1,)),
+    ("set_bit_mode", (12,)),
+    ("set_conversion_mode", (1,)),
+)
+
+_RTC_CASES = (
+    ("set_date", ("2025-01-01T12:00:00",)),
+    ("read_date", ()),
+    ("enable_output", ()),
+    ("disable_output", ()),
+    ("set_frequency", (1,)),
+    ("write_memory", (0x08, [1, 2, 3, 4, 5, 6, 7, 8])),
+    ("read_memory", (0x08, 8)),
+)
+
+CASES = (
+    [("ADCPi",) + case for case in _ADC_CASES] +
+    [("ADCDifferentialPi",) + case for case in _ADC_CASES] +
+    [("ADCDACPi", "read_adc_voltage", (1, 0)),
+     ("ADCDACPi", "read_adc_raw", (1, 0)),
+     ("ADCDACPi", "set_dac_voltage", (1, 1.0)),
+     ("ADCDACPi", "set_dac_raw", (1, 1000)),
+     ("ExpanderPi.ADC", "read_adc_voltage", (1, 0)),
+     ("ExpanderPi.ADC", "read_adc_raw", (1, 0)),
+     ("ExpanderPi.DAC", "set_dac_voltage", (1, 1.0)),
+     ("ExpanderPi.DAC", "set_dac_raw", (1, 1000))] +
+    [("ExpanderPi.IO",) + case for case in _IO_CASES] +
+    [("ExpanderPi.RTC",) + case for case in _RTC_CASES] +
+    [("I2CSwitch", "switch_channel", (1,)),
+     ("I2CSwitch", "set_channel_state", (2, True)),
+     ("I2CSwitch", "get_channel_state", (2,))] +
+    [("IOPi",) + case for case in _IO_CASES] +
+    [("IOZero32",) + case for case in _IOZERO32_CASES] +
+    [("RTCPi",) + case for case in _RTC_CASES] +
+    [("ServoPi.PWM", "set_pwm_freq", (200,)),
+     ("ServoPi.PWM", "set_pwm", (1, 0, 1000)),
+     ("ServoPi.PWM", "set_pwm_on_time", (1, 100)),
+     ("ServoPi.PWM", "set_pwm_off_time", (1, 1000)),
+     ("ServoPi.PWM", "get_pwm_on_time", (1,)),
+     ("ServoPi.PWM", "get_pwm_off_time", (1,)),
+     ("ServoPi.PWM", "set_all_pwm", (0, 1000)),
+     ("ServoPi.PWM", "set_allcall_address", (0x70,)),
+     ("ServoPi.PWM", "enable_allcall_address", ()),
+     ("ServoPi.PWM", "disable_allcall_address", ()),
+     ("ServoPi.PWM", "sleep", ()),
+     ("ServoPi.PWM", "wake", ()),
+     ("ServoPi.PWM", "is_sleeping", ()),
+     ("ServoPi.PWM", "invert_output", (False,)),
+     ("ServoPi.Servo", "move", (1, 125)),
+     ("ServoPi.Servo", "get_position", (1,)),
+     ("ServoPi.Servo", "set_low_limit", (1.0,)),
+     ("ServoPi.Servo", "set_high_limit", (2.0,)),
+     ("ServoPi.Servo", "offset_enable", ()),
+     ("ServoPi.Servo", "offset_disable", ())]
+)
+
+
+# key in BOARDS for each abelectronics.rig board type
+RIG_BOARDS = {
+    "IOPi": "IOPi",
+    "IOZero32": "IOZero32",
+    "ADCPi": "ADCPi",
+    "ADCDifferentialPi": "ADCDifferentialPi",
+    "PWM": "ServoPi.PWM",
+    "Servo": "ServoPi.Servo",
+    "RTC": "RTCPi",
+    "I2CSwitch": "I2CSwitch",
+}
+
+# methods that only read from the devices
+READ_PREFIXES = ("get_", "read_", "is_")
+
+
+def bus_counters(buses):
+    """
+    Add up the transaction and byte counters for simulated buses
+
+    :param buses: FakeSMBus and FakeSpiDev objects
+    :type buses: list
+    :return: transactions and bytes
+    :rtype: tuple
+    """
+    transactions = 0
+    data_bytes = 0
+    for bus in buses:
+        counters = bus.get_counters()
+        transactions += counters["transactions"]
+        if "bytes_transferred" in counters:
+            data_bytes += counters["bytes_transferred"]
+        else:
+            data_bytes += counters["bytes_written"] + counters["bytes_read"]
+    return transactions, data_bytes
+
+
+def _measure(function, args, duration, reset, counters):
+    """
+    Internal method for calling a method repeatedly for at least the
+    duration
+
+    :param reset: function that resets the bus counters
+    :type reset: callable
+    :param counters: function that returns the transactions and bytes
+    :type counters: callable
+    :return: calls, elapsed time, transactions and bytes
+    :rtype: tuple
+    """
+    function(*args)  # first call outside the measurement
+
+    calls = 1
+    while True:
+        reset()
+        start = time.perf_counter()
+        for _ in range(calls):
+            function(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+        # aim for the requested duration on the next run
+        calls = max(calls * 2, int(calls * duration / max(elapsed, 1e-9)))
+    transactions, data_bytes = counters()
+    return calls, elapsed, transactions, data_bytes
+
+
+def _result(board_name, method, args, calls, elapsed, transactions,
+            data_bytes):
+    """
+    Internal method for creating the result for one method
+    """
+    return {"board": board_name,
+            "method": method,
+            "arguments": ", ".join(repr(a) for a in args),
+            "calls": calls,
+            "calls_per_sec": calls / elapsed,
+            "us_per_call": elapsed * 1e6 / calls,
+            "transactions_per_call": transactions / float(calls),
+            "bytes_per_call": data_bytes / float(calls)}
+
+
+def run_case(board_name, method, args, duration):
+    """
+    Measure one method
+
+    :param board_name: key in BOARDS
+    :type board_name: str
+    :param method: method name
+    :type method: str
+    :param args: method arguments
+    :type args: tuple
+    :param duration: minimum time to run the method for in seconds
+    :type duration: float
+    :return: result for the method
+    :rtype: dict
+    """
+    board, buses = BOARDS[board_name]()
+
+    def reset():
+        for bus in buses:
+            bus.reset_counters()
+
+    measured = _measure(getattr(board, method), args, duration, reset,
+                        lambda: bus_counters(buses))
+
+    close = getattr(board, "close", None)
+    if close is not None:
+        close()
+    return _result(board_name, method, args, *measured)
+
+
+def _selected(cases, boards, methods):
+    """
+    Internal method for filtering the cases by board and method name
+    """
+    return [(board_name, method, arguments)
+            for board_name, method, arguments in cases
+            if (not boards or board_name in boards) and
+            (not methods or method in methods)]
+
+
+def run_cases(boards=None, methods=None, duration=0.1):
+    """
+    Measure the methods of the board classes on simulated devices
+
+    :param boards: names from BOARDS, defaults to every board
+    :type boards: list, optional
+    :param methods: method names, defaults to every method
+    :type methods: list, optional
+    :param duration: minimum time to run each method for in seconds,
+                     defaults to 0.1
+    :type duration: float, optional
+    :return: result for each method
+    :rtype: list
+    """
+    return [run_case(board_name, method, arguments, duration)
+            for board_name, method, arguments
+            in _selected(CASES, boards, methods)]
+
+
+def _statistics_counters():
+    """
+    Internal method for adding up the transactions and bytes recorded by
+    the bus instrumentation
+    """
+    transactions = 0
+    data_bytes = 0
+    for devices in i2cbus.get_statistics().values():
+        for device in devices.values():
+            transactions += device["count"]
+            data_bytes += device["bytes_written"] + device["bytes_read"]
+    return transactions, data_bytes
+
+
+def run_rig(rig, boards=None, methods=None, duration=0.1, writes=False):
+    """
+    Measure the methods of the boards in a rig on the real devices.  The
+    transactions are counted with the bus instrumentation, which is
+    enabled while the methods run.
+
+    :param rig: boards created by abelectronics.rig
+    :type rig: abelectronics.rig.Rig
+    :param boards: board names in the rig, defaults to every board
+    :type boards: list, optional
+    :param methods: method names, defaults to every method
+    :type methods: list, optional
+    :param duration: minimum time to run each method for in seconds,
+                     defaults to 0.1
+    :type duration: float, optional
+    :param writes: True = also run the methods that write to the devices
+                   and change their outputs, defaults to False
+    :type writes: bool, optional
+    :return: result for each method, with the board name from the rig
+    :rtype: list
+    """
+    results = []
+    i2cbus.set_instrumentation(True)
+    try:
+        for name in rig:
+            if boards and name not in boards:
+                continue
+            cases = [(method, arguments) for board_name, method, arguments
+                     in _selected(CASES, None, methods)
+                     if board_name == RIG_BOARDS.get(rig.get_type(name)) and
+                     (writes or method.startswith(READ_PREFIXES))]
+            for method, arguments in cases:
+                board = rig.select(name)
+                results.append(_result(
+                    name, method, arguments,
+                    *_measure(getattr(board, method), arguments, duration,
+                              i2cbus.reset_statistics,
+                              _statistics_counters)))
+    finally:
+        i2cbus.set_instrumentation(False)
+    return results
+
+
+def library_version():
+    """
+    :return: installed abelectronics package version or None
+    :rtype: str
+    """
+    try:
+        from importlib.metadata import version
+        return version("abelectronics")
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the results with an earlier run
+
+    :param results: results from this run
+    :type results: list
+    :param baseline: results loaded from a JSON file
+    :type baseline: dict
+    :param tolerance: allowed slowdown in percent
+    :type tolerance: float
+    :return: lines describing each regression
+    :rtype: list
+    """
+    earlier = dict(((r["board"], r["method"], r["arguments"]), r)
+                   for r in baseline["results"])
+    regressions = []
+    for result in results:
+        key = (result["board"], result["method"], result["arguments"])
+        old = earlier.get(key)
+        if old is None:
+            continue
+        name = "%s.%s(%s)" % key
+        for field in ("transactions_per_call", "bytes_per_call"):
+            if result[field] > old[field]:
+                regressions.append("%s %s %.2f -> %.2f" %
+                                   (name, field, old[field], result[field]))
+        change = 100.0 * (old["calls_per_sec"] - result["calls_per_sec"]) / \
+            old["calls_per_sec"]
+        if change > tolerance:
+            regressions.append("%s calls_per_sec %.0f -> %.0f (%.0f%% slower)"
+                               % (name, old["calls_per_sec"],
+                                  result["calls_per_sec"], change))
+    return regressions
+
+
+def write_table(results, output):
+    """
+    Write the results as a table
+    """
+    output.write("%-18s %-36s %12s %10s %13s %8s\n" %
+                 ("board", "method", "calls/sec", "us/call",
+                  "transactions", "bytes"))
+    for r in results:
+        method = "%s(%s)" % (r["method"], r["arguments"])
+        output.write("%-18s %-36s %12.0f %10.1f %13.2f %8.2f\n" %
+                     (r["board"], method, r["calls_per_sec"],
+                      r["us_per_call"], r["transactions_per_call"],
+                      r["bytes_per_call"]))
+
+
+
+
+def write_results(results, output, output_format="table", duration=None):
+    """
+    Write the results as a table, JSON or CSV.  The JSON results record
+    the library version, the Python version and the date.
+
+    :param results: results from run_cases or run_rig
+    :type results: list
+    :param output: file to write to
+    :type output: file
+    :param output_format: "table", "json" or "csv", defaults to "table"
+    :type output_format: str, optional
+    :param duration: duration of each measurement, saved in the JSON
+    :type duration: float, optional
+    """
+    if output_format == "json":
+        json.dump({"version": library_version(),
+                   "python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "date": datetime.datetime.now().isoformat(),
+                   "duration": duration,
+                   "results": results}, output, indent=2)
+        output.write("\n")
+    elif output_format == "csv":
+        if results:
+            writer = csv.DictWriter(output, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        write_table(results, output)
+
+
+def add_arguments(parser):
+    """
+    Add the benchmark options to a command line parser
+
+    :param parser: parser or sub-command parser
+    :type parser: argparse.ArgumentParser
+    """
+    parser.add_argument("-b", "--board", action="append",
+                        help="board to benchmark, can be repeated, "
+                             "defaults to all boards.  One of %s or a "
+                             "board name in the rig file" %
+                             ", ".join(sorted(BOARDS)))
+    parser.add_argument("-m", "--method", action="append",
+                        help="method to benchmark, can be repeated")
+    parser.add_argument("-d", "--duration", type=float, default=0.1,
+                        help="seconds to run each method for, "
+                             "defaults to 0.1")
+    parser.add_argument("-f", "--format", choices=("table", "json", "csv"),
+                        default="table", help="output format")
+    parser.add_argument("-o", "--output",
+                        help="file to write the results to, "
+                             "defaults to the console")
+    parser.add_argument("-c", "--compare",
+                        help="JSON results from an earlier run to compare "
+                             "with")
+    parser.add_argument("-t", "--tolerance", type=float, default=20.0,
+                        help="allowed slowdown in percent when comparing, "
+                             "defaults to 20")
+    parser.add_argument("-r", "--combined-reads", action="store_true",
+                        help="send multi-register reads as one i2c_rdwr "
+                             "call")
+    parser.add_argument("--rig", metavar="PATH",
+                        help="benchmark the boards in a rig file on the "
+                             "real devices instead of simulated devices")
+    parser.add_argument("-w", "--writes", action="store_true",
+                        help="with --rig, also run the methods that write "
+                             "to the devices.  The outputs will change")
+
+
+def run(args):
+    """
+    Run the benchmarks with the options from add_arguments
+
+    :param args: parsed command line
+    :type args: argparse.Namespace
+    :return: exit status, 1 if a regression was found
+    :rtype: int
+    """
+    i2cbus.set_combined_reads(args.combined_reads)
+
+    if args.rig:
+        from . import rig
+        with rig.load(args.rig) as boards:
+            results = run_rig(boards, args.board, args.method,
+                              args.duration, args.writes)
+    else:
+        unknown = set(args.board or ()) - set(BOARDS)
+        if unknown:
+            raise ValueError("unknown board %s, use one of %s" %
+                             (", ".join(sorted(unknown)),
+                              ", ".join(sorted(BOARDS))))
+        results = run_cases(args.board, args.method, args.duration)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        write_results(results, output, args.format, args.duration)
+    finally:
+        if args.output:
+            output.close()
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            sys.stderr.write("Regression: %s\n" % line)
+        if regressions:
+            return 1
+        sys.stderr.write("No regressions compared with %s\n" % args.compare)
+    return 0
+
+
+def main():
+    """
+    Run the benchmarks from the command line
+    """
+    parser = argparse.ArgumentParser(description="Driver benchmark suite")
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        status = run(args)
+    except ValueError as err:
+        parser.error(str(err))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | SMBus Backend Benchmark
+
+run with: python3 backends.py [-d duration]
+================================================
+
+Compares the SMBus implementations that can be used as the I2C bus for
+the board objects:
+
+smbus   - python-smbus
+smbus2  - smbus2
+raw     - abelectronics.rawi2c.RawI2CBus
+
+Each backend opens /dev/i2c-1 on the simulator's fake character device,
+abelectronics.simulator.FakeI2CDev, and runs common board operations.
+For each operation the benchmark reports the calls per second, the time
+per call, the time per call spent in the library and the backend with the
+time spent in the fake device removed, and the number of ioctl calls.
+
+python-smbus is a C extension that calls the kernel directly, so it
+cannot use the fake device and is only shown as not available.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+import time
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics.simulator import FakeI2CDev, MCP23017, MCP3424, \
+        PCA9685
+    from abelectronics.rawi2c import RawI2CBus
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def adcpi_read_raw(bus):
+    """
+    ADC Pi at 12 bits reading all 8 channels
+    """
+    adc = ADCPi(0x68, 0x69, 12, bus)
+
+    def run():
+        for channel in range(1, 9):
+            adc.read_raw(channel)
+    return adc, run
+
+
+def iopi_read_bus(bus):
+    """
+    IO Pi reading all 16 pins
+    """
+    iopi = IOPi(0x20, True, bus)
+    return iopi, iopi.read_bus
+
+
+def iopi_write_pin(bus):
+    """
+    IO Pi setting one output pin, a register read and write
+    """
+    iopi = IOPi(0x20, True, bus)
+    iopi.set_port_direction(0, 0x00)
+    return iopi, lambda: iopi.write_pin(1, 1)
+
+
+def servopi_set_pwm(bus):
+    """
+    Servo Pi setting the PWM output on one channel
+    """
+    pwm = PWM(0x40, bus)
+    return pwm, lambda: pwm.set_pwm(1, 0, 1000)
+
+
+OPERATIONS = (("ADCPi.read_raw x8", adcpi_read_raw),
+              ("IOPi.read_bus", iopi_read_bus),
+              ("IOPi.write_pin", iopi_write_pin),
+              ("PWM.set_pwm", servopi_set_pwm))
+
+
+def open_smbus(bus):
+    """
+    python-smbus calls the kernel from C so it would open the real device
+    instead of the fake device.  Returns None when it is installed.
+    """
+    import smbus  # noqa: F401
+    return None
+
+
+def open_smbus2(bus):
+    """
+    Open a bus with smbus2
+    """
+    from smbus2 import SMBus
+    return SMBus(bus)
+
+
+BACKENDS = (("smbus", open_smbus),
+            ("smbus2", open_smbus2),
+            ("raw", RawI2CBus))
+
+
+def measure(device, operation, duration):
+    """
+    Run one operation for at least the given time
+
+    :param device: fake character device
+    :type device: FakeI2CDev
+    :param operation: board object and the function to run
+    :type operation: tuple
+    :param duration: minimum time in seconds
+    :type duration: float
+    :return: calls, elapsed time and time spent in the fake device
+    :rtype: tuple
+    """
+    board, run = operation
+    run()
+    calls = 1
+    while True:
+        device.reset_counters()
+        device.ioctl_time = 0.0
+        start = time.perf_counter()
+        for _ in range(calls):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            break
+        calls = max(calls * 2, int(calls * duration / max(elapsed, 1e-9)))
+    board.close()
+    return calls, elapsed, device.ioctl_time
+
+
+def timed_ioctl(device):
+    """
+    Replace the ioctl method of a fake device with one that adds the time
+    taken to device.ioctl_time
+
+    :param device: fake character device
+    :type device: FakeI2CDev
+    """
+    ioctl = device.ioctl
+    clock = time.perf_counter
+
+    def timed(fd, request, arg):
+        start = clock()
+        try:
+            return ioctl(fd, request, arg)
+        finally:
+            device.ioctl_time += clock() - start
+
+    device.ioctl_time = 0.0
+    device.ioctl = timed
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="SMBus backend benchmark")
+    parser.add_argument("-d", "--duration", type=float, default=0.5,
+                        help="seconds to run each operation for, "
+                             "defaults to 0.5")
+    args = parser.parse_args()
+
+    devices = [MCP3424(0x68, 0), MCP3424(0x69, 0), MCP23017(0x20),
+               PCA9685(0x40)]
+
+    print("%-8s %-18s %10s %10s %12s %12s" %
+          ("backend", "operation", "calls/sec", "us/call",
+           "library us", "ioctls/call"))
+    with FakeI2CDev(1, devices) as device:
+        timed_ioctl(device)
+        for backend, open_bus in BACKENDS:
+            try:
+                bus = open_bus(1)
+            except ImportError:
+                print("%-8s not installed" % backend)
+                continue
+            if bus is None:
+                print("%-8s cannot use the simulated device" % backend)
+                continue
+
+            for name, create in OPERATIONS:
+                calls, elapsed, ioctl_time = measure(device, create(bus),
+                                                     args.duration)
+                ioctls = device.get_counters()["ioctls"]
+                print("%-8s %-18s %10.0f %10.2f %12.2f %12.2f" %
+                      (backend, name, calls / elapsed,
+                       elapsed * 1e6 / calls,
+                       (elapsed - ioctl_time) * 1e6 / calls,
+                       ioctls / float(calls)))
+            bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Bus Scheduler Benchmark
+
+run with: python3 bus_scheduler.py [-d duration] [-l latency] [-c channels]
+                                   [-a loggers]
+================================================
+
+Measures the latency of a 50 Hz servo control loop that shares an I2C bus
+with ADC Pi loggers reading at 18 bits on two ADC Pi boards.  Each logger
+thread polls its MCP3424 with repeated 4 byte reads while the conversion
+runs, so the bus is almost never idle.  The devices are simulated and each
+I2C message takes the time set with --latency, as it would on a real bus.
+
+Each servo update moves --channels channels with Servo.move.  The latency
+is the time from the start of the 20 ms period until the last move has
+been written.  The loop is run with the bus lock as a threading.RLock and
+with abelectronics.i2cbus.set_scheduling, where the servo thread sends its
+moves at REALTIME priority and the loggers at BACKGROUND priority.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+import threading
+import time
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics import i2cbus, scheduler
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP3424, PCA9685, constant_latency
+    from ADCPi import ADCPi
+    from ServoPi import Servo
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+PERIOD = 0.02  # 50 Hz servo updates
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values
+
+    :param values: sorted values
+    :type values: list
+    :param fraction: 0.0 to 1.0
+    :type fraction: float
+    :return: value
+    :rtype: float
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(scheduling, duration, latency, channels, loggers):
+    """
+    Run the servo loop alongside the ADC loggers
+
+    :param scheduling: True = use the bus scheduler
+    :type scheduling: bool
+    :param duration: seconds to run for
+    :type duration: float
+    :param latency: time for each I2C message in seconds
+    :type latency: float
+    :param channels: servo channels moved in each update
+    :type channels: int
+    :param loggers: number of ADC logger threads, 1 to 4
+    :type loggers: int
+    :return: update latencies in seconds, sorted, and the ADC readings
+    :rtype: tuple
+    """
+    i2cbus.set_locking(True)
+    i2cbus.set_scheduling(scheduling)
+    smbus = FakeSMBus(1, [PCA9685(0x40)] +
+                      [MCP3424(address) for address in range(0x68, 0x6C)])
+    servo = Servo(0x40, bus=smbus)
+    adcs = [ADCPi(0x68, 0x69, 18, bus=smbus),
+            ADCPi(0x6A, 0x6B, 18, bus=smbus)]
+    smbus.faults = FaultInjector(latency=constant_latency(latency))
+    stop = threading.Event()
+    readings = [0]
+
+    def log(adc, channel):
+        if scheduling:
+            scheduler.set_thread_priority(scheduler.BACKGROUND)
+        while not stop.is_set():
+            adc.read_raw(channel)
+            readings[0] += 1
+
+    # one logger for each MCP3424 so the loggers convert at the same time
+    threads = [threading.Thread(target=log, args=(adcs[i // 2],
+                                                  1 + 4 * (i % 2)))
+               for i in range(loggers)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    position = 0
+    tick = time.perf_counter()
+    end = tick + duration
+    while tick < end:
+        now = time.perf_counter()
+        if now < tick:
+            time.sleep(tick - now)
+        position = (position + 10) % 250
+        with scheduler.priority(scheduler.REALTIME, deadline=PERIOD / 2):
+            for channel in range(1, channels + 1):
+                servo.move(channel, position)
+        latencies.append(time.perf_counter() - tick)
+        tick += PERIOD
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    for adc in adcs:
+        adc.close()
+    servo.close()
+    i2cbus.set_scheduling(False)
+    i2cbus.set_locking(False)
+    return sorted(latencies), readings[0]
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Bus scheduler benchmark")
+    parser.add_argument("-d", "--duration", type=float, default=5.0,
+                        help="seconds to run each mode for, defaults to 5")
+    parser.add_argument("-l", "--latency", type=float, default=400,
+                        help="time for each I2C message in microseconds, "
+                             "defaults to 400")
+    parser.add_argument("-c", "--channels", type=int, default=4,
+                        help="servo channels moved in each update, "
+                             "defaults to 4")
+    parser.add_argument("-a", "--loggers", type=int, choices=(1, 2, 3, 4),
+                        default=4, help="ADC logger threads, defaults to 4")
+    args = parser.parse_args()
+
+    print("%-10s %8s %8s %8s %8s %8s %8s" %
+          ("bus lock", "updates", "p50 ms", "p99 ms", "max ms", "late",
+           "adc"))
+    for name, scheduling in (("RLock", False), ("scheduler", True)):
+        latencies, readings = run(scheduling, args.duration,
+                                  args.latency * 1e-6, args.channels,
+                                  args.loggers)
+        late = sum(1 for value in latencies if value > PERIOD / 2)
+        print("%-10s %8d %8.2f %8.2f %8.2f %8d %8d" %
+              (name, len(latencies), percentile(latencies, 0.5) * 1000,
+               percentile(latencies, 0.99) * 1000, latencies[-1] * 1000,
+               late, readings))
+
+
+if __name__ == "__main__":
+    main()
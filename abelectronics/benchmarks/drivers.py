@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Driver Benchmark Suite
+
+run with: python3 drivers.py [options]
+================================================
+
+Runs the public methods of every board class against simulated devices and
+reports for each method:
+
+calls/sec             - calls per second, measured over --duration seconds
+transactions/call     - I2C or SPI transactions for each call
+bytes/call            - bytes written and read on the bus for each call
+
+The simulated ADCs complete their conversions immediately so the results
+measure the time spent in the library.  The transaction and byte counts
+are the same as on the hardware.
+
+Save the results as JSON with --format json --output results.json and
+compare a later run with --compare results.json.  The comparison reports
+any change in the transactions or bytes for a method and any method that
+runs more than --tolerance percent slower, and exits with status 1 when a
+regression is found.
+
+The suite is in abelectronics.benchmark and can also be run with
+"abelectronics bench", which can benchmark the boards in a rig file on the
+real devices with --rig.
+
+Examples:
+
+    python3 drivers.py
+    python3 drivers.py --board IOPi --board ADCPi
+    python3 drivers.py --format json --output 2.5.6.json
+    python3 drivers.py --compare 2.5.6.json
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics import benchmark
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Driver benchmark suite")
+    benchmark.add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        status = benchmark.run(args)
+    except ValueError as err:
+        parser.error(str(err))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Fault Injection Benchmark
+
+run with: python3 fault_injection.py [-n calls] [-r rates] [-l latency]
+                                    [-R retries]
+================================================
+
+Measures how the throughput and the results of the drivers change when
+the I2C bus loses messages, as it can on long cables.  The devices are
+simulated and abelectronics.simulator.FaultInjector makes each I2C message
+fail with a NACK or a timeout at the selected rate, with half of the
+failures of each type.
+
+The operations are:
+
+adc read_raw   - ADCPi.read_raw at 12 bits with lost messages
+adc stuck      - ADCPi.read_raw at 12 bits with conversions that never
+                 finish, so read_raw waits for its conversion timeout
+pwm set_pwm    - PWM.set_pwm, which returns write errors without raising
+pwm sleep/wake - PWM.sleep and PWM.wake, which read and then write MODE1
+switch channel - I2CSwitch.switch_channel followed by get_channel_state,
+                 retried up to 3 times until the channel reads back as
+                 enabled
+
+For each operation and failure rate the benchmark shows the calls per
+second, the percentage of calls that raised an exception, the percentage
+that returned without raising but left the device in the wrong state, and
+the exception types that were raised.
+
+Use --retries to set an abelectronics.retry.RetryPolicy on the shared bus
+and compare the results with the transactions retried.
+
+The adc stuck operation waits for the read_raw timeout, 100 conversion
+times or about 0.42 seconds at 12 bits, for each stuck conversion, so it
+runs fewer calls.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import collections
+import os
+import time
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics import i2cbus
+    from abelectronics.retry import RetryPolicy
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP3424, PCA9546A, PCA9685, lognormal_latency
+    from ADCPi import ADCPi
+    from ServoPi import PWM
+    from I2CSwitch import I2CSwitch
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def adc_read_raw(smbus, rate):
+    """
+    Read channel 1 of an ADC Pi with lost messages
+    """
+    smbus.add_device(MCP3424(0x68, 0.0)).set_input(1, 1.024)
+    smbus.add_device(MCP3424(0x69, 0.0))
+    adc = ADCPi(0x68, 0x69, 12, smbus)
+    smbus.faults.nack_rate = smbus.faults.error_rate = rate / 2
+
+    def run():
+        return adc.read_raw(1) == 1024
+    return run
+
+
+def adc_stuck(smbus, rate):
+    """
+    Read channel 1 of an ADC Pi with stuck conversions
+    """
+    chip = smbus.add_device(MCP3424(0x68, 0.0))
+    chip.set_input(1, 1.024)
+    smbus.add_device(MCP3424(0x69, 0.0))
+    adc = ADCPi(0x68, 0x69, 12, smbus)
+    adc.set_conversion_mode(0)  # one-shot, each read starts a conversion
+    chip.stuck_rate = rate
+
+    def run():
+        return adc.read_raw(1) == 1024
+    return run
+
+
+def pwm_set_pwm(smbus, rate):
+    """
+    Set the off time of channel 1 on a PCA9685
+    """
+    chip = smbus.add_device(PCA9685(0x40))
+    pwm = PWM(0x40, bus=smbus)
+    smbus.faults.nack_rate = smbus.faults.error_rate = rate / 2
+    values = iter(range(1 << 30))
+
+    def run():
+        value = next(values) % 4096
+        pwm.set_pwm(1, 0, value)
+        return chip.registers[0x08] | (chip.registers[0x09] << 8) == value
+    return run
+
+
+def pwm_sleep_wake(smbus, rate):
+    """
+    Put a PCA9685 to sleep and wake it
+    """
+    chip = smbus.add_device(PCA9685(0x40))
+    pwm = PWM(0x40, bus=smbus)
+    smbus.faults.nack_rate = smbus.faults.error_rate = rate / 2
+    state = [False]
+
+    def run():
+        state[0] = not state[0]
+        if state[0]:
+            pwm.sleep()
+        else:
+            pwm.wake()
+        return bool(chip.registers[0x00] & 0x10) == state[0]
+    return run
+
+
+def switch_channel(smbus, rate):
+    """
+    Select a channel on an I2C Switch and check it was selected
+    """
+    chip = smbus.add_device(PCA9546A(0x70))
+    switch = I2CSwitch(0x70, bus=smbus)
+    smbus.faults.nack_rate = smbus.faults.error_rate = rate / 2
+    channels = iter(range(1 << 30))
+
+    def run():
+        channel = next(channels) % 4 + 1
+        for _ in range(3):
+            switch.switch_channel(channel)
+            try:
+                if switch.get_channel_state(channel):
+                    break
+            except (IOError, TypeError):
+                pass  # the failed read is returned as the error object
+        return chip.control == 1 << (channel - 1)
+    return run
+
+
+# name, setup function called with the bus and the failure rate, number of
+# calls as a fraction of -n
+OPERATIONS = (
+    ("adc read_raw", adc_read_raw, 1.0),
+    ("adc stuck", adc_stuck, 0.05),
+    ("pwm set_pwm", pwm_set_pwm, 1.0),
+    ("pwm sleep/wake", pwm_sleep_wake, 1.0),
+    ("switch channel", switch_channel, 1.0),
+)
+
+
+def run(setup, rate, calls, latency, seed):
+    """
+    Run an operation on a simulated bus with injected faults
+
+    :param setup: function that creates the devices and board object
+    :type setup: callable
+    :param rate: failure rate, 0.0 to 1.0
+    :type rate: float
+    :param calls: number of calls
+    :type calls: int
+    :param latency: median message latency in seconds, 0 = none
+    :type latency: float
+    :param seed: random number seed
+    :type seed: int
+    :return: calls per second, calls that raised, calls that left the
+             device in the wrong state and the exception type counts
+    :rtype: tuple
+    """
+    smbus = FakeSMBus(1)
+    # faults are enabled by the setup function after the board object
+    # is created
+    smbus.faults = FaultInjector(seed=seed)
+    operation = setup(smbus, rate)
+    if latency > 0:
+        smbus.faults.latency = lognormal_latency(latency)
+    raised = 0
+    wrong = 0
+    errors = collections.Counter()
+    start = time.perf_counter()
+    for _ in range(calls):
+        try:
+            if not operation():
+                wrong += 1
+        except Exception as err:
+            raised += 1
+            errors[type(err).__name__] += 1
+    elapsed = time.perf_counter() - start
+    return calls / elapsed, raised, wrong, errors
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Fault injection benchmark")
+    parser.add_argument("-n", "--calls", type=int, default=2000,
+                        help="number of calls for each operation and rate, "
+                             "defaults to 2000")
+    parser.add_argument("-r", "--rates", default="0,0.001,0.01,0.05",
+                        help="comma separated failure rates, "
+                             "defaults to 0,0.001,0.01,0.05")
+    parser.add_argument("-l", "--latency", type=float, default=0.0,
+                        help="median latency added to each I2C message in "
+                             "microseconds, defaults to 0")
+    parser.add_argument("-R", "--retries", type=int, default=0,
+                        help="retry transient errors up to this many times "
+                             "with abelectronics.retry, defaults to 0")
+    parser.add_argument("-s", "--seed", type=int, default=1,
+                        help="random number seed, defaults to 1")
+    args = parser.parse_args()
+    rates = [float(rate) for rate in args.rates.split(",")]
+    if args.retries:
+        # a budget large enough for every call, the benchmark measures the
+        # cost of the retries
+        i2cbus.set_retry_policy(RetryPolicy(retries=args.retries,
+                                            backoff=0.0001,
+                                            budget=args.calls * 10))
+
+    print("%-15s %6s %10s %8s %8s  %s" %
+          ("operation", "rate", "calls/s", "raised", "wrong", "exceptions"))
+    for name, setup, fraction in OPERATIONS:
+        calls = max(1, int(args.calls * fraction))
+        for rate in rates:
+            per_second, raised, wrong, errors = run(
+                setup, rate, calls, args.latency * 1e-6, args.seed)
+            print("%-15s %6g %10.0f %7.1f%% %7.1f%%  %s" %
+                  (name, rate, per_second, 100.0 * raised / calls,
+                   100.0 * wrong / calls,
+                   ", ".join("%s %d" % item
+                             for item in sorted(errors.items()))))
+
+
+if __name__ == "__main__":
+    main()
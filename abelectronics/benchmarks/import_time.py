@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Import Time Benchmark
+
+run with: python3 import_time.py [-r repeats] [package ...]
+================================================
+
+Measures the time taken to import each library package in a new Python
+process and shows whether the import loaded the hardware modules
+RPi.GPIO, spidev, smbus2 or smbus.
+
+Names such as abelectronics.IOPi are imported with "import abelectronics"
+and then read from the package, which imports the driver module the
+first time it is used.
+
+The hardware modules are loaded when the first object that needs them is
+created, so importing a package on a computer without I2C, GPIO or SPI
+support should not load any of them.
+
+Python only caches the compiled modules when it can write the __pycache__
+folders, so run the benchmark once, or run python3 -m compileall, before
+comparing the results.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+PACKAGES = ("abelectronics", "ADCDACPi", "ADCDifferentialPi", "ADCPi",
+            "ExpanderPi", "I2CSwitch", "IOPi", "IOZero32", "RTCPi",
+            "ServoPi", "abelectronics.IOPi", "abelectronics.ADCPi",
+            "abelectronics.Servo", "abelectronics.ExpanderPi")
+
+HARDWARE_MODULES = ("RPi.GPIO", "spidev", "smbus2", "smbus")
+
+# prints the import time in microseconds and the hardware modules that
+# were loaded by the import
+SCRIPT = ("import sys\n"
+          "import time\n"
+          "start = time.perf_counter()\n"
+          "%s\n"
+          "print(int((time.perf_counter() - start) * 1e6))\n"
+          "print(','.join(m for m in %r if m in sys.modules))\n")
+
+
+def import_statement(package):
+    """
+    Get the code that imports a package or reads a name from the
+    abelectronics package
+
+    :param package: package name or abelectronics.name
+    :type package: str
+    :return: code
+    :rtype: str
+    """
+    if package.startswith("abelectronics."):
+        return "import abelectronics\n%s" % package
+    return "import %s" % package
+
+
+def import_package(package):
+    """
+    Import a package in a new Python process
+
+    :param package: package name or abelectronics.name
+    :type package: str
+    :return: import time in microseconds and the hardware modules loaded,
+             or None and the error message if the import failed
+    :rtype: tuple
+    """
+    process = subprocess.run(
+        [sys.executable, "-c",
+         SCRIPT % (import_statement(package), HARDWARE_MODULES)],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return None, lines[-1] if lines else "import failed"
+    lines = process.stdout.splitlines()
+    return int(lines[0]), lines[1].strip() if len(lines) > 1 else ""
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Package import benchmark")
+    parser.add_argument("-r", "--repeats", type=int, default=5,
+                        help="number of imports, the best time is shown")
+    parser.add_argument("packages", nargs="*", default=PACKAGES,
+                        help="packages to import, defaults to all packages")
+    args = parser.parse_args()
+
+    print("%-26s %12s  %s" % ("package", "import ms", "hardware modules"))
+    for package in args.packages:
+        best = None
+        loaded = ""
+        for _ in range(args.repeats):
+            cumulative, loaded = import_package(package)
+            if cumulative is None:
+                break
+            if best is None or cumulative < best:
+                best = cumulative
+        if best is None:
+            print("%-26s %12s  %s" % (package, "failed", loaded))
+        else:
+            print("%-26s %12.2f  %s" % (package, best / 1000.0,
+                                        loaded or "none"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Startup Benchmark
+
+run with: python3 startup.py [-n boards] [-r repeats]
+================================================
+
+Measures the time taken to create N board objects with automatic I2C bus
+detection.  The boards are a mix of IO Pi and ADC Pi objects on a
+simulated bus so the benchmark can run on any computer.
+
+The benchmark compares:
+
+cached    - the bus number is detected once per process and every board
+            shares one bus handle
+uncached  - the bus number is detected again and a new bus is opened for
+            every board, the behaviour of earlier versions of the library
+
+The time taken to read the board revision from /proc/cpuinfo, which the
+Raspberry Pi detection uses, is also shown when the file exists.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+import time
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def open_bus(bus):
+    """
+    Open a simulated bus with IO Pi and ADC Pi chips at every address
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: simulated bus
+    :rtype: FakeSMBus
+    """
+    devices = [MCP23017(address) for address in range(0x20, 0x28)]
+    devices += [MCP3424(address, 0) for address in range(0x68, 0x70)]
+    return FakeSMBus(bus, devices=devices)
+
+
+def create_board(index, bus):
+    """
+    Create an IO Pi or ADC Pi object
+
+    :param index: board number
+    :type index: int
+    :param bus: I2C bus number or SMBus object
+    :type bus: int or SMBus
+    :return: board object
+    :rtype: IOPi or ADCPi
+    """
+    if index % 2 == 0:
+        return IOPi(0x20 + (index // 2) % 8, True, bus)
+    address = 0x68 + 2 * ((index // 2) % 4)
+    return ADCPi(address, address + 1, 12, bus)
+
+
+def cached(boards):
+    """
+    Create the boards using the shared bus and cached bus detection
+
+    :param boards: number of boards
+    :type boards: int
+    :return: time in seconds
+    :rtype: float
+    """
+    i2cbus.detect_bus(refresh=True)
+    start = time.perf_counter()
+    objects = [create_board(i, None) for i in range(boards)]
+    elapsed = time.perf_counter() - start
+    for board in objects:
+        board.close()
+    return elapsed
+
+
+def uncached(boards):
+    """
+    Create the boards detecting the bus and opening a new bus each time
+
+    :param boards: number of boards
+    :type boards: int
+    :return: time in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    objects = [create_board(i, open_bus(i2cbus.detect_bus(refresh=True)))
+               for i in range(boards)]
+    elapsed = time.perf_counter() - start
+    del objects
+    return elapsed
+
+
+def read_revision(count):
+    """
+    Read the Raspberry Pi revision from /proc/cpuinfo
+
+    :param count: number of reads
+    :type count: int
+    :return: time in seconds
+    :rtype: float
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        i2cbus._detect_raspberry_pi_bus()
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Board start-up benchmark")
+    parser.add_argument("-n", "--boards", type=int, default=16,
+                        help="number of board objects, defaults to 16")
+    parser.add_argument("-r", "--repeats", type=int, default=20,
+                        help="number of runs, the best run is shown")
+    args = parser.parse_args()
+
+    i2cbus.set_smbus_factory(open_bus)
+
+    print("Boards: %d" % args.boards)
+    for name, method in (("cached", cached), ("uncached", uncached)):
+        best = min(method(args.boards) for _ in range(args.repeats))
+        print("%-9s %9.3f ms total %9.1f us per board" %
+              (name, best * 1000, best * 1e6 / args.boards))
+
+    if os.path.exists("/proc/cpuinfo"):
+        best = min(read_revision(args.boards) for _ in range(args.repeats))
+        print("%-9s %9.3f ms total %9.1f us per board" %
+              ("cpuinfo", best * 1000, best * 1e6 / args.boards))
+
+    i2cbus.set_smbus_factory(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools | Write Coalescing Benchmark
+
+run with: python3 write_coalescing.py [-r repeats]
+================================================
+
+Compares the number of I2C transactions and the time taken for common
+write sequences sent directly to the bus and sent through a WriteQueue,
+which merges writes to consecutive registers into block writes.  The
+devices are simulated so the benchmark can run on any computer.
+
+The sequences are:
+
+pwm bytes    - 16 PCA9685 channels written one register at a time
+servo move   - Servo.move on all 16 channels
+pwm channels - PWM.set_pwm on all 16 channels
+iopi ports   - IOPi.write_port on port 0 and then port 1
+iopi init    - IOPi object creation with initialise=True
+
+The simulator runs far faster than a real I2C bus, so the estimated time
+on the bus is also shown.  Each I2C message costs a start condition, the
+address byte and a stop condition, and each data byte costs 9 clock
+cycles.
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import argparse
+import os
+import time
+
+try:
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from abelectronics.simulator import FakeSMBus, MCP23017, PCA9685
+    from abelectronics.writequeue import WriteQueue
+    from IOPi import IOPi
+    from ServoPi import PWM, Servo
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def setup_pca9685(bus):
+    """
+    Enable register auto-increment on the PCA9685
+    """
+    bus.write_byte_data(0x40, 0x00, 0x20)
+    return bus
+
+
+def pwm_bytes(bus):
+    """
+    Write the on and off times for 16 PWM channels with byte writes
+    """
+    for channel in range(16):
+        register = 0x06 + 4 * channel
+        bus.write_byte_data(0x40, register, 0)
+        bus.write_byte_data(0x40, register + 1, 0)
+        bus.write_byte_data(0x40, register + 2, (channel * 100) & 0xFF)
+        bus.write_byte_data(0x40, register + 3, (channel * 100) >> 8)
+
+
+def setup_servo(bus):
+    """
+    Create a Servo object without resetting the controller
+    """
+    return Servo(0x40, reset=False, bus=bus)
+
+
+def servo_move(servo):
+    """
+    Move the servos on all 16 channels
+    """
+    for channel in range(1, 17):
+        servo.move(channel, 125)
+
+
+def setup_pwm(bus):
+    """
+    Create a PWM object
+    """
+    return PWM(0x40, bus=bus)
+
+
+def pwm_channels(pwm):
+    """
+    Set the on and off times for all 16 channels
+    """
+    for channel in range(1, 17):
+        pwm.set_pwm(channel, 0, channel * 100)
+
+
+def setup_iopi(bus):
+    """
+    Create an IO Pi object with all pins set as outputs
+    """
+    iopi = IOPi(0x20, bus=bus)
+    iopi.set_bus_direction(0x0000)
+    return iopi
+
+
+def iopi_ports(iopi):
+    """
+    Write to both ports of the IO Pi
+    """
+    iopi.write_port(0, 0x55)
+    iopi.write_port(1, 0xAA)
+
+
+def iopi_init(bus):
+    """
+    Create and initialise an IO Pi object
+    """
+    IOPi(0x20, True, bus).close()
+
+
+# name, setup function called with the bus, sequence function
+SEQUENCES = (
+    ("pwm bytes", setup_pca9685, pwm_bytes),
+    ("servo move", setup_servo, servo_move),
+    ("pwm channels", setup_pwm, pwm_channels),
+    ("iopi ports", setup_iopi, iopi_ports),
+    ("iopi init", None, iopi_init),
+)
+
+
+def bus_time(counters, clock):
+    """
+    Estimate the time taken on a real I2C bus
+
+    :param counters: FakeSMBus counters
+    :type counters: dict
+    :param clock: I2C clock frequency in Hz
+    :type clock: int
+    :return: time in seconds
+    :rtype: float
+    """
+    data_bytes = counters["bytes_written"] + counters["bytes_read"]
+    # start + address byte + acknowledge + stop for each message
+    bits = counters["messages"] * 11 + data_bytes * 9
+    return bits / float(clock)
+
+
+def run(setup, sequence, queued, repeats):
+    """
+    Run a write sequence on a simulated bus
+
+    :param setup: function that creates the board object, or None to call
+                  the sequence with the bus
+    :type setup: callable
+    :param sequence: write sequence
+    :type sequence: callable
+    :param queued: True = send the writes through a WriteQueue
+    :type queued: bool
+    :param repeats: number of runs, the best time is returned
+    :type repeats: int
+    :return: counters for one run and the best time in seconds
+    :rtype: tuple
+    """
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), PCA9685(0x40)])
+    bus = WriteQueue(smbus) if queued else smbus
+    target = setup(bus) if setup is not None else bus
+    best = None
+    counters = None
+    for _ in range(repeats):
+        smbus.reset_counters()
+        start = time.perf_counter()
+        if queued:
+            with bus:
+                sequence(target)
+        else:
+            sequence(target)
+        elapsed = time.perf_counter() - start
+        counters = smbus.get_counters()
+        if best is None or elapsed < best:
+            best = elapsed
+    return counters, best
+
+
+def main():
+    """
+    Main program function
+    """
+    parser = argparse.ArgumentParser(description="Write coalescing benchmark")
+    parser.add_argument("-r", "--repeats", type=int, default=200,
+                        help="number of runs, the best run is shown")
+    parser.add_argument("-c", "--clock", type=int, default=100000,
+                        help="I2C clock in Hz for the bus time estimate, "
+                             "defaults to 100000")
+    args = parser.parse_args()
+
+    print("Transactions, time in the library and estimated time on a %d kHz "
+          "bus" % (args.clock // 1000))
+    print("%-13s %7s %7s %10s %10s %10s %10s %10s" %
+          ("sequence", "direct", "queued", "reduction", "direct us",
+           "queued us", "bus us", "queued bus"))
+    for name, setup, sequence in SEQUENCES:
+        direct, direct_time = run(setup, sequence, False, args.repeats)
+        queued, queued_time = run(setup, sequence, True, args.repeats)
+        before = direct["transactions"]
+        after = queued["transactions"]
+        print("%-13s %7d %7d %9.0f%% %10.1f %10.1f %10.0f %10.0f" %
+              (name, before, after, 100.0 * (before - after) / before,
+               direct_time * 1e6, queued_time * 1e6,
+               bus_time(direct, args.clock) * 1e6,
+               bus_time(queued, args.clock) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Command Line Tool
+
+Benchmarks, scans, samples and dumps the registers of the boards on a rig
+without writing a program.
+================================================
+
+Commands:
+
+bench   - measure the calls per second and the bus transactions of the
+          driver methods on simulated devices, or on the real devices of
+          a rig file with --rig
+scan    - find and identify the boards on an I2C bus
+sample  - read ADC Pi or ADC Differential Pi channels at a target rate and
+          write the readings to the console or a file as CSV or binary
+dump    - read the registers of a device without changing it and save
+          them as a snapshot that abelectronics.snapshot.restore can write
+          back to an IO Pi, IO Zero 32, Servo PWM Pi or RTC Pi
+
+The binary sample format is one record per sample of little-endian 64-bit
+floats: the time in seconds since the first sample followed by the value
+of each channel.  Read it with NumPy:
+
+    numpy.fromfile("samples.bin").reshape(-1, 1 + channels)
+
+Examples:
+
+    abelectronics scan -b 1
+    abelectronics bench --board IOPi --method write_pin
+    abelectronics bench --rig rig.json --format json --output rig.json
+    abelectronics sample -c 1 2 3 4 --rate 100 --count 1000
+    abelectronics sample --rig rig.json --board adc -f binary -o s.bin
+    abelectronics dump 0x20 -o iopi.json
+
+The tool is installed as the abelectronics command and can also be run
+with python3 -m abelectronics.
+"""
+import argparse
+import struct
+import sys
+import time
+
+from . import benchmark
+from . import i2cbus
+from . import scanner
+from . import snapshot
+
+# seconds between flushes of the sample output
+_FLUSH_INTERVAL = 0.2
+
+
+def _address(value):
+    """
+    Internal method for reading an I2C address that can be written in hex
+    """
+    return int(value, 0)
+
+
+def _sample_board(args):
+    """
+    Internal method for creating the ADC board for the sample command
+
+    :return: board object and a function that releases it
+    :rtype: tuple
+    """
+    if args.rig:
+        from . import rig
+        if not args.board:
+            raise ValueError("--board is needed with --rig")
+        boards = rig.load(args.rig)
+        try:
+            board = boards.select(args.board)
+        except KeyError:
+            boards.close()
+            raise ValueError("no board %s in %s" % (args.board, args.rig))
+        if not hasattr(board, "read_raw"):
+            boards.close()
+            raise ValueError("%s is not an ADC board" % args.board)
+        if args.bit_rate is not None:
+            board.set_bit_rate(args.bit_rate)
+        return board, boards.close
+    if args.differential:
+        from ADCDifferentialPi import ADCDifferentialPi as board_class
+    else:
+        from ADCPi import ADCPi as board_class
+    board = board_class(args.address[0], args.address[1],
+                        args.bit_rate or 12, args.bus)
+    return board, board.close
+
+
+def sample(board, channels, write, rate=0, count=None, raw=False):
+    """
+    Read ADC channels at a target rate.  Each sample is scheduled from the
+    start time, so a slow sample does not delay the samples after it.
+    When a sample starts more than one period late the schedule restarts
+    from the current time and the sample is counted as late.
+
+    :param board: ADCPi or ADCDifferentialPi object
+    :type board: object
+    :param channels: channel numbers
+    :type channels: list
+    :param write: function called with the time since the first sample
+                  and the list of readings
+    :type write: callable
+    :param rate: samples per second, 0 = as fast as possible, defaults to 0
+    :type rate: float, optional
+    :param count: number of samples, None = until interrupted,
+                  defaults to None
+    :type count: int, optional
+    :param raw: True = raw ADC codes, False = voltages, defaults to False
+    :type raw: bool, optional
+    :return: samples taken, elapsed time in seconds and late samples
+    :rtype: tuple
+    """
+    read = board.read_raw if raw else board.read_voltage
+    period = 1.0 / rate if rate > 0 else 0.0
+    samples = 0
+    late = 0
+    start = time.perf_counter()
+    deadline = start
+    try:
+        while count is None or samples < count:
+            if period:
+                now = time.perf_counter()
+                if now < deadline:
+                    time.sleep(deadline - now)
+                elif now - deadline > period:
+                    late += 1
+                    deadline = now
+                deadline += period
+            now = time.perf_counter()
+            if samples == 0:
+                start = now
+            write(now - start, [read(channel) for channel in channels])
+            samples += 1
+    except KeyboardInterrupt:
+        pass
+    return samples, time.perf_counter() - start, late
+
+
+def _run_sample(args):
+    """
+    Internal method for running the sample command
+    """
+    for channel in args.channel:
+        if not 1 <= channel <= 8:
+            raise ValueError("channel %d out of range 1 to 8" % channel)
+    binary = args.format == "binary"
+    if args.output:
+        output = open(args.output, "wb" if binary else "w")
+    else:
+        output = sys.stdout.buffer if binary else sys.stdout
+    record = struct.Struct("<%dd" % (1 + len(args.channel)))
+    flushed = [0.0]
+
+    def write(elapsed, values):
+        if binary:
+            output.write(record.pack(elapsed, *values))
+        else:
+            output.write("%.6f,%s\n" % (elapsed, ",".join(
+                str(value) for value in values)))
+        if elapsed - flushed[0] >= _FLUSH_INTERVAL:
+            output.flush()
+            flushed[0] = elapsed
+
+    board, release = _sample_board(args)
+    try:
+        if not binary:
+            output.write("time,%s\n" % ",".join(
+                "channel%d" % channel for channel in args.channel))
+        samples, elapsed, late = sample(board, args.channel, write,
+                                        args.rate, args.count, args.raw)
+    finally:
+        release()
+        if args.output:
+            output.close()
+        else:
+            output.flush()
+    sys.stderr.write("%d samples in %.3f s, %.1f samples/s, %d late\n" %
+                     (samples, elapsed, samples / elapsed if elapsed else 0,
+                      late))
+    return 0
+
+
+def _run_dump(args):
+    """
+    Internal method for running the dump command
+    """
+    chip = args.chip
+    if chip is None:
+        smbus = i2cbus.get_smbus(args.bus)
+        try:
+            with smbus.lock:
+                chip = scanner.identify(smbus, args.address)
+        finally:
+            i2cbus.release_smbus(smbus)
+        if chip is None:
+            raise ValueError("could not identify the chip at 0x%02x, "
+                             "use --chip" % args.address)
+    if args.output and snapshot.BOARDS[chip] not in snapshot.RESTORABLE:
+        raise ValueError("%s registers can not be restored, dump without "
+                         "--output" % chip)
+    registers = snapshot.read(args.bus, args.address, chip)
+    print("0x%02x  %s  %s" % (args.address, chip, snapshot.BOARDS[chip]))
+    for register, value in sorted(registers.items()):
+        print("0x%02x  0x%02x" % (register, value))
+    if args.output:
+        snapshot.write(args.output, snapshot.BOARDS[chip], registers)
+    return 0
+
+
+def _parser():
+    """
+    Internal method for creating the command line parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="abelectronics",
+        description="AB Electronics UK board tools")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    bench = commands.add_parser(
+        "bench", help="benchmark the driver methods",
+        description="Measure the driver methods on simulated devices or "
+                    "on the boards in a rig file")
+    benchmark.add_arguments(bench)
+    bench.set_defaults(run=benchmark.run)
+
+    scan = commands.add_parser(
+        "scan", help="find the boards on an I2C bus",
+        description="Find the AB Electronics UK boards on an I2C bus")
+    scanner.add_arguments(scan)
+    scan.set_defaults(run=scanner.run)
+
+    sampler = commands.add_parser(
+        "sample", help="stream ADC readings",
+        description="Read ADC channels at a target rate and write the "
+                    "readings as CSV or binary")
+    sampler.add_argument("-c", "--channel", type=int, nargs="+",
+                         default=[1], help="channels to read, defaults to 1")
+    sampler.add_argument("-r", "--rate", type=float, default=0,
+                         help="samples per second, defaults to as fast as "
+                              "possible")
+    sampler.add_argument("-n", "--count", type=int,
+                         help="number of samples, defaults to until "
+                              "Ctrl+C is pressed")
+    sampler.add_argument("-s", "--bit-rate", type=int,
+                         choices=(12, 14, 16, 18),
+                         help="ADC bit rate, defaults to 12 or the rig "
+                              "setting")
+    sampler.add_argument("--raw", action="store_true",
+                         help="write the raw ADC codes instead of voltages")
+    sampler.add_argument("-f", "--format", choices=("csv", "binary"),
+                         default="csv", help="output format")
+    sampler.add_argument("-o", "--output", metavar="PATH",
+                         help="file to write to, defaults to the console")
+    sampler.add_argument("-b", "--bus", type=int,
+                         help="I2C bus number, defaults to the detected bus")
+    sampler.add_argument("-a", "--address", type=_address, nargs=2,
+                         default=[0x68, 0x69], metavar="ADDRESS",
+                         help="I2C addresses of the two ADC chips, "
+                              "defaults to 0x68 0x69")
+    sampler.add_argument("-d", "--differential", action="store_true",
+                         help="the board is an ADC Differential Pi")
+    sampler.add_argument("--rig", metavar="PATH",
+                         help="use an ADC board from a rig file")
+    sampler.add_argument("--board", metavar="NAME",
+                         help="board name in the rig file")
+    sampler.set_defaults(run=_run_sample)
+
+    dump = commands.add_parser(
+        "dump", help="read the registers of a device",
+        description="Read the registers of a device without changing it")
+    dump.add_argument("address", type=_address, help="I2C address")
+    dump.add_argument("-b", "--bus", type=int,
+                      help="I2C bus number, defaults to the detected bus")
+    dump.add_argument("-c", "--chip", choices=sorted(snapshot.BOARDS),
+                      help="chip type, defaults to identifying the chip")
+    dump.add_argument("-o", "--output", metavar="PATH",
+                      help="save the registers as a snapshot file, not "
+                           "for the PCA9546A or MCP3424")
+    dump.set_defaults(run=_run_dump)
+    return parser
+
+
+def main(argv=None):
+    """
+    Run a command
+
+    :param argv: command line arguments, defaults to sys.argv[1:]
+    :type argv: list, optional
+    :return: exit status
+    :rtype: int
+    """
+    args = _parser().parse_args(argv)
+    try:
+        return args.run(args)
+    except (ValueError, IOError) as err:
+        sys.stderr.write("abelectronics %s: error: %s\n" %
+                         (args.command, err))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,734 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Device Daemon
+
+Owns the configured boards and serves requests from other processes over
+a Unix domain socket.
+================================================
+
+Every process that creates its own board objects opens the I2C bus itself,
+so two processes that use the same IO Pi can overwrite each other's
+changes when they both read, modify and write a register.  The daemon
+creates one object for each configured board and runs every request from
+every client on a single worker thread, so requests never interleave on
+the bus.
+
+Requests that arrive while the worker is busy are run together as a
+batch.  Identical reads on the same board in a batch, such as several
+clients polling IOPi.read_bus, are sent to the bus once, and writes to
+Servo Pi boards in a batch go through a WriteQueue so writes to
+consecutive PCA9685 registers are merged into block writes.
+
+Start the daemon with the boards to serve:
+
+    python3 -m abelectronics.daemon --board io=IOPi:0x20 \\
+        --board adc=ADCPi:0x68,0x69,12 --board servo=Servo:0x40
+
+and use the boards from any process with abelectronics.remote:
+
+    from abelectronics.remote import IOPi
+
+    iobus = IOPi("io")
+    iobus.write_pin(1, 1)
+
+The socket path defaults to abelectronics.sock in the temporary directory.
+Set the ABE_DAEMON_SOCKET environment variable or use --socket to change
+it.
+
+Protocol:
+
+Each message is a 4 byte little-endian length followed by the body.  A
+request body is the request id (uint32), the board id (uint16) and the
+method number (uint8) followed by the encoded arguments.  A response body
+is the request id (uint32) and a status byte followed by the encoded
+return value, or by the exception type and message when the status is 1.
+Values are encoded as a type byte followed by the data: N None, T True,
+F False, i int64, d double, s uint16 length and UTF-8 text, l uint16
+count and the encoded items.
+"""
+import argparse
+import errno
+import importlib
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+
+from . import i2cbus
+from .writequeue import WriteQueue
+
+SOCKET_ENVIRONMENT_VARIABLE = "ABE_DAEMON_SOCKET"
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "abelectronics.sock")
+
+# board type: module and class used to create the board
+BOARD_TYPES = {
+    "IOPi": ("IOPi", "IOPi"),
+    "ADCPi": ("ADCPi", "ADCPi"),
+    "PWM": ("ServoPi", "PWM"),
+    "Servo": ("ServoPi", "Servo"),
+}
+
+# methods that clients can call on each board type.  The position in the
+# tuple is the method number sent in a request, so add new methods to the
+# end.
+METHODS = {
+    "IOPi": ("set_pin_direction", "get_pin_direction",
+             "set_port_direction", "get_port_direction",
+             "set_bus_direction", "get_bus_direction",
+             "set_pin_pullup", "get_pin_pullup",
+             "set_port_pullups", "get_port_pullups",
+             "set_bus_pullups", "get_bus_pullups",
+             "write_pin", "write_port", "write_bus",
+             "read_pin", "read_port", "read_bus",
+             "invert_pin", "get_pin_polarity",
+             "invert_port", "get_port_polarity",
+             "invert_bus", "get_bus_polarity",
+             "mirror_interrupts", "set_interrupt_polarity",
+             "get_interrupt_polarity", "set_interrupt_type",
+             "get_interrupt_type", "set_interrupt_defaults",
+             "get_interrupt_defaults", "set_interrupt_on_pin",
+             "get_interrupt_on_pin", "set_interrupt_on_port",
+             "get_interrupt_on_port", "set_interrupt_on_bus",
+             "get_interrupt_on_bus", "read_interrupt_status",
+             "read_interrupt_capture", "reset_interrupts"),
+    "ADCPi": ("read_voltage", "read_raw", "set_pga", "set_bit_rate",
+              "set_bit_mode", "set_conversion_mode",
+              "get_i2c_address1", "get_i2c_address2"),
+    "PWM": ("set_pwm_freq", "set_pwm", "set_pwm_on_time",
+            "set_pwm_off_time", "get_pwm_on_time", "get_pwm_off_time",
+            "set_all_pwm", "output_disable", "output_enable",
+            "set_allcall_address", "enable_allcall_address",
+            "disable_allcall_address", "sleep", "wake", "is_sleeping",
+            "invert_output"),
+    "Servo": ("move", "get_position", "set_low_limit", "set_high_limit",
+              "set_frequency", "output_disable", "output_enable",
+              "offset_enable", "offset_disable", "sleep", "wake",
+              "is_sleeping"),
+}
+
+# methods that only read from the board.  Identical calls to these methods
+# on the same board in one batch are run once.
+READ_METHODS = frozenset((
+    "get_pin_direction", "get_port_direction", "get_bus_direction",
+    "get_pin_pullup", "get_port_pullups", "get_bus_pullups",
+    "read_pin", "read_port", "read_bus",
+    "get_pin_polarity", "get_port_polarity", "get_bus_polarity",
+    "get_interrupt_polarity", "get_interrupt_type",
+    "get_interrupt_defaults", "get_interrupt_on_pin",
+    "get_interrupt_on_port", "get_interrupt_on_bus",
+    "read_interrupt_status",
+    "read_voltage", "read_raw", "get_i2c_address1", "get_i2c_address2",
+    "get_pwm_on_time", "get_pwm_off_time", "is_sleeping",
+    "get_position"))
+
+# board types whose writes are merged by the write queue
+QUEUED_TYPES = frozenset(("PWM", "Servo"))
+
+# board id used for requests to the daemon itself
+DAEMON_BOARD = 0xFFFF
+LOOKUP = 0  # args: board name, returns [board id, board type]
+LIST = 1  # returns [[name, type], ...]
+
+OK = 0
+ERROR = 1
+
+_LENGTH = struct.Struct("<I")
+_REQUEST = struct.Struct("<IHB")
+_RESPONSE = struct.Struct("<IB")
+_INT = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+_COUNT = struct.Struct("<H")
+
+
+class _BatchQueue(WriteQueue):
+    """
+    Internal WriteQueue that counts the flushes that send writes and keeps
+    the error from the last one, so a failed flush is only reported to the
+    requests whose writes it was sending
+    """
+
+    def __init__(self, bus):
+        super().__init__(bus)
+        self.flushes = 0
+        self.error = None
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.flushes += 1
+        try:
+            super().flush()
+        except Exception as err:
+            self.error = err
+            raise
+
+
+def get_socket_path(path=None):
+    """
+    Get the path of the daemon socket
+
+    :param path: socket path, None = use ABE_DAEMON_SOCKET or the default
+    :type path: str, optional
+    :return: socket path
+    :rtype: str
+    """
+    if path is not None:
+        return path
+    return os.environ.get(SOCKET_ENVIRONMENT_VARIABLE, DEFAULT_SOCKET)
+
+
+def encode(value, out=None):
+    """
+    Encode a value for a message
+
+    :param value: None, bool, int, float, str or a list or tuple of values
+    :type value: object
+    :param out: buffer to append to, defaults to a new buffer
+    :type out: bytearray, optional
+    :return: encoded value
+    :rtype: bytearray
+    :raises TypeError: value cannot be encoded
+    """
+    if out is None:
+        out = bytearray()
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        out += b"i"
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out += b"d"
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out += b"s"
+        out += _COUNT.pack(len(data))
+        out += data
+    elif isinstance(value, (list, tuple)):
+        out += b"l"
+        out += _COUNT.pack(len(value))
+        for item in value:
+            encode(item, out)
+    else:
+        raise TypeError("cannot send %s to the daemon" %
+                        type(value).__name__)
+    return out
+
+
+def decode(data, offset=0):
+    """
+    Decode a value from a message
+
+    :param data: message body
+    :type data: bytes
+    :param offset: position of the value
+    :type offset: int
+    :return: value and the position after it
+    :rtype: tuple
+    :raises ValueError: unknown type byte
+    """
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"i":
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    if tag == b"d":
+        return _DOUBLE.unpack_from(data, offset)[0], offset + _DOUBLE.size
+    if tag == b"s":
+        length = _COUNT.unpack_from(data, offset)[0]
+        offset += _COUNT.size
+        return data[offset:offset + length].decode("utf-8"), offset + length
+    if tag == b"l":
+        count = _COUNT.unpack_from(data, offset)[0]
+        offset += _COUNT.size
+        items = []
+        for _ in range(count):
+            item, offset = decode(data, offset)
+            items.append(item)
+        return items, offset
+    raise ValueError("unknown value type %r" % tag)
+
+
+def decode_all(data, offset=0):
+    """
+    Decode every value from a position to the end of a message
+
+    :param data: message body
+    :type data: bytes
+    :param offset: position of the first value
+    :type offset: int
+    :return: values
+    :rtype: list
+    """
+    values = []
+    while offset < len(data):
+        value, offset = decode(data, offset)
+        values.append(value)
+    return values
+
+
+def send_message(sock, body):
+    """
+    Send a message with its length
+
+    :param sock: connected socket
+    :type sock: socket.socket
+    :param body: message body
+    :type body: bytes
+    """
+    sock.sendall(_LENGTH.pack(len(body)) + bytes(body))
+
+
+def receive_message(sock):
+    """
+    Receive one message
+
+    :param sock: connected socket
+    :type sock: socket.socket
+    :return: message body, or None when the connection is closed
+    :rtype: bytes
+    """
+    header = _receive(sock, _LENGTH.size)
+    if header is None:
+        return None
+    return _receive(sock, _LENGTH.unpack(header)[0])
+
+
+def _receive(sock, length):
+    """
+    Internal method for receiving an exact number of bytes
+
+    :return: data, or None when the connection is closed
+    :rtype: bytes
+    """
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class DeviceServer(object):
+    """
+    Serves the configured boards to clients on a Unix domain socket.
+    """
+
+    def __init__(self, boards, path=None, bus=None):
+        """
+        :param boards: board name, board type and constructor arguments
+                       for each board, e.g. ("io", "IOPi", (0x20,))
+        :type boards: list
+        :param path: socket path, defaults to get_socket_path()
+        :type path: str, optional
+        :param bus: I2C bus number, SMBus compatible object or None to
+                    detect the bus
+        :type bus: int, SMBus or None
+        :raises ValueError: unknown board type or duplicate board name
+        """
+        self.path = get_socket_path(path)
+        self.__smbus = i2cbus.get_smbus(bus)
+        self.__queue = None
+        self.__boards = []  # (name, type, object), indexed by board id
+        self.__names = {}
+        for name, board_type, args in boards:
+            self.add_board(name, board_type, args)
+
+        self.__requests = queue.Queue()
+        self.__socket = None
+        self.__threads = []
+        self.__clients = []
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.reset_counters()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_board(self, name, board_type, args=()):
+        """
+        Create a board and make it available to clients
+
+        :param name: name used by the clients
+        :type name: str
+        :param board_type: IOPi, ADCPi, PWM or Servo
+        :type board_type: str
+        :param args: constructor arguments before the bus
+        :type args: tuple, optional
+        :return: board id
+        :rtype: int
+        :raises ValueError: unknown board type or duplicate board name
+        """
+        if board_type not in BOARD_TYPES:
+            raise ValueError("unknown board type %s" % board_type)
+        if name in self.__names:
+            raise ValueError("duplicate board name %s" % name)
+        module_name, class_name = BOARD_TYPES[board_type]
+        board_class = getattr(importlib.import_module(module_name),
+                              class_name)
+        bus = self.__smbus
+        if board_type in QUEUED_TYPES:
+            if self.__queue is None:
+                self.__queue = _BatchQueue(self.__smbus)
+            bus = self.__queue
+        board = board_class(*args, bus=bus)
+        self.__names[name] = len(self.__boards)
+        self.__boards.append((name, board_type, board))
+        return self.__names[name]
+
+    def reset_counters(self):
+        """
+        Reset the request counters to 0
+        """
+        self.requests = 0
+        self.batches = 0
+        self.merged = 0
+
+    def get_counters(self):
+        """
+        Get the request counters
+
+        :return: requests run, batches run and reads that were answered
+                 from an identical read in the same batch
+        :rtype: dict
+        """
+        return {"requests": self.requests,
+                "batches": self.batches,
+                "merged": self.merged}
+
+    def start(self):
+        """
+        Create the socket and start serving clients on background threads.
+        The socket can only be used by the user running the daemon.
+
+        :raises OSError: another daemon is serving on the socket path
+        """
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError as err:
+                if err.errno != errno.ECONNREFUSED:
+                    raise
+                os.unlink(self.path)  # left behind by a daemon that stopped
+            else:
+                raise OSError(errno.EADDRINUSE,
+                              "a daemon is already serving on %s" % self.path)
+            finally:
+                probe.close()
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the socket is created with mode 0600, so no other user can
+        # connect before the daemon is serving
+        umask = os.umask(0o177)
+        try:
+            self.__socket.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.__socket.listen(16)
+        self.__running = True
+        for target, name in ((self.__accept, "accept"),
+                             (self.__work, "worker")):
+            thread = threading.Thread(target=target,
+                                      name="abelectronics-daemon-" + name)
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def serve_forever(self):
+        """
+        Start serving clients and wait until the server is closed
+        """
+        if not self.__running:
+            self.start()
+        for thread in list(self.__threads):
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def close(self):
+        """
+        Stop serving, close the client connections and boards and release
+        the bus
+        """
+        if self.__running:
+            self.__running = False
+            self.__socket.shutdown(socket.SHUT_RDWR)
+            self.__socket.close()
+            self.__requests.put(None)
+            for thread in self.__threads:
+                thread.join()
+            with self.__lock:
+                clients = list(self.__clients)
+            for client in clients:
+                try:
+                    client.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # already closed by the client
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        for _, _, board in self.__boards:
+            board.close()
+        self.__boards = []
+        self.__names = {}
+        if self.__queue is not None:
+            self.__queue.close()
+            self.__queue = None
+        if self.__smbus is not None:
+            i2cbus.release_smbus(self.__smbus)
+            self.__smbus = None
+
+    def __accept(self):
+        """
+        Internal method for accepting client connections
+        """
+        while self.__running:
+            try:
+                client, _ = self.__socket.accept()
+            except OSError:
+                break
+            with self.__lock:
+                self.__clients.append(client)
+            thread = threading.Thread(target=self.__read, args=(client,),
+                                      name="abelectronics-daemon-client")
+            thread.daemon = True
+            thread.start()
+
+    def __read(self, client):
+        """
+        Internal method for reading requests from a client and passing
+        them to the worker
+        """
+        try:
+            while True:
+                body = receive_message(client)
+                if body is None:
+                    break
+                request_id, board_id, method = _REQUEST.unpack_from(body)
+                self.__requests.put((client, request_id, board_id, method,
+                                     body[_REQUEST.size:]))
+        except OSError:
+            pass
+        with self.__lock:
+            if client in self.__clients:
+                self.__clients.remove(client)
+        client.close()
+
+    def __work(self):
+        """
+        Internal method for running the requests in batches
+        """
+        requests = self.__requests
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            batch = [request]
+            stop = False
+            while True:
+                try:
+                    request = requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            for client, body in self.__run_batch(batch):
+                try:
+                    send_message(client, body)
+                except OSError:
+                    pass  # the client has gone
+            if stop:
+                break
+
+    def __run_batch(self, batch):
+        """
+        Internal method for running a batch of requests
+
+        :param batch: client, request id, board id, method number and
+                      encoded arguments for each request
+        :type batch: list
+        :return: client and response body for each request
+        :rtype: list
+        """
+        results = []
+        reads = {}  # (board id, method, arguments): result
+        unsent = []  # results of the requests with writes still queued
+        write_queue = self.__queue
+        if write_queue is not None:
+            write_queue.begin()
+        try:
+            for client, request_id, board_id, method, args in batch:
+                if write_queue is not None:
+                    writes = write_queue.writes
+                    flushes = write_queue.flushes
+                    write_queue.error = None
+                key = (board_id, method, args)
+                if key in reads:
+                    self.merged += 1
+                    result = reads[key]
+                else:
+                    result, read = self.__run(board_id, method, args)
+                    if read:
+                        reads[key] = result
+                    else:
+                        # a change to the board makes earlier reads stale
+                        for other in [k for k in reads if k[0] == board_id]:
+                            del reads[other]
+                entry = [client, request_id, result]
+                results.append(entry)
+                if write_queue is not None:
+                    if write_queue.flushes != flushes:
+                        # the request sent the writes queued before it
+                        if write_queue.error is not None:
+                            self.__fail(unsent, write_queue.error)
+                        unsent = []
+                    if write_queue.pending and write_queue.writes != writes:
+                        unsent.append(entry)
+        finally:
+            if write_queue is not None:
+                try:
+                    write_queue.end()
+                except Exception as err:
+                    # only the requests whose writes were queued failed
+                    self.__fail(unsent, err)
+
+        self.requests += len(batch)
+        self.batches += 1
+        responses = []
+        for client, request_id, (status, value) in results:
+            body = bytearray(_RESPONSE.pack(request_id, status))
+            if status == OK:
+                try:
+                    encode(value, body)
+                except TypeError as err:
+                    body = bytearray(_RESPONSE.pack(request_id, ERROR))
+                    status, value = ERROR, err
+            if status == ERROR:
+                encode([type(value).__name__, str(value)], body)
+            responses.append((client, body))
+        return responses
+
+    @staticmethod
+    def __fail(results, err):
+        """
+        Internal method for reporting a failed flush to the requests whose
+        writes it was sending, unless they failed already
+        """
+        for result in results:
+            if result[2][0] == OK:
+                result[2] = (ERROR, err)
+
+    def __run(self, board_id, method, args):
+        """
+        Internal method for running one request
+
+        :return: (status, return value or exception) and True if the
+                 method only reads from the board
+        :rtype: tuple
+        """
+        try:
+            args = decode_all(args)
+            if board_id == DAEMON_BOARD:
+                return (OK, self.__daemon_request(method, args)), True
+            if board_id >= len(self.__boards):
+                raise ValueError("unknown board id %d" % board_id)
+            _, board_type, board = self.__boards[board_id]
+            methods = METHODS[board_type]
+            if method >= len(methods):
+                raise ValueError("unknown method %d for %s" %
+                                 (method, board_type))
+            name = methods[method]
+            return (OK, getattr(board, name)(*args)), name in READ_METHODS
+        except Exception as err:
+            return (ERROR, err), False
+
+    def __daemon_request(self, method, args):
+        """
+        Internal method for running a request to the daemon
+        """
+        if method == LOOKUP:
+            name = args[0]
+            if name not in self.__names:
+                raise ValueError("board %s not found" % name)
+            board_id = self.__names[name]
+            return [board_id, self.__boards[board_id][1]]
+        if method == LIST:
+            return [[name, board_type]
+                    for name, board_type, _ in self.__boards]
+        raise ValueError("unknown daemon request %d" % method)
+
+
+def parse_board(text):
+    """
+    Parse a board from the command line
+
+    :param text: name=type:arg,arg..., e.g. adc=ADCPi:0x68,0x69,12
+    :type text: str
+    :return: name, type and constructor arguments
+    :rtype: tuple
+    :raises ValueError: invalid board
+    """
+    name, _, spec = text.partition("=")
+    board_type, _, args = spec.partition(":")
+    if not name or not board_type:
+        raise ValueError("invalid board %s, use name=type:arguments" % text)
+    values = []
+    for arg in args.split(",") if args else []:
+        try:
+            values.append(int(arg, 0))
+        except ValueError:
+            values.append(float(arg))
+    return name, board_type, tuple(values)
+
+
+def main():
+    """
+    Run the daemon from the command line
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve AB Electronics UK boards to other processes")
+    parser.add_argument("-b", "--board", action="append", required=True,
+                        help="board to serve as name=type:arguments, for "
+                             "example io=IOPi:0x20 or adc=ADCPi:0x68,0x69,18."
+                             "  Types: " + ", ".join(sorted(BOARD_TYPES)))
+    parser.add_argument("-s", "--socket",
+                        help="socket path, defaults to " + get_socket_path())
+    parser.add_argument("--bus", type=int,
+                        help="I2C bus number, detected by default")
+    args = parser.parse_args()
+
+    try:
+        boards = [parse_board(board) for board in args.board]
+    except ValueError as err:
+        parser.error(str(err))
+
+    server = DeviceServer(boards, args.socket, args.bus)
+    print("Serving %s on %s" % (", ".join(b[0] for b in boards), server.path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,791 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Shared I2C Bus
+
+Process-wide registry of reference counted SMBus handles.
+================================================
+
+Every board object that is created with a bus number, or with no bus so
+the number is detected automatically, shares a single SMBus file
+descriptor for that bus.  The handle is opened by the first board that
+uses the bus and closed when the last board releases it.
+
+The I2C bus number for the single-board computer is detected once per
+process.  Set the ABE_I2C_BUS environment variable to a bus number to
+skip detection.
+
+Locking is disabled by default.  Call set_locking(True) before creating
+board objects that are used from more than one thread.  Each transaction
+then holds the bus lock and each board object holds a lock for its device
+address while it changes the device, so separate chips on one bus can be
+used from separate threads.
+
+Call set_instrumentation(True) to record the number of transactions, bytes
+and latency for each device and register.  Read the counters with
+get_statistics.  The ADC and IO drivers also report ADC conversion waits,
+conversion timeouts and IO interrupts, read with get_events.
+
+Call set_combined_reads(True) to send the register reads of operations
+that read several registers, such as IOPi.reset_interrupts, as one
+i2c_rdwr call with a message for each register write and read, and to
+read blocks of registers longer than 32 bytes, such as the Servo Pi
+channel registers, in one call.  This needs smbus2; other buses read each
+register separately.
+
+Call set_retry_policy with an abelectronics.retry.RetryPolicy to send
+transactions that fail with a transient error, such as a NACK, again after
+a short backoff.  The bus lock is released during the backoff so other
+devices on the bus are not held up.
+
+Call set_scheduling(True) with locking enabled to hand the bus to waiting
+transactions in priority and deadline order instead of letting the threads
+race for the bus lock.  Threads set the priority of their transactions
+with abelectronics.scheduler, so a servo control loop can get the bus
+between the polling reads of a background ADC logger.  Read the wait times
+and deadline misses with get_schedule_statistics.
+
+Example:
+
+    from abelectronics import i2cbus
+
+    smbus = i2cbus.get_smbus(1)      # opens /dev/i2c-1
+    smbus2 = i2cbus.get_smbus(1)     # same handle, reference count 2
+    i2cbus.release_smbus(smbus2)
+    i2cbus.release_smbus(smbus)      # closes /dev/i2c-1
+"""
+import contextlib
+import os
+import threading
+import time
+
+from .instrumentation import Instrumentation
+from .scheduler import BusScheduler
+
+# SMBus methods that are bound directly on the shared handle
+_SMBUS_METHODS = ("write_quick", "read_byte", "write_byte",
+                  "read_byte_data", "write_byte_data",
+                  "read_word_data", "write_word_data",
+                  "read_i2c_block_data", "write_i2c_block_data")
+
+# I2C bus numbers for single-board computers that do not use bus 1
+_DEVICE_BUS_MAP = {
+    "orangepione": 0,  # Orange Pi One
+    "orangepizero2": 3,  # Orange Pi Zero 2
+    "orangepiplus": 0,  # Orange Pi Plus
+    "orangepipcplus": 0,  # Orange Pi PC Plus
+    "linaro-alip": 1,  # Asus Tinker Board
+    "bpi-m2z": 0,  # Banana Pi BPI M2 Zero Ubuntu
+    "bpi-iot-ros-ai": 0,  # Banana Pi BPI M2 Zero Raspbian
+}
+
+BUS_ENVIRONMENT_VARIABLE = "ABE_I2C_BUS"
+
+_registry = {}
+_wrapped = {}
+_registry_lock = threading.Lock()
+_smbus_factory = None
+_locking = False
+_instrumentation = None
+_combined_reads = False
+_retry_policy = None
+_scheduling = False
+_i2c_msg = None
+_statistics = Instrumentation()
+_NO_LOCK = contextlib.nullcontext()
+_detected_bus = None
+
+
+def _detect_raspberry_pi_bus():
+    """
+    Internal method to detect the I2C bus from the Raspberry Pi board
+    revision
+
+    :return: I2C bus number
+    :rtype: int
+    """
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("Revision"):
+                    value = line.partition(":")[2].strip()
+                    if value[-4:] in ("0002", "0003"):
+                        return 0  # original model A or B
+                    return 1  # later models
+    except IOError:
+        pass
+    return 1  # default to bus 1 if the revision can't be determined
+
+
+def detect_bus(refresh=False):
+    """
+    Get the I2C bus number for the single-board computer.  The bus is
+    detected from the device name on the first call and the result is
+    reused by every later call.
+
+    :param refresh: True = detect the bus again, defaults to False
+    :type refresh: bool, optional
+    :return: I2C bus number
+    :rtype: int
+    :raises ValueError: ABE_I2C_BUS is not a bus number
+    """
+    global _detected_bus
+    if _detected_bus is not None and not refresh:
+        return _detected_bus
+
+    override = os.environ.get(BUS_ENVIRONMENT_VARIABLE)
+    if override:
+        try:
+            bus = int(override, 0)
+        except ValueError:
+            raise ValueError("%s must be an I2C bus number: %r" %
+                             (BUS_ENVIRONMENT_VARIABLE, override))
+    else:
+        import platform  # only needed to detect the bus
+        device = platform.uname()[1]
+        if device in _DEVICE_BUS_MAP:
+            bus = _DEVICE_BUS_MAP[device]
+        elif device == "raspberrypi":
+            bus = _detect_raspberry_pi_bus()
+        else:
+            bus = 1  # default to bus 1 for unknown devices
+
+    _detected_bus = bus
+    return bus
+
+
+def _open_smbus(bus):
+    """
+    Internal method for opening an I2C bus with smbus2 or python smbus
+
+    :param bus: I2C bus number
+    :type bus: int
+    :return: SMBus object
+    :rtype: SMBus
+    :raises ImportError: python-smbus or smbus2 not found
+    """
+    try:
+        from smbus2 import SMBus
+    except ImportError:
+        try:
+            from smbus import SMBus
+        except ImportError:
+            raise ImportError("python-smbus or smbus2 not found")
+    return SMBus(bus)
+
+
+def get_i2c_msg():
+    """
+    Import the smbus2 i2c_msg class, used to build the messages for
+    i2c_rdwr calls
+
+    :return: i2c_msg class, or False if smbus2 is not installed
+    :rtype: type or bool
+    """
+    global _i2c_msg
+    if _i2c_msg is None:
+        try:
+            from smbus2 import i2c_msg
+            _i2c_msg = i2c_msg
+        except ImportError:
+            _i2c_msg = False
+    return _i2c_msg
+
+
+def _locked(method, lock):
+    """
+    Internal method for wrapping an SMBus method so it holds the bus lock
+    for the whole transaction
+
+    :param method: SMBus method
+    :type method: callable
+    :param lock: bus lock
+    :type lock: threading.RLock or BusScheduler
+    :return: wrapped method
+    :rtype: callable
+    """
+    def locked(*args, **kwargs):
+        with lock:
+            return method(*args, **kwargs)
+    return locked
+
+
+class SharedSMBus(object):
+    """
+    Reference counted handle to an SMBus object shared by all board
+    objects on the same I2C bus.
+
+    The SMBus read and write methods are bound directly to the handle so
+    using the shared handle costs the same as using the SMBus object.
+    When locking is enabled each method holds the bus lock for the
+    length of the transaction and board objects take a lock for each
+    device address while they update the device.
+    """
+
+    def __init__(self, bus, smbus, owner=True):
+        """
+        :param bus: I2C bus number
+        :type bus: int
+        :param smbus: open SMBus object
+        :type smbus: SMBus
+        :param owner: True = close the SMBus object when the last reference
+                      is released, defaults to True
+        :type owner: bool, optional
+        """
+        self.bus = bus
+        self.smbus = smbus
+        self.owner = owner
+        self.references = 0
+        self.scheduling = _scheduling
+        self.lock = BusScheduler() if self.scheduling else threading.RLock()
+        self.locking = _locking
+        self.instrumentation = _instrumentation
+        self.combined_reads = _combined_reads
+        self.retry_policy = _retry_policy
+        self.__device_locks = {}
+        self.__attempts = {}
+        self._bind()
+
+    def __getattr__(self, name):
+        # methods that are not bound on the handle, such as i2c_rdwr
+        try:
+            smbus = self.__dict__["smbus"]
+        except KeyError:
+            raise AttributeError(name)
+        return getattr(smbus, name)
+
+    def __repr__(self):
+        return "SharedSMBus(bus=%s, references=%d)" % (self.bus,
+                                                        self.references)
+
+    def _bind(self):
+        """
+        Internal method for binding the SMBus methods to the handle
+        """
+        for name in _SMBUS_METHODS:
+            method = getattr(self.smbus, name, None)
+            if method is None:
+                continue
+            if self.instrumentation is not None:
+                method = self.instrumentation.wrap(self.bus, name, method)
+            if self.locking:
+                method = _locked(method, self.lock)
+            # one attempt, used for groups of reads retried together
+            self.__attempts[name] = method
+            if self.retry_policy is not None:
+                method = self.retry_policy.wrap(self.bus, name, method)
+            setattr(self, name, method)
+
+    def _retry(self, address, function):
+        """
+        Internal method for calling a function that sends one or more
+        transactions to a device, retrying transient errors when a retry
+        policy is set.  The function must take the bus lock itself so the
+        lock is not held during the backoff.
+        """
+        if self.retry_policy is None:
+            return function()
+        return self.retry_policy.call(self.bus, address, function)
+
+    @property
+    def closed(self):
+        """
+        :return: True if the handle has been released by every user
+        :rtype: bool
+        """
+        return self.references == 0
+
+    def set_locking(self, enabled):
+        """
+        Enable or disable the bus and device locks.  Board objects get
+        their device locks when they are created so locking should be
+        enabled before the board objects are created.
+
+        :param enabled: True = serialise transactions on the bus
+        :type enabled: bool
+        """
+        self.locking = bool(enabled)
+        self._bind()
+
+    def set_scheduling(self, enabled):
+        """
+        Use a BusScheduler or a threading.RLock as the bus lock.  The lock
+        is replaced, so it should only be changed while no thread is using
+        the bus.
+
+        :param enabled: True = hand the bus to waiting transactions in
+                        priority and deadline order
+        :type enabled: bool
+        """
+        enabled = bool(enabled)
+        if enabled == self.scheduling:
+            return
+        self.scheduling = enabled
+        self.lock = BusScheduler() if enabled else threading.RLock()
+        self._bind()
+
+    def set_instrumentation(self, instrumentation):
+        """
+        Start or stop recording the transactions on the bus
+
+        :param instrumentation: object that records the transactions,
+                                None = stop recording
+        :type instrumentation: Instrumentation or None
+        """
+        self.instrumentation = instrumentation
+        self._bind()
+
+    def set_combined_reads(self, enabled):
+        """
+        Enable or disable sending the reads in read_registers as one
+        i2c_rdwr call
+
+        :param enabled: True = use i2c_rdwr when the bus supports it
+        :type enabled: bool
+        """
+        self.combined_reads = bool(enabled)
+
+    def set_retry_policy(self, policy):
+        """
+        Start or stop retrying transactions that fail with a transient
+        error
+
+        :param policy: retry policy, None = do not retry
+        :type policy: RetryPolicy or None
+        """
+        self.retry_policy = policy
+        self._bind()
+
+    def read_registers(self, address, registers):
+        """
+        Read one byte from each of several registers on a device.  When
+        combined reads are enabled and the bus has an i2c_rdwr method the
+        reads are sent in one call with a register write message and a
+        one byte read message for each register.  Otherwise each register
+        is read with read_byte_data.
+
+        :param address: I2C address
+        :type address: int
+        :param registers: register numbers
+        :type registers: list
+        :return: value of each register
+        :rtype: list
+        """
+        rdwr = None
+        if self.combined_reads:
+            i2c_msg = get_i2c_msg()
+            if i2c_msg:
+                rdwr = getattr(self.smbus, "i2c_rdwr", None)
+        if rdwr is None:
+            read_byte_data = self.__attempts["read_byte_data"]
+
+            def read_each():
+                with self.lock if self.locking else _NO_LOCK:
+                    return [read_byte_data(address, register)
+                            for register in registers]
+            return self._retry(address, read_each)
+
+        messages = []
+        reads = []
+        for register in registers:
+            read = i2c_msg.read(address, 1)
+            messages.append(i2c_msg.write(address, [register]))
+            messages.append(read)
+            reads.append(read)
+
+        def transfer():
+            with self.lock if self.locking else _NO_LOCK:
+                rdwr(*messages)
+
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            self._retry(address, transfer)
+        else:
+            start = time.perf_counter()
+            try:
+                self._retry(address, transfer)
+            except Exception:
+                elapsed = (time.perf_counter() - start) / len(registers)
+                for register in registers:
+                    instrumentation.record(self.bus, address, register,
+                                           elapsed, error=True)
+                raise
+            # the call time is shared between the registers
+            elapsed = (time.perf_counter() - start) / len(registers)
+            for register in registers:
+                instrumentation.record(self.bus, address, register,
+                                       elapsed, written=1, read=1)
+        return [list(read)[0] for read in reads]
+
+    def read_block(self, address, register, length):
+        """
+        Read consecutive registers on a device that increments its register
+        pointer after each byte.  When combined reads are enabled and the
+        bus has an i2c_rdwr method the registers are read in one call with
+        a register write message and a read message of any length.
+        Otherwise the registers are read with read_i2c_block_data in blocks
+        of up to 32 bytes.
+
+        :param address: I2C address
+        :type address: int
+        :param register: first register
+        :type register: int
+        :param length: number of registers
+        :type length: int
+        :return: value of each register
+        :rtype: list
+        """
+        rdwr = None
+        if self.combined_reads:
+            i2c_msg = get_i2c_msg()
+            if i2c_msg:
+                rdwr = getattr(self.smbus, "i2c_rdwr", None)
+        if rdwr is None:
+            return _read_blocks(self, address, register, length)
+
+        read = i2c_msg.read(address, length)
+
+        def transfer():
+            with self.lock if self.locking else _NO_LOCK:
+                rdwr(i2c_msg.write(address, [register]), read)
+
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
+        try:
+            self._retry(address, transfer)
+        except Exception:
+            if instrumentation is not None:
+                instrumentation.record(self.bus, address, register,
+                                       time.perf_counter() - start,
+                                       error=True)
+            raise
+        if instrumentation is not None:
+            instrumentation.record(self.bus, address, register,
+                                   time.perf_counter() - start,
+                                   written=1, read=length)
+        return list(read)
+
+    def device_lock(self, address):
+        """
+        Get the lock for a device on the bus.  Board objects hold the lock
+        while they change the state of a device so one device can be used
+        from several threads while other devices on the bus carry on.
+
+        :param address: I2C address
+        :type address: int
+        :return: device lock, or a lock that does nothing when locking is
+                 disabled
+        :rtype: threading.RLock or contextlib.nullcontext
+        """
+        if not self.locking:
+            return _NO_LOCK
+        with _registry_lock:
+            lock = self.__device_locks.get(address)
+            if lock is None:
+                lock = self.__device_locks[address] = threading.RLock()
+            return lock
+
+    def release(self):
+        """
+        Release one reference to the bus.  The SMBus object is closed when
+        the last reference is released.
+        """
+        release_smbus(self)
+
+
+def set_smbus_factory(factory=None):
+    """
+    Set the function used to open a new I2C bus.  The function is called
+    with the bus number and must return an SMBus compatible object.  This
+    can be used to run the libraries on simulated buses.
+
+    :param factory: function to open a bus, None = use smbus2 or smbus
+    :type factory: callable, optional
+    """
+    global _smbus_factory
+    _smbus_factory = factory
+
+
+def set_locking(enabled):
+    """
+    Enable or disable locking on every open bus and on buses opened later.
+    Locking is disabled by default.  Enable it before creating board
+    objects that are used from more than one thread.
+
+    :param enabled: True = serialise transactions on each bus
+    :type enabled: bool
+    """
+    global _locking
+    with _registry_lock:
+        _locking = bool(enabled)
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        handle.set_locking(enabled)
+
+
+def set_scheduling(enabled):
+    """
+    Enable or disable priority and deadline scheduling of the bus lock on
+    every open bus and on buses opened later.  Scheduling is disabled by
+    default and only has an effect while locking is enabled.  Change it
+    while no thread is using the buses.
+
+    :param enabled: True = hand each bus to waiting transactions in
+                    priority and deadline order
+    :type enabled: bool
+    """
+    global _scheduling
+    with _registry_lock:
+        _scheduling = bool(enabled)
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        handle.set_scheduling(enabled)
+
+
+def set_instrumentation(enabled):
+    """
+    Start or stop recording the transactions on every open bus and on
+    buses opened later.  Recording is disabled by default.  The counters
+    are kept when recording stops.
+
+    :param enabled: True = record each transaction
+    :type enabled: bool
+    """
+    global _instrumentation
+    with _registry_lock:
+        _instrumentation = _statistics if enabled else None
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        handle.set_instrumentation(_instrumentation)
+
+
+def set_combined_reads(enabled):
+    """
+    Enable or disable combined register reads on every open bus and on
+    buses opened later.  When enabled, read_registers sends the reads in
+    one i2c_rdwr call on buses opened with smbus2.  Combined reads are
+    disabled by default.
+
+    :param enabled: True = use i2c_rdwr for read_registers
+    :type enabled: bool
+    """
+    global _combined_reads
+    with _registry_lock:
+        _combined_reads = bool(enabled)
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        handle.set_combined_reads(enabled)
+
+
+def set_retry_policy(policy):
+    """
+    Set the retry policy for every open bus and for buses opened later.
+    Transactions are not retried by default.
+
+    :param policy: retry policy, None = do not retry
+    :type policy: abelectronics.retry.RetryPolicy or None
+    """
+    global _retry_policy
+    with _registry_lock:
+        _retry_policy = policy
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        handle.set_retry_policy(policy)
+
+
+def read_registers(bus, address, registers):
+    """
+    Read one byte from each of several registers on a device.  See
+    SharedSMBus.read_registers.
+
+    :param bus: shared I2C bus handle or SMBus compatible object
+    :type bus: SharedSMBus or SMBus
+    :param address: I2C address
+    :type address: int
+    :param registers: register numbers
+    :type registers: list
+    :return: value of each register
+    :rtype: list
+    """
+    if isinstance(bus, SharedSMBus):
+        return bus.read_registers(address, registers)
+    return [bus.read_byte_data(address, register) for register in registers]
+
+
+def _read_blocks(bus, address, register, length):
+    """
+    Internal method for reading consecutive registers with SMBus block reads
+    of up to 32 bytes
+    """
+    values = []
+    while len(values) < length:
+        values += bus.read_i2c_block_data(address, register + len(values),
+                                          min(32, length - len(values)))
+    return values
+
+
+def read_block(bus, address, register, length):
+    """
+    Read consecutive registers on a device.  See SharedSMBus.read_block.
+
+    :param bus: shared I2C bus handle or SMBus compatible object
+    :type bus: SharedSMBus or SMBus
+    :param address: I2C address
+    :type address: int
+    :param register: first register
+    :type register: int
+    :param length: number of registers
+    :type length: int
+    :return: value of each register
+    :rtype: list
+    """
+    if isinstance(bus, SharedSMBus):
+        return bus.read_block(address, register, length)
+    return _read_blocks(bus, address, register, length)
+
+
+def get_statistics():
+    """
+    Get the transaction counters recorded since instrumentation was enabled
+    or the counters were reset.  See Instrumentation.snapshot for the
+    format.
+
+    :return: counters keyed by bus number and device address
+    :rtype: dict
+    """
+    return _statistics.snapshot()
+
+
+def get_events():
+    """
+    Get the conversion, timeout and interrupt counters reported by the
+    drivers since instrumentation was enabled or the counters were reset.
+    See Instrumentation.events for the format.
+
+    :return: counters keyed by bus number and device address
+    :rtype: dict
+    """
+    return _statistics.events()
+
+
+def get_schedule_statistics():
+    """
+    Get the bus scheduler counters for each open bus with scheduling
+    enabled.  See BusScheduler.snapshot for the format.
+
+    :return: counters keyed by bus number and priority level
+    :rtype: dict
+    """
+    with _registry_lock:
+        handles = list(_registry.values()) + list(_wrapped.values())
+    return dict((handle.bus, handle.lock.snapshot()) for handle in handles
+                if handle.scheduling)
+
+
+def reset_statistics():
+    """
+    Reset the transaction, event and bus scheduler counters
+    """
+    _statistics.reset()
+    with _registry_lock:
+        handles = list(_registry.values()) + list(_wrapped.values())
+    for handle in handles:
+        if handle.scheduling:
+            handle.lock.reset()
+
+
+def device_lock(bus, address):
+    """
+    Get the lock for a device on a bus
+
+    :param bus: shared I2C bus handle
+    :type bus: SharedSMBus
+    :param address: I2C address
+    :type address: int
+    :return: device lock, or a lock that does nothing for buses that are
+             not shared handles or when locking is disabled
+    :rtype: threading.RLock or contextlib.nullcontext
+    """
+    if isinstance(bus, SharedSMBus):
+        return bus.device_lock(address)
+    return _NO_LOCK
+
+
+def get_smbus(bus):
+    """
+    Get the shared handle for an I2C bus, opening the bus if no other
+    object is using it.
+
+    :param bus: I2C bus number, None = detect the bus number.  An SMBus
+                compatible object is given its own handle which never
+                closes the object, so the caller keeps ownership of it
+    :type bus: int, SMBus or None
+    :return: shared I2C bus handle
+    :rtype: SharedSMBus
+    :raises IOError: Could not open the I2C bus
+    """
+    if bus is None:
+        bus = detect_bus()
+    with _registry_lock:
+        if isinstance(bus, SharedSMBus):
+            handle = bus
+        elif isinstance(bus, int):
+            handle = _registry.get(bus)
+            if handle is None:
+                factory = _smbus_factory or _open_smbus
+                try:
+                    smbus = factory(bus)
+                except FileNotFoundError:
+                    raise FileNotFoundError("I2C bus %d not found. Check "
+                                            "that you have selected the "
+                                            "correct I2C bus." % bus)
+                handle = SharedSMBus(bus, smbus)
+                _registry[bus] = handle
+        else:
+            handle = _wrapped.get(id(bus))
+            if handle is None:
+                handle = SharedSMBus(getattr(bus, "bus", None), bus,
+                                     owner=False)
+                _wrapped[id(bus)] = handle
+        handle.references += 1
+        return handle
+
+
+def release_smbus(handle):
+    """
+    Release a handle returned by get_smbus.  The bus is closed when the
+    last reference is released.  Objects that are not shared handles are
+    ignored so the caller keeps ownership of buses it opened itself.
+
+    :param handle: shared I2C bus handle
+    :type handle: SharedSMBus
+    """
+    if not isinstance(handle, SharedSMBus):
+        return
+    with _registry_lock:
+        if handle.references == 0:
+            return
+        handle.references -= 1
+        if handle.references > 0:
+            return
+        if not handle.owner:
+            if _wrapped.get(id(handle.smbus)) is handle:
+                del _wrapped[id(handle.smbus)]
+            return
+        if _registry.get(handle.bus) is handle:
+            del _registry[handle.bus]
+        close = getattr(handle.smbus, "close", None)
+        if close is not None:
+            close()
+
+
+def open_buses():
+    """
+    Get the buses that are open in the registry
+
+    :return: reference count for each open bus number
+    :rtype: dict
+    """
+    with _registry_lock:
+        return dict((bus, handle.references)
+                    for bus, handle in _registry.items())
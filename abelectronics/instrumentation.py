@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Bus Instrumentation
+
+Transaction counters and latency histograms for each I2C device and
+register.
+================================================
+
+Instrumentation is enabled with abelectronics.i2cbus.set_instrumentation.
+While it is disabled the SMBus methods are bound directly on the shared bus
+handle, so the library runs at the same speed as it does without the
+instrumentation code.
+
+Example:
+
+    from abelectronics import i2cbus
+    from IOPi import IOPi
+
+    i2cbus.set_instrumentation(True)
+    iopi = IOPi(0x20)
+    iopi.write_pin(1, 1)
+    print(i2cbus.get_statistics()[1][0x20]["count"])
+"""
+import bisect
+import threading
+import time
+
+# upper bound in seconds of each latency histogram bucket.  The last
+# histogram bucket counts the transactions that took longer than 0.1 seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.0002, 0.0005,
+                   0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+# upper bound in seconds of each ADC conversion wait histogram bucket,
+# covering 240 samples per second at 12 bits to 3.75 at 18 bits.  The last
+# bucket counts the waits that took longer than 0.5 seconds
+CONVERSION_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+                      0.1, 0.2, 0.3, 0.5)
+
+
+def _no_register(args):
+    return None
+
+
+def _first_argument(args):
+    return args[0] if args else None
+
+
+# register, bytes written and bytes read for each SMBus method.  The byte
+# counts include the register byte and exclude the address byte.
+_TRANSFERS = {
+    "write_quick": (_no_register, lambda args: 0, lambda args: 0),
+    "read_byte": (_no_register, lambda args: 0, lambda args: 1),
+    "write_byte": (_no_register, lambda args: 1, lambda args: 0),
+    "read_byte_data": (_first_argument, lambda args: 1, lambda args: 1),
+    "write_byte_data": (_first_argument, lambda args: 2, lambda args: 0),
+    "read_word_data": (_first_argument, lambda args: 1, lambda args: 2),
+    "write_word_data": (_first_argument, lambda args: 3, lambda args: 0),
+    "read_i2c_block_data": (_first_argument, lambda args: 1,
+                            lambda args: args[1]),
+    "write_i2c_block_data": (_first_argument, lambda args: 1 + len(args[1]),
+                             lambda args: 0),
+}
+
+
+class RegisterStats(object):
+    """
+    Counters for one register on a device
+    """
+    __slots__ = ("count", "errors", "bytes_written", "bytes_read",
+                 "total_time", "max_time", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, other):
+        """
+        Add the counters from another RegisterStats object
+
+        :param other: counters to add
+        :type other: RegisterStats
+        """
+        self.count += other.count
+        self.errors += other.errors
+        self.bytes_written += other.bytes_written
+        self.bytes_read += other.bytes_read
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        for i, value in enumerate(other.histogram):
+            self.histogram[i] += value
+
+    def as_dict(self):
+        """
+        :return: counters as a dictionary
+        :rtype: dict
+        """
+        return {"count": self.count,
+                "errors": self.errors,
+                "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read,
+                "total_time": self.total_time,
+                "max_time": self.max_time,
+                "histogram": list(self.histogram)}
+
+
+class DeviceEvents(object):
+    """
+    Counters for events reported by the board drivers for one device
+    """
+    __slots__ = ("conversions", "conversion_time", "conversion_max",
+                 "conversion_histogram", "timeouts", "interrupts")
+
+    def __init__(self):
+        self.conversions = 0
+        self.conversion_time = 0.0
+        self.conversion_max = 0.0
+        self.conversion_histogram = [0] * (len(CONVERSION_BUCKETS) + 1)
+        self.timeouts = 0
+        self.interrupts = {}
+
+    def as_dict(self):
+        """
+        :return: counters as a dictionary
+        :rtype: dict
+        """
+        return {"conversions": self.conversions,
+                "conversion_time": self.conversion_time,
+                "conversion_max": self.conversion_max,
+                "conversion_histogram": list(self.conversion_histogram),
+                "timeouts": self.timeouts,
+                "interrupts": dict(self.interrupts)}
+
+
+class Instrumentation(object):
+    """
+    Records each SMBus transaction by bus number, device address and
+    register.
+    """
+
+    def __init__(self):
+        self.__stats = {}
+        self.__events = {}
+        self.__lock = threading.Lock()
+
+    def record(self, bus, address, register, elapsed,
+               written=0, read=0, error=False):
+        """
+        Record one transaction
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param address: I2C address
+        :type address: int
+        :param register: register number, None for transactions without a
+                         register such as read_byte
+        :type register: int or None
+        :param elapsed: time taken in seconds
+        :type elapsed: float
+        :param written: number of bytes written, defaults to 0
+        :type written: int, optional
+        :param read: number of bytes read, defaults to 0
+        :type read: int, optional
+        :param error: True = the transaction failed, defaults to False
+        :type error: bool, optional
+        """
+        key = (bus, address, register)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        with self.__lock:
+            stats = self.__stats.get(key)
+            if stats is None:
+                stats = self.__stats[key] = RegisterStats()
+            stats.count += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            stats.histogram[bucket] += 1
+            if error:
+                stats.errors += 1
+            else:
+                stats.bytes_written += written
+                stats.bytes_read += read
+
+    def __device_events(self, bus, address):
+        """
+        Internal method for getting the event counters for a device.  The
+        lock must be held.
+        """
+        events = self.__events.get((bus, address))
+        if events is None:
+            events = self.__events[(bus, address)] = DeviceEvents()
+        return events
+
+    def record_conversion(self, bus, address, elapsed):
+        """
+        Record the time an ADC driver waited for a conversion result
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param address: I2C address
+        :type address: int
+        :param elapsed: time from starting to poll the ADC until the
+                        result was ready in seconds
+        :type elapsed: float
+        """
+        bucket = bisect.bisect_left(CONVERSION_BUCKETS, elapsed)
+        with self.__lock:
+            events = self.__device_events(bus, address)
+            events.conversions += 1
+            events.conversion_time += elapsed
+            if elapsed > events.conversion_max:
+                events.conversion_max = elapsed
+            events.conversion_histogram[bucket] += 1
+
+    def record_timeout(self, bus, address):
+        """
+        Record an ADC conversion that timed out
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param address: I2C address
+        :type address: int
+        """
+        with self.__lock:
+            self.__device_events(bus, address).timeouts += 1
+
+    def record_interrupts(self, bus, address, port, count):
+        """
+        Record the pins that had an interrupt when an IO driver read the
+        interrupt flags
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param address: I2C address
+        :type address: int
+        :param port: 0 or 1
+        :type port: int
+        :param count: number of pins with an interrupt
+        :type count: int
+        """
+        with self.__lock:
+            interrupts = self.__device_events(bus, address).interrupts
+            interrupts[port] = interrupts.get(port, 0) + count
+
+    def events(self):
+        """
+        Get a copy of the event counters reported by the drivers.  The
+        result is a dictionary keyed by bus number then device address.
+        Each device has conversions, conversion_time and conversion_max in
+        seconds, a conversion_histogram with the number of conversions in
+        each CONVERSION_BUCKETS bucket, timeouts and an interrupts
+        dictionary with the count for each port.
+
+        :return: counters
+        :rtype: dict
+        """
+        with self.__lock:
+            items = [(key, events.as_dict())
+                     for key, events in self.__events.items()]
+        result = {}
+        for (bus, address), values in items:
+            result.setdefault(bus, {})[address] = values
+        return result
+
+    def wrap(self, bus, name, method):
+        """
+        Wrap an SMBus method so each call is recorded
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param name: SMBus method name
+        :type name: str
+        :param method: SMBus method
+        :type method: callable
+        :return: wrapped method
+        :rtype: callable
+        """
+        register_of, written_by, read_by = _TRANSFERS[name]
+        record = self.record
+        clock = time.perf_counter
+
+        def instrumented(address, *args, **kwargs):
+            start = clock()
+            try:
+                result = method(address, *args, **kwargs)
+            except Exception:
+                record(bus, address, register_of(args), clock() - start,
+                       error=True)
+                raise
+            record(bus, address, register_of(args), clock() - start,
+                   written_by(args), read_by(args))
+            return result
+        return instrumented
+
+    def snapshot(self):
+        """
+        Get a copy of the counters.  The result is a dictionary keyed by
+        bus number then device address.  Each device has the totals for
+        the device and a "registers" dictionary with the counters for each
+        register.  Transactions without a register are listed under None.
+
+        Each set of counters has count, errors, bytes_written, bytes_read,
+        total_time and max_time in seconds and a histogram with the number
+        of transactions in each LATENCY_BUCKETS bucket.
+
+        :return: counters
+        :rtype: dict
+        """
+        with self.__lock:
+            items = [(key, stats.as_dict())
+                     for key, stats in self.__stats.items()]
+        result = {}
+        totals = {}
+        for (bus, address, register), values in items:
+            device = result.setdefault(bus, {}).setdefault(
+                address, {"registers": {}})
+            device["registers"][register] = values
+            total = totals.get((bus, address))
+            if total is None:
+                total = totals[(bus, address)] = RegisterStats()
+            stats = RegisterStats()
+            for name in RegisterStats.__slots__:
+                setattr(stats, name, values[name])
+            total.add(stats)
+        for (bus, address), total in totals.items():
+            result[bus][address].update(total.as_dict())
+        return result
+
+    def reset(self):
+        """
+        Reset all counters
+        """
+        with self.__lock:
+            self.__stats.clear()
+            self.__events.clear()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Prometheus Metrics
+
+Serves the bus instrumentation counters in the Prometheus text format.
+================================================
+
+The metrics are read from abelectronics.i2cbus.get_statistics and
+abelectronics.i2cbus.get_events, so no work is added to the driver methods
+apart from the instrumentation itself.  The counters are only converted to
+text when the endpoint is scraped.
+
+Metrics:
+
+abelectronics_i2c_transactions_total{bus,address}      transactions
+abelectronics_i2c_errors_total{bus,address}            failed transactions
+abelectronics_i2c_bytes_written_total{bus,address}     bytes written
+abelectronics_i2c_bytes_read_total{bus,address}        bytes read
+abelectronics_i2c_transaction_seconds{bus,address}     latency histogram
+abelectronics_adc_conversion_seconds{bus,address}      ADC conversion wait
+abelectronics_adc_timeouts_total{bus,address}          ADC conversion timeouts
+abelectronics_io_interrupts_total{bus,address,port}    IO pin interrupts
+
+The transactions per second for each address is the Prometheus rate of
+abelectronics_i2c_transactions_total.
+
+Example:
+
+    from abelectronics import metrics
+    from ADCPi import ADCPi
+
+    server = metrics.start_http_server(9100)
+    adc = ADCPi(0x68, 0x69, 12)
+    while True:
+        adc.read_voltage(1)
+
+then scrape http://127.0.0.1:9100/metrics
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from . import i2cbus
+from .instrumentation import CONVERSION_BUCKETS, LATENCY_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(bus, address, **extra):
+    """
+    Internal method for formatting the labels of a device
+    """
+    labels = 'bus="%s",address="0x%02x"' % (bus, address)
+    for name, value in sorted(extra.items()):
+        labels += ',%s="%s"' % (name, value)
+    return labels
+
+
+def _histogram(lines, name, labels, buckets, histogram, total, count):
+    """
+    Internal method for adding the cumulative buckets, sum and count of a
+    histogram
+    """
+    cumulative = 0
+    for bound, value in zip(buckets, histogram):
+        cumulative += value
+        lines.append('%s_bucket{%s,le="%r"} %d' %
+                     (name, labels, bound, cumulative))
+    lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, count))
+    lines.append("%s_sum{%s} %r" % (name, labels, total))
+    lines.append("%s_count{%s} %d" % (name, labels, count))
+
+
+def render():
+    """
+    Get the current counters in the Prometheus text format
+
+    :return: metrics text
+    :rtype: str
+    """
+    statistics = i2cbus.get_statistics()
+    events = i2cbus.get_events()
+
+    devices = [(bus, address, stats)
+               for bus, addresses in sorted(statistics.items())
+               for address, stats in sorted(addresses.items())]
+    lines = []
+
+    for key, kind, text in (
+            ("count", "transactions_total", "I2C transactions"),
+            ("errors", "errors_total", "I2C transactions that failed"),
+            ("bytes_written", "bytes_written_total", "Bytes written"),
+            ("bytes_read", "bytes_read_total", "Bytes read")):
+        name = "abelectronics_i2c_" + kind
+        lines.append("# HELP %s %s" % (name, text))
+        lines.append("# TYPE %s counter" % name)
+        for bus, address, stats in devices:
+            lines.append("%s{%s} %d" % (name, _labels(bus, address),
+                                        stats[key]))
+
+    name = "abelectronics_i2c_transaction_seconds"
+    lines.append("# HELP %s I2C transaction latency" % name)
+    lines.append("# TYPE %s histogram" % name)
+    for bus, address, stats in devices:
+        _histogram(lines, name, _labels(bus, address), LATENCY_BUCKETS,
+                   stats["histogram"], stats["total_time"], stats["count"])
+
+    devices = [(bus, address, values)
+               for bus, addresses in sorted(events.items())
+               for address, values in sorted(addresses.items())]
+
+    name = "abelectronics_adc_conversion_seconds"
+    lines.append("# HELP %s Time waiting for ADC conversion results" % name)
+    lines.append("# TYPE %s histogram" % name)
+    for bus, address, values in devices:
+        if values["conversions"] or values["timeouts"]:
+            _histogram(lines, name, _labels(bus, address),
+                       CONVERSION_BUCKETS, values["conversion_histogram"],
+                       values["conversion_time"], values["conversions"])
+
+    name = "abelectronics_adc_timeouts_total"
+    lines.append("# HELP %s ADC conversions that timed out" % name)
+    lines.append("# TYPE %s counter" % name)
+    for bus, address, values in devices:
+        if values["conversions"] or values["timeouts"]:
+            lines.append("%s{%s} %d" % (name, _labels(bus, address),
+                                        values["timeouts"]))
+
+    name = "abelectronics_io_interrupts_total"
+    lines.append("# HELP %s IO pins that had an interrupt" % name)
+    lines.append("# TYPE %s counter" % name)
+    for bus, address, values in devices:
+        for port, count in sorted(values["interrupts"].items()):
+            lines.append("%s{%s} %d" % (name,
+                                        _labels(bus, address, port=port),
+                                        count))
+
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Request handler for the metrics endpoint
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes are not logged
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server for the metrics endpoint, see start_http_server
+    """
+    daemon_threads = True
+
+    def __init__(self, port, address="127.0.0.1"):
+        """
+        :param port: TCP port, 0 = any free port
+        :type port: int
+        :param address: address to listen on, defaults to 127.0.0.1
+        :type address: str, optional
+        """
+        HTTPServer.__init__(self, (address, port), _Handler)
+        self.port = self.server_address[1]
+        self.__thread = None
+
+    def start(self):
+        """
+        Serve requests in a background thread
+        """
+        self.__thread = threading.Thread(target=self.serve_forever,
+                                         name="abelectronics-metrics")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def close(self):
+        """
+        Stop the server and close the socket
+        """
+        if self.__thread is not None:
+            self.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.server_close()
+
+
+def start_http_server(port, address="127.0.0.1"):
+    """
+    Enable instrumentation and serve the metrics at /metrics in a
+    background thread
+
+    :param port: TCP port, 0 = any free port
+    :type port: int
+    :param address: address to listen on, defaults to 127.0.0.1
+    :type address: str, optional
+    :return: server, call close() to stop it
+    :rtype: MetricsServer
+    """
+    i2cbus.set_instrumentation(True)
+    server = MetricsServer(port, address)
+    server.start()
+    return server
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Profiling
+
+Wall-clock spans for the driver hot paths and their internal phases.
+================================================
+
+Profiling is disabled by default.  Call enable() or set the ABE_PROFILE
+environment variable to a value other than 0 before importing the
+libraries to record spans in a bounded in-memory buffer.  When the buffer
+is full the oldest spans are dropped.
+
+The drivers record the phases of their hot paths:
+
+ADCPi.read_raw:lock           waiting for the ADC device lock
+ADCPi.read_raw:config         selecting the channel and starting a conversion
+ADCPi.read_raw:conversion     polling until the conversion is ready
+ADCPi.read_raw:decode         converting the result to a signed value
+IOPi.__set_pin:lock           waiting for the IO device lock
+IOPi.__set_pin:read           reading the register
+IOPi.__set_pin:write          writing the updated register
+Servo.move:convert            converting the position to a pulse length
+Servo.move:write              writing the channel registers
+
+Call profile() with a board object to also record a span for each call to
+its public methods.
+
+While profiling is disabled the drivers only test the module profiler
+variable, so the hot paths run at the same speed as they do without the
+profiling code.
+
+Example:
+
+    from abelectronics import profiling
+    from ADCPi import ADCPi
+
+    profiling.enable()
+    adc = profiling.profile(ADCPi(0x68, 0x69, 12))
+    for i in range(100):
+        adc.read_voltage(1)
+    print(profiling.report())
+"""
+import collections
+import functools
+import os
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = "ABE_PROFILE"
+
+# number of spans kept in the buffer
+DEFAULT_BUFFER_SIZE = 10000
+
+Span = collections.namedtuple("Span", ("name", "start", "duration",
+                                       "thread"))
+
+# the active Profiler, None when profiling is disabled
+profiler = None
+
+
+class Profiler(object):
+    """
+    Bounded buffer of spans
+    """
+
+    # clock used for the span start and end times
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        """
+        :param size: number of spans to keep, defaults to 10000
+        :type size: int, optional
+        :raises ValueError: size must be at least 1
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.recorded = 0
+        self.__spans = collections.deque(maxlen=size)
+
+    def record(self, name, start):
+        """
+        Record a span that ends now.  The end time is returned so the next
+        phase can start where this one ended.
+
+        :param name: span name
+        :type name: str
+        :param start: start time from clock()
+        :type start: float
+        :return: end time
+        :rtype: float
+        """
+        end = time.perf_counter()
+        # deque.append is atomic, so no lock is needed
+        self.__spans.append(Span(name, start, end - start,
+                                 threading.current_thread().ident))
+        self.recorded += 1
+        return end
+
+    def wrap(self, name, method):
+        """
+        Wrap a function so each call is recorded as a span
+
+        :param name: span name
+        :type name: str
+        :param method: function to wrap
+        :type method: callable
+        :return: wrapped function
+        :rtype: callable
+        """
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, start)
+        return wrapper
+
+    @property
+    def dropped(self):
+        """
+        :return: number of spans dropped because the buffer was full,
+                 approximate when several threads record spans
+        :rtype: int
+        """
+        return max(0, self.recorded - self.size)
+
+    def spans(self):
+        """
+        Get the spans in the buffer, oldest first
+
+        :return: spans
+        :rtype: list of Span
+        """
+        return list(self.__spans)
+
+    def reset(self):
+        """
+        Remove every span from the buffer
+        """
+        self.__spans.clear()
+        self.recorded = 0
+
+    def summary(self):
+        """
+        Get the count, total, mean, minimum, median, 99th percentile and
+        maximum duration in seconds of the spans in the buffer for each
+        span name
+
+        :return: statistics keyed by span name
+        :rtype: dict
+        """
+        durations = {}
+        for span in self.spans():
+            durations.setdefault(span.name, []).append(span.duration)
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            count = len(values)
+            total = sum(values)
+            summary[name] = {"count": count,
+                             "total": total,
+                             "mean": total / count,
+                             "min": values[0],
+                             "median": values[count // 2],
+                             "p99": values[min(count - 1,
+                                               int(count * 0.99))],
+                             "max": values[-1]}
+        return summary
+
+
+def enable(size=DEFAULT_BUFFER_SIZE):
+    """
+    Start recording spans in a new buffer
+
+    :param size: number of spans to keep, defaults to 10000
+    :type size: int, optional
+    :return: the active profiler
+    :rtype: Profiler
+    """
+    global profiler
+    profiler = Profiler(size)
+    return profiler
+
+
+def disable():
+    """
+    Stop recording spans.  The spans recorded so far are kept by the
+    Profiler object returned by enable().
+    """
+    global profiler
+    profiler = None
+
+
+def is_enabled():
+    """
+    :return: True if spans are being recorded
+    :rtype: bool
+    """
+    return profiler is not None
+
+
+def profile(board, methods=None):
+    """
+    Record a span for each call to the public methods of a board object.
+    The methods are wrapped on the object, other objects of the same class
+    are not changed.  The spans are named after the class and method, for
+    example IOPi.write_pin.
+
+    :param board: board object
+    :type board: object
+    :param methods: names of the methods to wrap, defaults to every public
+                    method
+    :type methods: list, optional
+    :raises RuntimeError: profiling is not enabled
+    :return: the board object
+    :rtype: object
+    """
+    if profiler is None:
+        raise RuntimeError("profiling is not enabled")
+    if methods is None:
+        methods = [name for name in dir(type(board))
+                   if not name.startswith("_") and
+                   callable(getattr(type(board), name))]
+    prefix = type(board).__name__ + "."
+    for name in methods:
+        setattr(board, name,
+                profiler.wrap(prefix + name, getattr(board, name)))
+    return board
+
+
+def summary():
+    """
+    Get the statistics for each span name, see Profiler.summary
+
+    :raises RuntimeError: profiling is not enabled
+    :return: statistics keyed by span name
+    :rtype: dict
+    """
+    if profiler is None:
+        raise RuntimeError("profiling is not enabled")
+    return profiler.summary()
+
+
+def report():
+    """
+    Format the statistics for each span name as a table with the times in
+    microseconds
+
+    :raises RuntimeError: profiling is not enabled
+    :return: report text
+    :rtype: str
+    """
+    lines = ["%-32s %8s %10s %10s %10s %10s %10s" %
+             ("span", "count", "total ms", "mean us", "median us",
+              "p99 us", "max us")]
+    for name, stats in sorted(summary().items()):
+        lines.append("%-32s %8d %10.3f %10.1f %10.1f %10.1f %10.1f" %
+                     (name, stats["count"], stats["total"] * 1e3,
+                      stats["mean"] * 1e6, stats["median"] * 1e6,
+                      stats["p99"] * 1e6, stats["max"] * 1e6))
+    if profiler.dropped:
+        lines.append("%d older spans dropped" % profiler.dropped)
+    return "\n".join(lines)
+
+
+if os.environ.get(ENVIRONMENT_VARIABLE, "0") not in ("", "0"):
+    enable()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Raw I2C Bus
+
+SMBus compatible I2C bus that uses the Linux I2C_RDWR ioctl directly.
+================================================
+
+smbus2 creates new ctypes structures for every transaction.  RawI2CBus
+creates the i2c_msg structures and data buffers once when the bus is
+opened and reuses them for every call, so each transaction is one ioctl
+with no other allocation apart from the returned value.  This reduces the
+time spent in Python when polling devices such as the ADC Pi.
+
+Every transaction is sent with I2C_RDWR, so the bus adapter must support
+plain I2C transfers.  The Raspberry Pi and most single-board computers do.
+The buffers are shared by all methods so a RawI2CBus object must not be
+used from more than one thread at the same time.  Call
+abelectronics.i2cbus.set_locking(True) when board objects on the bus are
+used from several threads.
+
+Use it for one board by passing it as the bus:
+
+    from abelectronics.rawi2c import RawI2CBus
+    from ADCPi import ADCPi
+
+    adc = ADCPi(0x68, 0x69, 12, RawI2CBus(1))
+
+or for every board that opens a bus by number:
+
+    from abelectronics import i2cbus
+    from abelectronics.rawi2c import RawI2CBus
+
+    i2cbus.set_smbus_factory(RawI2CBus)
+"""
+import ctypes
+import fcntl
+import os
+
+I2C_RDWR = 0x0707  # combined read and write transfer
+I2C_M_RD = 0x0001  # read message flag
+BLOCK_MAX = 32  # largest SMBus block transfer
+
+
+class _I2CMsg(ctypes.Structure):
+    """
+    struct i2c_msg from linux/i2c.h
+    """
+    _fields_ = [("addr", ctypes.c_uint16),
+                ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16),
+                ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+
+class _I2CRdwrData(ctypes.Structure):
+    """
+    struct i2c_rdwr_ioctl_data from linux/i2c-dev.h
+    """
+    _fields_ = [("msgs", ctypes.POINTER(_I2CMsg)),
+                ("nmsgs", ctypes.c_uint32)]
+
+
+class RawI2CBus(object):
+    """
+    SMBus compatible I2C bus that sends each transaction as one I2C_RDWR
+    ioctl using preallocated buffers
+    """
+
+    def __init__(self, bus=None):
+        """
+        :param bus: I2C bus number or device path, None = do not open a bus
+        :type bus: int or str, optional
+        """
+        self.bus = None
+        self.fd = None
+
+        self.__write_buffer = (ctypes.c_uint8 * (BLOCK_MAX + 1))()
+        self.__read_buffer = (ctypes.c_uint8 * BLOCK_MAX)()
+
+        # message 0 writes the register, message 1 reads the data
+        self.__msgs = (_I2CMsg * 2)()
+        self.__msgs[0].buf = self.__write_buffer
+        self.__msgs[1].flags = I2C_M_RD
+        self.__msgs[1].buf = self.__read_buffer
+        self.__write = _I2CRdwrData(self.__msgs, 1)
+        self.__write_read = _I2CRdwrData(self.__msgs, 2)
+        self.__read = _I2CRdwrData(
+            ctypes.cast(ctypes.byref(self.__msgs[1]),
+                        ctypes.POINTER(_I2CMsg)), 1)
+
+        if bus is not None:
+            self.open(bus)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self, bus):
+        """
+        Open an I2C bus
+
+        :param bus: I2C bus number or device path, e.g. /dev/i2c-1
+        :type bus: int or str
+        :raises TypeError: bus is not an int or str
+        """
+        if isinstance(bus, int):
+            path = "/dev/i2c-%d" % bus
+        elif isinstance(bus, str):
+            path = bus
+        else:
+            raise TypeError("bus must be an int or str")
+        self.fd = os.open(path, os.O_RDWR)
+        self.bus = bus
+        # looked up when the bus is opened so a replaced fcntl.ioctl, such
+        # as abelectronics.simulator.FakeI2CDev, is used
+        self.__ioctl = fcntl.ioctl
+
+    def close(self):
+        """
+        Close the I2C bus
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __transfer(self, data, address, write_length, read_length=0):
+        """
+        Internal method for sending the preallocated messages
+
+        :param data: _I2CRdwrData for the messages to send
+        :type data: _I2CRdwrData
+        :param address: I2C address
+        :type address: int
+        :param write_length: bytes in the write buffer
+        :type write_length: int
+        :param read_length: bytes to read into the read buffer
+        :type read_length: int
+        """
+        msgs = self.__msgs
+        msgs[0].addr = address
+        msgs[0].len = write_length
+        msgs[1].addr = address
+        msgs[1].len = read_length
+        self.__ioctl(self.fd, I2C_RDWR, data)
+
+    def write_quick(self, i2c_addr, force=None):
+        self.__transfer(self.__write, i2c_addr, 0)
+
+    def read_byte(self, i2c_addr, force=None):
+        self.__transfer(self.__read, i2c_addr, 0, 1)
+        return self.__read_buffer[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self.__write_buffer[0] = value & 0xFF
+        self.__transfer(self.__write, i2c_addr, 1)
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        self.__write_buffer[0] = register
+        self.__transfer(self.__write_read, i2c_addr, 1, 1)
+        return self.__read_buffer[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        buffer = self.__write_buffer
+        buffer[0] = register
+        buffer[1] = value & 0xFF
+        self.__transfer(self.__write, i2c_addr, 2)
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        self.__write_buffer[0] = register
+        self.__transfer(self.__write_read, i2c_addr, 1, 2)
+        buffer = self.__read_buffer
+        return buffer[0] | (buffer[1] << 8)
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        buffer = self.__write_buffer
+        buffer[0] = register
+        buffer[1] = value & 0xFF
+        buffer[2] = (value >> 8) & 0xFF
+        self.__transfer(self.__write, i2c_addr, 3)
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        if length > BLOCK_MAX:
+            raise ValueError("Desired block length over %d bytes" % BLOCK_MAX)
+        self.__write_buffer[0] = register
+        self.__transfer(self.__write_read, i2c_addr, 1, length)
+        return self.__read_buffer[:length]
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        length = len(data)
+        if length > BLOCK_MAX:
+            raise ValueError("Data length cannot exceed %d bytes" % BLOCK_MAX)
+        buffer = self.__write_buffer
+        buffer[0] = register
+        buffer[1:1 + length] = [value & 0xFF for value in data]
+        self.__transfer(self.__write, i2c_addr, 1 + length)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        """
+        Send smbus2 i2c_msg objects in one I2C_RDWR ioctl
+
+        :param i2c_msgs: messages to send
+        :type i2c_msgs: smbus2.i2c_msg
+        """
+        msgs = (_I2CMsg * len(i2c_msgs))()
+        for msg, i2c_msg in zip(msgs, i2c_msgs):
+            msg.addr = i2c_msg.addr
+            msg.flags = i2c_msg.flags
+            msg.len = i2c_msg.len
+            msg.buf = ctypes.cast(i2c_msg.buf, ctypes.POINTER(ctypes.c_uint8))
+        self.__ioctl(self.fd, I2C_RDWR, _I2CRdwrData(msgs, len(i2c_msgs)))
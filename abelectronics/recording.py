@@ -0,0 +1,676 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Bus Recording
+
+Records the I2C and SPI transactions of the board objects to a binary
+file and replays them without the hardware.
+================================================
+
+A Recorder wraps the SMBus and SpiDev objects used by the board objects.
+Each transaction is written to the recording with the time since the
+previous transaction, the time it took, the data sent and the data or
+error returned.  A Replay reads the file and gives the board objects
+SMBus and SpiDev objects that return the recorded responses in the same
+order, so the same workload can be run and profiled on a computer
+without the boards attached.
+
+Record every board that opens an I2C bus by number and an ADC DAC Pi:
+
+    from abelectronics import i2cbus
+    from abelectronics.recording import Recorder
+    from ADCDACPi import ADCDACPi
+    from ADCPi import ADCPi
+
+    recorder = Recorder("rig.abr")
+    i2cbus.set_smbus_factory(recorder.smbus)
+    adc = ADCPi(0x68, 0x69, 12)
+    adcdac = ADCDACPi(1, recorder.spidev(0, 0), recorder.spidev(0, 1))
+    ...
+    recorder.close()
+
+Replay the recording:
+
+    from abelectronics.recording import Replay
+
+    replay = Replay("rig.abr")
+    i2cbus.set_smbus_factory(replay.smbus)
+    adc = ADCPi(0x68, 0x69, 12)
+    adcdac = ADCDACPi(1, replay.spidev(0, 0), replay.spidev(0, 1))
+    ...
+
+The board objects must make the same calls in the same order as they did
+when the recording was made.  A transaction that does not match the next
+transaction in the recording raises ReplayError.  Set timing=True to wait
+for the recorded transaction time on each call so slow transactions are
+reproduced.
+
+Print a recording with:
+
+    python3 -m abelectronics.recording rig.abr
+
+File format, all values little-endian:
+
+    header: "ABEREC", version (uint8), 0 (uint8), start time (float64)
+    record: operation (uint8), channel (uint8), I2C address (uint8),
+            microseconds since the previous record (uint32),
+            transaction time in microseconds (uint32),
+            request length (uint16), response length (uint16),
+            request bytes, response bytes
+
+Operation 0 names a channel, one bus or SPI chip select, with the name in
+the request bytes.  Bit 7 of the operation is set when the transaction
+raised an error and the response is the error number (uint16).
+"""
+import argparse
+import collections
+import errno
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"ABEREC"
+VERSION = 1
+
+_HEADER = struct.Struct("<6sBBd")
+_RECORD = struct.Struct("<BBBIIHH")
+_ERRNO = struct.Struct("<H")
+_MSG = struct.Struct("<BHH")  # i2c_rdwr message address, flags and length
+
+CHANNEL = 0
+ERROR = 0x80
+I2C_RDWR = 10
+I2C_M_RD = 0x0001  # i2c_rdwr read message flag
+
+_MAX_UINT32 = 0xFFFFFFFF
+
+
+def _none(value):
+    return b""
+
+
+def _byte(value):
+    return bytes((value & 0xFF,))
+
+
+def _word(value):
+    return bytes((value & 0xFF, (value >> 8) & 0xFF))
+
+
+def _block(values):
+    return bytes(value & 0xFF for value in values)
+
+
+# operation number, SMBus method, request bytes from the arguments,
+# response bytes from the return value and return value from the response
+_SMBUS_OPERATIONS = (
+    (1, "write_quick", lambda args: b"", _none, lambda data: None),
+    (2, "read_byte", lambda args: b"", _byte, lambda data: data[0]),
+    (3, "write_byte", lambda args: _byte(args[0]), _none,
+     lambda data: None),
+    (4, "read_byte_data", lambda args: _byte(args[0]), _byte,
+     lambda data: data[0]),
+    (5, "write_byte_data", lambda args: _byte(args[0]) + _byte(args[1]),
+     _none, lambda data: None),
+    (6, "read_word_data", lambda args: _byte(args[0]), _word,
+     lambda data: data[0] | (data[1] << 8)),
+    (7, "write_word_data", lambda args: _byte(args[0]) + _word(args[1]),
+     _none, lambda data: None),
+    (8, "read_i2c_block_data", lambda args: _byte(args[0]) + _byte(args[1]),
+     _block, list),
+    (9, "write_i2c_block_data", lambda args: _byte(args[0]) + _block(args[1]),
+     _none, lambda data: None),
+)
+
+# SpiDev methods, readbytes sends the number of bytes to read
+_SPI_OPERATIONS = (
+    (16, "xfer2", lambda args: _block(args[0]), _block, list),
+    (17, "xfer", lambda args: _block(args[0]), _block, list),
+    (18, "writebytes", lambda args: _block(args[0]), _none,
+     lambda data: None),
+    (19, "readbytes", lambda args: _word(args[0]), _block, list),
+)
+
+OPERATION_NAMES = dict([(operation[0], operation[1]) for operation in
+                        _SMBUS_OPERATIONS + _SPI_OPERATIONS] +
+                       [(CHANNEL, "channel"), (I2C_RDWR, "i2c_rdwr")])
+
+# one transaction read from a recording.  time and duration are in
+# seconds, error is the error number or None
+Transaction = collections.namedtuple(
+    "Transaction", ["time", "channel", "operation", "address", "duration",
+                    "request", "response", "error"])
+
+
+class ReplayError(Exception):
+    """
+    A transaction does not match the recording
+    """
+    pass
+
+
+def _rdwr_request(i2c_msgs):
+    """
+    Internal method for getting the request bytes for i2c_rdwr messages.
+    Each message has the address, flags and length followed by the data of
+    write messages.
+    """
+    request = b""
+    for msg in i2c_msgs:
+        request += _MSG.pack(msg.addr, msg.flags, msg.len)
+        if not msg.flags & I2C_M_RD:
+            request += _block(list(msg))
+    return request
+
+
+def _rdwr_address(i2c_msgs):
+    return i2c_msgs[0].addr if i2c_msgs else 0
+
+
+class _RecordingSMBus(object):
+    """
+    SMBus compatible object that records each transaction, see
+    Recorder.smbus
+    """
+
+    def __init__(self, recorder, channel, bus, smbus, owner):
+        self.bus = bus
+        self.smbus = smbus
+        self.__owner = owner
+        for operation, name, request_of, response_of, _ in \
+                _SMBUS_OPERATIONS:
+            method = getattr(smbus, name, None)
+            if method is not None:
+                setattr(self, name, recorder._wrap(
+                    channel, operation, method, request_of, response_of))
+        rdwr = getattr(smbus, "i2c_rdwr", None)
+        if rdwr is not None:
+            self.i2c_rdwr = self.__i2c_rdwr(recorder, channel, rdwr)
+
+    @staticmethod
+    def __i2c_rdwr(recorder, channel, rdwr):
+        """
+        Internal method for recording i2c_rdwr calls.  The response is the
+        data of the read messages.
+        """
+        record = recorder._record
+        clock = time.perf_counter
+
+        def recorded(*i2c_msgs):
+            request = _rdwr_request(i2c_msgs)
+            address = _rdwr_address(i2c_msgs)
+            start = clock()
+            try:
+                rdwr(*i2c_msgs)
+            except (IOError, OSError) as err:
+                record(channel, I2C_RDWR, address, start, clock(), request,
+                       error=err)
+                raise
+            end = clock()
+            response = b"".join(_block(list(msg)) for msg in i2c_msgs
+                                if msg.flags & I2C_M_RD)
+            record(channel, I2C_RDWR, address, start, end, request, response)
+        return recorded
+
+    def close(self):
+        """
+        Close the SMBus object if it was opened by the recorder
+        """
+        if self.__owner:
+            self.smbus.close()
+
+
+class _RecordingSpiDev(object):
+    """
+    SpiDev compatible object that records each transfer, see
+    Recorder.spidev.  Other attributes, such as max_speed_hz, are read
+    from and set on the SpiDev object.
+    """
+
+    def __init__(self, recorder, channel, spi):
+        object.__setattr__(self, "spi", spi)
+        for operation, name, request_of, response_of, _ in _SPI_OPERATIONS:
+            method = getattr(spi, name)
+            object.__setattr__(self, name, recorder._wrap(
+                channel, operation, method, request_of, response_of,
+                address=False))
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["spi"], name)
+
+    def __setattr__(self, name, value):
+        setattr(self.spi, name, value)
+
+    def close(self):
+        self.spi.close()
+
+
+class Recorder(object):
+    """
+    Records the transactions of SMBus and SpiDev objects to a file
+    """
+
+    def __init__(self, path):
+        """
+        :param path: recording file, an existing file is replaced
+        :type path: str
+        """
+        self.path = path
+        self.records = 0
+        self.__file = open(path, "wb")
+        self.__file.write(_HEADER.pack(MAGIC, VERSION, 0, time.time()))
+        self.__lock = threading.Lock()
+        self.__channels = 0
+        self.__last = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _record(self, channel, operation, address, start, end, request,
+                response=b"", error=None):
+        """
+        Internal method for writing a record
+
+        :param channel: channel number
+        :type channel: int
+        :param operation: operation number
+        :type operation: int
+        :param address: I2C address, 0 for SPI
+        :type address: int
+        :param start: perf_counter time when the transaction started
+        :type start: float
+        :param end: perf_counter time when the transaction finished
+        :type end: float
+        :param request: data sent
+        :type request: bytes
+        :param response: data returned
+        :type response: bytes, optional
+        :param error: exception raised by the transaction
+        :type error: OSError, optional
+        """
+        if error is not None:
+            operation |= ERROR
+            response = _ERRNO.pack(getattr(error, "errno", None) or
+                                   errno.EIO)
+        duration = min(int((end - start) * 1e6), _MAX_UINT32)
+        with self.__lock:
+            if self.__file is None:
+                return
+            delta = min(max(int((start - self.__last) * 1e6), 0), _MAX_UINT32)
+            self.__last = start
+            self.__file.write(_RECORD.pack(
+                operation, channel, address, delta, duration, len(request),
+                len(response)) + request + response)
+            self.records += 1
+
+    def _wrap(self, channel, operation, method, request_of, response_of,
+              address=True):
+        """
+        Internal method for wrapping an SMBus or SpiDev method so each call
+        is recorded
+        """
+        record = self._record
+        clock = time.perf_counter
+
+        if address:
+            def recorded(i2c_addr, *args, **kwargs):
+                request = request_of(args)
+                start = clock()
+                try:
+                    result = method(i2c_addr, *args, **kwargs)
+                except (IOError, OSError) as err:
+                    record(channel, operation, i2c_addr, start, clock(),
+                           request, error=err)
+                    raise
+                record(channel, operation, i2c_addr, start, clock(), request,
+                       response_of(result))
+                return result
+        else:
+            def recorded(*args, **kwargs):
+                request = request_of(args)
+                start = clock()
+                try:
+                    result = method(*args, **kwargs)
+                except (IOError, OSError) as err:
+                    record(channel, operation, 0, start, clock(), request,
+                           error=err)
+                    raise
+                record(channel, operation, 0, start, clock(), request,
+                       response_of(result))
+                return result
+        return recorded
+
+    def __channel(self, name):
+        """
+        Internal method for adding a channel to the recording
+        """
+        with self.__lock:
+            if self.__channels > 0xFF:
+                raise ValueError("a recording can have up to 256 channels")
+            channel = self.__channels
+            self.__channels += 1
+        now = time.perf_counter()
+        self._record(channel, CHANNEL, 0, now, now, name.encode("utf-8"))
+        return channel
+
+    def smbus(self, bus, smbus=None):
+        """
+        Get an SMBus compatible object that records each transaction.
+        The function can be passed to abelectronics.i2cbus.set_smbus_factory
+        to record every board that opens a bus by number.
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param smbus: SMBus object to record, defaults to opening the bus
+                      with smbus2 or python-smbus.  The object is closed
+                      when the recording object is closed if it was opened
+                      by the recorder
+        :type smbus: SMBus, optional
+        :return: recording SMBus object
+        :rtype: object
+        """
+        owner = smbus is None
+        if owner:
+            from .i2cbus import _open_smbus
+            smbus = _open_smbus(bus)
+        channel = self.__channel("i2c-%d" % bus)
+        return _RecordingSMBus(self, channel, bus, smbus, owner)
+
+    def spidev(self, bus, cs, spi=None):
+        """
+        Get a SpiDev compatible object that records each transfer
+
+        :param bus: SPI bus number
+        :type bus: int
+        :param cs: chip select
+        :type cs: int
+        :param spi: open SpiDev object to record, defaults to opening the
+                    device with spidev
+        :type spi: SpiDev, optional
+        :return: recording SpiDev object
+        :rtype: object
+        :raises ImportError: spidev not found
+        """
+        if spi is None:
+            try:
+                import spidev
+            except ImportError:
+                raise ImportError("spidev not found.")
+            spi = spidev.SpiDev()
+            spi.open(bus, cs)
+        channel = self.__channel("spidev%d.%d" % (bus, cs))
+        return _RecordingSpiDev(self, channel, spi)
+
+    def flush(self):
+        """
+        Write the buffered records to the file
+        """
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.flush()
+
+    def close(self):
+        """
+        Close the recording.  Transactions after the recording is closed
+        are not recorded.
+        """
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+def read_transactions(path):
+    """
+    Read the transactions in a recording
+
+    :param path: recording file
+    :type path: str
+    :return: a Transaction for each record apart from the channel records,
+             with the channel name and operation name
+    :rtype: generator
+    :raises ValueError: the file is not a recording
+    """
+    with open(path, "rb") as recording:
+        data = recording.read()
+    if len(data) < _HEADER.size:
+        raise ValueError("%s is not a bus recording" % path)
+    magic, version, _, _ = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("%s is not a bus recording" % path)
+
+    channels = {}
+    offset = _HEADER.size
+    elapsed = 0
+    while offset + _RECORD.size <= len(data):
+        operation, channel, address, delta, duration, request_length, \
+            response_length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        request = data[offset:offset + request_length]
+        offset += request_length
+        response = data[offset:offset + response_length]
+        offset += response_length
+        if len(response) != response_length:
+            break  # the recording was not closed
+        elapsed += delta
+
+        if operation == CHANNEL:
+            channels[channel] = request.decode("utf-8")
+            continue
+        error = None
+        if operation & ERROR:
+            operation &= ~ERROR
+            error = _ERRNO.unpack(response)[0]
+            response = b""
+        yield Transaction(elapsed / 1e6, channels.get(channel, str(channel)),
+                          OPERATION_NAMES.get(operation, str(operation)),
+                          address, duration / 1e6, request, response, error)
+
+
+class _ReplayChannel(object):
+    """
+    Base class for the objects that return the recorded responses for one
+    channel
+    """
+
+    def __init__(self, name, transactions, timing):
+        self.name = name
+        self.transactions = transactions
+        self.timing = timing
+
+    def _next(self, operation, address, request):
+        """
+        Internal method for getting the response of the next transaction
+
+        :raises ReplayError: the transaction does not match the recording
+        :raises IOError: the transaction raised an error when recorded
+        """
+        try:
+            transaction = self.transactions.popleft()
+        except IndexError:
+            raise ReplayError("%s: end of the recording" % self.name)
+        if transaction.operation != operation or \
+                transaction.address != address or \
+                transaction.request != request:
+            raise ReplayError(
+                "%s: %s(0x%02x, %s) does not match the recorded "
+                "%s(0x%02x, %s) at %.6f seconds" %
+                (self.name, operation, address, request.hex(),
+                 transaction.operation, transaction.address,
+                 transaction.request.hex(), transaction.time))
+        if self.timing:
+            time.sleep(transaction.duration)
+        if transaction.error is not None:
+            raise IOError(transaction.error, os.strerror(transaction.error))
+        return transaction.response
+
+    def close(self):
+        pass
+
+
+class _ReplaySMBus(_ReplayChannel):
+    """
+    SMBus compatible object that returns the recorded responses, see
+    Replay.smbus
+    """
+
+    def __init__(self, bus, transactions, timing):
+        _ReplayChannel.__init__(self, "i2c-%d" % bus, transactions, timing)
+        self.bus = bus
+        for _, name, request_of, _, result_of in _SMBUS_OPERATIONS:
+            setattr(self, name, self.__method(name, request_of, result_of))
+
+    def __method(self, name, request_of, result_of):
+        """
+        Internal method for creating an SMBus method
+        """
+        replay = self._next
+
+        def replayed(i2c_addr, *args, **kwargs):
+            return result_of(replay(name, i2c_addr, request_of(args)))
+        return replayed
+
+    def i2c_rdwr(self, *i2c_msgs):
+        response = self._next("i2c_rdwr", _rdwr_address(i2c_msgs),
+                              _rdwr_request(i2c_msgs))
+        offset = 0
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                for i in range(msg.len):
+                    msg.buf[i] = response[offset:offset + 1]
+                    offset += 1
+
+
+class _ReplaySpiDev(_ReplayChannel):
+    """
+    SpiDev compatible object that returns the recorded responses, see
+    Replay.spidev
+    """
+
+    def __init__(self, bus, cs, transactions, timing):
+        _ReplayChannel.__init__(self, "spidev%d.%d" % (bus, cs),
+                                transactions, timing)
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bits_per_word = 8
+        for _, name, request_of, _, result_of in _SPI_OPERATIONS:
+            setattr(self, name, self.__method(name, request_of, result_of))
+
+    def __method(self, name, request_of, result_of):
+        """
+        Internal method for creating a SpiDev method
+        """
+        replay = self._next
+
+        def replayed(*args, **kwargs):
+            return result_of(replay(name, 0, request_of(args)))
+        return replayed
+
+    def open(self, bus, device):
+        pass
+
+
+class Replay(object):
+    """
+    Returns the recorded responses to the board objects
+    """
+
+    def __init__(self, path, timing=False):
+        """
+        :param path: recording file
+        :type path: str
+        :param timing: True = wait for the recorded transaction time on each
+                       call, defaults to False
+        :type timing: bool, optional
+        :raises ValueError: the file is not a recording
+        """
+        self.path = path
+        self.timing = timing
+        self.__channels = {}
+        for transaction in read_transactions(path):
+            self.__channels.setdefault(
+                transaction.channel, collections.deque()).append(transaction)
+
+    def __transactions(self, name):
+        """
+        Internal method for getting the transactions of a channel
+        """
+        if name not in self.__channels:
+            raise ValueError("%s is not in the recording" % name)
+        return self.__channels[name]
+
+    def smbus(self, bus):
+        """
+        Get an SMBus compatible object that returns the recorded responses
+        for an I2C bus.  The function can be passed to
+        abelectronics.i2cbus.set_smbus_factory.
+
+        :param bus: I2C bus number
+        :type bus: int
+        :return: replay SMBus object
+        :rtype: object
+        :raises ValueError: the bus is not in the recording
+        """
+        return _ReplaySMBus(bus, self.__transactions("i2c-%d" % bus),
+                            self.timing)
+
+    def spidev(self, bus, cs):
+        """
+        Get a SpiDev compatible object that returns the recorded responses
+        for an SPI chip select
+
+        :param bus: SPI bus number
+        :type bus: int
+        :param cs: chip select
+        :type cs: int
+        :return: replay SpiDev object
+        :rtype: object
+        :raises ValueError: the chip select is not in the recording
+        """
+        return _ReplaySpiDev(bus, cs,
+                             self.__transactions("spidev%d.%d" % (bus, cs)),
+                             self.timing)
+
+    def remaining(self):
+        """
+        Get the number of recorded transactions that have not been replayed
+
+        :return: transactions
+        :rtype: int
+        """
+        return sum(len(transactions)
+                   for transactions in self.__channels.values())
+
+
+def main():
+    """
+    Print the transactions in a recording
+    """
+    parser = argparse.ArgumentParser(
+        description="Print an AB Electronics UK bus recording")
+    parser.add_argument("path", help="recording file")
+    parser.add_argument("-s", "--slowest", type=int, metavar="COUNT",
+                        help="only print the slowest transactions")
+    args = parser.parse_args()
+
+    transactions = read_transactions(args.path)
+    if args.slowest:
+        transactions = sorted(transactions, key=lambda t: t.duration,
+                              reverse=True)[:args.slowest]
+    for transaction in transactions:
+        if transaction.error is not None:
+            result = os.strerror(transaction.error)
+        else:
+            result = transaction.response.hex()
+        print("%12.6f %-11s %-20s 0x%02x %9.1f us %-16s %s" %
+              (transaction.time, transaction.channel, transaction.operation,
+               transaction.address, transaction.duration * 1e6,
+               transaction.request.hex(), result))
+
+
+if __name__ == "__main__":
+    main()
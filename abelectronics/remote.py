@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Device Daemon Clients
+
+Board classes that send each method call to abelectronics.daemon.
+================================================
+
+The IOPi, ADCPi, PWM and Servo classes have the same methods as the board
+classes in the IOPi, ADCPi and ServoPi packages, but each call is run by
+the daemon on the board with the name given when the object is created.
+Several processes can use the same board at the same time.  Arguments are
+passed by position.
+
+Example:
+
+    from abelectronics.remote import ADCPi, IOPi
+
+    adc = ADCPi("adc")
+    iobus = IOPi("io")
+    iobus.set_port_direction(0, 0x00)
+    iobus.write_port(0, 0xFF)
+    print(adc.read_voltage(1))
+"""
+import itertools
+import socket
+import threading
+
+from . import daemon
+
+# exceptions raised by the board methods that are raised again by the
+# client, other exceptions are raised as IOError
+_EXCEPTIONS = {
+    "ValueError": ValueError,
+    "TypeError": TypeError,
+    "OSError": IOError,
+    "TimeoutError": TimeoutError,
+}
+
+
+class Connection(object):
+    """
+    Connection to the daemon.  A connection can be shared by several board
+    objects and threads; each call waits for its response.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: socket path, defaults to daemon.get_socket_path()
+        :type path: str, optional
+        :raises IOError: Could not connect to the daemon
+        """
+        self.path = daemon.get_socket_path(path)
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.__socket.connect(self.path)
+        except OSError as err:
+            self.__socket.close()
+            raise IOError("Could not connect to the daemon at %s: %s" %
+                          (self.path, err))
+        self.__lock = threading.Lock()
+        self.__ids = itertools.count(1)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def call(self, board_id, method, args=()):
+        """
+        Run a method on the daemon
+
+        :param board_id: board id from lookup
+        :type board_id: int
+        :param method: method number
+        :type method: int
+        :param args: method arguments
+        :type args: tuple, optional
+        :return: method return value
+        :raises IOError: connection closed or the method raised an
+                         exception that is not a ValueError or TypeError
+        """
+        request_id = next(self.__ids) & 0xFFFFFFFF
+        body = bytearray(daemon._REQUEST.pack(request_id, board_id, method))
+        for arg in args:
+            daemon.encode(arg, body)
+
+        with self.__lock:
+            if self.closed:
+                raise IOError("Connection to the daemon is closed")
+            daemon.send_message(self.__socket, body)
+            response = daemon.receive_message(self.__socket)
+        if response is None:
+            raise IOError("Connection to the daemon was closed")
+
+        response_id, status = daemon._RESPONSE.unpack_from(response)
+        if response_id != request_id:
+            raise IOError("Unexpected response from the daemon")
+        value, _ = daemon.decode(response, daemon._RESPONSE.size)
+        if status != daemon.OK:
+            name, message = value
+            raise _EXCEPTIONS.get(name, IOError)(message)
+        return value
+
+    def lookup(self, name):
+        """
+        Find a board on the daemon
+
+        :param name: board name
+        :type name: str
+        :return: board id and board type
+        :rtype: tuple
+        :raises ValueError: board not found
+        """
+        board_id, board_type = self.call(daemon.DAEMON_BOARD, daemon.LOOKUP,
+                                          (name,))
+        return board_id, board_type
+
+    def boards(self):
+        """
+        Get the boards served by the daemon
+
+        :return: name and type of each board
+        :rtype: list
+        """
+        return [tuple(board) for board in
+                self.call(daemon.DAEMON_BOARD, daemon.LIST)]
+
+    def close(self):
+        """
+        Close the connection
+        """
+        with self.__lock:
+            if not self.closed:
+                self.closed = True
+                self.__socket.close()
+
+
+class RemoteBoard(object):
+    """
+    Base class for boards used through the daemon
+    """
+
+    BOARD_TYPE = None
+
+    def __init__(self, name, connection=None, path=None):
+        """
+        :param name: board name configured on the daemon
+        :type name: str
+        :param connection: connection to share with other boards, defaults
+                           to a new connection that is closed by close()
+        :type connection: Connection, optional
+        :param path: socket path for a new connection
+        :type path: str, optional
+        :raises ValueError: board not found or is a different type
+        :raises IOError: Could not connect to the daemon
+        """
+        self.__owner = connection is None
+        self.__connection = connection or Connection(path)
+        try:
+            board_id, board_type = self.__connection.lookup(name)
+            if board_type != self.BOARD_TYPE:
+                raise ValueError("board %s is a %s not a %s" %
+                                 (name, board_type, self.BOARD_TYPE))
+        except Exception:
+            if self.__owner:
+                self.__connection.close()
+            raise
+        self.name = name
+        self.board_id = board_id
+        for method, method_name in enumerate(daemon.METHODS[board_type]):
+            setattr(self, method_name, self.__method(method))
+
+    def __method(self, method):
+        """
+        Internal method for creating the function for a board method
+        """
+        call = self.__connection.call
+        board_id = self.board_id
+
+        def remote(*args):
+            return call(board_id, method, args)
+        return remote
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection to the daemon if this object opened it.  The
+        board stays open on the daemon.
+        """
+        if self.__owner:
+            self.__connection.close()
+
+
+class IOPi(RemoteBoard):
+    """
+    IO Pi served by the daemon, see IOPi.IOPi for the methods
+    """
+    BOARD_TYPE = "IOPi"
+
+
+class ADCPi(RemoteBoard):
+    """
+    ADC Pi served by the daemon, see ADCPi.ADCPi for the methods
+    """
+    BOARD_TYPE = "ADCPi"
+
+
+class PWM(RemoteBoard):
+    """
+    Servo Pi PWM served by the daemon, see ServoPi.PWM for the methods
+    """
+    BOARD_TYPE = "PWM"
+
+
+class Servo(RemoteBoard):
+    """
+    Servo Pi Servo served by the daemon, see ServoPi.Servo for the methods
+    """
+    BOARD_TYPE = "Servo"
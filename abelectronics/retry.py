@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Bus Retries
+
+Retry policy with exponential backoff and per-device retry budgets for
+transient I2C errors.
+================================================
+
+Retries are enabled with abelectronics.i2cbus.set_retry_policy.  While no
+policy is set the SMBus methods are bound directly on the shared bus
+handle, so the library runs at the same speed as it does without the retry
+code.
+
+A transaction that fails with a transient error, such as a NACK (EREMOTEIO)
+or a timeout, is sent again after a short backoff.  The bus lock is only
+held for each attempt, so other devices on the bus carry on while a device
+is backing off.  Board objects keep their own device lock during the
+retries, so a read-modify-write on one device cannot be interleaved with
+another thread using the same device.
+
+Each device has a budget of retries that refills at a steady rate.  When a
+device uses its budget, because it is disconnected or has failed, its
+errors are raised straight away instead of taking bus time from the other
+devices.
+
+write_quick is used to probe for devices, where a NACK is the answer
+rather than an error, so it is never retried.
+
+Example:
+
+    from abelectronics import i2cbus
+    from abelectronics.retry import RetryPolicy
+    from ServoPi import PWM
+
+    i2cbus.set_locking(True)
+    i2cbus.set_retry_policy(RetryPolicy(retries=3, backoff=0.0005))
+    pwm = PWM(0x40)
+    pwm.set_pwm(1, 0, 2000)  # retried up to 3 times on a transient error
+"""
+import errno
+import random
+import threading
+import time
+
+# errors that can be caused by noise or a busy device and are worth
+# sending again
+RETRY_ERRORS = (errno.EREMOTEIO, errno.EIO, errno.ETIMEDOUT, errno.EAGAIN,
+                errno.EBUSY)
+
+# SMBus methods that are not retried
+NO_RETRY_METHODS = ("write_quick",)
+
+
+class RetryPolicy(object):
+    """
+    Retries transient SMBus errors with exponential backoff, limited by a
+    retry budget for each device.
+    """
+
+    def __init__(self, retries=3, backoff=0.0005, max_backoff=0.02,
+                 budget=20, period=1.0, budgets=None, errors=RETRY_ERRORS):
+        """
+        :param retries: maximum number of retries for each transaction,
+                        defaults to 3
+        :type retries: int, optional
+        :param backoff: delay in seconds before the first retry, doubled for
+                        each later retry, defaults to 0.0005
+        :type backoff: float, optional
+        :param max_backoff: longest delay in seconds, defaults to 0.02
+        :type max_backoff: float, optional
+        :param budget: retries each device can use in each period,
+                       defaults to 20
+        :type budget: int, optional
+        :param period: time in seconds for the budget to refill,
+                       defaults to 1.0
+        :type period: float, optional
+        :param budgets: budget for selected devices keyed by I2C address
+        :type budgets: dict, optional
+        :param errors: errno values that are retried,
+                       defaults to RETRY_ERRORS
+        :type errors: tuple, optional
+        """
+        if retries < 0:
+            raise ValueError("retries must be 0 or more")
+        if period <= 0:
+            raise ValueError("period must be more than 0")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.period = period
+        self.budgets = dict(budgets or {})
+        self.errors = frozenset(errors)
+        self.__tokens = {}
+        self.__stats = {}
+        self.__lock = threading.Lock()
+
+    def __take(self, bus, address):
+        """
+        Internal method for taking one retry from the budget of a device
+
+        :return: True if the device has a retry left
+        :rtype: bool
+        """
+        budget = self.budgets.get(address, self.budget)
+        now = time.monotonic()
+        key = (bus, address)
+        with self.__lock:
+            tokens, updated = self.__tokens.get(key, (budget, now))
+            tokens = min(budget, tokens + (now - updated) * budget /
+                         self.period)
+            if tokens < 1:
+                self.__tokens[key] = (tokens, now)
+                self.__count(key, "budget_exceeded")
+                return False
+            self.__tokens[key] = (tokens - 1, now)
+            self.__count(key, "retries")
+            return True
+
+    def __count(self, key, name):
+        """
+        Internal method for incrementing a counter, called with the lock held
+        """
+        stats = self.__stats.get(key)
+        if stats is None:
+            stats = self.__stats[key] = {"retries": 0, "recovered": 0,
+                                         "failed": 0, "budget_exceeded": 0}
+        stats[name] += 1
+
+    def delay(self, attempt):
+        """
+        Get the backoff before a retry.  The delay doubles for each retry,
+        up to max_backoff, with up to half of it removed at random so
+        devices that failed together do not retry together.
+
+        :param attempt: retry number, 1 for the first retry
+        :type attempt: int
+        :return: delay in seconds
+        :rtype: float
+        """
+        delay = min(self.max_backoff, self.backoff * (1 << (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, bus, address, function, *args, **kwargs):
+        """
+        Call a function that sends a transaction to a device, retrying
+        transient errors.  Do not hold the bus lock while calling this
+        method or it will be held during the backoff.
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param address: I2C address
+        :type address: int
+        :param function: function to call
+        :type function: callable
+        :return: result of the function
+        :raises IOError: the transaction failed after the retries or with
+                         an error that is not retried
+        """
+        attempt = 0
+        while True:
+            try:
+                result = function(*args, **kwargs)
+            except (IOError, OSError) as err:
+                if err.errno not in self.errors:
+                    raise
+                if attempt >= self.retries or not self.__take(bus, address):
+                    if attempt:
+                        with self.__lock:
+                            self.__count((bus, address), "failed")
+                    raise
+                attempt += 1
+                time.sleep(self.delay(attempt))
+                continue
+            if attempt:
+                with self.__lock:
+                    self.__count((bus, address), "recovered")
+            return result
+
+    def wrap(self, bus, name, method):
+        """
+        Wrap an SMBus method so transient errors are retried
+
+        :param bus: I2C bus number
+        :type bus: int
+        :param name: SMBus method name
+        :type name: str
+        :param method: SMBus method, holding the bus lock for one attempt
+                       when locking is enabled
+        :type method: callable
+        :return: wrapped method
+        :rtype: callable
+        """
+        if name in NO_RETRY_METHODS:
+            return method
+        call = self.call
+
+        def retried(address, *args, **kwargs):
+            return call(bus, address, method, address, *args, **kwargs)
+        return retried
+
+    def snapshot(self):
+        """
+        Get a copy of the counters.  The result is a dictionary keyed by
+        bus number then device address with the number of retries, the
+        transactions that passed after a retry, the transactions that
+        failed after retrying and the errors that were not retried because
+        the device had used its budget.
+
+        :return: counters keyed by bus number and device address
+        :rtype: dict
+        """
+        with self.__lock:
+            snapshot = {}
+            for (bus, address), stats in self.__stats.items():
+                snapshot.setdefault(bus, {})[address] = dict(stats)
+            return snapshot
+
+    def reset(self):
+        """
+        Reset the counters and refill every budget
+        """
+        with self.__lock:
+            self.__stats.clear()
+            self.__tokens.clear()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Rig Configuration
+
+Builds and configures every board in a rig from a JSON or TOML file.
+================================================
+
+The configuration file lists the boards with their addresses, buses,
+I2C Switch channels and initial settings.  load() creates the board
+objects in one pass.  The boards on each bus share one bus handle, and
+each board reads its registers and only writes the settings that differ,
+so restarting a service on a configured rig sends few writes.
+
+Boards behind an I2C Switch are created after the switch, with the switch
+channel selected first.  Call Rig.select(name) to select the switch
+channels for a board before using it.
+
+Example file, rig.json:
+
+    {
+        "bus": 1,
+        "boards": [
+            {"name": "adc", "type": "ADCPi", "address": ["0x68", "0x69"],
+             "bit_rate": 16, "pga": 2},
+            {"name": "io", "type": "IOPi", "address": "0x20",
+             "direction": "0x00FF", "pullups": "0x00FF", "output": 0},
+            {"name": "servo", "type": "Servo", "address": "0x40",
+             "low_limit": 1.0, "high_limit": 2.0, "frequency": 50,
+             "reset": false, "limits": {"16": [0.8, 2.2]}},
+            {"name": "rtc", "type": "RTC", "output": true, "frequency": 1},
+            {"name": "switch", "type": "I2CSwitch", "address": "0x70"},
+            {"name": "io2", "type": "IOPi", "address": "0x20",
+             "switch": "switch", "channel": 2}
+        ]
+    }
+
+The same file in TOML uses a [[boards]] table for each board.  TOML files
+need Python 3.11 or the tomli package.
+
+Example:
+
+    from abelectronics import rig
+
+    boards = rig.load("rig.json")
+    print(boards.report())
+    boards["io"].write_pin(9, 1)
+    boards.select("io2").write_pin(1, 1)
+
+or from the command line:
+
+    python3 -m abelectronics.rig rig.json
+"""
+import argparse
+import collections
+import importlib
+import json
+import time
+
+from . import i2cbus
+
+try:
+    import tomllib as _toml
+except ImportError:
+    try:
+        import tomli as _toml
+    except ImportError:
+        _toml = None
+
+# board type: module and class used to create the board
+BOARD_TYPES = {
+    "IOPi": ("IOPi", "IOPi"),
+    "IOZero32": ("IOZero32", "IOZero32"),
+    "ADCPi": ("ADCPi", "ADCPi"),
+    "ADCDifferentialPi": ("ADCDifferentialPi", "ADCDifferentialPi"),
+    "PWM": ("ServoPi", "PWM"),
+    "Servo": ("ServoPi", "Servo"),
+    "RTC": ("RTCPi", "RTC"),
+    "I2CSwitch": ("I2CSwitch", "I2CSwitch"),
+}
+
+# settings that each board type accepts in addition to name, type, bus,
+# address, switch and channel
+SETTINGS = {
+    "IOPi": ("initialise", "direction", "pullups", "invert", "output"),
+    "IOZero32": ("direction", "invert", "output"),
+    "ADCPi": ("bit_rate", "pga", "conversion_mode"),
+    "ADCDifferentialPi": ("bit_rate", "pga", "conversion_mode"),
+    "PWM": ("frequency", "calibration"),
+    "Servo": ("low_limit", "high_limit", "reset", "frequency",
+              "calibration", "limits", "offset"),
+    "RTC": ("output", "frequency"),
+    "I2CSwitch": (),
+}
+
+# DS1307 control register values for each RTCPi frequency setting
+_RTC_FREQUENCY = {1: 0x00, 2: 0x01, 3: 0x02, 4: 0x03}
+
+
+def _number(value, name):
+    """
+    Internal method for reading a number that can be written as a hex
+    string such as "0x20"
+    """
+    if isinstance(value, str):
+        try:
+            return int(value, 0)
+        except ValueError:
+            raise ValueError("%s must be a number: %r" % (name, value))
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("%s must be a number: %r" % (name, value))
+    return value
+
+
+def read_config(path):
+    """
+    Read a rig configuration file.  Files ending in .toml are read as
+    TOML, other files as JSON.
+
+    :param path: file path
+    :type path: str
+    :return: configuration
+    :rtype: dict
+    :raises ValueError: TOML is not available
+    """
+    if path.endswith(".toml"):
+        if _toml is None:
+            raise ValueError("TOML files need Python 3.11 or the tomli "
+                             "package")
+        with open(path, "rb") as config_file:
+            return _toml.load(config_file)
+    with open(path) as config_file:
+        return json.load(config_file)
+
+
+def _create_iopi(board_class, smbus, address, settings):
+    """
+    Internal method for creating an IO Pi and writing the registers that
+    differ from the settings, in one read and paired writes
+    """
+    board = board_class(address, initialise=False, bus=smbus,
+                        warm_start=True)
+    values = {}
+    if settings.get("initialise", True):
+        values = {"direction": 0xFFFF, "pullups": 0x0000, "invert": 0x0000}
+    for name in ("direction", "pullups", "invert", "output"):
+        if name in settings:
+            values[name] = _number(settings[name], name)
+    registers = {}
+    for name, register in (("direction", board_class.IODIRA),
+                           ("invert", board_class.IPOLA),
+                           ("pullups", board_class.GPPUA),
+                           ("output", board_class.OLATA)):
+        if name in values:
+            registers[register] = values[name] & 0xFF
+            registers[register + 1] = (values[name] >> 8) & 0xFF
+    if registers:
+        board.set_registers(registers)
+    return board
+
+
+def _create_iozero32(board_class, smbus, address, settings):
+    """
+    Internal method for creating an IO Zero 32 and writing the settings
+    that differ from the device
+    """
+    board = board_class(address, bus=smbus)
+    if "invert" in settings:
+        value = _number(settings["invert"], "invert")
+        if board.get_bus_polarity() != value:
+            board.set_bus_polarity(value)
+    if "output" in settings:
+        board.write_bus(_number(settings["output"], "output"))
+    if "direction" in settings:
+        value = _number(settings["direction"], "direction")
+        if board.get_bus_direction() != value:
+            board.set_bus_direction(value)
+    return board
+
+
+def _create_adc(board_class, smbus, address, settings):
+    """
+    Internal method for creating an ADC Pi or ADC Differential Pi.  The
+    settings are stored in the object and sent with the next conversion.
+    """
+    if isinstance(address, (list, tuple)):
+        addresses = [_number(value, "address") for value in address]
+    else:
+        addresses = [address, address + 1]
+    if len(addresses) != 2:
+        raise ValueError("ADC boards need two addresses")
+    board = board_class(addresses[0], addresses[1],
+                        _number(settings.get("bit_rate", 18), "bit_rate"),
+                        bus=smbus)
+    if "pga" in settings:
+        board.set_pga(_number(settings["pga"], "pga"))
+    if "conversion_mode" in settings:
+        board.set_conversion_mode(_number(settings["conversion_mode"],
+                                          "conversion_mode"))
+    return board
+
+
+def _create_pwm(board_class, smbus, address, settings):
+    """
+    Internal method for creating a Servo PWM Pi.  The frequency is only
+    written when the prescaler differs.
+    """
+    board = board_class(address, bus=smbus, warm_start=True)
+    if "frequency" in settings:
+        board.set_pwm_freq(_number(settings["frequency"], "frequency"),
+                           _number(settings.get("calibration", 0),
+                                   "calibration"))
+    return board
+
+
+def _create_servo(board_class, smbus, address, settings):
+    """
+    Internal method for creating a Servo object with its limits
+    """
+    board = board_class(address,
+                        _number(settings.get("low_limit", 1.0), "low_limit"),
+                        _number(settings.get("high_limit", 2.0),
+                                "high_limit"),
+                        bool(settings.get("reset", True)), bus=smbus,
+                        frequency=_number(settings.get("frequency", 50),
+                                          "frequency"),
+                        warm_start=True)
+    for channel, (low, high) in settings.get("limits", {}).items():
+        board.set_low_limit(_number(low, "low_limit"), int(channel))
+        board.set_high_limit(_number(high, "high_limit"), int(channel))
+    if "frequency" in settings:
+        board.set_frequency(_number(settings["frequency"], "frequency"),
+                            _number(settings.get("calibration", 0),
+                                    "calibration"))
+    if "offset" in settings:
+        if settings["offset"]:
+            board.offset_enable()
+        else:
+            board.offset_disable()
+    return board
+
+
+def _create_rtc(board_class, smbus, address, settings):
+    """
+    Internal method for creating an RTC Pi and writing the control register
+    when it differs
+    """
+    configured = "output" in settings or "frequency" in settings
+    board = board_class(bus=smbus, initialise=not configured,
+                        warm_start=True)
+    if configured:
+        frequency = _number(settings.get("frequency", 4), "frequency")
+        if frequency not in _RTC_FREQUENCY:
+            raise ValueError("RTC frequency must be 1 to 4")
+        control = _RTC_FREQUENCY[frequency]
+        if settings.get("output", False):
+            control |= 0x90  # OUT and SQWE
+        board.set_registers({board_class.CONTROL: control})
+    return board
+
+
+def _create_switch(board_class, smbus, address, settings):
+    """
+    Internal method for creating an I2C Switch
+    """
+    return board_class(address, bus=smbus)
+
+
+_CREATE = {
+    "IOPi": _create_iopi,
+    "IOZero32": _create_iozero32,
+    "ADCPi": _create_adc,
+    "ADCDifferentialPi": _create_adc,
+    "PWM": _create_pwm,
+    "Servo": _create_servo,
+    "RTC": _create_rtc,
+    "I2CSwitch": _create_switch,
+}
+
+# default address for each board type
+_ADDRESSES = {
+    "IOPi": 0x20,
+    "IOZero32": 0x20,
+    "ADCPi": (0x68, 0x69),
+    "ADCDifferentialPi": (0x68, 0x69),
+    "PWM": 0x40,
+    "Servo": 0x40,
+    "RTC": 0x68,
+    "I2CSwitch": 0x70,
+}
+
+
+class Rig(object):
+    """
+    The board objects described by a rig configuration
+    """
+
+    def __init__(self, config):
+        """
+        Create and configure every board in the configuration
+
+        :param config: configuration from read_config or a dictionary in
+                       the same format
+        :type config: dict
+        :raises ValueError: invalid configuration
+        """
+        self.boards = collections.OrderedDict()
+        self.timings = collections.OrderedDict()
+        self.bring_up_time = 0.0
+        self.__configs = collections.OrderedDict()
+        self.__handles = {}
+        self.__selected = {}
+
+        default_bus = config.get("bus")
+        for settings in config.get("boards", []):
+            name = settings.get("name")
+            board_type = settings.get("type")
+            if not name:
+                raise ValueError("every board needs a name")
+            if name in self.__configs:
+                raise ValueError("duplicate board name %s" % name)
+            if board_type not in BOARD_TYPES:
+                raise ValueError("unknown board type %r for %s, use one of "
+                                 "%s" % (board_type, name,
+                                         ", ".join(sorted(BOARD_TYPES))))
+            unknown = set(settings) - set(SETTINGS[board_type]) - \
+                set(("name", "type", "bus", "address", "switch", "channel"))
+            if unknown:
+                raise ValueError("unknown settings for %s: %s" %
+                                 (name, ", ".join(sorted(unknown))))
+            settings = dict(settings)
+            settings.setdefault("bus", default_bus)
+            self.__configs[name] = settings
+
+        start = time.perf_counter()
+        try:
+            # boards on the bus first, then the boards behind each switch
+            for name in sorted(self.__configs,
+                               key=lambda name: (len(self.__path(name)),
+                                                 self.__path(name))):
+                board_start = time.perf_counter()
+                self.boards[name] = self.__create(name)
+                self.timings[name] = time.perf_counter() - board_start
+        except Exception:
+            self.close()
+            raise
+        self.bring_up_time = time.perf_counter() - start
+
+    def __getitem__(self, name):
+        return self.boards[name]
+
+    def __contains__(self, name):
+        return name in self.boards
+
+    def __iter__(self):
+        return iter(self.boards)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __path(self, name, seen=()):
+        """
+        Internal method for getting the switch name and channel for each
+        switch between the bus and a board
+        """
+        settings = self.__configs[name]
+        switch = settings.get("switch")
+        if switch is None:
+            return ()
+        if switch not in self.__configs or \
+                self.__configs[switch]["type"] != "I2CSwitch":
+            raise ValueError("%s: %r is not an I2CSwitch board" %
+                             (name, switch))
+        if switch in seen:
+            raise ValueError("%s: switch loop" % name)
+        channel = settings.get("channel")
+        if channel not in (1, 2, 3, 4):
+            raise ValueError("%s: switch channel must be 1 to 4" % name)
+        return self.__path(switch, seen + (name,)) + ((switch, channel),)
+
+    def __create(self, name):
+        """
+        Internal method for creating and configuring one board
+        """
+        settings = self.__configs[name]
+        board_type = settings["type"]
+        for switch, channel in self.__path(name):
+            self.__select(switch, channel)
+        bus = settings["bus"]
+        key = bus if isinstance(bus, int) or bus is None else id(bus)
+        smbus = self.__handles.get(key)
+        if smbus is None:
+            smbus = self.__handles[key] = i2cbus.get_smbus(bus)
+        address = settings.get("address", _ADDRESSES[board_type])
+        if _CREATE[board_type] is not _create_adc:
+            address = _number(address, "address")
+        module_name, class_name = BOARD_TYPES[board_type]
+        board_class = getattr(importlib.import_module(module_name),
+                              class_name)
+        return _CREATE[board_type](board_class, smbus, address, settings)
+
+    def __select(self, switch, channel):
+        """
+        Internal method for selecting a switch channel when it is not
+        already selected
+        """
+        if self.__selected.get(switch) != channel:
+            self.boards[switch].switch_channel(channel)
+            self.__selected[switch] = channel
+
+    def get_type(self, name):
+        """
+        Get the type of a board
+
+        :param name: board name
+        :type name: str
+        :return: board type from BOARD_TYPES
+        :rtype: str
+        """
+        return self.__configs[name]["type"]
+
+    def select(self, name):
+        """
+        Select the I2C Switch channels between the bus and a board
+
+        :param name: board name
+        :type name: str
+        :return: board object
+        :rtype: object
+        """
+        for switch, channel in self.__path(name):
+            self.__select(switch, channel)
+        return self.boards[name]
+
+    def report(self):
+        """
+        Get the time taken to create and configure each board
+
+        :return: report text
+        :rtype: str
+        """
+        lines = ["%-16s %-18s %10s" % ("board", "type", "time ms")]
+        for name, elapsed in self.timings.items():
+            lines.append("%-16s %-18s %10.3f" %
+                         (name, self.__configs[name]["type"],
+                          elapsed * 1e3))
+        lines.append("%-16s %-18s %10.3f" %
+                     ("total", "", self.bring_up_time * 1e3))
+        return "\n".join(lines)
+
+    def close(self):
+        """
+        Release the I2C buses used by the boards
+        """
+        for board in self.boards.values():
+            close = getattr(board, "close", None)
+            if close is not None:
+                close()
+        for smbus in self.__handles.values():
+            i2cbus.release_smbus(smbus)
+        self.boards.clear()
+        self.__handles.clear()
+
+
+def load(path):
+    """
+    Read a rig configuration file and create and configure the boards
+
+    :param path: JSON or TOML file path
+    :type path: str
+    :return: the boards
+    :rtype: Rig
+    :raises ValueError: invalid configuration
+    """
+    return Rig(read_config(path))
+
+
+def main():
+    """
+    Bring up the boards in a rig configuration file and show the time taken
+    """
+    parser = argparse.ArgumentParser(
+        description="Create and configure the boards in a rig file")
+    parser.add_argument("config", help="JSON or TOML rig file")
+    args = parser.parse_args()
+    with load(args.config) as boards:
+        print(boards.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Shared Sample Ring
+
+Shares timestamped ADC samples between processes through a ring buffer in
+shared memory.
+================================================
+
+One process runs a SampleProducer that reads the ADC channels and writes
+each set of readings to a ring buffer in multiprocessing.shared_memory.
+Any number of processes can open the ring with a SampleReader and read
+the latest samples without reading the ADC themselves, so a logger and a
+dashboard add no load to the I2C bus.
+
+The producer writes a sample and then increments the sequence number in
+the header of the ring, so readers never need a lock.  The sequence number
+is a 32-bit counter, which is loaded and stored in one access on 32-bit
+ARM as well as on 64-bit platforms, so a reader never sees half of an
+update.  It wraps to 0 after the largest multiple of the capacity below
+2**32, and readers compare sequence numbers modulo that period.  Readers
+that copy samples read the sequence number again after the copy and
+retry if the producer has overwritten them.  Every sample is
+written twice, at its slot and at the slot plus the capacity, so any run
+of up to capacity samples is contiguous in memory and SampleReader.latest
+can return NumPy views of the ring without copying.  A view shows the
+data in the ring, so samples in it are overwritten once the producer has
+written capacity more samples.  Use SampleReader.valid to check a view
+after using it, or SampleReader.copy_latest to get a consistent copy.
+
+The producer only needs the standard library.  The reader needs NumPy.
+
+Example:
+
+    # producer process
+    from abelectronics.samplering import SampleProducer
+    from ADCPi import ADCPi
+
+    producer = SampleProducer("adcpi", ADCPi(0x68, 0x69, 12))
+    producer.run()
+
+    # reader processes
+    from abelectronics.samplering import SampleReader
+
+    reader = SampleReader("adcpi")
+    timestamps, values = reader.latest(100)  # values[:, 0] is channel 1
+"""
+import array
+import threading
+import time
+from multiprocessing import shared_memory
+
+MAGIC = 0x41424553  # "ABES"
+VERSION = 2
+MAX_CHANNELS = 8
+
+# header: 16 int64 values, except the sequence number which is a uint32 in
+# the first 4 bytes of its slot
+_MAGIC = 0
+_VERSION = 1
+_CAPACITY = 2
+_CHANNEL_COUNT = 3
+_SEQUENCE = 4
+_FILLED = 5  # 1 once the sequence number has wrapped
+_CHANNELS = 8  # channel numbers, up to MAX_CHANNELS
+_HEADER_SIZE = 16 * 8
+_SEQUENCE_LIMIT = 1 << 32
+
+
+def _period(capacity):
+    """
+    Internal method for getting the value at which the sequence number
+    wraps to 0.  It is a multiple of the capacity so the slot of each
+    sample follows on across the wrap.
+
+    :param capacity: number of samples
+    :type capacity: int
+    :return: sequence period
+    :rtype: int
+    """
+    return capacity * (_SEQUENCE_LIMIT // capacity)
+
+
+def _size(capacity, channel_count):
+    """
+    Internal method for getting the size of a ring in bytes
+
+    :param capacity: number of samples
+    :type capacity: int
+    :param channel_count: channels in each sample
+    :type channel_count: int
+    :return: size in bytes
+    :rtype: int
+    """
+    # two copies of each timestamp and each set of readings
+    return _HEADER_SIZE + 2 * capacity * 8 * (1 + channel_count)
+
+
+def _attach(name):
+    """
+    Internal method for opening an existing shared memory block without
+    registering it with the resource tracker, which would remove the block
+    when the reading process exits
+
+    :param name: shared memory name
+    :type name: str
+    :return: shared memory
+    :rtype: multiprocessing.shared_memory.SharedMemory
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python 3.12 and earlier register every block that is opened
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+def _read_function(board):
+    """
+    Internal method for getting the function that reads a channel voltage
+
+    :param board: ADCPi, ADCDifferentialPi, ExpanderPi.ADC or ADCDACPi
+    :type board: object
+    :return: function called with the channel number
+    :rtype: callable
+    :raises TypeError: board does not have an ADC
+    """
+    if hasattr(board, "read_voltage"):
+        return board.read_voltage
+    if hasattr(board, "read_adc_voltage"):
+        read_adc_voltage = board.read_adc_voltage
+        return lambda channel: read_adc_voltage(channel, 0)
+    raise TypeError("board does not have read_voltage or read_adc_voltage")
+
+
+class SampleProducer(object):
+    """
+    Reads ADC channels and writes the samples to a shared memory ring.
+    """
+
+    def __init__(self, name, board, channels=None, capacity=4096):
+        """
+        :param name: shared memory name used by the readers
+        :type name: str
+        :param board: ADCPi, ADCDifferentialPi, ExpanderPi.ADC or ADCDACPi
+                      object, or a function called with a channel number
+                      that returns the voltage
+        :type board: object
+        :param channels: channel numbers to read, defaults to 1 to 8, or
+                         1 to 2 for an ADCDACPi
+        :type channels: list, optional
+        :param capacity: number of samples kept, defaults to 4096
+        :type capacity: int, optional
+        :raises ValueError: no channels, too many channels or capacity < 1
+        :raises FileExistsError: a ring with the same name exists
+        """
+        if callable(board):
+            self.__read = board
+        else:
+            self.__read = _read_function(board)
+        if channels is None:
+            channels = [1, 2] if type(board).__name__ == "ADCDACPi" \
+                else list(range(1, 9))
+        channels = list(channels)
+        if not 1 <= len(channels) <= MAX_CHANNELS:
+            raise ValueError("channels: 1 to %d channels" % MAX_CHANNELS)
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.name = name
+        self.channels = channels
+        self.capacity = capacity
+        self.__shm = shared_memory.SharedMemory(
+            name, create=True, size=_size(capacity, len(channels)))
+
+        buf = self.__shm.buf
+        self.__header = buf[:_HEADER_SIZE].cast("q")
+        self.__sequence = buf[_SEQUENCE * 8:_SEQUENCE * 8 + 4].cast("I")
+        self.__period = _period(capacity)
+        self.__timestamps = buf[_HEADER_SIZE:
+                                _HEADER_SIZE + 16 * capacity].cast("d")
+        self.__values = buf[_HEADER_SIZE + 16 * capacity:
+                            _size(capacity, len(channels))].cast("d")
+
+        header = self.__header
+        header[_VERSION] = VERSION
+        header[_CAPACITY] = capacity
+        header[_CHANNEL_COUNT] = len(channels)
+        header[_SEQUENCE] = 0
+        header[_FILLED] = 0
+        for i, channel in enumerate(channels):
+            header[_CHANNELS + i] = channel
+        header[_MAGIC] = MAGIC  # written last, the ring is ready
+
+        self.__thread = None
+        self.__stop = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def sequence(self):
+        """
+        :return: number of samples written, modulo the sequence period
+        :rtype: int
+        """
+        return self.__sequence[0]
+
+    def write(self, values, timestamp=None):
+        """
+        Write one sample to the ring
+
+        :param values: voltage for each channel
+        :type values: list
+        :param timestamp: sample time in seconds since the epoch, defaults
+                          to time.time()
+        :type timestamp: float, optional
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        sequence = self.__sequence[0]
+        capacity = self.capacity
+        slot = sequence % capacity
+        count = len(self.channels)
+        row = array.array("d", values)
+
+        for position in (slot, slot + capacity):
+            self.__timestamps[position] = timestamp
+            self.__values[position * count:(position + 1) * count] = row
+        sequence += 1
+        if sequence == self.__period:
+            sequence = 0
+            self.__header[_FILLED] = 1
+        # publish the sample after it has been written, with one 32-bit store
+        self.__sequence[0] = sequence
+
+    def sample(self):
+        """
+        Read every channel once and write the sample to the ring
+
+        :return: voltage for each channel
+        :rtype: list
+        """
+        timestamp = time.time()
+        read = self.__read
+        values = [read(channel) for channel in self.channels]
+        self.write(values, timestamp)
+        return values
+
+    def run(self, interval=0, count=None):
+        """
+        Write samples until stop() is called
+
+        :param interval: minimum time between samples in seconds, defaults
+                         to 0 = as fast as the ADC allows
+        :type interval: float, optional
+        :param count: number of samples to write, None = no limit
+        :type count: int, optional
+        """
+        stop = self.__stop
+        next_time = time.monotonic()
+        written = 0
+        while not stop.is_set() and (count is None or written < count):
+            self.sample()
+            written += 1
+            if interval > 0:
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                else:
+                    next_time = time.monotonic()
+
+    def start(self, interval=0):
+        """
+        Write samples on a background thread until stop() is called
+
+        :param interval: minimum time between samples in seconds
+        :type interval: float, optional
+        """
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.run, args=(interval,),
+            name="abelectronics-samples-" + self.name)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop writing samples
+        """
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def close(self):
+        """
+        Stop writing samples and remove the ring.  Readers that have the
+        ring open can read the samples until they close it.
+        """
+        self.stop()
+        if self.__shm is None:
+            return
+        self.__header[_MAGIC] = 0
+        for view in (self.__header, self.__sequence, self.__timestamps,
+                     self.__values):
+            view.release()
+        self.__shm.close()
+        self.__shm.unlink()
+        self.__shm = None
+
+
+class SampleReader(object):
+    """
+    Reads the samples in a shared memory ring written by a SampleProducer.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: shared memory name used by the producer
+        :type name: str
+        :raises FileNotFoundError: ring not found
+        :raises ValueError: shared memory is not a sample ring
+        :raises ImportError: numpy not found
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy not found")
+
+        self.name = name
+        self.__shm = _attach(name)
+        buf = self.__shm.buf
+        header = numpy.ndarray((16,), numpy.int64, buf)
+        if header[_MAGIC] != MAGIC or header[_VERSION] != VERSION:
+            del header
+            self.__shm.close()
+            raise ValueError("%s is not a sample ring" % name)
+
+        self.capacity = int(header[_CAPACITY])
+        count = int(header[_CHANNEL_COUNT])
+        self.channels = [int(c) for c in header[_CHANNELS:_CHANNELS + count]]
+        self.__header = header
+        self.__sequence = numpy.ndarray((1,), numpy.uint32, buf,
+                                        _SEQUENCE * 8)
+        self.__period = _period(self.capacity)
+        self.__timestamps = numpy.ndarray(
+            (2 * self.capacity,), numpy.float64, buf, _HEADER_SIZE)
+        self.__values = numpy.ndarray(
+            (2 * self.capacity, count), numpy.float64, buf,
+            _HEADER_SIZE + 16 * self.capacity)
+        self.__timestamps.flags.writeable = False
+        self.__values.flags.writeable = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def sequence(self):
+        """
+        :return: number of samples written by the producer, modulo the
+                 sequence period
+        :rtype: int
+        """
+        return int(self.__sequence[0])
+
+    def __written(self, sequence):
+        """
+        Internal method for getting the number of samples in the ring,
+        up to the capacity
+        """
+        if self.__header[_FILLED]:
+            return self.capacity
+        return min(sequence, self.capacity)
+
+    def __window(self, sequence, count):
+        """
+        Internal method for getting views of the samples before a sequence
+        number
+        """
+        end = (sequence - 1) % self.capacity + self.capacity + 1
+        return (self.__timestamps[end - count:end],
+                self.__values[end - count:end])
+
+    def latest(self, count=1):
+        """
+        Get the latest samples as read-only views of the ring.  The views
+        are not copied, so samples in them are overwritten once the
+        producer has written capacity more samples.
+
+        :param count: number of samples, up to the capacity
+        :type count: int, optional
+        :return: timestamps with shape (n,) and voltages with shape
+                 (n, channels), oldest first.  n is less than count when
+                 fewer samples have been written
+        :rtype: tuple
+        :raises ValueError: count out of range: 1 to capacity
+        """
+        if count < 1 or count > self.capacity:
+            raise ValueError("count out of range: 1 to %d" % self.capacity)
+        sequence = self.sequence
+        return self.__window(sequence, min(count, self.__written(sequence)))
+
+    def since(self, sequence):
+        """
+        Get the samples written after a sequence number, for consumers
+        such as loggers that need every sample
+
+        :param sequence: sequence number returned by the previous call,
+                         0 for the first call
+        :type sequence: int
+        :return: new sequence number, timestamps, voltages and the number
+                 of samples that were overwritten before they were read
+        :rtype: tuple
+        """
+        current = self.sequence
+        count = (current - sequence) % self.__period
+        missed = max(0, count - self.capacity)
+        count = min(count, self.capacity)
+        timestamps, values = self.__window(current, count) if count > 0 \
+            else (self.__timestamps[:0], self.__values[:0])
+        return current, timestamps, values, missed
+
+    def valid(self, sequence, count):
+        """
+        Check that samples have not been overwritten
+
+        :param sequence: value of the sequence property when the samples
+                         were read
+        :type sequence: int
+        :param count: number of samples read
+        :type count: int
+        :return: True if the samples are still in the ring
+        :rtype: bool
+        """
+        # the sample being written may overwrite the oldest slot
+        written = (self.sequence - sequence) % self.__period
+        return written + count < self.capacity
+
+    def copy_latest(self, count=1):
+        """
+        Get a copy of the latest samples that was not changed while it
+        was copied
+
+        :param count: number of samples, up to the capacity - 1.  The
+                      oldest slot may be being overwritten by the producer
+        :type count: int, optional
+        :return: timestamps and voltages
+        :rtype: tuple
+        :raises ValueError: count out of range: 1 to capacity - 1
+        """
+        if count < 1 or count >= self.capacity:
+            raise ValueError("count out of range: 1 to %d" %
+                             (self.capacity - 1))
+        while True:
+            sequence = self.sequence
+            available = min(count, self.__written(sequence))
+            timestamps, values = self.__window(sequence, available) \
+                if available else (self.__timestamps[:0], self.__values[:0])
+            timestamps = timestamps.copy()
+            values = values.copy()
+            if self.valid(sequence, available):
+                return timestamps, values
+
+    def close(self):
+        """
+        Close the ring.  Views returned by latest and since must be
+        deleted first.
+        """
+        if self.__shm is None:
+            return
+        del self.__header, self.__sequence, self.__timestamps, self.__values
+        self.__shm.close()
+        self.__shm = None
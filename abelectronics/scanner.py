@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK I2C Bus Scanner
+
+Finds the devices on an I2C bus and behind each I2C Switch channel,
+identifies the chip on each address and caches the result.
+================================================
+
+Each address is probed once with a quick write.  The chip type of each
+device that responds is found from the way its registers behave, using
+reads that do not change the outputs or configuration of the device:
+
+0x20 - 0x27   MCP23017 (IO Pi, Expander Pi) or PCA9535 (IO Zero 32)
+0x40 - 0x7F   PCA9685 (Servo PWM Pi)
+0x68 - 0x6F   MCP3424 (ADC Pi, ADC Differential Pi) or DS1307 (RTC Pi)
+0x70 - 0x77   PCA9546A (I2C Switch)
+
+Telling the MCP3424 from the DS1307 needs an I2C read that is longer than
+an SMBus block read, so it uses i2c_rdwr from smbus2.  With python-smbus
+0x68 is reported as an unknown device.  The MCP23017 and PCA9535 are told
+apart by the registers above 0x07, which the PCA9535 does not have, and in
+the rare case that the register values are the same on both chips the
+device is reported as an MCP23017.
+
+The I2C Switch channels are scanned one at a time with the other channels
+and switches disabled.  The switch control registers are restored when the
+scan is finished.  The bus lock is held for the whole scan.
+
+get_inventory saves the result to a JSON file and reads the file on later
+calls so a service can create its board objects without probing the bus.
+
+Example:
+
+    from abelectronics import scanner
+    from I2CSwitch import I2CSwitch
+
+    devices = scanner.get_inventory(1)
+    for device in devices:
+        print(scanner.format_device(device))
+    boards = scanner.create_boards(devices)
+    # the ADC Pi on channel 2 of the I2C Switch at 0x70
+    I2CSwitch(0x70).switch_channel(2)
+    adcs = scanner.create_boards(devices, path=((0x70, 2),))
+
+Scan from the command line:
+
+    python3 -m abelectronics.scanner -b 1
+"""
+import argparse
+import collections
+import importlib
+import json
+import os
+
+from . import i2cbus
+
+INVENTORY_VERSION = 1
+INVENTORY_ENVIRONMENT_VARIABLE = "ABE_I2C_INVENTORY"
+DEFAULT_INVENTORY_DIRECTORY = os.path.join("~", ".cache", "abelectronics")
+
+# addresses used by the AB Electronics UK I2C boards
+ADDRESSES = (tuple(range(0x20, 0x28)) + tuple(range(0x40, 0x48)) +
+             tuple(range(0x68, 0x78)))
+
+# addresses probed by i2cdetect
+ALL_ADDRESSES = tuple(range(0x03, 0x78))
+
+# board module and class for each chip
+BOARDS = {
+    "MCP23017": ("IOPi", "IOPi"),
+    "PCA9535": ("IOZero32", "IOZero32"),
+    "MCP3424": ("ADCPi", "ADCPi"),
+    "DS1307": ("RTCPi", "RTC"),
+    "PCA9685": ("ServoPi", "PWM"),
+    "PCA9546A": ("I2CSwitch", "I2CSwitch"),
+}
+
+# a device found by the scanner.  chip is None when the device could not
+# be identified.  path has the switch address and channel for each I2C
+# Switch between the bus and the device, empty for devices on the bus.
+Device = collections.namedtuple("Device", ["bus", "address", "chip", "path"])
+
+_RAW_READ_LENGTH = 64  # every DS1307 register, the pointer wraps at 0x3F
+
+
+def _is_pca9685(smbus, address):
+    """
+    Internal method for checking for a PCA9685.  The sub-address and
+    all-call registers hold 8-bit I2C addresses so bit 0 is always 0, and
+    the prescaler can not be below 3.
+    """
+    for register in (0x02, 0x03, 0x04, 0x05):
+        if smbus.read_byte_data(address, register) & 0x01:
+            return False
+    return smbus.read_byte_data(address, 0xFE) >= 3
+
+
+def _identify_switch(smbus, address):
+    """
+    Internal method for identifying a device at 0x70 to 0x77.  The PCA9546A
+    control register is written by the register reads used to look for a
+    PCA9685, so it is restored afterwards.
+    """
+    control = smbus.read_byte(address)
+    if _is_pca9685(smbus, address):
+        return "PCA9685"
+    smbus.write_byte(address, control)
+    if control & 0xF0 == 0:
+        return "PCA9546A"
+    return None
+
+
+def _identify_expander(smbus, address):
+    """
+    Internal method for identifying an MCP23017 or PCA9535.  The PCA9535
+    only uses the low 3 bits of the register address so registers 0x0A to
+    0x0F read the same values as 0x02 to 0x07.  On the MCP23017 0x0A and
+    0x0B are both IOCON, bit 0 of IOCON is always 0 and INTF can only have
+    bits set for pins with interrupts enabled in GPINTEN.  The input
+    registers are not read as reading them clears the interrupts.
+    """
+    values = {}
+    for register in (0x02, 0x03, 0x04, 0x05, 0x06, 0x07,
+                     0x0A, 0x0B, 0x0C, 0x0D, 0x0E, 0x0F):
+        values[register] = smbus.read_byte_data(address, register)
+    pca9535 = all(values[register] == values[register + 8]
+                  for register in range(0x02, 0x08))
+    mcp23017 = (values[0x0A] == values[0x0B] and
+                not values[0x0A] & 0x01 and
+                not values[0x0E] & ~values[0x04] and
+                not values[0x0F] & ~values[0x05])
+    if pca9535 and mcp23017:
+        # both are possible, the PCA9535 reads the input port at 0x08 and
+        # 0x00 while the MCP23017 has INTCONA and IODIRA
+        pca9535 = (smbus.read_byte_data(address, 0x00) ==
+                   smbus.read_byte_data(address, 0x08))
+    if pca9535:
+        return "PCA9535"
+    if mcp23017:
+        return "MCP23017"
+    return None
+
+
+def _identify_adc(smbus, address):
+    """
+    Internal method for identifying an MCP3424 or DS1307.  After the
+    conversion result the MCP3424 repeats its configuration byte for as
+    long as it is read, while a DS1307 returns each of its registers.  The
+    MCP3424 can not be read with register reads as the register byte would
+    change its configuration.
+    """
+    i2c_msg = i2cbus.get_i2c_msg()
+    rdwr = getattr(smbus, "i2c_rdwr", None)
+    if not i2c_msg or rdwr is None:
+        # the DS1307 is always at 0x68
+        return None if address == 0x68 else "MCP3424"
+    read = i2c_msg.read(address, _RAW_READ_LENGTH)
+    rdwr(read)
+    data = list(read)
+    if data[3:] == [data[-1]] * (len(data) - 3):
+        return "MCP3424"
+    if address == 0x68:
+        return "DS1307"
+    return None
+
+
+def identify(smbus, address):
+    """
+    Identify the chip at an address
+
+    :param smbus: SMBus object or shared bus handle
+    :type smbus: SMBus
+    :param address: I2C address of a device that responds
+    :type address: int
+    :return: chip name from BOARDS or None if the chip is not known
+    :rtype: str
+    :raises IOError: the device did not respond
+    """
+    if 0x70 <= address <= 0x77:
+        return _identify_switch(smbus, address)
+    if 0x20 <= address <= 0x27:
+        return _identify_expander(smbus, address)
+    if 0x68 <= address <= 0x6F:
+        return _identify_adc(smbus, address)
+    if 0x40 <= address <= 0x7F and _is_pca9685(smbus, address):
+        return "PCA9685"
+    return None
+
+
+def _probe(smbus, address):
+    """
+    Internal method for checking if a device responds to an address
+    """
+    try:
+        smbus.write_quick(address)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def _scan(smbus, bus, addresses, switches, path, skip):
+    """
+    Internal method for scanning the devices on the bus or a switch channel
+
+    :param skip: addresses that respond on the parent bus
+    :type skip: set
+    """
+    addresses = [address for address in addresses if address not in skip]
+    devices = []
+    controls = []
+
+    # find the switches first and disable them so the devices behind them
+    # do not respond while the bus is scanned
+    if switches:
+        for address in addresses:
+            if 0x70 <= address <= 0x77 and _probe(smbus, address):
+                chip = _identify_switch(smbus, address)
+                devices.append(Device(bus, address, chip, path))
+                if chip == "PCA9546A":
+                    controls.append((address, smbus.read_byte(address)))
+                    smbus.write_byte(address, 0x00)
+    found = set(device.address for device in devices)
+
+    try:
+        for address in addresses:
+            if address not in found and _probe(smbus, address):
+                devices.append(Device(bus, address,
+                                      identify(smbus, address), path))
+        devices.sort(key=lambda device: device.address)
+
+        skip = skip | set(device.address for device in devices)
+        for address, _ in controls:
+            for channel in range(1, 5):
+                smbus.write_byte(address, 1 << (channel - 1))
+                devices.extend(_scan(smbus, bus, addresses, switches,
+                                     path + ((address, channel),), skip))
+            smbus.write_byte(address, 0x00)
+    finally:
+        for address, control in controls:
+            smbus.write_byte(address, control)
+    return devices
+
+
+def scan(bus=None, addresses=ADDRESSES, switches=True):
+    """
+    Find and identify the devices on an I2C bus
+
+    :param bus: I2C bus number or an SMBus compatible object such as
+                simulator.FakeSMBus, None = detect the bus number
+    :type bus: int or SMBus, optional
+    :param addresses: addresses to probe, defaults to ADDRESSES
+    :type addresses: list, optional
+    :param switches: True = scan each channel of the I2C Switches found,
+                     defaults to True
+    :type switches: bool, optional
+    :return: devices found, sorted by switch channel and address
+    :rtype: list
+    :raises IOError: Could not open the I2C bus
+    """
+    smbus = i2cbus.get_smbus(bus)
+    try:
+        with smbus.lock:
+            return _scan(smbus, smbus.bus, sorted(addresses), switches, (),
+                         set())
+    finally:
+        i2cbus.release_smbus(smbus)
+
+
+def get_inventory_path(bus, path=None):
+    """
+    Get the path of the inventory file for a bus
+
+    :param bus: I2C bus number
+    :type bus: int
+    :param path: inventory file, None = use ABE_I2C_INVENTORY or
+                 ~/.cache/abelectronics/i2c-<bus>.json
+    :type path: str, optional
+    :return: inventory file path
+    :rtype: str
+    """
+    if path is not None:
+        return path
+    path = os.environ.get(INVENTORY_ENVIRONMENT_VARIABLE)
+    if path:
+        return path
+    return os.path.join(os.path.expanduser(DEFAULT_INVENTORY_DIRECTORY),
+                        "i2c-%s.json" % bus)
+
+
+def save_inventory(devices, path):
+    """
+    Save the devices found by scan to a JSON file
+
+    :param devices: devices from scan
+    :type devices: list
+    :param path: inventory file
+    :type path: str
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    data = {"version": INVENTORY_VERSION,
+            "devices": [{"bus": device.bus,
+                         "address": device.address,
+                         "chip": device.chip,
+                         "path": [list(step) for step in device.path]}
+                        for device in devices]}
+    temporary = path + ".tmp"
+    with open(temporary, "w") as inventory:
+        json.dump(data, inventory, indent=2)
+    os.replace(temporary, path)
+
+
+def load_inventory(path):
+    """
+    Read the devices saved by save_inventory
+
+    :param path: inventory file
+    :type path: str
+    :return: devices
+    :rtype: list
+    :raises ValueError: the file is not an inventory
+    """
+    with open(path) as inventory:
+        data = json.load(inventory)
+    if not isinstance(data, dict) or \
+            data.get("version") != INVENTORY_VERSION:
+        raise ValueError("%s is not an I2C inventory" % path)
+    return [Device(device["bus"], device["address"], device["chip"],
+                   tuple(tuple(step) for step in device["path"]))
+            for device in data["devices"]]
+
+
+def get_inventory(bus=None, path=None, refresh=False, addresses=ADDRESSES):
+    """
+    Get the devices on an I2C bus from the inventory file, scanning the
+    bus and saving the inventory if there is no file
+
+    :param bus: I2C bus number, None = detect the bus number
+    :type bus: int, optional
+    :param path: inventory file, see get_inventory_path
+    :type path: str, optional
+    :param refresh: True = scan the bus even if the file exists, defaults
+                    to False
+    :type refresh: bool, optional
+    :param addresses: addresses to probe, defaults to ADDRESSES
+    :type addresses: list, optional
+    :return: devices
+    :rtype: list
+    """
+    if bus is None:
+        bus = i2cbus.detect_bus()
+    path = get_inventory_path(bus, path)
+    if not refresh:
+        try:
+            devices = load_inventory(path)
+            if all(device.bus == bus for device in devices):
+                return devices
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass  # missing or damaged, scan again
+    devices = scan(bus, addresses)
+    save_inventory(devices, path)
+    return devices
+
+
+def create_boards(devices, bus=None, path=()):
+    """
+    Create a board object for each identified device on the bus or on one
+    I2C Switch channel.  The board objects write to their devices when
+    they are created, so select the switch channel before creating the
+    boards behind it.  The two MCP3424 chips on each ADC Pi are paired in
+    address order.
+
+    :param devices: devices from scan or get_inventory
+    :type devices: list
+    :param bus: I2C bus number or SMBus compatible object used by the
+                boards, defaults to the bus number of each device
+    :type bus: int or SMBus, optional
+    :param path: switch address and channel for each switch between the
+                 bus and the devices, defaults to the devices on the bus
+    :type path: tuple, optional
+    :return: device and board object pairs, the device for an ADC Pi is
+             the first MCP3424
+    :rtype: list
+    """
+    boards = []
+    adcs = collections.OrderedDict()
+    path = tuple(tuple(step) for step in path)
+    for device in devices:
+        if device.chip not in BOARDS or device.path != path:
+            continue
+        board_bus = device.bus if bus is None else bus
+        if device.chip == "MCP3424":
+            adcs.setdefault((device.bus, device.path), []).append(device)
+            continue
+        module_name, class_name = BOARDS[device.chip]
+        board_class = getattr(importlib.import_module(module_name),
+                              class_name)
+        if device.chip == "DS1307":
+            board = board_class(bus=board_bus)
+        else:
+            board = board_class(device.address, bus=board_bus)
+        boards.append((device, board))
+
+    if adcs:
+        module_name, class_name = BOARDS["MCP3424"]
+        board_class = getattr(importlib.import_module(module_name),
+                              class_name)
+        for chips in adcs.values():
+            chips.sort(key=lambda device: device.address)
+            for i in range(0, len(chips), 2):
+                pair = chips[i:i + 2]
+                board_bus = pair[0].bus if bus is None else bus
+                boards.append((pair[0], board_class(
+                    pair[0].address, pair[-1].address, bus=board_bus)))
+    return boards
+
+
+def format_device(device):
+    """
+    Get a line of text describing a device
+
+    :param device: device from scan or get_inventory
+    :type device: Device
+    :return: text
+    :rtype: str
+    """
+    board = BOARDS.get(device.chip)
+    where = " ".join("switch 0x%02x channel %d" % step
+                     for step in device.path) or "bus"
+    return "0x%02x  %-9s %-20s %s" % (
+        device.address, device.chip or "unknown",
+        ".".join(board) if board else "", where)
+
+
+def add_arguments(parser):
+    """
+    Add the scanner options to a command line parser
+
+    :param parser: parser or sub-command parser
+    :type parser: argparse.ArgumentParser
+    """
+    parser.add_argument("-b", "--bus", type=int,
+                        help="I2C bus number, defaults to the detected bus")
+    parser.add_argument("-a", "--all", action="store_true",
+                        help="probe every address from 0x03 to 0x77")
+    parser.add_argument("-c", "--cached", action="store_true",
+                        help="use the inventory file if there is one")
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="inventory file, see get_inventory_path")
+
+
+def run(args):
+    """
+    Scan a bus with the options from add_arguments and print the devices
+
+    :param args: parsed command line
+    :type args: argparse.Namespace
+    :return: exit status
+    :rtype: int
+    """
+    devices = get_inventory(args.bus, args.output, not args.cached,
+                            ALL_ADDRESSES if args.all else ADDRESSES)
+    for device in devices:
+        print(format_device(device))
+    return 0
+
+
+def main():
+    """
+    Scan a bus and print the devices
+    """
+    parser = argparse.ArgumentParser(
+        description="Find the AB Electronics UK boards on an I2C bus")
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Bus Scheduler
+
+Priority and deadline ordering for the transactions on a shared I2C bus.
+================================================
+
+Scheduling is enabled with abelectronics.i2cbus.set_scheduling.  The bus
+lock of each shared bus handle is then a BusScheduler instead of a
+threading.RLock.  When a transaction finishes and other threads are
+waiting for the bus, the bus goes to the waiting transaction with the most
+urgent priority, and between transactions with the same priority to the
+one with the earliest deadline.  Transactions with the same priority and
+no deadline get the bus in the order they asked for it.
+
+A transaction that has started is never interrupted, so a real-time
+transaction waits for at most the one transaction that is on the bus when
+it asks for it, plus any real-time transactions queued before it.  A
+background thread polling an ADC conversion with repeated reads gives the
+bus up between each read.
+
+The priority is set for the current thread, either for a block of code
+with priority() or for everything the thread does with
+set_thread_priority().  Lower numbers are more urgent.  A deadline given
+to priority() is measured from the start of the block, and transactions
+that get the bus after their deadline are counted as deadline misses.
+
+The locking must also be enabled with i2cbus.set_locking(True), as the
+scheduler orders the transactions that wait for the bus lock.
+
+Example:
+
+    import threading
+    import time
+    from abelectronics import i2cbus, scheduler
+    from ADCPi import ADCPi
+    from ServoPi import Servo
+
+    i2cbus.set_locking(True)
+    i2cbus.set_scheduling(True)
+    servo = Servo(0x40)
+    adc = ADCPi(0x68, 0x69, 18)
+
+    def log():
+        scheduler.set_thread_priority(scheduler.BACKGROUND)
+        while True:
+            print(adc.read_voltage(1))
+
+    threading.Thread(target=log, daemon=True).start()
+    while True:
+        # 20 ms servo period, the move must be on the bus within 2 ms
+        with scheduler.priority(scheduler.REALTIME, deadline=0.002):
+            servo.move(1, 125)
+        time.sleep(0.02)
+"""
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+# priority levels, lower numbers get the bus first
+REALTIME = 0
+NORMAL = 1
+BACKGROUND = 2
+
+_NO_DEADLINE = float("inf")
+
+_state = threading.local()
+
+
+def _check_level(level):
+    """
+    Internal method for checking a priority level
+    """
+    if isinstance(level, bool) or not isinstance(level, int):
+        raise ValueError("priority level must be an int such as REALTIME, "
+                         "NORMAL or BACKGROUND")
+
+
+def set_thread_priority(level):
+    """
+    Set the priority of the bus transactions sent by the current thread
+    outside priority() blocks.  Threads start at NORMAL.
+
+    :param level: priority level, lower numbers are more urgent
+    :type level: int
+    :raises ValueError: level is not an int
+    """
+    _check_level(level)
+    _state.level = level
+
+
+def get_thread_priority():
+    """
+    Get the priority and deadline for the bus transactions sent by the
+    current thread
+
+    :return: priority level and the deadline as a time.perf_counter value,
+             or None when there is no deadline
+    :rtype: tuple
+    """
+    deadline = getattr(_state, "deadline", _NO_DEADLINE)
+    return (getattr(_state, "level", NORMAL),
+            None if deadline == _NO_DEADLINE else deadline)
+
+
+@contextlib.contextmanager
+def priority(level, deadline=None):
+    """
+    Send the bus transactions in a block of code with a priority and an
+    optional deadline.  Blocks can be nested; the outer priority and
+    deadline are restored at the end of the inner block.
+
+    :param level: priority level, lower numbers are more urgent
+    :type level: int
+    :param deadline: seconds from the start of the block by which its
+                     transactions should be on the bus, None = no deadline,
+                     defaults to None
+    :type deadline: float, optional
+    :raises ValueError: level is not an int or deadline is negative
+    """
+    _check_level(level)
+    if deadline is not None and deadline < 0:
+        raise ValueError("deadline must be 0 or more seconds")
+    previous = (getattr(_state, "level", NORMAL),
+                getattr(_state, "deadline", _NO_DEADLINE))
+    _state.level = level
+    _state.deadline = (_NO_DEADLINE if deadline is None
+                       else time.perf_counter() + deadline)
+    try:
+        yield
+    finally:
+        _state.level, _state.deadline = previous
+
+
+class _Waiter(object):
+    """
+    Internal class for a thread waiting for the bus
+    """
+    __slots__ = ("ident", "event", "woken")
+
+    def __init__(self, ident):
+        self.ident = ident
+        self.event = threading.Lock()
+        self.event.acquire()  # released to wake the thread
+        self.woken = False
+
+
+class BusScheduler(object):
+    """
+    Reentrant bus lock that gives the bus to the waiting transactions in
+    priority and deadline order.  It can be used in place of a
+    threading.RLock.
+
+    When the bus is released the most urgent waiting thread is woken.  A
+    thread that asks for a free bus takes it straight away only if it is
+    more urgent than every waiting thread, so a real-time thread sending
+    several transactions in a row keeps the bus, but a less urgent thread
+    never gets the bus ahead of a more urgent one that is waiting.
+    """
+
+    def __init__(self):
+        self.__mutex = threading.Lock()
+        self.__owner = None
+        self.__count = 0
+        self.__waiters = []
+        self.__sequence = itertools.count()
+        self.__counters = {}
+
+    def __repr__(self):
+        return "BusScheduler(waiting=%d)" % len(self.__waiters)
+
+    def acquire(self, blocking=True, timeout=-1):
+        """
+        Take the bus, waiting behind the more urgent transactions
+
+        :param blocking: False = return straight away if the bus is in use,
+                         defaults to True
+        :type blocking: bool, optional
+        :param timeout: longest time to wait in seconds, -1 = no limit,
+                        defaults to -1
+        :type timeout: float, optional
+        :return: True if the bus was taken
+        :rtype: bool
+        """
+        ident = threading.get_ident()
+        if self.__owner == ident:
+            self.__count += 1
+            return True
+        level = getattr(_state, "level", NORMAL)
+        deadline = getattr(_state, "deadline", _NO_DEADLINE)
+        waiters = self.__waiters
+        with self.__mutex:
+            entry = (level, deadline, next(self.__sequence))
+            if self.__owner is None and (not waiters or
+                                         entry < waiters[0][:3]):
+                self.__owner = ident
+                self.__count = 1
+                self._record(level, deadline, 0.0)
+                return True
+            if not blocking:
+                return False
+            waiter = _Waiter(ident)
+            entry += (waiter,)
+            heapq.heappush(waiters, entry)
+        start = time.perf_counter()
+        end = None if timeout is None or timeout < 0 else start + timeout
+        while True:
+            if end is None:
+                woken = waiter.event.acquire()
+            else:
+                woken = waiter.event.acquire(
+                    True, max(0.0, end - time.perf_counter()))
+            with self.__mutex:
+                if self.__owner is None and waiters[0] is entry:
+                    heapq.heappop(waiters)
+                    self.__owner = ident
+                    self.__count = 1
+                    break
+                if not woken:
+                    # timed out, pass on a wake up this thread was given
+                    waiters.remove(entry)
+                    heapq.heapify(waiters)
+                    if waiter.woken and self.__owner is None:
+                        self.__wake()
+                    return False
+                # a more urgent thread took the bus first
+                waiter.woken = False
+        self._record(level, deadline, time.perf_counter() - start)
+        return True
+
+    def release(self):
+        """
+        Release the bus and wake the most urgent waiting thread
+
+        :raises RuntimeError: the bus is not held by the current thread
+        """
+        if self.__owner != threading.get_ident():
+            raise RuntimeError("cannot release un-acquired lock")
+        self.__count -= 1
+        if self.__count:
+            return
+        with self.__mutex:
+            self.__owner = None
+            self.__wake()
+
+    def __wake(self):
+        """
+        Internal method for waking the most urgent waiting thread, called
+        with the mutex held
+        """
+        if self.__waiters:
+            waiter = self.__waiters[0][-1]
+            if not waiter.woken:
+                waiter.woken = True
+                waiter.event.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def _record(self, level, deadline, wait):
+        """
+        Internal method for counting a transaction that has taken the bus.
+        Only the thread holding the bus calls it, so the counters do not
+        need a lock of their own.
+        """
+        counters = self.__counters.get(level)
+        if counters is None:
+            counters = self.__counters[level] = {
+                "transactions": 0, "waits": 0, "wait_time": 0.0,
+                "max_wait": 0.0, "deadline_misses": 0}
+        counters["transactions"] += 1
+        if wait > 0.0:
+            counters["waits"] += 1
+            counters["wait_time"] += wait
+            if wait > counters["max_wait"]:
+                counters["max_wait"] = wait
+        if deadline != _NO_DEADLINE and time.perf_counter() > deadline:
+            counters["deadline_misses"] += 1
+
+    def waiting(self):
+        """
+        :return: number of threads waiting for the bus
+        :rtype: int
+        """
+        with self.__mutex:
+            return len(self.__waiters)
+
+    def snapshot(self):
+        """
+        Get the counters for each priority level.  Each level has the
+        number of transactions, the number that waited for the bus, the
+        total and longest wait in seconds and the number of transactions
+        that got the bus after their deadline.
+
+        :return: counters keyed by priority level
+        :rtype: dict
+        """
+        return dict((level, dict(counters))
+                    for level, counters in list(self.__counters.items()))
+
+    def reset(self):
+        """
+        Reset the counters
+        """
+        self.__counters = {}
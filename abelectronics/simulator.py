@@ -0,0 +1,1808 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Device Simulator
+
+Software models of the chips used on the AB Electronics UK expansion
+boards and a fake SMBus and SpiDev that route bus transactions to them.
+================================================
+
+The models follow the register maps and bus framing described in the
+manufacturers' datasheets so the libraries can be run, tested and
+benchmarked on a computer without any hardware attached.
+
+I2C devices: MCP3424, MCP23017, PCA9535, PCA9685, DS1307 and PCA9546A
+SPI devices: MCP3208, MCP3202 and MCP4822
+
+FakeI2CDev simulates the /dev/i2c-N character device for SMBus
+implementations that use os.open and fcntl.ioctl.
+
+FaultInjector adds random NACKs, I/O errors and latency to the messages on
+a FakeSMBus, and MCP3424.stuck_rate leaves ADC conversions stuck busy, for
+measuring how the libraries behave on an unreliable bus.
+
+Example:
+
+    from abelectronics.simulator import FakeSMBus, MCP23017
+    from IOPi import IOPi
+
+    smbus = FakeSMBus(1)
+    smbus.add_device(MCP23017(0x20))
+    iopi = IOPi(0x20, bus=smbus)
+"""
+import datetime
+import errno
+import math
+import os
+import random
+import struct
+import time
+
+I2C_M_RD = 0x0001  # i2c_msg flag for a read message
+
+# ioctl requests from linux/i2c-dev.h
+I2C_SLAVE = 0x0703
+I2C_SLAVE_FORCE = 0x0706
+I2C_FUNCS = 0x0705
+I2C_RDWR = 0x0707
+I2C_PEC = 0x0708
+I2C_SMBUS = 0x0720
+
+_I2C_FUNCS = 0x0EFF0009  # plain I2C and SMBus emulation
+_I2C_MSG = "@HHHP"  # struct i2c_msg: addr, flags, len, buf
+
+
+def _nack():
+    """
+    Internal method for creating the error raised when a device does not
+    acknowledge its address
+
+    :return: Remote I/O error
+    :rtype: OSError
+    """
+    return OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+
+
+def _bcd_dec(bcd):
+    """
+    Internal method for converting a BCD format number to decimal
+
+    :param bcd: BCD formatted number
+    :type bcd: int
+    :return: decimal number
+    :rtype: int
+    """
+    return bcd - 6 * (bcd >> 4)
+
+
+def _dec_bcd(dec):
+    """
+    Internal method for converting a decimal number to BCD format
+
+    :param dec: decimal number, 0 to 99
+    :type dec: int
+    :return: BCD formatted number
+    :rtype: int
+    """
+    return ((dec // 10) << 4) | (dec % 10)
+
+
+"""
+I2C Devices
+"""
+
+
+class I2CDevice(object):
+    """
+    Base class for simulated I2C devices.
+
+    A device receives the raw I2C messages addressed to it.  A write message
+    is a list of bytes sent by the master and a read message returns the
+    requested number of bytes from the device.
+    """
+
+    def __init__(self, address):
+        """
+        :param address: 7-bit I2C address of the device
+        :type address: int
+        """
+        self.address = address
+
+    def write(self, data):
+        """
+        Receive an I2C write message
+
+        :param data: bytes sent to the device, may be empty for a quick write
+        :type data: list
+        """
+        raise NotImplementedError
+
+    def read(self, length):
+        """
+        Respond to an I2C read message
+
+        :param length: number of bytes requested by the master
+        :type length: int
+        :return: bytes sent by the device
+        :rtype: list
+        """
+        raise NotImplementedError
+
+
+class RegisterDevice(I2CDevice):
+    """
+    Base class for devices with an internal register pointer.
+
+    The first byte of a write message sets the register pointer and any
+    following bytes are written to consecutive registers.  A read message
+    returns bytes from the register pointer onwards.
+    """
+    size = 256
+
+    def __init__(self, address):
+        super().__init__(address)
+        self.registers = bytearray(self.size)
+        self._pointer = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Restore the power-on register values
+        """
+        self.registers = bytearray(self.size)
+        self._pointer = 0
+
+    def write(self, data):
+        if len(data) == 0:
+            return
+        self._pointer = data[0] % self.size
+        for value in data[1:]:
+            self.write_register(self._pointer, value & 0xFF)
+            self._pointer = self.next_register(self._pointer)
+
+    def read(self, length):
+        result = []
+        for _ in range(length):
+            result.append(self.read_register(self._pointer))
+            self._pointer = self.next_register(self._pointer)
+        return result
+
+    def read_register(self, register):
+        """
+        Read a register as the I2C master sees it
+
+        :param register: register address
+        :type register: int
+        :return: register value
+        :rtype: int
+        """
+        return self.registers[register]
+
+    def write_register(self, register, value):
+        """
+        Write a register as the I2C master sees it
+
+        :param register: register address
+        :type register: int
+        :param value: 0 to 255
+        :type value: int
+        """
+        self.registers[register] = value
+
+    def next_register(self, register):
+        """
+        Get the register pointer after an access to the selected register
+
+        :param register: register address
+        :type register: int
+        :return: next register address
+        :rtype: int
+        """
+        return (register + 1) % self.size
+
+
+class MCP3424(I2CDevice):
+    """
+    Microchip MCP3424 18-bit delta-sigma ADC used on the ADC Pi and
+    ADC Differential Pi.
+
+    Input voltages are set at the chip inputs.  The ADC Pi divides the
+    board inputs by 2.471 before they reach the MCP3424.
+    """
+
+    # sample rate selection bits S1-S0: (resolution, samples per second)
+    RATES = {
+        0: (12, 240.0),
+        1: (14, 60.0),
+        2: (16, 15.0),
+        3: (18, 3.75)
+    }
+
+    def __init__(self, address=0x68, time_scale=1.0):
+        """
+        :param address: I2C address, 0x68 to 0x6F, defaults to 0x68
+        :type address: int, optional
+        :param time_scale: multiplier applied to the conversion time.
+                           1.0 = datasheet conversion times,
+                           0.0 = conversions complete immediately,
+                           defaults to 1.0
+        :type time_scale: float, optional
+        """
+        super().__init__(address)
+        self.time_scale = time_scale
+        self.inputs = [0.0, 0.0, 0.0, 0.0]
+        self.conversions = 0
+        # probability that a conversion never completes, leaving RDY set
+        # until a configuration write starts a new conversion
+        self.stuck_rate = 0.0
+        self.stuck_conversions = 0
+        self._stuck = False
+        self.reset()
+
+    def reset(self):
+        """
+        Restore the power-on state: continuous conversion, 12-bit,
+        channel 1, gain 1
+        """
+        self.config = 0x90
+        self._output = 0
+        self._fresh = False
+        self.__start()
+
+    def __start(self):
+        """
+        Internal method for starting a conversion
+        """
+        self._converting = True
+        self._fresh = False
+        self._ready_at = time.monotonic() + self.conversion_time()
+        self._stuck = self.stuck_rate > 0 and \
+            random.random() < self.stuck_rate
+        if self._stuck:
+            self.stuck_conversions += 1
+
+    def set_input(self, channel, voltage):
+        """
+        Set the differential voltage on an input channel
+
+        :param channel: 1 to 4
+        :type channel: int
+        :param voltage: voltage between CHn+ and CHn-
+        :type voltage: float
+        """
+        if channel < 1 or channel > 4:
+            raise ValueError('set_input: channel out of range (1 to 4)')
+        self.inputs[channel - 1] = float(voltage)
+
+    @property
+    def channel(self):
+        """
+        Selected input channel, 1 to 4
+        """
+        return ((self.config >> 5) & 0x03) + 1
+
+    @property
+    def continuous(self):
+        """
+        True when the device is in continuous conversion mode
+        """
+        return bool(self.config & 0x10)
+
+    @property
+    def resolution(self):
+        """
+        Selected resolution in bits, 12, 14, 16 or 18
+        """
+        return self.RATES[(self.config >> 2) & 0x03][0]
+
+    @property
+    def gain(self):
+        """
+        Selected PGA gain, 1, 2, 4 or 8
+        """
+        return 1 << (self.config & 0x03)
+
+    def conversion_time(self):
+        """
+        Get the conversion time for the selected sample rate
+
+        :return: seconds per conversion after scaling
+        :rtype: float
+        """
+        rate = self.RATES[(self.config >> 2) & 0x03][1]
+        return self.time_scale / rate
+
+    def __convert(self):
+        """
+        Internal method for converting the selected input to an output code
+
+        :return: signed output code
+        :rtype: int
+        """
+        bits = self.resolution
+        full_scale = 1 << (bits - 1)
+        code = int(round(self.inputs[self.channel - 1] * self.gain *
+                         full_scale / 2.048))
+        self.conversions += 1
+        return max(-full_scale, min(full_scale - 1, code))
+
+    def __update(self):
+        """
+        Internal method for completing any conversion that has finished
+        """
+        now = time.monotonic()
+        if self._converting and now >= self._ready_at and not self._stuck:
+            self._output = self.__convert()
+            self._fresh = True
+            if self.continuous:
+                self._ready_at = now + self.conversion_time()
+            else:
+                self._converting = False
+
+    def write(self, data):
+        if len(data) == 0:
+            return
+        value = data[0]
+        changed = (value & 0x7F) != (self.config & 0x7F)
+        self.config = (self.config & 0x80) | (value & 0x7F)
+        if self.continuous:
+            # a new configuration restarts the conversion
+            if changed or not self._converting:
+                self.__start()
+        elif value & 0x80:
+            # writing RDY = 1 in one-shot mode starts a conversion
+            self.__start()
+        elif changed:
+            self._converting = False
+
+    def read(self, length):
+        self.__update()
+        config = self.config & 0x7F
+        if not self._fresh:
+            config |= 0x80  # RDY = 1, the output register has not been updated
+        code = self._output
+        if self.resolution == 18:
+            result = [(code >> 16) & 0xFF, (code >> 8) & 0xFF, code & 0xFF]
+        else:
+            result = [(code >> 8) & 0xFF, code & 0xFF]
+        while len(result) < length:
+            result.append(config)
+        # the result has been read, RDY returns to 1 until the next conversion
+        self._fresh = False
+        return result[:length]
+
+
+class MCP23017(RegisterDevice):
+    """
+    Microchip MCP23017 16-bit I/O expander used on the IO Pi and Expander Pi.
+
+    Only the IOCON.BANK = 0 register map used by the libraries is modelled.
+    Pin 1 is bit 0 of the 16-bit pin values.
+    """
+    size = 0x16
+
+    IODIRA = 0x00
+    IODIRB = 0x01
+    IPOLA = 0x02
+    IPOLB = 0x03
+    GPINTENA = 0x04
+    GPINTENB = 0x05
+    DEFVALA = 0x06
+    DEFVALB = 0x07
+    INTCONA = 0x08
+    INTCONB = 0x09
+    IOCON = 0x0A
+    IOCON2 = 0x0B
+    GPPUA = 0x0C
+    GPPUB = 0x0D
+    INTFA = 0x0E
+    INTFB = 0x0F
+    INTCAPA = 0x10
+    INTCAPB = 0x11
+    GPIOA = 0x12
+    GPIOB = 0x13
+    OLATA = 0x14
+    OLATB = 0x15
+
+    def __init__(self, address=0x20):
+        """
+        :param address: I2C address, 0x20 to 0x27, defaults to 0x20
+        :type address: int, optional
+        """
+        self.inputs = 0x0000
+        self.driven = 0x0000
+        self.interrupt_count = 0
+        super().__init__(address)
+
+    def reset(self):
+        super().reset()
+        self.registers[self.IODIRA] = 0xFF
+        self.registers[self.IODIRB] = 0xFF
+
+    def __word(self, a_register):
+        """
+        Internal method for reading an A/B register pair as a 16-bit value
+        """
+        return self.registers[a_register] | \
+            (self.registers[a_register + 1] << 8)
+
+    def pins(self):
+        """
+        Get the logic level on each pin.  Outputs follow the output latch,
+        inputs follow the externally driven level, or the pull-up when the
+        pin is not driven.
+
+        :return: 16-bit pin levels
+        :rtype: int
+        """
+        direction = self.__word(self.IODIRA)
+        pullups = self.__word(self.GPPUA)
+        inputs = (self.inputs & self.driven) | (pullups & ~self.driven)
+        return ((self.__word(self.OLATA) & ~direction) |
+                (inputs & direction)) & 0xFFFF
+
+    def __gpio(self):
+        """
+        Internal method for getting the GPIO register value with the input
+        polarity applied to the input pins
+        """
+        return self.pins() ^ (self.__word(self.IPOLA) &
+                              self.__word(self.IODIRA))
+
+    def set_inputs(self, value, mask=0xFFFF):
+        """
+        Drive the input pins from an external source
+
+        :param value: 16-bit logic levels
+        :type value: int
+        :param mask: pins being driven, defaults to all pins
+        :type mask: int, optional
+        """
+        before = self.__gpio()
+        self.inputs = (self.inputs & ~mask) | (value & mask)
+        self.driven |= mask
+        self.__check_interrupts(before, self.__gpio())
+
+    def set_input(self, pin, value):
+        """
+        Drive a single input pin
+
+        :param pin: 1 to 16
+        :type pin: int
+        :param value: 0 or 1
+        :type value: int
+        """
+        self.set_inputs(value << (pin - 1), 1 << (pin - 1))
+
+    def release_inputs(self, mask=0xFFFF):
+        """
+        Stop driving the selected pins so they float
+
+        :param mask: pins to release, defaults to all pins
+        :type mask: int, optional
+        """
+        before = self.__gpio()
+        self.driven &= ~mask
+        self.__check_interrupts(before, self.__gpio())
+
+    def interrupt_active(self, port):
+        """
+        Get the state of an interrupt output
+
+        :param port: 0 = INT A, 1 = INT B
+        :type port: int
+        :return: True when the interrupt output is asserted
+        :rtype: bool
+        """
+        if self.registers[self.IOCON] & 0x40:  # MIRROR
+            return bool(self.registers[self.INTFA] |
+                        self.registers[self.INTFB])
+        return bool(self.registers[self.INTFA + port])
+
+    def __check_interrupts(self, before, after):
+        """
+        Internal method for applying the interrupt-on-change logic after the
+        pin levels change
+        """
+        enabled = self.__word(self.GPINTENA) & self.__word(self.IODIRA)
+        compare = self.__word(self.INTCONA)
+        defaults = self.__word(self.DEFVALA)
+        triggered = (((after ^ defaults) & compare) |
+                     ((after ^ before) & ~compare)) & enabled
+        for port in (0, 1):
+            bits = (triggered >> (8 * port)) & 0xFF
+            if bits:
+                if self.registers[self.INTFA + port] == 0:
+                    self.registers[self.INTCAPA + port] = \
+                        (after >> (8 * port)) & 0xFF
+                    self.interrupt_count += 1
+                self.registers[self.INTFA + port] |= bits
+
+    def read_register(self, register):
+        if register in (self.GPIOA, self.GPIOB):
+            port = register - self.GPIOA
+            self.registers[self.INTFA + port] = 0
+            return (self.__gpio() >> (8 * port)) & 0xFF
+        if register in (self.INTCAPA, self.INTCAPB):
+            self.registers[self.INTFA + register - self.INTCAPA] = 0
+        return self.registers[register]
+
+    def write_register(self, register, value):
+        if register in (self.IOCON, self.IOCON2):
+            # IOCON is shared between both addresses
+            self.registers[self.IOCON] = value
+            self.registers[self.IOCON2] = value
+        elif register in (self.GPIOA, self.GPIOB):
+            # writing GPIO writes the output latch
+            self.registers[register + 2] = value
+        elif register in (self.INTFA, self.INTFB, self.INTCAPA, self.INTCAPB):
+            pass  # read-only
+        else:
+            self.registers[register] = value
+
+    def next_register(self, register):
+        if self.registers[self.IOCON] & 0x20:
+            # SEQOP = 1, byte mode toggles between the A/B register pair
+            return register ^ 0x01
+        return (register + 1) % self.size
+
+
+class PCA9535(RegisterDevice):
+    """
+    NXP PCA9535 16-bit I/O expander used on the IO Zero 32.
+    Pin 1 is bit 0 of the 16-bit pin values.
+    """
+    size = 8
+
+    INPUTPORT0 = 0x00
+    INPUTPORT1 = 0x01
+    OUTPUTPORT0 = 0x02
+    OUTPUTPORT1 = 0x03
+    INVERTPORT0 = 0x04
+    INVERTPORT1 = 0x05
+    CONFIGPORT0 = 0x06
+    CONFIGPORT1 = 0x07
+
+    def __init__(self, address=0x20):
+        """
+        :param address: I2C address, 0x20 to 0x27, defaults to 0x20
+        :type address: int, optional
+        """
+        self.inputs = 0x0000
+        self.interrupt = False
+        super().__init__(address)
+
+    def reset(self):
+        super().reset()
+        self.registers[self.OUTPUTPORT0] = 0xFF
+        self.registers[self.OUTPUTPORT1] = 0xFF
+        self.registers[self.CONFIGPORT0] = 0xFF
+        self.registers[self.CONFIGPORT1] = 0xFF
+
+    def __word(self, register):
+        """
+        Internal method for reading a register pair as a 16-bit value
+        """
+        return self.registers[register] | (self.registers[register + 1] << 8)
+
+    def pins(self):
+        """
+        Get the logic level on each pin
+
+        :return: 16-bit pin levels
+        :rtype: int
+        """
+        config = self.__word(self.CONFIGPORT0)
+        return ((self.__word(self.OUTPUTPORT0) & ~config) |
+                (self.inputs & config)) & 0xFFFF
+
+    def set_inputs(self, value, mask=0xFFFF):
+        """
+        Drive the input pins from an external source
+
+        :param value: 16-bit logic levels
+        :type value: int
+        :param mask: pins being driven, defaults to all pins
+        :type mask: int, optional
+        """
+        before = self.pins()
+        self.inputs = (self.inputs & ~mask) | (value & mask)
+        if (before ^ self.pins()) & self.__word(self.CONFIGPORT0):
+            self.interrupt = True
+
+    def set_input(self, pin, value):
+        """
+        Drive a single input pin
+
+        :param pin: 1 to 16
+        :type pin: int
+        :param value: 0 or 1
+        :type value: int
+        """
+        self.set_inputs(value << (pin - 1), 1 << (pin - 1))
+
+    def read_register(self, register):
+        if register in (self.INPUTPORT0, self.INPUTPORT1):
+            self.interrupt = False
+            value = self.pins() ^ self.__word(self.INVERTPORT0)
+            return (value >> (8 * register)) & 0xFF
+        return self.registers[register]
+
+    def write_register(self, register, value):
+        if register not in (self.INPUTPORT0, self.INPUTPORT1):
+            self.registers[register] = value
+
+    def next_register(self, register):
+        # the command byte toggles between the two registers in a pair
+        return register ^ 0x01
+
+
+class PCA9685(RegisterDevice):
+    """
+    NXP PCA9685 16-channel 12-bit PWM controller used on the Servo PWM Pi.
+    """
+
+    MODE1 = 0x00
+    MODE2 = 0x01
+    SUBADR1 = 0x02
+    SUBADR2 = 0x03
+    SUBADR3 = 0x04
+    ALLCALLADR = 0x05
+    LED0_ON_L = 0x06
+    ALL_LED_ON_L = 0xFA
+    PRE_SCALE = 0xFE
+
+    def __init__(self, address=0x40, oscillator=25000000):
+        """
+        :param address: I2C address, defaults to 0x40
+        :type address: int, optional
+        :param oscillator: internal oscillator frequency, defaults to 25MHz
+        :type oscillator: int, optional
+        """
+        self.oscillator = oscillator
+        super().__init__(address)
+
+    def reset(self):
+        super().reset()
+        self.registers[self.MODE1] = 0x11  # SLEEP and ALLCALL
+        self.registers[self.MODE2] = 0x04  # OUTDRV
+        self.registers[self.SUBADR1] = 0xE2
+        self.registers[self.SUBADR2] = 0xE4
+        self.registers[self.SUBADR3] = 0xE8
+        self.registers[self.ALLCALLADR] = 0xE0
+        for channel in range(16):
+            # full off
+            self.registers[self.LED0_ON_L + 4 * channel + 3] = 0x10
+        self.registers[self.PRE_SCALE] = 0x1E
+
+    @property
+    def sleeping(self):
+        """
+        True when the oscillator is off
+        """
+        return bool(self.registers[self.MODE1] & 0x10)
+
+    @property
+    def frequency(self):
+        """
+        PWM output frequency in Hz from the prescaler
+        """
+        return self.oscillator / (4096.0 *
+                                  (self.registers[self.PRE_SCALE] + 1))
+
+    def get_channel(self, channel):
+        """
+        Get the on and off times for a channel
+
+        :param channel: 1 to 16
+        :type channel: int
+        :return: (on_time, off_time) including the full on and
+                 full off bits 12
+        :rtype: tuple
+        """
+        base = self.LED0_ON_L + 4 * (channel - 1)
+        on = self.registers[base] | (self.registers[base + 1] << 8)
+        off = self.registers[base + 2] | (self.registers[base + 3] << 8)
+        return on & 0x1FFF, off & 0x1FFF
+
+    def read_register(self, register):
+        if self.ALL_LED_ON_L <= register < self.PRE_SCALE:
+            return 0  # the ALL_LED registers are write only
+        return self.registers[register]
+
+    def write_register(self, register, value):
+        if register == self.MODE1:
+            # writing 1 to RESTART clears the bit
+            value &= 0x7F
+        elif register == self.PRE_SCALE:
+            if not self.sleeping:
+                return  # the prescaler can only be written in sleep mode
+            value = max(value, 3)
+        elif self.ALL_LED_ON_L <= register < self.PRE_SCALE:
+            offset = register - self.ALL_LED_ON_L
+            for channel in range(16):
+                self.registers[self.LED0_ON_L + 4 * channel + offset] = value
+            return
+        self.registers[register] = value
+
+    def next_register(self, register):
+        if not self.registers[self.MODE1] & 0x20:
+            return register  # auto-increment disabled
+        if register == 0x45 or register == 0xFF:
+            return 0x00
+        return register + 1
+
+
+class DS1307(RegisterDevice):
+    """
+    Maxim DS1307 real-time clock used on the RTC Pi and Expander Pi.
+
+    The clock advances in real time while the clock halt bit is clear.
+    Registers 0x08 to 0x3F are the 56 bytes of battery-backed RAM.
+    """
+    size = 0x40
+
+    SECONDS = 0x00
+    MINUTES = 0x01
+    HOURS = 0x02
+    DAYOFWEEK = 0x03
+    DAY = 0x04
+    MONTH = 0x05
+    YEAR = 0x06
+    CONTROL = 0x07
+
+    def __init__(self, address=0x68, start=None):
+        """
+        :param address: I2C address, defaults to 0x68
+        :type address: int, optional
+        :param start: date and time to start the clock running from.
+                      If no value is set the device is in its first
+                      power-on state with the clock halted, defaults to None
+        :type start: datetime.datetime, optional
+        """
+        self._time_base = datetime.datetime(2000, 1, 1)
+        self._day_base = 1
+        self._clock_base = time.monotonic()
+        super().__init__(address)
+        if start is not None:
+            self.set_datetime(start)
+
+    def reset(self):
+        super().reset()
+        self.registers[0:8] = bytearray([0x80, 0x00, 0x00, 0x01,
+                                         0x01, 0x01, 0x00, 0x03])
+        self.__rebase()
+
+    @property
+    def halted(self):
+        """
+        True when the clock halt bit is set
+        """
+        return bool(self.registers[self.SECONDS] & 0x80)
+
+    def set_datetime(self, value):
+        """
+        Set the time registers and start the clock
+
+        :param value: new date and time
+        :type value: datetime.datetime
+        """
+        self.registers[self.SECONDS] = _dec_bcd(value.second)
+        self.registers[self.MINUTES] = _dec_bcd(value.minute)
+        self.registers[self.HOURS] = _dec_bcd(value.hour)
+        self.registers[self.DAYOFWEEK] = value.isoweekday()
+        self.registers[self.DAY] = _dec_bcd(value.day)
+        self.registers[self.MONTH] = _dec_bcd(value.month)
+        self.registers[self.YEAR] = _dec_bcd(value.year % 100)
+        self.__rebase()
+
+    def now(self):
+        """
+        Get the current date and time held by the clock
+
+        :return: current date and time, or None if the registers do not
+                 hold a valid date
+        :rtype: datetime.datetime
+        """
+        self.__refresh()
+        return self.__parse()
+
+    def __parse(self):
+        """
+        Internal method for converting the time registers to a datetime
+        """
+        hours = self.registers[self.HOURS]
+        if hours & 0x40:  # 12-hour mode
+            hour = _bcd_dec(hours & 0x1F) % 12
+            if hours & 0x20:
+                hour += 12
+        else:
+            hour = _bcd_dec(hours & 0x3F)
+        try:
+            return datetime.datetime(
+                2000 + _bcd_dec(self.registers[self.YEAR]),
+                _bcd_dec(self.registers[self.MONTH] & 0x1F),
+                _bcd_dec(self.registers[self.DAY] & 0x3F),
+                hour,
+                _bcd_dec(self.registers[self.MINUTES] & 0x7F),
+                _bcd_dec(self.registers[self.SECONDS] & 0x7F))
+        except ValueError:
+            return None
+
+    def __rebase(self):
+        """
+        Internal method for restarting the countdown chain from the values
+        in the time registers
+        """
+        parsed = self.__parse()
+        if parsed is not None:
+            self._time_base = parsed
+        self._day_base = self.registers[self.DAYOFWEEK]
+        self._clock_base = time.monotonic()
+
+    def __refresh(self):
+        """
+        Internal method for updating the time registers with the
+        elapsed time
+        """
+        if self.halted:
+            return
+        elapsed = int(time.monotonic() - self._clock_base)
+        current = self._time_base + datetime.timedelta(seconds=elapsed)
+        days = (current.date() - self._time_base.date()).days
+        hours = self.registers[self.HOURS]
+        if hours & 0x40:
+            hour = current.hour % 12 or 12
+            hours = 0x40 | (0x20 if current.hour >= 12 else 0) | _dec_bcd(hour)
+        else:
+            hours = _dec_bcd(current.hour)
+        self.registers[self.SECONDS] = _dec_bcd(current.second)
+        self.registers[self.MINUTES] = _dec_bcd(current.minute)
+        self.registers[self.HOURS] = hours
+        self.registers[self.DAYOFWEEK] = (self._day_base - 1 + days) % 7 + 1
+        self.registers[self.DAY] = _dec_bcd(current.day)
+        self.registers[self.MONTH] = _dec_bcd(current.month)
+        self.registers[self.YEAR] = _dec_bcd(current.year % 100)
+
+    def write(self, data):
+        self.__refresh()
+        super().write(data)
+        if len(data) > 1 and data[0] < self.CONTROL:
+            self.__rebase()
+
+    def read(self, length):
+        self.__refresh()
+        return super().read(length)
+
+    def next_register(self, register):
+        return (register + 1) % self.size
+
+
+class PCA9546A(I2CDevice):
+    """
+    NXP PCA9546A 4-channel I2C switch used on the I2C Switch.
+
+    Devices attached to a channel respond on the parent bus while that
+    channel is enabled in the control register.
+    """
+
+    def __init__(self, address=0x70):
+        """
+        :param address: I2C address, 0x70 to 0x77, defaults to 0x70
+        :type address: int, optional
+        """
+        super().__init__(address)
+        self.control = 0x00
+        self.channels = {1: {}, 2: {}, 3: {}, 4: {}}
+
+    def reset(self):
+        """
+        Reset the switch, disabling all channels
+        """
+        self.control = 0x00
+
+    def attach(self, channel, device):
+        """
+        Attach a device to a downstream channel
+
+        :param channel: 1 to 4
+        :type channel: int
+        :param device: simulated device
+        :type device: I2CDevice
+        :return: the attached device
+        :rtype: I2CDevice
+        """
+        if channel < 1 or channel > 4:
+            raise ValueError('attach: channel out of range (1 to 4)')
+        self.channels[channel][device.address] = device
+        return device
+
+    def find(self, address):
+        """
+        Find a device on the enabled channels
+
+        :param address: I2C address
+        :type address: int
+        :return: device or None if no device responds
+        :rtype: I2CDevice
+        """
+        for channel in range(1, 5):
+            if self.control & (1 << (channel - 1)):
+                devices = self.channels[channel]
+                if address in devices:
+                    return devices[address]
+                for device in devices.values():
+                    if isinstance(device, PCA9546A):
+                        found = device.find(address)
+                        if found is not None:
+                            return found
+        return None
+
+    def write(self, data):
+        if len(data) > 0:
+            self.control = data[-1] & 0x0F
+
+    def read(self, length):
+        return [self.control] * length
+
+
+"""
+SPI Devices
+"""
+
+
+class SPIDevice(object):
+    """
+    Base class for simulated SPI devices.  Each transfer is one
+    chip-select cycle.
+    """
+
+    def transfer(self, data):
+        """
+        Perform a full duplex transfer
+
+        :param data: bytes clocked into the device
+        :type data: list
+        :return: bytes clocked out of the device
+        :rtype: list
+        """
+        raise NotImplementedError
+
+
+class _SARADC(SPIDevice):
+    """
+    Shared bit-level framing for the Microchip MCP320x SAR ADCs
+    """
+    channels = 8
+    config_bits = 4  # bits clocked in after the start bit
+    sample_clocks = 1  # clocks between the last config bit and the null bit
+
+    def __init__(self, vref):
+        self.vref = vref
+        self.inputs = [0.0] * self.channels
+        self.conversions = 0
+
+    def set_input(self, channel, voltage):
+        """
+        Set the voltage on an input channel
+
+        :param channel: 1 to the number of channels
+        :type channel: int
+        :param voltage: voltage on the input relative to ground
+        :type voltage: float
+        """
+        if channel < 1 or channel > self.channels:
+            raise ValueError('set_input: channel out of range')
+        self.inputs[channel - 1] = float(voltage)
+
+    def _decode(self, config):
+        """
+        Decode the configuration bits
+
+        :return: (positive input, negative input or None, LSB first output
+                  after the MSB first output)
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+    def transfer(self, data):
+        bits_in = [(byte >> (7 - i)) & 1 for byte in data for i in range(8)]
+        bits_out = [0] * len(bits_in)
+        if 1 in bits_in:
+            start = bits_in.index(1)
+            position = start + 1 + self.config_bits
+            if position <= len(bits_in):
+                positive, negative, lsb_first = self._decode(
+                    bits_in[start + 1:position])
+                voltage = self.inputs[positive]
+                if negative is not None:
+                    voltage -= self.inputs[negative]
+                code = int(voltage * 4096 / self.vref)
+                code = max(0, min(4095, code))
+                self.conversions += 1
+                # sample clocks and the null bit
+                position += self.sample_clocks + 1
+                sequence = [(code >> (11 - i)) & 1 for i in range(12)]
+                if lsb_first:
+                    sequence += sequence[-2::-1]
+                for bit in sequence:
+                    if position >= len(bits_out):
+                        break
+                    bits_out[position] = bit
+                    position += 1
+        result = []
+        for index in range(0, len(bits_out), 8):
+            byte = 0
+            for bit in bits_out[index:index + 8]:
+                byte = (byte << 1) | bit
+            result.append(byte)
+        return result
+
+
+class MCP3208(_SARADC):
+    """
+    Microchip MCP3208 8-channel 12-bit ADC used on the Expander Pi
+    """
+    channels = 8
+    config_bits = 4
+    sample_clocks = 1
+
+    def __init__(self, vref=4.096):
+        """
+        :param vref: reference voltage, defaults to 4.096
+        :type vref: float, optional
+        """
+        super().__init__(vref)
+
+    def _decode(self, config):
+        single = config[0]
+        channel = (config[1] << 2) | (config[2] << 1) | config[3]
+        if single:
+            return channel, None, True
+        # differential pairs CH0/CH1, CH2/CH3 ... with the odd bit
+        # selecting which input is positive
+        return channel, channel ^ 0x01, True
+
+
+class MCP3202(_SARADC):
+    """
+    Microchip MCP3202 2-channel 12-bit ADC used on the ADC DAC Pi
+    """
+    channels = 2
+    config_bits = 3
+    sample_clocks = 0
+
+    def __init__(self, vref=3.3):
+        """
+        :param vref: reference voltage, the 3.3V supply on the ADC DAC Pi,
+                     defaults to 3.3
+        :type vref: float, optional
+        """
+        super().__init__(vref)
+
+    def _decode(self, config):
+        single, odd, msbf = config
+        if single:
+            return odd, None, not msbf
+        return odd, odd ^ 0x01, not msbf
+
+
+class MCP4822(SPIDevice):
+    """
+    Microchip MCP4822 2-channel 12-bit DAC used on the ADC DAC Pi and
+    Expander Pi.  LDAC is tied low so outputs update at the end of each
+    write.
+    """
+
+    def __init__(self):
+        self.values = [0, 0]
+        self.gains = [2, 2]
+        self.active = [False, False]
+        self.writes = 0
+
+    def transfer(self, data):
+        if len(data) >= 2:
+            # only the first 16 clocks are used
+            word = (data[0] << 8) | data[1]
+            channel = (word >> 15) & 0x01
+            self.gains[channel] = 1 if word & 0x2000 else 2
+            self.active[channel] = bool(word & 0x1000)
+            self.values[channel] = word & 0x0FFF
+            self.writes += 1
+        return [0] * len(data)
+
+    def output_voltage(self, channel):
+        """
+        Get the output voltage on a channel
+
+        :param channel: 1 or 2
+        :type channel: int
+        :return: output voltage
+        :rtype: float
+        """
+        if not self.active[channel - 1]:
+            return 0.0
+        return (2.048 * self.values[channel - 1] / 4096 *
+                self.gains[channel - 1])
+
+
+"""
+Buses
+"""
+
+
+"""
+Fault Injection
+"""
+
+
+def constant_latency(seconds):
+    """
+    Latency distribution for FaultInjector with the same delay for every
+    message
+
+    :param seconds: delay
+    :type seconds: float
+    :return: function returning the delay for a message
+    :rtype: callable
+    """
+    return lambda rng: seconds
+
+
+def uniform_latency(low, high):
+    """
+    Latency distribution for FaultInjector with delays spread evenly
+    between two values
+
+    :param low: shortest delay in seconds
+    :type low: float
+    :param high: longest delay in seconds
+    :type high: float
+    :return: function returning the delay for a message
+    :rtype: callable
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median, sigma=0.5):
+    """
+    Latency distribution for FaultInjector with most delays near the
+    median and a long tail of slow messages, like a bus shared with other
+    masters or a busy kernel
+
+    :param median: median delay in seconds
+    :type median: float
+    :param sigma: standard deviation of the log of the delay,
+                  defaults to 0.5
+    :type sigma: float, optional
+    :return: function returning the delay for a message
+    :rtype: callable
+    """
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+class FaultInjector(object):
+    """
+    Random faults and latency for the messages on a FakeSMBus.
+
+    Each I2C message to a selected address can be delayed, fail with a NACK
+    (OSError EREMOTEIO, the error raised when a device does not acknowledge
+    its address) or fail with another I/O error such as a timeout.  A
+    failed message does not reach the device.
+    """
+
+    def __init__(self, nack_rate=0.0, error_rate=0.0, latency=None,
+                 addresses=None, error=errno.ETIMEDOUT, seed=None):
+        """
+        :param nack_rate: probability that a message is not acknowledged,
+                          0.0 to 1.0, defaults to 0.0
+        :type nack_rate: float, optional
+        :param error_rate: probability that a message fails with an I/O
+                           error, 0.0 to 1.0, defaults to 0.0
+        :type error_rate: float, optional
+        :param latency: function called with a random.Random object that
+                        returns the delay in seconds for a message, such as
+                        uniform_latency(0.0001, 0.0005).
+                        None = no delay, defaults to None
+        :type latency: callable, optional
+        :param addresses: I2C addresses to inject faults on,
+                          None = every address, defaults to None
+        :type addresses: list, optional
+        :param error: errno for the I/O errors, defaults to ETIMEDOUT
+        :type error: int, optional
+        :param seed: random number seed for repeatable runs
+        :type seed: int, optional
+        """
+        if not 0.0 <= nack_rate <= 1.0 or not 0.0 <= error_rate <= 1.0:
+            raise ValueError("rates must be between 0.0 and 1.0")
+        self.nack_rate = nack_rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self.addresses = None if addresses is None else set(addresses)
+        self.error = error
+        self.random = random.Random(seed)
+        self.reset_counters()
+
+    def reset_counters(self):
+        """
+        Reset the fault counters to 0
+        """
+        self.nacks = 0
+        self.errors = 0
+        self.delay = 0.0
+
+    def get_counters(self):
+        """
+        Get the fault counters
+
+        :return: nacks, errors and the total delay in seconds
+        :rtype: dict
+        """
+        return {"nacks": self.nacks, "errors": self.errors,
+                "delay": self.delay}
+
+    def inject(self, address):
+        """
+        Delay a message and decide if it fails
+
+        :param address: I2C address of the message
+        :type address: int
+        :return: error for the message to fail with, or None
+        :rtype: OSError
+        """
+        if self.addresses is not None and address not in self.addresses:
+            return None
+        if self.latency is not None:
+            delay = self.latency(self.random)
+            if delay > 0:
+                time.sleep(delay)
+                self.delay += delay
+        value = self.random.random()
+        if value < self.nack_rate:
+            self.nacks += 1
+            return _nack()
+        if value < self.nack_rate + self.error_rate:
+            self.errors += 1
+            return OSError(self.error, os.strerror(self.error))
+        return None
+
+
+class FakeSMBus(object):
+    """
+    Drop-in replacement for smbus2.SMBus that routes each transaction to
+    simulated I2C devices.
+
+    Transaction counters and an optional logic-analyser style trace make it
+    possible to measure the bus cost of each library call.
+    """
+
+    def __init__(self, bus=None, devices=None, trace=False, faults=None):
+        """
+        :param bus: I2C bus number, used for identification only
+        :type bus: int, optional
+        :param devices: simulated devices to add to the bus
+        :type devices: list, optional
+        :param trace: True = record each I2C message in the trace list
+        :type trace: bool, optional
+        :param faults: faults and latency to add to each message
+        :type faults: FaultInjector, optional
+        """
+        self.bus = bus
+        self.devices = {}
+        self.trace = [] if trace else None
+        self.faults = faults
+        self.closed = False
+        self.reset_counters()
+        for device in devices or []:
+            self.add_device(device)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self, bus):
+        """
+        Open the bus
+
+        :param bus: I2C bus number
+        :type bus: int
+        """
+        self.bus = bus
+        self.closed = False
+
+    def close(self):
+        """
+        Close the bus
+        """
+        self.closed = True
+
+    def add_device(self, device):
+        """
+        Connect a simulated device to the bus
+
+        :param device: simulated device
+        :type device: I2CDevice
+        :return: the added device
+        :rtype: I2CDevice
+        """
+        self.devices[device.address] = device
+        return device
+
+    def remove_device(self, address):
+        """
+        Disconnect a simulated device from the bus
+
+        :param address: I2C address
+        :type address: int
+        """
+        self.devices.pop(address, None)
+
+    def reset_counters(self):
+        """
+        Reset the transaction counters to 0
+        """
+        self.transactions = 0
+        self.messages = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def get_counters(self):
+        """
+        Get the transaction counters
+
+        :return: transactions, messages, bytes_written and bytes_read
+        :rtype: dict
+        """
+        return {"transactions": self.transactions,
+                "messages": self.messages,
+                "bytes_written": self.bytes_written,
+                "bytes_read": self.bytes_read}
+
+    def find(self, address):
+        """
+        Find the device that responds to an address
+
+        :param address: I2C address
+        :type address: int
+        :return: device or None
+        :rtype: I2CDevice
+        """
+        device = self.devices.get(address)
+        if device is None:
+            for switch in self.devices.values():
+                if isinstance(switch, PCA9546A):
+                    device = switch.find(address)
+                    if device is not None:
+                        break
+        return device
+
+    def __inject(self, direction, address):
+        """
+        Internal method for applying the fault injector to a message
+
+        :param direction: "W" or "R"
+        :type direction: str
+        :param address: I2C address
+        :type address: int
+        :raises OSError: injected NACK or I/O error
+        """
+        error = self.faults.inject(address)
+        if error is not None:
+            self.messages += 1
+            if self.trace is not None:
+                self.trace.append("%s 0x%02X %s" % (
+                    direction, address,
+                    "NACK" if error.errno == errno.EREMOTEIO
+                    else errno.errorcode.get(error.errno, error.errno)))
+            raise error
+
+    def _write(self, address, data):
+        """
+        Send an I2C write message
+
+        :param address: I2C address
+        :type address: int
+        :param data: bytes to send
+        :type data: list
+        """
+        if self.faults is not None:
+            self.__inject("W", address)
+        if self.trace is not None:
+            self.trace.append(" ".join(["W 0x%02X" % address] +
+                                       ["0x%02X" % b for b in data]))
+        self.messages += 1
+        device = self.find(address)
+        if device is None:
+            raise _nack()
+        self.bytes_written += len(data)
+        device.write(list(data))
+
+    def _read(self, address, length):
+        """
+        Send an I2C read message
+
+        :param address: I2C address
+        :type address: int
+        :param length: number of bytes to read
+        :type length: int
+        :return: bytes read
+        :rtype: list
+        """
+        if self.faults is not None:
+            self.__inject("R", address)
+        self.messages += 1
+        device = self.find(address)
+        if device is None:
+            if self.trace is not None:
+                self.trace.append("R 0x%02X NACK" % address)
+            raise _nack()
+        data = device.read(length)
+        self.bytes_read += len(data)
+        if self.trace is not None:
+            self.trace.append(" ".join(["R 0x%02X" % address] +
+                                       ["0x%02X" % b for b in data]))
+        return data
+
+    # smbus2 compatible methods
+
+    def write_quick(self, i2c_addr, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [])
+
+    def read_byte(self, i2c_addr, force=None):
+        self.transactions += 1
+        return self._read(i2c_addr, 1)[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [value & 0xFF])
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [register])
+        return self._read(i2c_addr, 1)[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [register, value & 0xFF])
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [register])
+        data = self._read(i2c_addr, 2)
+        return data[0] | (data[1] << 8)
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        self.transactions += 1
+        self._write(i2c_addr, [register, value & 0xFF, (value >> 8) & 0xFF])
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        if length > 32:
+            raise ValueError("Desired block length over 32 bytes")
+        self.transactions += 1
+        self._write(i2c_addr, [register])
+        return self._read(i2c_addr, length)
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        if len(data) > 32:
+            raise ValueError("Data length cannot exceed 32 bytes")
+        self.transactions += 1
+        self._write(i2c_addr, [register] + [b & 0xFF for b in data])
+
+    def i2c_rdwr(self, *i2c_msgs):
+        # smbus2.i2c_msg objects, sent as one transaction
+        self.transactions += 1
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                for i, value in enumerate(self._read(msg.addr, msg.len)):
+                    msg.buf[i] = bytes((value,))
+            else:
+                self._write(msg.addr, list(msg))
+
+
+class FakeI2CDev(object):
+    """
+    Fake /dev/i2c-N character device for running SMBus implementations
+    that call os.open and fcntl.ioctl, such as smbus2 and
+    abelectronics.rawi2c, against simulated I2C devices.
+
+    While the object is used as a context manager os.open, os.close and
+    fcntl.ioctl are replaced so opening the device path returns a file
+    descriptor that is routed to the simulated bus.  The I2C_SLAVE,
+    I2C_FUNCS, I2C_SMBUS and I2C_RDWR requests are supported.  SMBus
+    implementations written in C, such as python-smbus, call the kernel
+    directly and cannot use the fake device.
+    """
+
+    def __init__(self, bus=1, devices=None):
+        """
+        :param bus: I2C bus number, the device path is /dev/i2c-bus
+        :type bus: int, optional
+        :param devices: simulated devices to add to the bus
+        :type devices: list, optional
+        """
+        self.path = "/dev/i2c-%d" % bus
+        self.smbus = FakeSMBus(bus, devices)
+        self.ioctls = 0
+        self.__addresses = {}  # slave address for each open descriptor
+        self.__saved = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        """
+        Replace os.open, os.close and fcntl.ioctl so the device path opens
+        the fake device
+        """
+        import fcntl
+        import sys
+
+        smbus2 = sys.modules.get("smbus2.smbus2")
+        self.__saved = (os.open, os.close, fcntl.ioctl,
+                        smbus2, getattr(smbus2, "ioctl", None))
+        real_open, real_close, real_ioctl = self.__saved[:3]
+        addresses = self.__addresses
+
+        def fake_open(path, flags, *args, **kwargs):
+            if path == self.path:
+                # reserve a real descriptor number so it cannot clash
+                fd = real_open(os.devnull, os.O_RDONLY)
+                addresses[fd] = None
+                return fd
+            return real_open(path, flags, *args, **kwargs)
+
+        def fake_close(fd):
+            addresses.pop(fd, None)
+            real_close(fd)
+
+        def fake_ioctl(fd, request, arg=0, *args):
+            if fd in addresses:
+                return self.ioctl(fd, request, arg)
+            return real_ioctl(fd, request, arg, *args)
+
+        os.open = fake_open
+        os.close = fake_close
+        fcntl.ioctl = fake_ioctl
+        if smbus2 is not None:
+            smbus2.ioctl = fake_ioctl
+
+    def uninstall(self):
+        """
+        Restore os.open, os.close and fcntl.ioctl
+        """
+        import fcntl
+
+        if self.__saved is None:
+            return
+        os.open, os.close, fcntl.ioctl, smbus2, ioctl = self.__saved
+        if smbus2 is not None:
+            smbus2.ioctl = ioctl
+        self.__saved = None
+
+    def reset_counters(self):
+        """
+        Reset the ioctl and bus transaction counters to 0
+        """
+        self.ioctls = 0
+        self.smbus.reset_counters()
+
+    def get_counters(self):
+        """
+        Get the ioctl and bus transaction counters
+
+        :return: ioctls and the FakeSMBus counters
+        :rtype: dict
+        """
+        counters = self.smbus.get_counters()
+        counters["ioctls"] = self.ioctls
+        return counters
+
+    def ioctl(self, fd, request, arg):
+        """
+        Handle an ioctl request on an open descriptor
+
+        :param fd: file descriptor
+        :type fd: int
+        :param request: ioctl request number
+        :type request: int
+        :param arg: request argument, an int or a ctypes object
+        :type arg: int or ctypes object
+        :return: 0
+        :rtype: int
+        :raises OSError: unsupported request or device not found
+        """
+        import ctypes
+
+        self.ioctls += 1
+        if request in (I2C_SLAVE, I2C_SLAVE_FORCE):
+            self.__addresses[fd] = arg
+        elif request == I2C_FUNCS:
+            arg.value = _I2C_FUNCS
+        elif request == I2C_PEC:
+            pass
+        elif request == I2C_SMBUS:
+            read_write, command, size, data = struct.unpack_from(
+                "@BBIP", bytes(arg))
+            data = (ctypes.c_uint8 * 34).from_address(data)
+            self.__smbus(self.__addresses[fd], read_write == 1, command,
+                         size, data)
+        elif request == I2C_RDWR:
+            msgs, nmsgs = struct.unpack_from("@PI", bytes(arg))
+            size = struct.calcsize(_I2C_MSG)
+            self.smbus.transactions += 1
+            for i in range(nmsgs):
+                addr, flags, length, buf = struct.unpack(
+                    _I2C_MSG, ctypes.string_at(msgs + i * size, size))
+                if flags & I2C_M_RD:
+                    data = self.smbus._read(addr, length)
+                    ctypes.memmove(buf, bytes(bytearray(data)), length)
+                else:
+                    self.smbus._write(addr, bytearray(
+                        ctypes.string_at(buf, length)))
+        else:
+            raise OSError(errno.ENOTTY, os.strerror(errno.ENOTTY))
+        return 0
+
+    def __smbus(self, address, read, command, size, data):
+        """
+        Internal method for running an I2C_SMBUS request on the bus
+
+        :param address: I2C address set with I2C_SLAVE
+        :type address: int
+        :param read: True = read, False = write
+        :type read: bool
+        :param command: register or byte value
+        :type command: int
+        :param size: transaction type
+        :type size: int
+        :param data: i2c_smbus_data union
+        :type data: ctypes array
+        """
+        smbus = self.smbus
+        if size == 0:  # quick
+            smbus.write_quick(address)
+        elif size == 1 and read:  # byte
+            data[0] = smbus.read_byte(address)
+        elif size == 1:
+            smbus.write_byte(address, command)
+        elif size == 2 and read:  # byte data
+            data[0] = smbus.read_byte_data(address, command)
+        elif size == 2:
+            smbus.write_byte_data(address, command, data[0])
+        elif size == 3 and read:  # word data
+            word = smbus.read_word_data(address, command)
+            data[0] = word & 0xFF
+            data[1] = word >> 8
+        elif size == 3:
+            smbus.write_word_data(address, command, data[0] | data[1] << 8)
+        elif size == 8 and read:  # I2C block data
+            values = smbus.read_i2c_block_data(address, command, data[0])
+            data[1:1 + len(values)] = values
+        elif size == 8:
+            smbus.write_i2c_block_data(address, command,
+                                       list(data[1:1 + data[0]]))
+        else:
+            raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+
+
+class FakeSpiDev(object):
+    """
+    Drop-in replacement for spidev.SpiDev that routes each transfer to a
+    simulated SPI device.
+
+    Devices can be attached to a bus and chip select so the device is chosen
+    when the driver calls open(bus, device).
+    """
+
+    def __init__(self, device=None, devices=None):
+        """
+        :param device: simulated device used for every chip select
+        :type device: SPIDevice, optional
+        :param devices: simulated devices keyed by (bus, chip select)
+        :type devices: dict, optional
+        """
+        self.device = device
+        self.devices = dict(devices or {})
+        self.bus = None
+        self.cs = None
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.bits_per_word = 8
+        self.closed = False
+        self.reset_counters()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def attach(self, bus, cs, device):
+        """
+        Attach a device to a bus and chip select
+
+        :param bus: SPI bus number
+        :type bus: int
+        :param cs: chip select
+        :type cs: int
+        :param device: simulated device
+        :type device: SPIDevice
+        :return: the attached device
+        :rtype: SPIDevice
+        """
+        self.devices[(bus, cs)] = device
+        return device
+
+    def open(self, bus, device):
+        """
+        Open an SPI device
+
+        :param bus: SPI bus number
+        :type bus: int
+        :param device: chip select
+        :type device: int
+        """
+        if self.device is None and (bus, device) not in self.devices:
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT),
+                "/dev/spidev%d.%d" % (bus, device))
+        self.bus = bus
+        self.cs = device
+        self.closed = False
+
+    def close(self):
+        """
+        Close the SPI device
+        """
+        self.closed = True
+
+    def reset_counters(self):
+        """
+        Reset the transfer counters to 0
+        """
+        self.transactions = 0
+        self.bytes_transferred = 0
+
+    def get_counters(self):
+        """
+        Get the transfer counters
+
+        :return: transactions and bytes_transferred
+        :rtype: dict
+        """
+        return {"transactions": self.transactions,
+                "bytes_transferred": self.bytes_transferred}
+
+    def __target(self):
+        """
+        Internal method for getting the device on the open chip select
+        """
+        if self.closed:
+            raise OSError(errno.EBADF, os.strerror(errno.EBADF))
+        device = self.devices.get((self.bus, self.cs), self.device)
+        if device is None:
+            raise OSError(errno.ENXIO, os.strerror(errno.ENXIO))
+        return device
+
+    def xfer2(self, values, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        device = self.__target()
+        self.transactions += 1
+        self.bytes_transferred += len(values)
+        return device.transfer(list(values))
+
+    def xfer(self, values, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self.xfer2(values, speed_hz, delay_usecs, bits_per_word)
+
+    def writebytes(self, values):
+        self.xfer2(values)
+
+    def readbytes(self, length):
+        return self.xfer2([0] * length)
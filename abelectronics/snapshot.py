@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Register Snapshots
+
+Saves the configuration registers of a board to a JSON file and restores
+them on a warm start.
+================================================
+
+A snapshot can be taken of any board object with get_registers and
+set_registers methods: IOPi, IOZero32, ServoPi.PWM, RTCPi.RTC and the
+ExpanderPi IO and RTC.  restore() reads
+the current registers from the device and only writes the registers that
+have a different value, so outputs that are already in the saved state do
+not glitch when a program restarts.
+
+The MCP23017 snapshots do not include the GPIO or INTCAP registers and the
+IO Zero 32 snapshot does not include the input ports, so taking a snapshot
+does not clear pending interrupts.  The RTC time registers are saved but
+not restored, use set_date to set the time.
+
+read() reads the registers of a device from its address and chip type
+without creating a board object, using only reads that do not change the
+device.  It is used by "abelectronics dump" and can read every chip found
+by abelectronics.scanner.  The I2C Switch and ADC Pi registers it returns
+can be printed but not restored, RESTORABLE lists the boards that
+restore() can write to.
+
+File format:
+
+    {"version": 1, "board": "IOPi", "registers": {"0x00": 255, ...}}
+
+Example:
+
+    from abelectronics import snapshot
+    from IOPi import IOPi
+
+    bus = IOPi(0x20)
+    snapshot.save(bus, "iopi.json")
+
+    # after a restart
+    bus = IOPi(0x20, initialise=False)
+    snapshot.restore(bus, "iopi.json")
+"""
+import json
+
+from . import i2cbus
+
+VERSION = 1
+
+# registers read by read() for each chip.  The MCP23017 GPIO and INTCAP
+# registers and the PCA9535 input ports are not read as reading them
+# clears the interrupts.
+REGISTERS = {
+    "MCP23017": tuple(range(0x00, 0x10)) + (0x14, 0x15),
+    "PCA9535": tuple(range(0x02, 0x08)),
+    "PCA9685": tuple(range(0x00, 0x46)) + (0xFE,),
+    "DS1307": tuple(range(0x00, 0x40)),
+}
+
+# board class that restores the registers of each chip
+BOARDS = {
+    "MCP23017": "IOPi",
+    "PCA9535": "IOZero32",
+    "PCA9685": "PWM",
+    "DS1307": "RTC",
+    "PCA9546A": "I2CSwitch",
+    "MCP3424": "ADCPi",
+}
+
+# boards with a set_registers method that restore() can write a snapshot to
+RESTORABLE = ("IOPi", "IOZero32", "PWM", "RTC")
+
+# longest run of registers read in one block read for each chip.  The
+# PCA9535 register pointer only toggles between the two registers of a
+# pair, so its registers are read a pair at a time.
+_RUN_LENGTH = {"PCA9535": 2}
+
+# register, bit and bit value that turn on the register auto-increment of
+# each chip: PCA9685 MODE1.AI and MCP23017 IOCON.SEQOP.  The registers of
+# a device with auto-increment turned off are read one at a time.
+_AUTO_INCREMENT = {
+    "PCA9685": (0x00, 0x20, 0x20),
+    "MCP23017": (0x0A, 0x20, 0x00),
+}
+
+
+def _runs(registers, limit=None):
+    """
+    Internal method for splitting registers into runs of consecutive
+    registers
+
+    :param limit: longest run, None = no limit, defaults to None
+    :type limit: int, optional
+    :return: first register and length of each run
+    :rtype: list
+    """
+    runs = []
+    for register in registers:
+        if runs and runs[-1][0] + runs[-1][1] == register and \
+                (limit is None or runs[-1][1] < limit):
+            runs[-1][1] += 1
+        else:
+            runs.append([register, 1])
+    return runs
+
+
+def write(path, board_name, registers):
+    """
+    Write registers to a snapshot file
+
+    :param path: file path
+    :type path: str
+    :param board_name: board class name, checked by load
+    :type board_name: str
+    :param registers: register values keyed by register number
+    :type registers: dict
+    """
+    with open(path, "w") as snapshot_file:
+        json.dump({"version": VERSION,
+                   "board": board_name,
+                   "registers": dict(("0x%02x" % register, value)
+                                     for register, value
+                                     in sorted(registers.items()))},
+                  snapshot_file, indent=1, sort_keys=True)
+
+
+def save(board, path):
+    """
+    Save the registers of a board to a file
+
+    :param board: board object with a get_registers method
+    :type board: IOPi, IOZero32, PWM or RTC
+    :param path: file path
+    :type path: str
+    :return: register values keyed by register number
+    :rtype: dict
+    """
+    registers = board.get_registers()
+    write(path, type(board).__name__, registers)
+    return registers
+
+
+def load(path, board=None):
+    """
+    Load the registers from a snapshot file
+
+    :param path: file path
+    :type path: str
+    :param board: check the snapshot was saved from a board of the same type
+    :type board: IOPi, IOZero32, PWM or RTC, optional
+    :raises ValueError: snapshot version or board type does not match
+    :return: register values keyed by register number
+    :rtype: dict
+    """
+    with open(path) as snapshot_file:
+        data = json.load(snapshot_file)
+    if data.get("version") != VERSION:
+        raise ValueError("unsupported snapshot version %r" %
+                         data.get("version"))
+    if board is not None and data.get("board") != type(board).__name__:
+        raise ValueError("snapshot is for %s not %s" %
+                         (data.get("board"), type(board).__name__))
+    return dict((int(register, 16), value)
+                for register, value in data["registers"].items())
+
+
+def restore(board, path):
+    """
+    Write the registers in a snapshot file that differ from the device
+
+    :param board: board object with a set_registers method
+    :type board: IOPi, IOZero32, PWM or RTC
+    :param path: file path
+    :type path: str
+    :raises ValueError: snapshot version or board type does not match
+    :return: number of registers written
+    :rtype: int
+    """
+    return board.set_registers(load(path, board))
+
+
+def read(bus, address, chip):
+    """
+    Read the registers of a device without creating a board object.  The
+    PCA9546A control register is returned as register 0x00, and the
+    MCP3424 configuration byte, which needs smbus2 to read, as register
+    0x00.
+
+    :param bus: I2C bus number or an SMBus compatible object such as
+                simulator.FakeSMBus, None = detect the bus number
+    :type bus: int or SMBus
+    :param address: I2C address
+    :type address: int
+    :param chip: chip name from BOARDS, see abelectronics.scanner.identify
+    :type chip: str
+    :raises ValueError: unknown chip
+    :raises IOError: the device did not respond or the MCP3424 can not be
+                     read without smbus2
+    :return: register values keyed by register number
+    :rtype: dict
+    """
+    if chip not in BOARDS:
+        raise ValueError("unknown chip %r, use one of %s" %
+                         (chip, ", ".join(sorted(BOARDS))))
+    smbus = i2cbus.get_smbus(bus)
+    try:
+        with smbus.lock:
+            if chip == "PCA9546A":
+                return {0x00: smbus.read_byte(address)}
+            if chip == "MCP3424":
+                # a register read would write the configuration byte
+                i2c_msg = i2cbus.get_i2c_msg()
+                if not i2c_msg or getattr(smbus, "i2c_rdwr", None) is None:
+                    raise IOError("reading an MCP3424 needs smbus2")
+                message = i2c_msg.read(address, 4)
+                smbus.i2c_rdwr(message)
+                return {0x00: list(message)[3]}
+            limit = _RUN_LENGTH.get(chip)
+            if chip in _AUTO_INCREMENT:
+                register, bit, value = _AUTO_INCREMENT[chip]
+                if smbus.read_byte_data(address, register) & bit != value:
+                    limit = 1
+            registers = {}
+            for first, length in _runs(REGISTERS[chip], limit):
+                values = i2cbus.read_block(smbus, address, first, length)
+                registers.update(zip(range(first, first + length), values))
+            return registers
+    finally:
+        i2cbus.release_smbus(smbus)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | ADCDACPi SPI devices
+
+run with: python3 adcdac_spi.py
+================================================
+
+This test checks that importing ADCDACPi and creating an ADCDACPi object
+does not open the SPI devices, that the ADC and DAC work with SpiDev
+objects from abelectronics.simulator and that SPI devices passed to the
+constructor are not closed when the object is closed.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Import check: PASSED
+Construct check: PASSED
+ADC read check: PASSED
+DAC write check: PASSED
+Separate objects check: PASSED
+Close check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics.simulator import FakeSpiDev, MCP3202, MCP4822
+    from ADCDACPi import ADCDACPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    passed &= check("Import", "spidev" not in sys.modules)
+
+    ADCDACPi(1, spi_bus=1, adc_cs=2, dac_cs=2)
+    passed &= check("Construct", "spidev" not in sys.modules)
+
+    adc = MCP3202(3.3)
+    dac = MCP4822()
+    adc_spi = FakeSpiDev(adc)
+    dac_spi = FakeSpiDev(dac)
+
+    with ADCDACPi(1, adc_spi, dac_spi) as adcdac:
+        adc.set_input(1, 1.65)
+        passed &= check("ADC read",
+                        abs(adcdac.read_adc_voltage(1, 0) - 1.65) < 0.01)
+
+        adcdac.set_dac_voltage(1, 1.5)
+        passed &= check("DAC write",
+                        abs(dac.output_voltage(1) - 1.5) < 0.01)
+
+        other = ADCDACPi(2, adc_spi, dac_spi)
+        other.set_dac_raw(2, 100)
+        passed &= check("Separate objects", adcdac.dac_tx != other.dac_tx)
+
+    passed &= check("Close", not adc_spi.closed and not dac_spi.closed)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
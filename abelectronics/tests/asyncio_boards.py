@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | aio
+
+run with: python3 asyncio_boards.py
+================================================
+
+This test checks that board methods can be awaited through
+abelectronics.aio, that the boards on a bus share one worker thread that
+runs their calls one at a time and that a board given a worker of its own
+takes turns for each transaction through the bus lock, so an IO Pi can be
+read while an ADC Pi on the same bus waits for a conversion.  It also
+checks that the event loop keeps running while an ADC conversion is in
+progress and that exceptions from the board are raised in the coroutine.
+The buses are simulated with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Bus worker check: PASSED
+Bus key check: PASSED
+IO Pi read check: PASSED
+Servo move check: PASSED
+ADC read check: PASSED
+Event loop check: PASSED
+Bus worker order check: PASSED
+Locking required check: PASSED
+Boards during conversion check: PASSED
+Worker thread check: PASSED
+Exception check: PASSED
+Close check: PASSED
+Worker stopped check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+import asyncio
+import threading
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import aio, i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424, \
+        PCA9685
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+    from ServoPi import Servo
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+class HeldMCP3424(MCP3424):
+    """
+    MCP3424 with conversions that do not finish until release is set, so
+    the test can check what happens while a conversion is pending without
+    depending on the timing
+    """
+
+    def __init__(self, address):
+        super().__init__(address, time_scale=0)
+        self.release = threading.Event()
+        self.polls = 0
+
+    def read(self, length):
+        result = super().read(length)
+        if not self.release.is_set():
+            self.polls += 1
+            start = 3 if self.resolution == 18 else 2
+            for i in range(start, len(result)):
+                result[i] |= 0x80  # RDY = 1, conversion in progress
+        return result
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+async def run_checks():
+    """
+    Run the checks on the event loop
+
+    :return: True if every check passed
+    :rtype: bool
+    """
+    passed = True
+
+    chip = MCP23017(0x20)
+    adc_chip = MCP3424(0x68, time_scale=1.0)
+    held_chip = HeldMCP3424(0x69)
+    pwm_chip = PCA9685(0x40)
+    smbus = FakeSMBus(1, devices=[chip, adc_chip, held_chip, pwm_chip])
+    other_bus = FakeSMBus(2, devices=[MCP23017(0x20)])
+
+    io = aio.AsyncBoard(IOPi(0x20, bus=smbus))
+    adc = aio.AsyncBoard(ADCPi(0x68, 0x69, 16, bus=smbus))
+    servo = aio.AsyncBoard(Servo(0x40, bus=smbus))
+    other = aio.AsyncBoard(IOPi(0x20, bus=other_bus))
+
+    handle = io.board.get_bus()
+    passed &= check("Bus worker",
+                    io.worker is adc.worker is servo.worker and
+                    other.worker is not io.worker and not handle.locking)
+    passed &= check("Bus key",
+                    aio.bus_key(io.board) == aio.bus_key(adc.board) ==
+                    ("i2c", id(smbus)) and
+                    aio.bus_key(other.board) == ("i2c", id(other_bus)) and
+                    aio.bus_key(object())[0] == "board")
+
+    await io.set_bus_direction(0xFFFF)
+    chip.set_inputs(0x1234)
+    passed &= check("IO Pi read", await io.read_bus() == 0x1234)
+
+    await servo.move(1, 125)
+    on_time, off_time = pwm_chip.get_channel(1)
+    passed &= check("Servo move", off_time - on_time > 0)
+
+    # count the event loop ticks while a 16 bit conversion is in progress
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.002)
+            ticks += 1
+
+    adc_chip.set_input(1, 1.0)  # 2.471 V at the ADC Pi input
+    task = asyncio.ensure_future(ticker())
+    voltage = await adc.read_voltage(1)
+    task.cancel()
+    passed &= check("ADC read", abs(voltage - 2.471) < 0.01)
+    passed &= check("Event loop", ticks >= 5)
+
+    # the worker for the bus runs the IO Pi read after the conversion
+    adc_task = asyncio.ensure_future(adc.read_raw(5))
+    while held_chip.polls < 2:
+        await asyncio.sleep(0.001)
+    io_task = asyncio.ensure_future(io.read_bus())
+    await asyncio.sleep(0.05)
+    waiting = not io_task.done()
+    held_chip.release.set()
+    await adc_task
+    passed &= check("Bus worker order",
+                    waiting and await io_task == 0x1234)
+
+    board = IOPi(0x20, initialise=False, bus=smbus)
+    try:
+        aio.AsyncBoard(board, key=("io",))
+        passed &= check("Locking required", False)
+    except ValueError:
+        passed &= check("Locking required", True)
+    board.close()
+
+    # boards with their own worker read the IO Pi while a conversion on
+    # the same bus is pending, the reads must finish before the conversion
+    i2cbus.set_locking(True)
+    own_io = aio.AsyncBoard(IOPi(0x20, initialise=False, bus=smbus),
+                            key=("io",))
+    own_adc = aio.AsyncBoard(ADCPi(0x68, 0x69, 16, bus=smbus), key=("adc",))
+    held_chip.release.clear()
+    held_chip.polls = 0
+    adc_task = asyncio.ensure_future(own_adc.read_raw(5))
+    while held_chip.polls < 2:
+        await asyncio.sleep(0.001)
+    values = []
+    try:
+        for value in (0x0001, 0x0F0F, 0xABCD):
+            chip.set_inputs(value)
+            values.append(await asyncio.wait_for(own_io.read_bus(), 5))
+    except asyncio.TimeoutError:
+        pass
+    pending = not adc_task.done()
+    held_chip.release.set()
+    await adc_task
+    await own_io.close()
+    await own_adc.close()
+    i2cbus.set_locking(False)
+    passed &= check("Boards during conversion",
+                    values == [0x0001, 0x0F0F, 0xABCD] and pending and
+                    own_io.worker is not own_adc.worker is not io.worker)
+
+    passed &= check("Worker thread",
+                    await io.worker.run(threading.current_thread) is
+                    io.worker.thread)
+
+    try:
+        await adc.read_raw(9)
+        passed &= check("Exception", False)
+    except ValueError:
+        passed &= check("Exception", True)
+
+    async with io:
+        pass
+    await adc.close()
+    await servo.close()
+    await other.close()
+    passed &= check("Close", smbus.closed is False)
+    for board in (io, adc, servo, other):
+        board.worker.thread.join(1)
+    passed &= check("Worker stopped",
+                    not any(board.worker.thread.is_alive()
+                            for board in (io, adc, servo, other)))
+
+    return passed
+
+
+def main():
+    """
+    Main program function
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        passed = loop.run_until_complete(run_checks())
+    finally:
+        loop.close()
+        aio.shutdown()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | bus recording
+
+run with: python3 bus_recording.py
+================================================
+
+This test records the I2C and SPI transactions of IO Pi, ADC Pi, Servo Pi
+and ADC DAC Pi objects on simulated buses, replays the recording to new
+board objects without the simulator and checks that they return the same
+values.  It also checks that recorded errors are raised again and that a
+call that does not match the recording raises ReplayError.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Record check: PASSED
+File size check: PASSED
+Read transactions check: PASSED
+Replay check: PASSED
+Replay complete check: PASSED
+Combined reads check: PASSED
+Recorded error check: PASSED
+Mismatch check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import os
+    import sys
+    import tempfile
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.recording import Recorder, Replay, ReplayError, \
+        read_transactions
+    from abelectronics.simulator import FakeSMBus, FakeSpiDev, MCP23017, \
+        MCP3424, PCA9685, MCP3202, MCP4822
+    from ADCDACPi import ADCDACPi
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def workload(smbus, adc_spi, dac_spi):
+    """
+    Run the same operations on each set of buses
+
+    :return: values read by the board objects
+    :rtype: list
+    """
+    iopi = IOPi(0x20, bus=smbus)
+    adc = ADCPi(0x68, 0x69, 12, bus=smbus)
+    pwm = PWM(0x40, bus=smbus)
+    adcdac = ADCDACPi(1, adc_spi, dac_spi)
+
+    values = []
+    iopi.set_port_direction(0, 0x00)
+    iopi.write_port(0, 0xA5)
+    values.append(iopi.read_port(0))
+    iopi.reset_interrupts()
+    adc.set_conversion_mode(0)
+    for channel in range(1, 5):
+        values.append(adc.read_raw(channel))
+    pwm.set_pwm(1, 0, 1000)
+    values.append(pwm.get_pwm_off_time(1))
+    values.append(adcdac.read_adc_raw(1, 0))
+    adcdac.set_dac_raw(1, 2048)
+
+    iopi.close()
+    adc.close()
+    pwm.close()
+    return values
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "rig.abr")
+
+    adc_chip = MCP3424(0x68, 0)
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), adc_chip,
+                                  MCP3424(0x69, 0), PCA9685(0x40)])
+    adc_chip.set_input(2, 1.5)
+    spi_adc = MCP3202(3.3)
+    spi_adc.set_input(1, 2.0)
+
+    with Recorder(path) as recorder:
+        recorded = workload(recorder.smbus(1, smbus),
+                            recorder.spidev(0, 0, FakeSpiDev(spi_adc)),
+                            recorder.spidev(0, 1, FakeSpiDev(MCP4822())))
+        records = recorder.records
+    passed &= check("Record",
+                    records == smbus.transactions + 2 + 3)
+
+    # 15 byte record header and the register and data bytes
+    passed &= check("File size",
+                    os.path.getsize(path) < 24 + records * 20)
+
+    transactions = list(read_transactions(path))
+    passed &= check("Read transactions",
+                    len(transactions) == records - 3 and
+                    transactions[0].channel == "i2c-1" and
+                    transactions[0].operation == "write_byte_data" and
+                    transactions[-1].channel == "spidev0.1")
+
+    replay = Replay(path)
+    replayed = workload(replay.smbus(1), replay.spidev(0, 0),
+                        replay.spidev(0, 1))
+    passed &= check("Replay", replayed == recorded)
+    passed &= check("Replay complete", replay.remaining() == 0)
+
+    # combined reads are recorded as one i2c_rdwr transaction
+    i2cbus.set_combined_reads(True)
+    with Recorder(path) as recorder:
+        iopi = IOPi(0x20, bus=recorder.smbus(1, smbus))
+        iopi.reset_interrupts()
+        iopi.close()
+    replay = Replay(path)
+    iopi = IOPi(0x20, bus=replay.smbus(1))
+    iopi.reset_interrupts()
+    iopi.close()
+    passed &= check("Combined reads",
+                    "i2c_rdwr" in [t.operation for t in
+                                   read_transactions(path)] and
+                    replay.remaining() == 0)
+    i2cbus.set_combined_reads(False)
+
+    with Recorder(path) as recorder:
+        bus = recorder.smbus(1, smbus)
+        try:
+            bus.read_byte_data(0x50, 0x00)
+        except IOError:
+            pass
+    try:
+        Replay(path).smbus(1).read_byte_data(0x50, 0x00)
+        passed &= check("Recorded error", False)
+    except IOError:
+        passed &= check("Recorded error", True)
+
+    try:
+        Replay(path).smbus(1).read_byte_data(0x51, 0x00)
+        passed &= check("Mismatch", False)
+    except ReplayError:
+        passed &= check("Mismatch", True)
+
+    os.remove(path)
+    os.rmdir(directory)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
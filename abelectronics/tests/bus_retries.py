@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | bus retries
+
+run with: python3 bus_retries.py
+================================================
+
+This test sets an abelectronics.retry.RetryPolicy on the shared I2C bus and
+uses abelectronics.simulator.FaultInjector to make the simulated devices
+fail.  It checks that transient errors are retried, that other errors and
+device probes are not, that a failed device stops retrying when it has
+used its budget and that other devices carry on while a device is backing
+off.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Lost writes check: PASSED
+Retried writes check: PASSED
+Retry counters check: PASSED
+Combined reads check: PASSED
+Other errors check: PASSED
+Probe check: PASSED
+Budget check: PASSED
+Backoff without bus lock check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import errno
+import threading
+import time
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.retry import RetryPolicy
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP23017, PCA9685
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+WRITES = 200
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def lost_writes(policy):
+    """
+    Set the PWM off time on a bus that loses 10% of its messages and count
+    the writes that did not reach the device
+
+    :param policy: retry policy or None
+    :type policy: RetryPolicy
+    :return: number of lost writes
+    :rtype: int
+    """
+    i2cbus.set_retry_policy(policy)
+    smbus = FakeSMBus(1)
+    chip = smbus.add_device(PCA9685(0x40))
+    pwm = PWM(0x40, bus=smbus)
+    smbus.faults = FaultInjector(nack_rate=0.05, error_rate=0.05, seed=3)
+    lost = 0
+    for value in range(WRITES):
+        try:
+            pwm.set_pwm(1, 0, value)
+        except IOError:
+            pass
+        if chip.registers[0x08] | (chip.registers[0x09] << 8) != value:
+            lost += 1
+    pwm.close()
+    return lost
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    passed &= check("Lost writes", lost_writes(None) > 0)
+
+    policy = RetryPolicy(retries=5, backoff=0.0001, budget=1000)
+    passed &= check("Retried writes", lost_writes(policy) == 0)
+
+    stats = policy.snapshot()[1][0x40]
+    passed &= check("Retry counters",
+                    stats["retries"] > 0 and stats["recovered"] > 0 and
+                    stats["failed"] == 0)
+
+    # a failed register read retries the whole group of reads
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20)])
+    iopi = IOPi(0x20, bus=smbus)
+    iopi.set_interrupt_on_port(0, 0xFF)
+    smbus.faults = FaultInjector(nack_rate=0.05, seed=4)
+    results = []
+    for _ in range(20):
+        iopi.reset_interrupts()
+        results.append(iopi.read_interrupt_capture(0))
+    passed &= check("Combined reads", results == [0] * 20)
+
+    policy = RetryPolicy(retries=3, backoff=0.0001)
+    i2cbus.set_retry_policy(policy)
+    smbus.faults = FaultInjector(error_rate=1.0, error=errno.EINVAL)
+    smbus.reset_counters()
+    try:
+        iopi.read_port(0)
+        passed &= check("Other errors", False)
+    except OSError:
+        passed &= check("Other errors", smbus.transactions == 1)
+
+    # a NACK from write_quick means there is no device at the address
+    smbus.faults = None
+    smbus.reset_counters()
+    handle = i2cbus.get_smbus(smbus)
+    try:
+        handle.write_quick(0x21)
+    except OSError:
+        pass
+    passed &= check("Probe", smbus.transactions == 1)
+    i2cbus.release_smbus(handle)
+
+    policy = RetryPolicy(retries=3, backoff=0.0001, budgets={0x20: 5})
+    i2cbus.set_retry_policy(policy)
+    smbus.faults = FaultInjector(nack_rate=1.0)
+    smbus.reset_counters()
+    failures = 0
+    for _ in range(5):
+        try:
+            iopi.read_port(0)
+        except OSError:
+            failures += 1
+    stats = policy.snapshot()[1][0x20]
+    # the first read uses 3 retries and the second the last 2, then the
+    # budget is used and the last 3 reads are not retried
+    passed &= check("Budget",
+                    failures == 5 and smbus.transactions == 4 + 3 + 3 and
+                    stats["retries"] == 5 and stats["failed"] == 2 and
+                    stats["budget_exceeded"] == 4)
+
+    # a long backoff on one device does not hold up another device
+    i2cbus.set_locking(True)
+    i2cbus.set_retry_policy(RetryPolicy(retries=1, backoff=0.3))
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), MCP23017(0x21)])
+    failing = IOPi(0x20, bus=smbus)
+    working = IOPi(0x21, bus=smbus)
+    smbus.faults = FaultInjector(nack_rate=1.0, addresses=[0x20])
+
+    def read_failing():
+        try:
+            failing.read_port(0)
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=read_failing)
+    thread.start()
+    time.sleep(0.05)  # the failing read is backing off
+    start = time.monotonic()
+    working.read_port(0)
+    elapsed = time.monotonic() - start
+    thread.join()
+    passed &= check("Backoff without bus lock", elapsed < 0.1)
+
+    i2cbus.set_retry_policy(None)
+    i2cbus.set_locking(False)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | bus scanner
+
+run with: python3 bus_scanner.py
+================================================
+
+This test scans a simulated I2C bus with IO expanders, ADCs, an RTC, a PWM
+controller and I2C Switches, and checks that each chip is identified, that
+the devices behind each switch channel are found, that the switch channels
+are restored and that the inventory file is used in place of a scan.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Devices found check: PASSED
+Chip types check: PASSED
+Switch channels check: PASSED
+Switch restored check: PASSED
+Inventory file check: PASSED
+Cached inventory check: PASSED
+Create boards check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import os
+    import sys
+    import tempfile
+    sys.path.append("../..")
+    from abelectronics import scanner
+    from abelectronics.simulator import FakeSMBus, MCP23017, PCA9535, \
+        MCP3424, DS1307, PCA9685, PCA9546A
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+    from IOZero32 import IOZero32
+    from RTCPi import RTC
+    from ServoPi import PWM
+    from I2CSwitch import I2CSwitch
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    switch = PCA9546A(0x70)
+    nested = PCA9546A(0x71)
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), PCA9535(0x21),
+                                  MCP23017(0x22), PCA9535(0x23),
+                                  PCA9685(0x40), DS1307(0x68), switch])
+    switch.attach(1, MCP23017(0x24))
+    switch.attach(2, MCP3424(0x6A, 0))
+    switch.attach(2, MCP3424(0x6B, 0))
+    switch.attach(4, nested)
+    nested.attach(1, PCA9685(0x41))
+
+    # configured by the drivers, the power-on state for 0x20 and 0x21
+    IOPi(0x22, bus=smbus)
+    zero = IOZero32(0x23, bus=smbus)
+    zero.set_bus_direction(0x0000)
+    zero.write_bus(0x0000)
+    switch.control = 0x05
+
+    devices = scanner.scan(smbus)
+    chips = dict(((device.address, device.path), device.chip)
+                 for device in devices)
+
+    passed &= check("Devices found",
+                    [device.address for device in devices] ==
+                    [0x20, 0x21, 0x22, 0x23, 0x40, 0x68, 0x70,
+                     0x24, 0x6A, 0x6B, 0x71, 0x41])
+
+    passed &= check("Chip types",
+                    chips[(0x20, ())] == "MCP23017" and
+                    chips[(0x21, ())] == "PCA9535" and
+                    chips[(0x22, ())] == "MCP23017" and
+                    chips[(0x23, ())] == "PCA9535" and
+                    chips[(0x40, ())] == "PCA9685" and
+                    chips[(0x68, ())] == "DS1307" and
+                    chips[(0x70, ())] == "PCA9546A")
+
+    passed &= check("Switch channels",
+                    chips[(0x24, ((0x70, 1),))] == "MCP23017" and
+                    chips[(0x6A, ((0x70, 2),))] == "MCP3424" and
+                    chips[(0x6B, ((0x70, 2),))] == "MCP3424" and
+                    chips[(0x71, ((0x70, 4),))] == "PCA9546A" and
+                    chips[(0x41, ((0x70, 4), (0x71, 1)))] == "PCA9685")
+
+    passed &= check("Switch restored",
+                    switch.control == 0x05 and nested.control == 0x00)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "i2c-1.json")
+    scanner.save_inventory(devices, path)
+    passed &= check("Inventory file", scanner.load_inventory(path) == devices)
+
+    smbus.reset_counters()
+    cached = scanner.get_inventory(1, path)
+    passed &= check("Cached inventory",
+                    cached == devices and smbus.transactions == 0)
+
+    switch.control = 0x00
+    types = [type(board) for device, board in
+             scanner.create_boards(devices, smbus)]
+    switch.control = 0x02
+    adcs = scanner.create_boards(devices, smbus, ((0x70, 2),))
+    passed &= check("Create boards",
+                    types == [IOPi, IOZero32, IOPi, IOZero32, PWM, RTC,
+                              I2CSwitch] and
+                    len(adcs) == 1 and isinstance(adcs[0][1], ADCPi) and
+                    adcs[0][0].address == 0x6A)
+
+    os.remove(path)
+    os.rmdir(directory)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
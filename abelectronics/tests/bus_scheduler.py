@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | bus scheduler
+
+run with: python3 bus_scheduler.py
+================================================
+
+This test checks the abelectronics.scheduler.BusScheduler bus lock.
+Threads wait for the bus with different priorities and deadlines and must
+get it in priority order, then deadline order, then the order they asked
+for it.  It then enables scheduling on a simulated bus with a servo
+control loop at REALTIME priority and two ADC Pi loggers at BACKGROUND
+priority, and checks that the servo moves wait less for the bus than the
+ADC polling reads.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Priority order check: PASSED
+Deadline order check: PASSED
+Arrival order check: PASSED
+Reentrant check: PASSED
+Timeout check: PASSED
+Priority blocks check: PASSED
+Deadline misses check: PASSED
+Shared bus check: PASSED
+Servo with ADC loggers check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import threading
+import time
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus, scheduler
+    from abelectronics.scheduler import BusScheduler
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP3424, PCA9685, constant_latency
+    from ADCPi import ADCPi
+    from ServoPi import Servo
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def grant_order(requests):
+    """
+    Start a thread for each request while the bus is held, one after the
+    other, then release the bus and record the order the threads get it
+
+    :param requests: name, priority level and deadline for each thread
+    :type requests: list
+    :return: names in the order the threads got the bus
+    :rtype: list
+    """
+    lock = BusScheduler()
+    order = []
+
+    def request(name, level, deadline):
+        with scheduler.priority(level, deadline):
+            with lock:
+                order.append(name)
+
+    lock.acquire()
+    threads = []
+    for name, level, deadline in requests:
+        thread = threading.Thread(target=request,
+                                  args=(name, level, deadline))
+        thread.start()
+        threads.append(thread)
+        timeout = time.monotonic() + 5
+        while lock.waiting() < len(threads) and time.monotonic() < timeout:
+            time.sleep(0.001)
+    lock.release()
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    passed &= check("Priority order", grant_order([
+        ("logger", scheduler.BACKGROUND, None),
+        ("display", scheduler.NORMAL, None),
+        ("servo", scheduler.REALTIME, None),
+        ("logger2", scheduler.BACKGROUND, None)]) ==
+        ["servo", "display", "logger", "logger2"])
+
+    passed &= check("Deadline order", grant_order([
+        ("none", scheduler.REALTIME, None),
+        ("late", scheduler.REALTIME, 5.0),
+        ("soon", scheduler.REALTIME, 1.0)]) == ["soon", "late", "none"])
+
+    passed &= check("Arrival order", grant_order([
+        ("first", scheduler.NORMAL, None),
+        ("second", scheduler.NORMAL, None),
+        ("third", scheduler.NORMAL, None)]) == ["first", "second", "third"])
+
+    # the same thread can take the bus again, other threads wait until
+    # it has been released as many times as it was taken
+    lock = BusScheduler()
+    taken = []
+    with lock:
+        with lock:
+            thread = threading.Thread(
+                target=lambda: taken.append(lock.acquire(False)))
+            thread.start()
+            thread.join()
+    thread = threading.Thread(target=lambda: taken.append(lock.acquire()))
+    thread.start()
+    thread.join()
+    try:
+        lock.release()
+        released = True
+    except RuntimeError:
+        released = False
+    passed &= check("Reentrant", taken == [False, True] and not released)
+
+    lock = BusScheduler()
+    results = []
+    lock.acquire()
+    thread = threading.Thread(
+        target=lambda: results.append(lock.acquire(timeout=0.01)))
+    thread.start()
+    thread.join()
+    lock.release()
+    passed &= check("Timeout", results == [False] and lock.waiting() == 0 and
+                    lock.acquire(False))
+    lock.release()
+
+    levels = [scheduler.get_thread_priority()]
+    with scheduler.priority(scheduler.REALTIME, deadline=0.5):
+        with scheduler.priority(scheduler.BACKGROUND):
+            levels.append(scheduler.get_thread_priority())
+        level, deadline = scheduler.get_thread_priority()
+    levels.append(scheduler.get_thread_priority())
+    try:
+        scheduler.set_thread_priority("high")
+        invalid = False
+    except ValueError:
+        invalid = True
+    passed &= check("Priority blocks", levels == [
+        (scheduler.NORMAL, None), (scheduler.BACKGROUND, None),
+        (scheduler.NORMAL, None)] and level == scheduler.REALTIME and
+        0 < deadline - time.perf_counter() <= 0.5 and invalid)
+
+    lock = BusScheduler()
+    with scheduler.priority(scheduler.REALTIME, deadline=0.0):
+        time.sleep(0.001)
+        with lock:
+            pass
+    with lock:
+        pass
+    counters = lock.snapshot()
+    passed &= check("Deadline misses",
+                    counters[scheduler.REALTIME]["deadline_misses"] == 1 and
+                    counters[scheduler.NORMAL]["transactions"] == 1 and
+                    counters[scheduler.NORMAL]["deadline_misses"] == 0)
+
+    # scheduling on a shared bus, the lock is swapped when it is enabled
+    i2cbus.set_locking(True)
+    i2cbus.set_scheduling(True)
+    # the conversions take a tenth of the real time so the loggers read
+    # several times while the servo loop runs
+    smbus = FakeSMBus(1, [PCA9685(0x40), MCP3424(0x68, 0.1),
+                          MCP3424(0x69, 0.1)])
+    servo = Servo(0x40, bus=smbus)
+    adc = ADCPi(0x68, 0x69, 18, bus=smbus)
+    handle = i2cbus.get_smbus(smbus)
+    i2cbus.reset_statistics()
+    with scheduler.priority(scheduler.REALTIME):
+        servo.move(1, 125)
+    passed &= check("Shared bus", isinstance(handle.lock, BusScheduler) and
+                    i2cbus.get_schedule_statistics() == {1: {
+                        scheduler.REALTIME: {
+                            "transactions": 1, "waits": 0,
+                            "wait_time": 0.0, "max_wait": 0.0,
+                            "deadline_misses": 0}}})
+
+    # each I2C message takes 0.5 ms, the loggers keep the bus busy
+    smbus.faults = FaultInjector(latency=constant_latency(0.0005))
+    smbus.devices[0x68].set_input(1, 1.0)
+    smbus.devices[0x69].set_input(1, 2.0)
+    stop = threading.Event()
+    readings = {1: set(), 5: set()}
+
+    def log(channel):
+        scheduler.set_thread_priority(scheduler.BACKGROUND)
+        while not stop.is_set():
+            readings[channel].add(adc.read_raw(channel))
+
+    threads = [threading.Thread(target=log, args=(channel,))
+               for channel in (1, 5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    i2cbus.reset_statistics()
+    for position in range(50):
+        with scheduler.priority(scheduler.REALTIME):
+            for channel in range(1, 5):
+                servo.move(channel, position)
+        time.sleep(0.005)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    counters = handle.lock.snapshot()
+    realtime = counters[scheduler.REALTIME]
+    background = counters[scheduler.BACKGROUND]
+    passed &= check("Servo with ADC loggers",
+                    realtime["transactions"] == 200 and
+                    realtime["wait_time"] / realtime["transactions"] <
+                    background["wait_time"] / background["transactions"] and
+                    abs(servo.get_position(4) - 49) <= 1 and
+                    readings == {1: set([64000]), 5: set([128000])})
+
+    i2cbus.release_smbus(handle)
+    adc.close()
+    servo.close()
+    i2cbus.set_scheduling(False)
+    i2cbus.set_locking(False)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | combined register reads
+
+run with: python3 combined_reads.py
+================================================
+
+This test checks that operations which read several registers, such as
+IOPi.reset_interrupts and PWM.get_pwm_off_time, read each register
+separately by default and send the reads as one i2c_rdwr call after
+abelectronics.i2cbus.set_combined_reads(True).  The bus is simulated with
+abelectronics.simulator.  smbus2 must be installed for the combined reads.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Separate reads check: PASSED
+Combined reads check: PASSED
+Interrupt reset check: PASSED
+PWM off time check: PASSED
+PWM on time check: PASSED
+Statistics check: PASSED
+Disable check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, PCA9685
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    iochip = MCP23017(0x20)
+    pwmchip = PCA9685(0x40)
+    smbus = FakeSMBus(1, devices=[iochip, pwmchip], trace=True)
+
+    iopi = IOPi(0x20, bus=smbus)
+    pwm = PWM(0x40, bus=smbus)
+    pwm.set_pwm(1, 100, 3000)
+
+    smbus.reset_counters()
+    iopi.reset_interrupts()
+    passed &= check("Separate reads", smbus.transactions == 2)
+
+    i2cbus.set_combined_reads(True)
+
+    iopi.set_interrupt_on_pin(1, 1)
+    iochip.set_input(1, 0)
+    smbus.reset_counters()
+    del smbus.trace[:]
+    iopi.reset_interrupts()
+    passed &= check("Combined reads", smbus.transactions == 1 and
+                    smbus.trace == ["W 0x20 0x10", "R 0x20 0x00",
+                                    "W 0x20 0x11", "R 0x20 0x00"])
+    passed &= check("Interrupt reset", iopi.read_interrupt_status(0) == 0)
+
+    smbus.reset_counters()
+    passed &= check("PWM off time", pwm.get_pwm_off_time(1) == 3000 and
+                    smbus.transactions == 1)
+    passed &= check("PWM on time", pwm.get_pwm_on_time(1) == 100)
+
+    i2cbus.reset_statistics()
+    i2cbus.set_instrumentation(True)
+    pwm.get_pwm_off_time(2)
+    i2cbus.set_instrumentation(False)
+    registers = i2cbus.get_statistics()[1][0x40]["registers"]
+    passed &= check("Statistics", registers[0x0C]["count"] == 1 and
+                    registers[0x0D]["bytes_read"] == 1)
+
+    i2cbus.set_combined_reads(False)
+    smbus.reset_counters()
+    pwm.get_pwm_off_time(1)
+    passed &= check("Disable", smbus.transactions == 2)
+
+    iopi.close()
+    pwm.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
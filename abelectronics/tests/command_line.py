@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | command line tool
+
+run with: python3 command_line.py
+================================================
+
+This test runs the scan, dump, sample and bench commands of the
+abelectronics command line tool on a simulated bus with an IO Pi, a Servo
+PWM Pi and an ADC Pi.  It checks the output of each command, that dump
+does not write to the device and that bench with a rig file only runs the
+methods that read from the devices.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Scan check: PASSED
+Dump check: PASSED
+Dump restore check: PASSED
+Dump ADC output check: PASSED
+Sample CSV check: PASSED
+Sample binary check: PASSED
+Sample rate check: PASSED
+Bench check: PASSED
+Bench rig check: PASSED
+Errors check: PASSED
+Bus released check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import contextlib
+    import io
+    import json
+    import os
+    import struct
+    import sys
+    import tempfile
+    import time
+    sys.path.append("../..")
+    from abelectronics import cli, i2cbus, snapshot
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424, \
+        PCA9685
+    from IOPi import IOPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def run(*argv):
+    """
+    Run a command and capture the console output
+
+    :return: exit status and the lines written to stdout
+    :rtype: tuple
+    """
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), \
+            contextlib.redirect_stderr(io.StringIO()):
+        status = cli.main(list(argv))
+    return status, out.getvalue().splitlines()
+
+
+def main():
+    """
+    Main program function
+    """
+    passed = True
+    iopi = MCP23017(0x20)
+    pwm = PCA9685(0x40)
+    smbus = FakeSMBus(1, devices=[iopi, pwm, MCP3424(0x68, 0),
+                                  MCP3424(0x69, 0)], trace=True)
+    i2cbus.set_smbus_factory(lambda bus: smbus)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "file")
+
+    status, lines = run("scan", "-b", "1", "-o", path)
+    passed &= check("Scan", status == 0 and
+                    [line.split()[:2] for line in lines] ==
+                    [["0x20", "MCP23017"], ["0x40", "PCA9685"],
+                     ["0x68", "MCP3424"], ["0x69", "MCP3424"]])
+
+    board = IOPi(0x20, bus=1)
+    board.set_port_direction(0, 0x00)
+    board.write_port(0, 0x5A)
+    board.close()
+    registers = bytes(iopi.registers)
+    del smbus.trace[:]
+    status, lines = run("dump", "0x20", "-b", "1", "-o", path)
+    passed &= check("Dump", status == 0 and
+                    lines[0].split() == ["0x20", "MCP23017", "IOPi"] and
+                    "0x14  0x5a" in lines and
+                    iopi.registers == registers and
+                    not [entry for entry in smbus.trace
+                         if entry.startswith("W") and
+                         len(entry.split()) > 3])
+
+    iopi.registers[0x14] = 0x00
+    board = IOPi(0x20, initialise=False, bus=1)
+    written = snapshot.restore(board, path)
+    board.close()
+    passed &= check("Dump restore", written == 1 and
+                    iopi.registers[0x14] == 0x5A)
+
+    # an ADC Pi snapshot could not be restored so it is not saved
+    adc_path = os.path.join(directory, "adc.json")
+    status, lines = run("dump", "0x68", "-b", "1", "-o", adc_path)
+    passed &= check("Dump ADC output", status == 1 and lines == [] and
+                    not os.path.exists(adc_path))
+
+    status, lines = run("sample", "-b", "1", "-c", "1", "5", "-n", "5",
+                        "--raw")
+    passed &= check("Sample CSV", status == 0 and len(lines) == 6 and
+                    lines[0] == "time,channel1,channel5" and
+                    all(len(line.split(",")) == 3 for line in lines[1:]))
+
+    status, lines = run("sample", "-b", "1", "-c", "1", "2", "3", "-n", "4",
+                        "-f", "binary", "-o", path)
+    with open(path, "rb") as sample_file:
+        data = sample_file.read()
+    records = list(struct.iter_unpack("<4d", data))
+    passed &= check("Sample binary", status == 0 and len(data) == 128 and
+                    records[0][0] == 0.0 and
+                    all(a[0] <= b[0] for a, b in zip(records, records[1:])))
+
+    start = time.perf_counter()
+    status, lines = run("sample", "-b", "1", "-r", "200", "-n", "11")
+    elapsed = time.perf_counter() - start
+    passed &= check("Sample rate", status == 0 and
+                    0.05 <= float(lines[-1].split(",")[0]) < 0.1 and
+                    elapsed >= 0.05)
+
+    status, lines = run("bench", "-b", "IOPi", "-m", "write_pin",
+                        "-d", "0.01", "-f", "json", "-o", path)
+    with open(path) as results_file:
+        results = json.load(results_file)["results"]
+    passed &= check("Bench", status == 0 and len(results) == 1 and
+                    results[0]["transactions_per_call"] == 2)
+
+    rig_path = os.path.join(directory, "rig.json")
+    with open(rig_path, "w") as rig_file:
+        json.dump({"bus": 1, "boards": [
+            {"name": "io", "type": "IOPi", "address": "0x20",
+             "initialise": False},
+            {"name": "pwm", "type": "PWM", "address": "0x40"}]}, rig_file)
+    registers = bytes(iopi.registers)
+    status, lines = run("bench", "--rig", rig_path, "-d", "0.002",
+                        "-f", "json", "-o", path)
+    with open(path) as results_file:
+        results = json.load(results_file)["results"]
+    read_pin = [result for result in results
+                if result["method"] == "read_pin"]
+    passed &= check("Bench rig", status == 0 and
+                    set(result["board"] for result in results) ==
+                    set(["io", "pwm"]) and
+                    all(result["method"].startswith(("get_", "read_",
+                                                     "is_"))
+                        for result in results) and
+                    read_pin[0]["transactions_per_call"] == 1 and
+                    iopi.registers == registers)
+
+    status, lines = run("dump", "0x30", "-b", "1")
+    try:
+        run("flash")
+        passed &= check("Errors", False)
+    except SystemExit as err:
+        passed &= check("Errors", status == 1 and err.code == 2)
+
+    passed &= check("Bus released", i2cbus.open_buses() == {})
+
+    i2cbus.set_smbus_factory(None)
+    os.remove(path)
+    os.remove(rig_path)
+    os.rmdir(directory)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | device daemon
+
+run with: python3 device_daemon.py
+================================================
+
+This test checks that abelectronics.daemon serves boards to clients from
+abelectronics.remote, that calls from several client threads do not lose
+read-modify-write updates, that identical reads in a batch are sent to
+the bus once and that errors are raised in the client.  A failed Servo Pi
+write in a batch must only fail that request, a second daemon must not
+remove the socket of a running daemon and a socket left behind by a
+daemon that stopped must be replaced.  The bus is
+simulated with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Encoding check: PASSED
+Board list check: PASSED
+IO Pi check: PASSED
+ADC Pi check: PASSED
+Servo Pi check: PASSED
+Concurrent clients check: PASSED
+Merged reads check: PASSED
+Error check: PASSED
+Board type check: PASSED
+Batch write error check: PASSED
+Running daemon check: PASSED
+Stale socket check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    import os
+    import socket
+    import stat
+    import struct
+    import tempfile
+    import threading
+    sys.path.append("../..")
+    from abelectronics import daemon, remote
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP23017, MCP3424, PCA9685
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    values = [None, True, False, -5, 2.5, "text", [1, [2, "x"]]]
+    passed &= check("Encoding", daemon.decode_all(
+        bytes(daemon.encode(values)))[0] == values)
+
+    iochip = MCP23017(0x20)
+    adc = MCP3424(0x68, 0)
+    pwmchip = PCA9685(0x40)
+    smbus = FakeSMBus(1, devices=[iochip, adc, MCP3424(0x69, 0), pwmchip])
+    path = os.path.join(tempfile.mkdtemp(), "daemon.sock")
+    boards = [("io", "IOPi", (0x20,)),
+              ("adc", "ADCPi", (0x68, 0x69, 12)),
+              ("pwm", "PWM", (0x40,))]
+
+    with daemon.DeviceServer(boards, path, smbus) as server:
+        connection = remote.Connection(path)
+        passed &= check("Board list", connection.boards() ==
+                        [("io", "IOPi"), ("adc", "ADCPi"), ("pwm", "PWM")])
+
+        iobus = remote.IOPi("io", connection)
+        iobus.set_bus_direction(0x0000)
+        iobus.write_bus(0x1234)
+        passed &= check("IO Pi", iobus.read_bus() == 0x1234 and
+                        iochip.pins() == 0x1234)
+
+        adc.set_input(1, 1.0)
+        adcpi = remote.ADCPi("adc", connection)
+        passed &= check("ADC Pi", abs(adcpi.read_voltage(1) - 2.471) < 0.01)
+
+        pwm = remote.PWM("pwm", path=path)
+        pwm.set_pwm(1, 0, 1000)
+        passed &= check("Servo Pi", pwmchip.get_channel(1) == (0, 1000) and
+                        pwm.get_pwm_off_time(1) == 1000)
+        pwm.close()
+
+        # each thread sets and clears its own pin with read-modify-write
+        iobus.write_bus(0x0000)
+
+        def toggle(pin):
+            client = remote.IOPi("io", path=path)
+            for _ in range(50):
+                client.write_pin(pin, 1)
+                client.write_pin(pin, 0)
+            client.write_pin(pin, 1)
+            client.close()
+
+        threads = [threading.Thread(target=toggle, args=(pin,))
+                   for pin in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        passed &= check("Concurrent clients", iochip.pins() == 0x00FF)
+
+        # many clients reading at once
+        clients = [remote.IOPi("io", path=path) for _ in range(8)]
+        server.reset_counters()
+        smbus.reset_counters()
+        results = []
+
+        def poll(client):
+            for _ in range(50):
+                results.append(client.read_bus())
+            client.close()
+
+        threads = [threading.Thread(target=poll, args=(client,))
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counters = server.get_counters()
+        passed &= check("Merged reads", set(results) == {0x00FF} and
+                        smbus.transactions ==
+                        counters["requests"] - counters["merged"])
+
+        try:
+            iobus.write_pin(17, 1)
+            error = False
+        except ValueError:
+            error = True
+        passed &= check("Error", error)
+
+        try:
+            remote.ADCPi("io", connection)
+            wrong_type = False
+        except ValueError:
+            wrong_type = True
+        passed &= check("Board type", wrong_type)
+
+        # send the requests together so they run in one batch behind a slow
+        # ADC conversion, the writes to the Servo Pi fail when they are sent
+        adc.time_scale = 50.0
+        smbus.faults = FaultInjector(error_rate=1.0, addresses=[0x40])
+        requests = [(1, 1, [1]),  # adc read_raw
+                    (0, 17, []),  # io read_bus
+                    (2, 1, [1, 0, 2000]),  # pwm set_pwm
+                    (0, 5, [])]  # io get_bus_direction
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+        messages = b""
+        for request_id, (board_id, method, args) in enumerate(requests):
+            body = struct.pack("<IHB", request_id, board_id, method)
+            for arg in args:
+                body += bytes(daemon.encode(arg))
+            messages += struct.pack("<I", len(body)) + body
+        client.sendall(messages)
+        statuses = {}
+        for _ in requests:
+            body = daemon.receive_message(client)
+            request_id, status = struct.unpack_from("<IB", body)
+            statuses[request_id] = status
+        client.close()
+        smbus.faults = None
+        adc.time_scale = 0.0
+        passed &= check("Batch write error", statuses == {
+            0: daemon.OK, 1: daemon.OK, 2: daemon.ERROR, 3: daemon.OK})
+
+        second = daemon.DeviceServer([], path, smbus)
+        try:
+            second.start()
+            running = False
+        except OSError:
+            running = True
+        second.close()
+        passed &= check("Running daemon", running and
+                        iobus.read_bus() == 0x00FF)
+
+        connection.close()
+
+    # a socket file that nothing is listening on
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    umask = os.umask(0o022)
+    with daemon.DeviceServer(boards, path, smbus):
+        connection = remote.Connection(path)
+        passed &= check("Stale socket", len(connection.boards()) == 3 and
+                        stat.S_IMODE(os.stat(path).st_mode) == 0o600 and
+                        os.umask(umask) == 0o022)
+        connection.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
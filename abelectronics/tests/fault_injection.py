@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | fault injection
+
+run with: python3 fault_injection.py
+================================================
+
+This test adds NACKs, I/O errors, latency and stuck ADC conversions to
+simulated devices with abelectronics.simulator.FaultInjector and checks
+the errors seen by the libraries.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+NACK check: PASSED
+I/O error check: PASSED
+Address filter check: PASSED
+Repeatable check: PASSED
+Latency check: PASSED
+Stuck conversion check: PASSED
+PWM write error check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import errno
+    import sys
+    import time
+    sys.path.append("../..")
+    from abelectronics.simulator import FakeSMBus, FaultInjector, \
+        MCP23017, MCP3424, PCA9685, constant_latency
+    from ADCPi import ADCPi, ADCTimeoutError
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def fault_errors(faults, calls):
+    """
+    Read a simulated IO Pi several times and get the errors
+
+    :param faults: fault injector
+    :type faults: FaultInjector
+    :param calls: number of reads
+    :type calls: int
+    :return: errno for each read, None for a read that passed
+    :rtype: list
+    """
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20)])
+    iopi = IOPi(0x20, bus=smbus)
+    smbus.faults = faults
+    results = []
+    for _ in range(calls):
+        try:
+            iopi.read_port(0)
+            results.append(None)
+        except OSError as err:
+            results.append(err.errno)
+    return results
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), PCA9685(0x40)],
+                      trace=True)
+    iopi = IOPi(0x20, bus=smbus)
+    pwm = PWM(0x40, bus=smbus)
+
+    smbus.faults = FaultInjector(nack_rate=1.0)
+    del smbus.trace[:]
+    try:
+        iopi.read_port(0)
+        passed &= check("NACK", False)
+    except OSError as err:
+        passed &= check("NACK",
+                        err.errno == errno.EREMOTEIO and
+                        smbus.trace == ["W 0x20 NACK"] and
+                        smbus.faults.nacks == 1)
+
+    smbus.faults = FaultInjector(error_rate=1.0)
+    try:
+        iopi.read_port(0)
+        passed &= check("I/O error", False)
+    except OSError as err:
+        passed &= check("I/O error",
+                        err.errno == errno.ETIMEDOUT and
+                        smbus.faults.errors == 1)
+
+    smbus.faults = FaultInjector(error_rate=1.0, addresses=[0x40])
+    iopi.read_port(0)
+    passed &= check("Address filter", smbus.faults.errors == 0)
+
+    first = fault_errors(FaultInjector(0.1, 0.1, seed=5), 200)
+    second = fault_errors(FaultInjector(0.1, 0.1, seed=5), 200)
+    passed &= check("Repeatable",
+                    first == second and
+                    errno.EREMOTEIO in first and errno.ETIMEDOUT in first and
+                    None in first)
+
+    smbus.faults = FaultInjector(latency=constant_latency(0.002))
+    start = time.monotonic()
+    iopi.read_port(0)  # a write message and a read message
+    elapsed = time.monotonic() - start
+    passed &= check("Latency",
+                    elapsed >= 0.004 and
+                    abs(smbus.faults.delay - 0.004) < 1e-9)
+    smbus.faults = None
+
+    adc_bus = FakeSMBus(1)
+    chip = adc_bus.add_device(MCP3424(0x68, 0.0))
+    adc_bus.add_device(MCP3424(0x69, 0.0))
+    adc = ADCPi(0x68, 0x69, 12, adc_bus)
+    adc.read_raw(1)
+    adc.set_conversion_mode(0)
+    chip.stuck_rate = 1.0
+    try:
+        adc.read_raw(1)
+        passed &= check("Stuck conversion", False)
+    except ADCTimeoutError:
+        chip.stuck_rate = 0.0
+        # the next conversion completes
+        passed &= check("Stuck conversion",
+                        adc.read_raw(1) == 0 and chip.stuck_conversions > 0)
+
+    pwm.set_pwm(1, 0, 1000)
+    smbus.faults = FaultInjector(error_rate=1.0)
+    try:
+        pwm.set_pwm(1, 0, 2000)
+        raised = False
+    except IOError:
+        raised = True
+    smbus.faults = None
+    passed &= check("PWM write error",
+                    raised and pwm.get_pwm_off_time(1) == 1000)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | instrumentation
+
+run with: python3 instrumentation.py
+================================================
+
+This test checks that the shared I2C bus records the transactions, bytes,
+errors and latency for each device and register when instrumentation is
+enabled, that the counters can be reset and that the SMBus methods are
+bound directly when instrumentation is disabled.  The bus is simulated
+with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Disabled binding check: PASSED
+Register count check: PASSED
+Byte count check: PASSED
+Device total check: PASSED
+Histogram check: PASSED
+ADC polling check: PASSED
+Error count check: PASSED
+Reset check: PASSED
+Stopped recording check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), MCP3424(0x68, 0),
+                                  MCP3424(0x69, 0)])
+    iopi = IOPi(0x20, bus=smbus)
+    adc = ADCPi(0x68, 0x69, 12, bus=smbus)
+    handle = i2cbus.get_smbus(smbus)
+    passed &= check("Disabled binding",
+                    handle.write_byte_data == smbus.write_byte_data)
+
+    i2cbus.reset_statistics()
+    i2cbus.set_instrumentation(True)
+    smbus.reset_counters()
+
+    iopi.set_port_direction(0, 0x00)
+    for _ in range(10):
+        iopi.write_pin(1, 1)
+
+    stats = i2cbus.get_statistics()[1][0x20]
+    registers = stats["registers"]
+    # IODIRA write, then a read and a write of GPIOA for each write_pin
+    passed &= check("Register count",
+                    registers[0x00]["count"] == 1 and
+                    registers[0x12]["count"] == 20)
+
+    counters = smbus.get_counters()
+    passed &= check("Byte count",
+                    stats["bytes_written"] == counters["bytes_written"] and
+                    stats["bytes_read"] == counters["bytes_read"])
+
+    passed &= check("Device total",
+                    stats["count"] == counters["transactions"] and
+                    stats["count"] == sum(r["count"]
+                                          for r in registers.values()))
+
+    passed &= check("Histogram",
+                    sum(stats["histogram"]) == stats["count"] and
+                    stats["max_time"] > 0 and
+                    stats["total_time"] >= stats["max_time"])
+
+    adc.set_conversion_mode(0)
+    adc.read_raw(1)
+    adc_stats = i2cbus.get_statistics()[1][0x68]["registers"]
+    # a write to start the conversion then a read for each poll, using the
+    # configuration byte as the register
+    polls = sum(r["count"] for register, r in adc_stats.items()
+                if register is not None)
+    passed &= check("ADC polling",
+                    adc_stats[None]["count"] >= 1 and polls >= 1)
+
+    try:
+        handle.read_byte_data(0x40, 0x00)
+    except IOError:
+        pass
+    missing = i2cbus.get_statistics()[1][0x40]
+    passed &= check("Error count",
+                    missing["errors"] == 1 and missing["bytes_read"] == 0)
+
+    i2cbus.reset_statistics()
+    passed &= check("Reset", i2cbus.get_statistics() == {})
+
+    i2cbus.set_instrumentation(False)
+    iopi.write_pin(1, 0)
+    passed &= check("Stopped recording",
+                    i2cbus.get_statistics() == {} and
+                    handle.write_byte_data == smbus.write_byte_data)
+
+    i2cbus.release_smbus(handle)
+    iopi.close()
+    adc.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
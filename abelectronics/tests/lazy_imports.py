@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | hardware imports
+
+run with: python3 lazy_imports.py
+================================================
+
+This test checks that importing the ServoPi, I2CSwitch and ExpanderPi
+packages does not import RPi.GPIO or spidev, and that the I2C classes in
+those packages can be used on the simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Import check: PASSED
+Servo PWM check: PASSED
+I2C Switch check: PASSED
+Expander Pi IO check: PASSED
+Expander Pi SPI check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics.simulator import FakeSMBus, FakeSpiDev, MCP23017, \
+        MCP3208, PCA9546A, PCA9685
+    import ServoPi
+    import I2CSwitch
+    import ExpanderPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    passed &= check("Import", "RPi.GPIO" not in sys.modules and
+                    "spidev" not in sys.modules)
+
+    pwmchip = PCA9685(0x40)
+    iochip = MCP23017(0x20)
+    switch = PCA9546A(0x70)
+    smbus = FakeSMBus(1, devices=[pwmchip, iochip, switch])
+
+    pwm = ServoPi.PWM(0x40, bus=smbus)
+    pwm.set_pwm(1, 0, 1000)
+    passed &= check("Servo PWM", pwmchip.get_channel(1) == (0, 1000))
+    pwm.close()
+
+    i2cswitch = I2CSwitch.I2CSwitch(0x70, bus=smbus)
+    i2cswitch.switch_channel(2)
+    passed &= check("I2C Switch", i2cswitch.get_channel_state(2) == 1)
+    i2cswitch.close()
+
+    io = ExpanderPi.IO(bus=smbus)
+    io.set_port_direction(0, 0x00)
+    io.write_pin(1, 1)
+    passed &= check("Expander Pi IO", iochip.pins() & 0x01 == 1)
+    io.close()
+
+    adc = ExpanderPi.ADC(spi=FakeSpiDev(MCP3208(4.096)))
+    passed &= check("Expander Pi SPI", "spidev" not in sys.modules and
+                    adc.read_adc_raw(1, 0) == 0)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
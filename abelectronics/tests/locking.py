@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | locking
+
+run with: python3 locking.py
+================================================
+
+This test enables locking in abelectronics.i2cbus and uses one IO Pi and
+one ADC Pi object from several threads on a simulated bus.
+
+Each thread on the IO Pi sets and clears its own pins with write_pin,
+which reads and then writes the output register.  Each thread on the
+ADC Pi reads a channel on a different MCP3424 chip, then two threads
+read different channels on the same chip.  The ADC readings must match
+the input voltages and the two chips must convert at the same time so
+the threads finish in less time than reading the chips one after the
+other.  Two ADC Pi objects created with the addresses swapped must be
+able to change the gain of both chips from two threads without a
+deadlock, so the device locks must be taken in address order.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+IO Pi write_pin threads check: PASSED
+ADC Pi read_raw threads check: PASSED
+ADC Pi same chip threads check: PASSED
+ADC Pi overlap check: PASSED
+ADC Pi swapped addresses check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+import threading
+import time
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+READS = 20
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def run_threads(targets):
+    """
+    Run each target in its own thread and wait for them to finish
+
+    :param targets: functions to run
+    :type targets: list
+    :return: time in seconds
+    :rtype: float
+    """
+    threads = [threading.Thread(target=target) for target in targets]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - start
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+    i2cbus.set_locking(True)
+
+    # switch threads as often as possible to expose any races
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(0.000001)
+
+    bus = FakeSMBus(1)
+    chip = bus.add_device(MCP23017(0x20))
+    adc1 = bus.add_device(MCP3424(0x68))
+    adc2 = bus.add_device(MCP3424(0x69))
+
+    # IO Pi, each thread toggles its own pins on port 0
+    iopi = IOPi(0x20, bus=bus)
+    iopi.set_port_direction(0, 0x00)
+
+    def toggle(pin):
+        for _ in range(500):
+            iopi.write_pin(pin, 1)
+            iopi.write_pin(pin, 0)
+        iopi.write_pin(pin, 1)
+
+    run_threads([lambda pin=pin: toggle(pin) for pin in range(1, 9)])
+    passed &= check("IO Pi write_pin threads", chip.pins() & 0xFF == 0xFF)
+
+    # ADC Pi, one thread for each MCP3424
+    adc1.set_input(1, 0.5)
+    adc1.set_input(2, 0.25)
+    adc2.set_input(1, 1.0)
+    adc = ADCPi(0x68, 0x69, 12, bus=bus)
+    results = {1: [], 2: [], 5: []}
+
+    def read(channel):
+        for _ in range(READS):
+            results[channel].append(adc.read_raw(channel))
+
+    single = run_threads([lambda: read(1)])
+    results[1] = []
+    both = run_threads([lambda: read(1), lambda: read(5)])
+
+    passed &= check("ADC Pi read_raw threads",
+                    set(results[1]) == {500} and set(results[5]) == {1000})
+
+    results[1] = []
+    run_threads([lambda: read(1), lambda: read(2)])
+    passed &= check("ADC Pi same chip threads",
+                    set(results[1]) == {500} and set(results[2]) == {250})
+    passed &= check("ADC Pi overlap", both < single * 1.5)
+
+    # the two device locks are taken in address order, so a thread that
+    # waits for the 0x68 lock does not hold the 0x69 lock
+    swapped = ADCPi(0x69, 0x68, 12, bus=bus)
+    handle = swapped.get_bus()
+    low = i2cbus.device_lock(handle, 0x68)
+    high = i2cbus.device_lock(handle, 0x69)
+    free = []
+
+    def try_high():
+        free.append(high.acquire(False))
+        if free[-1]:
+            high.release()
+
+    with low:
+        thread = threading.Thread(target=swapped.set_pga, args=(2,))
+        thread.start()
+        time.sleep(0.1)
+        checker = threading.Thread(target=try_high)
+        checker.start()
+        checker.join()
+    thread.join()
+    passed &= check("ADC Pi swapped addresses", free == [True])
+
+    swapped.close()
+    adc.close()
+    iopi.close()
+    i2cbus.set_locking(False)
+    sys.setswitchinterval(switch_interval)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
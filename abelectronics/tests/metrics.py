@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | metrics
+
+run with: python3 metrics.py
+================================================
+
+This test checks that abelectronics.metrics serves the transaction
+counters, ADC conversion wait times, ADC timeouts and IO interrupts in the
+Prometheus text format.  The bus is simulated with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Content type check: PASSED
+Transaction count check: PASSED
+Latency histogram check: PASSED
+Conversion histogram check: PASSED
+ADC timeout check: PASSED
+IO interrupt check: PASSED
+Not found check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+    sys.path.append("../..")
+    from abelectronics import i2cbus, metrics
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424
+    from ADCPi import ADCPi, ADCTimeoutError
+    from IOPi import IOPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def sample(text, line):
+    """
+    Get the value of a metric line
+
+    :param text: metrics text
+    :type text: str
+    :param line: metric name and labels
+    :type line: str
+    :return: value or None when the metric is missing
+    :rtype: float
+    """
+    for row in text.splitlines():
+        if row.startswith(line + " "):
+            return float(row[len(line) + 1:])
+    return None
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    expander = MCP23017(0x20)
+    slow_adc = MCP3424(0x6A, time_scale=1000)
+    smbus = FakeSMBus(1, devices=[expander, MCP3424(0x68, 0),
+                                  MCP3424(0x69, 0), slow_adc,
+                                  MCP3424(0x6B, 0)])
+    iopi = IOPi(0x20, bus=smbus)
+    adc = ADCPi(0x68, 0x69, 12, bus=smbus)
+    slow = ADCPi(0x6A, 0x6B, 12, bus=smbus)
+
+    i2cbus.reset_statistics()
+    server = metrics.start_http_server(0)
+    url = "http://127.0.0.1:%d/metrics" % server.port
+
+    iopi.set_port_direction(0, 0xFF)
+    iopi.set_interrupt_type(0, 0x00)
+    iopi.set_interrupt_on_port(0, 0x03)
+    iopi.reset_interrupts()
+    expander.set_input(1, 1)
+    expander.set_input(2, 1)
+    iopi.read_interrupt_status(0)
+    for _ in range(5):
+        iopi.read_port(0)
+
+    adc.set_conversion_mode(0)
+    for _ in range(3):
+        adc.read_raw(1)
+
+    slow.set_conversion_mode(0)
+    try:
+        slow.read_raw(1)
+    except ADCTimeoutError:
+        pass
+
+    response = urlopen(url)
+    text = response.read().decode("utf-8")
+    passed &= check("Content type",
+                    response.headers["Content-Type"] == metrics.CONTENT_TYPE)
+
+    stats = i2cbus.get_statistics()[1][0x20]
+    labels = '{bus="1",address="0x20"}'
+    passed &= check("Transaction count",
+                    sample(text, "abelectronics_i2c_transactions_total" +
+                           labels) == stats["count"])
+
+    passed &= check("Latency histogram",
+                    sample(text, 'abelectronics_i2c_transaction_seconds_'
+                                 'bucket{bus="1",address="0x20",le="+Inf"}')
+                    == stats["count"] and
+                    sample(text, "abelectronics_i2c_transaction_seconds_count"
+                           + labels) == stats["count"])
+
+    passed &= check("Conversion histogram",
+                    sample(text, 'abelectronics_adc_conversion_seconds_count'
+                                 '{bus="1",address="0x68"}') == 3 and
+                    sample(text, 'abelectronics_adc_conversion_seconds_bucket'
+                                 '{bus="1",address="0x68",le="+Inf"}') == 3)
+
+    passed &= check("ADC timeout",
+                    sample(text, 'abelectronics_adc_timeouts_total'
+                                 '{bus="1",address="0x6a"}') == 1 and
+                    sample(text, 'abelectronics_adc_timeouts_total'
+                                 '{bus="1",address="0x68"}') == 0)
+
+    passed &= check("IO interrupt",
+                    sample(text, 'abelectronics_io_interrupts_total'
+                                 '{bus="1",address="0x20",port="0"}') == 2)
+
+    try:
+        urlopen("http://127.0.0.1:%d/other" % server.port)
+        passed &= check("Not found", False)
+    except HTTPError as err:
+        passed &= check("Not found", err.code == 404)
+
+    server.close()
+    i2cbus.set_instrumentation(False)
+    iopi.close()
+    adc.close()
+    slow.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
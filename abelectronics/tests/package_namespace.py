@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | package namespace
+
+run with: python3 package_namespace.py
+================================================
+
+This test checks that the board classes and library modules can be used
+from the abelectronics package, and that each one is only imported when
+it is first used.  The imports are checked in new Python processes.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Package import check: PASSED
+Board class import check: PASSED
+Simulated board check: PASSED
+Same classes check: PASSED
+Library module check: PASSED
+Cached attribute check: PASSED
+Unknown attribute check: PASSED
+Directory check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import os
+    import subprocess
+    import sys
+    sys.path.append("../..")
+    import abelectronics
+    import ExpanderPi
+    import IOPi
+    import ServoPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+# modules that should only be imported when they are used
+MODULES = ("ADCDACPi", "ADCDifferentialPi", "ADCPi", "ExpanderPi",
+           "I2CSwitch", "IOPi", "IOZero32", "RTCPi", "ServoPi",
+           "abelectronics.i2cbus", "abelectronics.simulator", "smbus2",
+           "smbus", "spidev", "RPi.GPIO")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def loaded_modules(code):
+    """
+    Run code in a new Python process
+
+    :param code: code to run
+    :type code: str
+    :return: the modules in MODULES that were imported
+    :rtype: set
+    """
+    script = "import sys\n%s\nprint(','.join(m for m in %r " \
+             "if m in sys.modules))\n" % (code, MODULES)
+    output = subprocess.check_output([sys.executable, "-c", script],
+                                     cwd=ROOT, universal_newlines=True)
+    return set(name for name in output.strip().split(",") if name)
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    passed &= check("Package import",
+                    loaded_modules("import abelectronics") == set())
+
+    passed &= check("Board class import",
+                    loaded_modules("import abelectronics\n"
+                                   "abelectronics.IOPi") ==
+                    set(["IOPi", "abelectronics.i2cbus"]))
+
+    passed &= check("Simulated board", loaded_modules(
+        "import abelectronics\n"
+        "from abelectronics.simulator import FakeSMBus, MCP23017\n"
+        "chip = MCP23017(0x20)\n"
+        "bus = abelectronics.IOPi(0x20, bus=FakeSMBus(1, [chip]))\n"
+        "bus.set_port_direction(0, 0x00)\n"
+        "bus.write_pin(1, 1)\n"
+        "assert chip.pins() & 0x01") ==
+        set(["IOPi", "abelectronics.i2cbus", "abelectronics.simulator"]))
+
+    passed &= check("Same classes",
+                    abelectronics.IOPi is IOPi.IOPi and
+                    abelectronics.Servo is ServoPi.Servo and
+                    abelectronics.PWM is ServoPi.PWM and
+                    abelectronics.ExpanderPi is ExpanderPi)
+
+    passed &= check("Library module",
+                    abelectronics.rig is sys.modules["abelectronics.rig"])
+
+    passed &= check("Cached attribute", "Servo" in vars(abelectronics))
+
+    try:
+        abelectronics.SPIPi
+        passed &= check("Unknown attribute", False)
+    except AttributeError:
+        passed &= check("Unknown attribute", True)
+
+    passed &= check("Directory", set(["ADCPi", "RTC", "scanner"]) <=
+                    set(dir(abelectronics)))
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
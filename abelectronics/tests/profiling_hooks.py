@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | profiling
+
+run with: python3 profiling_hooks.py
+================================================
+
+This test enables abelectronics.profiling and runs the ADC Pi, IO Pi and
+Servo Pi hot paths against simulated devices, checking that a span is
+recorded for each phase, that the buffer keeps the newest spans, that the
+public methods of a profiled board are recorded and that nothing is
+recorded after profiling is disabled.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+ADC Pi phases check: PASSED
+IO Pi phases check: PASSED
+Servo phases check: PASSED
+Profiled methods check: PASSED
+Summary check: PASSED
+Bounded buffer check: PASSED
+Disabled check: PASSED
+Environment variable check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import os
+    import subprocess
+    import sys
+    sys.path.append("../..")
+    from abelectronics import profiling
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424, \
+        PCA9685
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+    from ServoPi import Servo
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), MCP3424(0x68, 0),
+                                  MCP3424(0x69, 0), PCA9685(0x40)])
+    iopi = IOPi(0x20, bus=smbus)
+    iopi.set_port_direction(0, 0x00)
+    adc = ADCPi(0x68, 0x69, 12, smbus)
+    servo = Servo(0x40, bus=smbus)
+
+    profiler = profiling.enable()
+    adc.read_raw(1)
+    names = [span.name for span in profiler.spans()]
+    passed &= check("ADC Pi phases",
+                    names == ["ADCPi.read_raw:lock", "ADCPi.read_raw:config",
+                              "ADCPi.read_raw:conversion",
+                              "ADCPi.read_raw:decode"])
+
+    profiler.reset()
+    iopi.write_pin(1, 1)
+    names = [span.name for span in profiler.spans()]
+    passed &= check("IO Pi phases",
+                    names == ["IOPi.__set_pin:lock", "IOPi.__set_pin:read",
+                              "IOPi.__set_pin:write"])
+
+    profiler.reset()
+    servo.move(1, 100)
+    spans = profiler.spans()
+    passed &= check("Servo phases",
+                    [span.name for span in spans] ==
+                    ["Servo.move:convert", "Servo.move:write"] and
+                    spans[1].start >= spans[0].start + spans[0].duration)
+
+    profiler.reset()
+    profiling.profile(iopi, ["write_pin", "read_pin"])
+    iopi.write_pin(2, 1)
+    value = iopi.read_pin(2)
+    spans = profiler.spans()
+    passed &= check("Profiled methods",
+                    value == 1 and spans[-1].name == "IOPi.read_pin" and
+                    spans[-2].name == "IOPi.write_pin" and
+                    spans[-2].duration >= sum(span.duration
+                                              for span in spans[:-2]))
+
+    for i in range(10):
+        adc.read_raw(1)
+    summary = profiling.summary()
+    stats = summary["ADCPi.read_raw:conversion"]
+    passed &= check("Summary",
+                    stats["count"] == 10 and
+                    stats["min"] <= stats["median"] <= stats["p99"] <=
+                    stats["max"] and
+                    "ADCPi.read_raw:conversion" in profiling.report())
+
+    profiler = profiling.enable(5)
+    for i in range(4):
+        servo.move(1, i)
+    passed &= check("Bounded buffer",
+                    len(profiler.spans()) == 5 and profiler.dropped == 3 and
+                    profiler.spans()[-1].name == "Servo.move:write")
+
+    profiling.disable()
+    adc.read_raw(1)
+    iopi.write_pin(3, 1)
+    passed &= check("Disabled",
+                    profiler.recorded == 8 and
+                    not profiling.is_enabled())
+
+    environment = dict(os.environ, ABE_PROFILE="1")
+    output = subprocess.check_output(
+        [sys.executable, "-c",
+         "from abelectronics import profiling; "
+         "print(profiling.is_enabled())"],
+        cwd=os.path.join("..", ".."), env=environment)
+    passed &= check("Environment variable", output.strip() == b"True")
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
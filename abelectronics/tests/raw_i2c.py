@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | rawi2c
+
+run with: python3 raw_i2c.py
+================================================
+
+This test checks that abelectronics.rawi2c.RawI2CBus sends each SMBus
+transaction as one ioctl, reads and writes the same data as smbus2 and
+can be used as the bus for board objects.  The /dev/i2c-1 device is
+simulated with abelectronics.simulator.FakeI2CDev.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Byte data check: PASSED
+Word data check: PASSED
+Block data check: PASSED
+Byte check: PASSED
+Single ioctl check: PASSED
+No acknowledge check: PASSED
+smbus2 check: PASSED
+ADC Pi check: PASSED
+Combined reads check: PASSED
+Uninstall check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    import os
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeI2CDev, MCP23017, MCP3424, \
+        PCA9685
+    from abelectronics.rawi2c import RawI2CBus
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    real_open = os.open
+    adc = MCP3424(0x68, 0)
+    devices = [adc, MCP3424(0x69, 0), MCP23017(0x20), PCA9685(0x40)]
+
+    with FakeI2CDev(1, devices) as device:
+        bus = RawI2CBus(1)
+
+        bus.write_byte_data(0x20, 0x00, 0x0F)
+        passed &= check("Byte data", bus.read_byte_data(0x20, 0x00) == 0x0F)
+
+        bus.write_word_data(0x20, 0x00, 0x1234)
+        passed &= check("Word data", bus.read_word_data(0x20, 0x00) == 0x1234)
+
+        bus.write_byte_data(0x40, 0x00, 0x20)  # MODE1 auto-increment
+        bus.write_i2c_block_data(0x40, 0x06, [1, 2, 3, 4])
+        passed &= check("Block data", bus.read_i2c_block_data(0x40, 0x06, 4)
+                        == [1, 2, 3, 4])
+
+        bus.write_byte(0x40, 0x07)
+        passed &= check("Byte", bus.read_byte(0x40) == 2)
+
+        device.reset_counters()
+        bus.read_i2c_block_data(0x68, 0x9C, 4)
+        bus.read_i2c_block_data(0x69, 0x9C, 4)
+        passed &= check("Single ioctl", device.get_counters()["ioctls"] == 2)
+
+        try:
+            bus.read_byte_data(0x50, 0x00)
+            nack = False
+        except OSError:
+            nack = True
+        passed &= check("No acknowledge", nack)
+
+        try:
+            from smbus2 import SMBus
+            smbus = SMBus(1)
+            passed &= check("smbus2", smbus.read_word_data(0x20, 0x00) ==
+                            0x1234)
+            smbus.close()
+        except ImportError:
+            print("smbus2 not installed")
+
+        adcpi = ADCPi(0x68, 0x69, 12, bus)
+        adc.set_input(1, 1.0)
+        passed &= check("ADC Pi", abs(adcpi.read_voltage(1) - 2.471) < 0.01)
+        adcpi.close()
+
+        i2cbus.set_combined_reads(True)
+        iopi = IOPi(0x20, True, bus)
+        device.reset_counters()
+        iopi.reset_interrupts()
+        i2cbus.set_combined_reads(False)
+        passed &= check("Combined reads", device.get_counters()["ioctls"] == 1)
+        iopi.close()
+
+        bus.close()
+
+    passed &= check("Uninstall", os.open is real_open)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
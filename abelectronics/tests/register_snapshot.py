@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | register snapshots
+
+run with: python3 register_snapshot.py
+================================================
+
+This test configures simulated IO Pi, Servo PWM Pi and RTC Pi boards,
+checks that creating the board objects again with a warm start does not
+write to the devices, saves snapshots with abelectronics.snapshot and
+restores them to devices in a different state, checking that only the
+registers that differ are written.  The IO Zero 32 and the Expander Pi IO
+and RTC snapshots are restored in the same way.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+IO Pi warm start check: PASSED
+PWM warm start check: PASSED
+RTC warm start check: PASSED
+Default start check: PASSED
+IO Pi restore check: PASSED
+PWM restore check: PASSED
+RTC restore check: PASSED
+Unchanged restore check: PASSED
+PWM auto-increment check: PASSED
+IO Zero 32 restore check: PASSED
+IO Zero 32 read check: PASSED
+Auto-increment off read check: PASSED
+Expander Pi restore check: PASSED
+Board type check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import os
+    import sys
+    import tempfile
+    sys.path.append("../..")
+    from abelectronics import snapshot
+    from abelectronics.simulator import FakeSMBus, MCP23017, PCA9535, \
+        PCA9685, DS1307
+    from ExpanderPi import IO, RTC as ExpanderRTC
+    from IOPi import IOPi
+    from IOZero32 import IOZero32
+    from ServoPi import PWM, Servo
+    from RTCPi import RTC
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def writes(smbus):
+    """
+    Get the write messages in the bus trace that set a register
+
+    :param smbus: simulated bus
+    :type smbus: FakeSMBus
+    :return: trace entries
+    :rtype: list
+    """
+    return [entry for entry in smbus.trace
+            if entry.startswith("W") and len(entry.split()) > 3]
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), PCA9685(0x40),
+                                  DS1307(0x68)], trace=True)
+
+    iopi = IOPi(0x20, bus=smbus)
+    iopi.set_port_direction(0, 0x0F)
+    iopi.set_port_pullups(0, 0x0F)
+    iopi.set_interrupt_on_port(0, 0x03)
+    iopi.write_port(0, 0xA0)
+
+    pwm = PWM(0x40, bus=smbus)
+    pwm.set_pwm_freq(60)
+    pwm.set_pwm(1, 0, 1000)
+    pwm.set_pwm(2, 100, 2000)
+
+    rtc = RTC(bus=smbus)
+
+    # creating the objects again on a warm start
+    del smbus.trace[:]
+    IOPi(0x20, initialise=False, bus=smbus, warm_start=True)
+    passed &= check("IO Pi warm start",
+                    writes(smbus) == [] and smbus.transactions > 0)
+
+    del smbus.trace[:]
+    PWM(0x40, bus=smbus, warm_start=True).set_pwm_freq(60)
+    Servo(0x40, reset=False, bus=smbus, warm_start=True)
+    pwm_writes = writes(smbus)
+
+    del smbus.trace[:]
+    RTC(bus=smbus, warm_start=True)
+    passed &= check("PWM warm start", pwm_writes == [])
+    passed &= check("RTC warm start", writes(smbus) == [])
+
+    # without warm_start the settings are written when the objects are
+    # created
+    del smbus.trace[:]
+    PWM(0x40, bus=smbus)
+    RTC(bus=smbus)
+    passed &= check("Default start",
+                    writes(smbus) == ["W 0x40 0x00 0x20", "W 0x40 0x01 0x0C",
+                                      "W 0x68 0x07 0x03"])
+
+    rtc.set_frequency(2)
+    rtc.enable_output()
+    rtc.write_memory(0x10, [1, 2, 3])
+
+    directory = tempfile.mkdtemp()
+    paths = [os.path.join(directory, name)
+             for name in ("iopi.json", "pwm.json", "rtc.json")]
+    snapshot.save(iopi, paths[0])
+    snapshot.save(pwm, paths[1])
+    snapshot.save(rtc, paths[2])
+
+    # restore to devices in a different state
+    target = FakeSMBus(1, devices=[MCP23017(0x20), PCA9685(0x40),
+                                   DS1307(0x68)], trace=True)
+    iopi2 = IOPi(0x20, bus=target)
+    iopi2.set_port_direction(0, 0x0F)
+    del target.trace[:]
+    count = snapshot.restore(iopi2, paths[0])
+    passed &= check("IO Pi restore",
+                    count == 3 and len(writes(target)) == 3 and
+                    iopi2.get_registers() == iopi.get_registers())
+
+    pwm2 = PWM(0x40, bus=target)
+    pwm2.set_pwm(1, 0, 1000)
+    del target.trace[:]
+    count = snapshot.restore(pwm2, paths[1])
+    # the prescaler and the channel 2 registers that differ
+    passed &= check("PWM restore",
+                    count == 4 and
+                    "W 0x40 0x0A 0x64" in writes(target) and
+                    "W 0x40 0x0C 0xD0 0x07" in writes(target) and
+                    pwm2.get_registers() == pwm.get_registers())
+
+    rtc2 = RTC(bus=target)
+    del target.trace[:]
+    count = snapshot.restore(rtc2, paths[2])
+    registers = rtc2.get_registers()
+    passed &= check("RTC restore",
+                    count == 4 and registers[0x07] == 0x91 and
+                    [registers[0x10], registers[0x11], registers[0x12]] ==
+                    [1, 2, 3] and
+                    "W 0x68 0x10 0x01 0x02 0x03" in writes(target))
+
+    del target.trace[:]
+    counts = [snapshot.restore(board, path)
+              for board, path in zip((iopi2, pwm2, rtc2), paths)]
+    passed &= check("Unchanged restore",
+                    counts == [0, 0, 0] and writes(target) == [])
+
+    # a MODE1 saved without auto-increment keeps the block writes working
+    count = pwm2.set_registers({0x00: 0x00})
+    pwm2.set_pwm(3, 0, 1500)
+    passed &= check("PWM auto-increment",
+                    count == 0 and pwm2.get_pwm_off_time(3) == 1500)
+
+    # the PCA9535 register pointer only moves within a register pair
+    smbus = FakeSMBus(1, devices=[PCA9535(0x20)], trace=True)
+    iozero = IOZero32(0x20, bus=smbus)
+    iozero.write_bus(0x1234)
+    iozero.set_bus_polarity(0x5600)
+    iozero.set_bus_direction(0x00FF)
+    saved = iozero.get_registers()
+    target = FakeSMBus(1, devices=[PCA9535(0x20)], trace=True)
+    iozero2 = IOZero32(0x20, bus=target)
+    iozero2.write_bus(0x1234)
+    del target.trace[:]
+    count = iozero2.set_registers(saved)
+    passed &= check("IO Zero 32 restore",
+                    saved == {0x02: 0x34, 0x03: 0x12, 0x04: 0x00,
+                              0x05: 0x56, 0x06: 0xFF, 0x07: 0x00} and
+                    count == 2 and
+                    writes(target) == ["W 0x20 0x05 0x56",
+                                       "W 0x20 0x07 0x00"] and
+                    iozero2.get_registers() == saved)
+
+    chip = target.devices[0x20]
+    for register, value in zip(range(0x02, 0x08),
+                               (0x11, 0x22, 0x33, 0x44, 0x55, 0x66)):
+        chip.registers[register] = value
+    passed &= check("IO Zero 32 read",
+                    snapshot.read(target, 0x20, "PCA9535") ==
+                    {0x02: 0x11, 0x03: 0x22, 0x04: 0x33,
+                     0x05: 0x44, 0x06: 0x55, 0x07: 0x66})
+
+    # devices with the register auto-increment turned off
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), PCA9685(0x40)])
+    mcp_chip = smbus.devices[0x20]
+    pwm_chip = smbus.devices[0x40]
+    for chip in (mcp_chip, pwm_chip):
+        for register in range(0x01, 0x10):
+            chip.registers[register] = register
+    mcp_chip.registers[0x0A] = mcp_chip.registers[0x0B] = 0x20  # SEQOP
+    pwm_chip.registers[0x00] = 0x00  # AI off
+    mcp = snapshot.read(smbus, 0x20, "MCP23017")
+    pca = snapshot.read(smbus, 0x40, "PCA9685")
+    passed &= check("Auto-increment off read",
+                    [mcp[register] for register in range(0x00, 0x10)] ==
+                    list(mcp_chip.registers[0x00:0x10]) and
+                    [pca[register] for register in range(0x00, 0x10)] ==
+                    list(range(0x00, 0x10)))
+
+    smbus = FakeSMBus(1, devices=[MCP23017(0x20), DS1307(0x68)])
+    expander_io = IO(bus=smbus)
+    expander_io.set_port_direction(1, 0xF0)
+    expander_io.write_port(1, 0x0A)
+    expander_rtc = ExpanderRTC(bus=smbus)
+    expander_rtc.set_frequency(1)
+    expander_rtc.write_memory(0x20, [9, 8])
+    target = FakeSMBus(1, devices=[MCP23017(0x20), DS1307(0x68)],
+                       trace=True)
+    io2 = IO(bus=target)
+    rtc3 = ExpanderRTC(bus=target)
+    counts = [io2.set_registers(expander_io.get_registers()),
+              rtc3.set_registers(expander_rtc.get_registers())]
+    registers = rtc3.get_registers()
+    passed &= check("Expander Pi restore",
+                    counts == [2, 3] and
+                    io2.get_registers() == expander_io.get_registers() and
+                    registers[0x07] == expander_rtc.get_registers()[0x07] and
+                    [registers[0x20], registers[0x21]] == [9, 8])
+
+    try:
+        snapshot.restore(rtc2, paths[0])
+        passed &= check("Board type", False)
+    except ValueError:
+        passed &= check("Board type", True)
+
+    for path in paths:
+        os.remove(path)
+    os.rmdir(directory)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
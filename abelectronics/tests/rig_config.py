@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | rig configuration
+
+run with: python3 rig_config.py
+================================================
+
+This test loads JSON and TOML rig files with abelectronics.rig on a
+simulated bus with an ADC Pi, an IO Pi, a Servo PWM Pi, an RTC Pi and an
+I2C Switch with an IO Pi on one of its channels.  It checks the settings
+on the simulated chips, that the boards share one bus handle and that
+loading the rig again on the configured devices does not write to them.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Boards created check: PASSED
+Shared bus check: PASSED
+IO Pi settings check: PASSED
+Switch channel check: PASSED
+Servo settings check: PASSED
+RTC settings check: PASSED
+Warm restart check: PASSED
+TOML file check: PASSED
+Invalid config check: PASSED
+Bus released check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import json
+    import os
+    import sys
+    import tempfile
+    sys.path.append("../..")
+    from abelectronics import i2cbus, rig
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424, \
+        PCA9685, DS1307, PCA9546A
+    from ADCPi import ADCPi
+    from IOPi import IOPi
+    from ServoPi import Servo
+    from RTCPi import RTC
+    from I2CSwitch import I2CSwitch
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+CONFIG = {
+    "bus": 1,
+    "boards": [
+        {"name": "adc", "type": "ADCPi", "address": ["0x6A", "0x6B"],
+         "bit_rate": 12, "pga": 2},
+        {"name": "io2", "type": "IOPi", "address": "0x24",
+         "switch": "switch", "channel": 2, "direction": "0x0000",
+         "output": "0x8001"},
+        {"name": "io", "type": "IOPi", "address": "0x20",
+         "direction": "0xFF00", "pullups": "0xFF00", "output": "0x00A5"},
+        {"name": "servo", "type": "Servo", "address": "0x40",
+         "frequency": 60, "limits": {"16": [0.8, 2.2]}},
+        {"name": "rtc", "type": "RTC", "output": True, "frequency": 1},
+        {"name": "switch", "type": "I2CSwitch", "address": "0x70"},
+    ]
+}
+
+TOML = """
+bus = 1
+
+[[boards]]
+name = "io"
+type = "IOPi"
+address = "0x20"
+direction = 0xFF00
+pullups = 0xFF00
+output = 0x00A5
+"""
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def writes(smbus):
+    """
+    Get the write messages in the bus trace that set a register
+
+    :param smbus: simulated bus
+    :type smbus: FakeSMBus
+    :return: trace entries
+    :rtype: list
+    """
+    return [entry for entry in smbus.trace
+            if entry.startswith("W") and len(entry.split()) > 3]
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    switch = PCA9546A(0x70)
+    expander = switch.attach(2, MCP23017(0x24))
+    iopi = MCP23017(0x20)
+    pwm = PCA9685(0x40)
+    rtc = DS1307(0x68)
+    smbus = FakeSMBus(1, devices=[MCP3424(0x6A, 0), MCP3424(0x6B, 0),
+                                  iopi, pwm, rtc, switch], trace=True)
+    i2cbus.set_smbus_factory(lambda bus: smbus)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "rig.json")
+    with open(path, "w") as config_file:
+        json.dump(CONFIG, config_file)
+
+    boards = rig.load(path)
+    passed &= check("Boards created",
+                    list(boards) == ["adc", "io", "servo", "rtc", "switch",
+                                     "io2"] and
+                    isinstance(boards["adc"], ADCPi) and
+                    isinstance(boards["io"], IOPi) and
+                    isinstance(boards["servo"], Servo) and
+                    isinstance(boards["rtc"], RTC) and
+                    isinstance(boards["switch"], I2CSwitch) and
+                    "total" in boards.report())
+
+    # the rig and each board hold a reference to the same handle
+    passed &= check("Shared bus", i2cbus.open_buses() == {1: 7})
+
+    passed &= check("IO Pi settings",
+                    iopi.registers[0x00] == 0x00 and
+                    iopi.registers[0x01] == 0xFF and
+                    iopi.registers[0x0D] == 0xFF and
+                    iopi.registers[0x14] == 0xA5)
+
+    passed &= check("Switch channel",
+                    expander.registers[0x00] == 0x00 and
+                    expander.registers[0x15] == 0x80 and
+                    switch.control == 0x02)
+
+    passed &= check("Servo settings",
+                    pwm.registers[0xFE] == 101 and
+                    boards["adc"].read_voltage(1) == 0.0)
+
+    passed &= check("RTC settings", rtc.registers[0x07] == 0x90)
+    boards.close()
+
+    del smbus.trace[:]
+    switch.control = 0x00
+    with rig.load(path) as boards:
+        # only the switch channel is selected, the devices are set up
+            passed &= check("Warm restart", writes(smbus) == [] and
+                        switch.control == 0x02)
+
+    toml_path = os.path.join(directory, "rig.toml")
+    with open(toml_path, "w") as config_file:
+        config_file.write(TOML)
+    iopi.reset()
+    with rig.load(toml_path) as boards:
+        passed &= check("TOML file",
+                        list(boards) == ["io"] and
+                        iopi.registers[0x14] == 0xA5)
+
+    try:
+        rig.Rig({"boards": [{"name": "x", "type": "IOPi",
+                             "colour": "red"}]})
+        passed &= check("Invalid config", False)
+    except ValueError:
+        passed &= check("Invalid config", True)
+
+    passed &= check("Bus released", i2cbus.open_buses() == {})
+
+    i2cbus.set_smbus_factory(None)
+    os.remove(path)
+    os.remove(toml_path)
+    os.rmdir(directory)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
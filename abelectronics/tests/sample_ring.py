@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | samplering
+
+run with: python3 sample_ring.py
+================================================
+
+This test checks that abelectronics.samplering.SampleProducer writes ADC
+Pi samples to a shared memory ring and that a SampleReader in this
+process and in another process can read the latest samples as NumPy views
+after the ring has wrapped, and that readers follow the 32-bit sequence
+number when it wraps to 0.  The ADC is simulated with
+abelectronics.simulator.  NumPy must be installed.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Sequence check: PASSED
+Latest check: PASSED
+Zero copy check: PASSED
+Order check: PASSED
+Since check: PASSED
+Copy check: PASSED
+Other process check: PASSED
+Close check: PASSED
+Sequence wrap check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    import os
+    import subprocess
+    sys.path.append("../..")
+    from abelectronics import samplering
+    from abelectronics.samplering import SampleProducer, SampleReader
+    from abelectronics.simulator import FakeSMBus, MCP3424
+    from ADCPi import ADCPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+# reads the latest sample in another process
+READER = ("import sys\n"
+          "sys.path.append(%r)\n"
+          "from abelectronics.samplering import SampleReader\n"
+          "reader = SampleReader(%r)\n"
+          "timestamps, values = reader.latest(1)\n"
+          "print(reader.sequence, round(values[0][1], 4))\n"
+          "del timestamps, values\n"
+          "reader.close()\n")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    name = "abe_test_%d" % os.getpid()
+    chip = MCP3424(0x68, 0)
+    adc = ADCPi(0x68, 0x69, 12, FakeSMBus(1, [chip, MCP3424(0x69, 0)]))
+
+    producer = SampleProducer(name, adc, channels=[1, 2], capacity=16)
+    reader = SampleReader(name)
+
+    for i in range(20):
+        chip.set_input(2, i * 0.01)
+        producer.sample()
+    passed &= check("Sequence", reader.sequence == 20 and
+                    reader.channels == [1, 2])
+
+    timestamps, values = reader.latest(10)
+    passed &= check("Latest", values.shape == (10, 2) and
+                    abs(values[-1][1] - 0.19 * 2.471) < 0.001)
+    passed &= check("Zero copy", values.base is not None and
+                    not values.flags.writeable)
+    passed &= check("Order", list(timestamps) == sorted(timestamps) and
+                    abs(values[0][1] - 0.10 * 2.471) < 0.001)
+
+    sequence, timestamps, values, missed = reader.since(0)
+    new = reader.since(sequence)
+    passed &= check("Since", sequence == 20 and len(values) == 16 and
+                    missed == 4 and len(new[2]) == 0)
+
+    timestamps, values = reader.copy_latest(15)
+    producer.sample()
+    passed &= check("Copy", values.shape == (15, 2) and values.base is None
+                    and not reader.valid(sequence, 15))
+
+    process = subprocess.run(
+        [sys.executable, "-c", READER % (os.path.abspath("../.."), name)],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    passed &= check("Other process", process.stdout.split() ==
+                    ["21", str(round(0.19 * 2.471, 4))])
+
+    del timestamps, values, new
+    reader.close()
+    producer.close()
+    try:
+        SampleReader(name)
+        removed = False
+    except FileNotFoundError:
+        removed = True
+    passed &= check("Close", removed)
+
+    # the sequence number wraps after 32 samples instead of 2**32
+    samplering._SEQUENCE_LIMIT = 40
+    producer = SampleProducer(name, lambda channel: 0.0, channels=[1],
+                              capacity=16)
+    reader = SampleReader(name)
+    for i in range(30):
+        producer.write([i], float(i))
+    sequence = reader.sequence
+    for i in range(30, 40):
+        producer.write([i], float(i))
+    current, timestamps, values, missed = reader.since(sequence)
+    latest = list(reader.latest(15)[1][:, 0])
+    passed &= check("Sequence wrap", producer.sequence == 8 and
+                    current == 8 and missed == 0 and
+                    list(timestamps) == [float(i) for i in range(30, 40)] and
+                    latest == [float(i) for i in range(25, 40)] and
+                    reader.valid(current, 15) and
+                    not reader.valid(sequence, 10) and
+                    reader.copy_latest(3)[0].tolist() == [37.0, 38.0, 39.0])
+    samplering._SEQUENCE_LIMIT = 1 << 32
+    del timestamps, values
+    reader.close()
+    producer.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | i2cbus
+
+run with: python3 shared_bus.py
+================================================
+
+This test checks that board objects created with the same I2C bus number
+share one SMBus object, that the bus is closed when the last object
+is closed and that the ABE_I2C_BUS environment variable overrides the
+bus detection.  The buses are simulated with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Shared bus open check: PASSED
+Shared bus reference check: PASSED
+Invalid address release check: PASSED
+Repeated close check: PASSED
+Shared bus close check: PASSED
+User bus check: PASSED
+Bus detection override check: PASSED
+Bus detection cache check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+import os
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics import i2cbus
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+    opened = []
+
+    def open_bus(bus):
+        smbus = FakeSMBus(bus, devices=[MCP23017(0x20), MCP23017(0x21),
+                                        MCP3424(0x68, 0), MCP3424(0x69, 0)])
+        opened.append(smbus)
+        return smbus
+
+    i2cbus.set_smbus_factory(open_bus)
+
+    iopi1 = IOPi(0x20, bus=1)
+    iopi2 = IOPi(0x21, bus=1)
+    adc = ADCPi(0x68, 0x69, 12, bus=1)
+    passed &= check("Shared bus open", len(opened) == 1)
+    passed &= check("Shared bus reference", i2cbus.open_buses() == {1: 3})
+
+    try:
+        ADCPi(0x10, 0x69, 12, bus=1)
+    except ValueError:
+        pass
+    passed &= check("Invalid address release",
+                    i2cbus.open_buses() == {1: 3})
+
+    iopi1.close()
+    iopi1.close()
+    passed &= check("Repeated close", i2cbus.open_buses() == {1: 2})
+
+    iopi2.close()
+    adc.close()
+    passed &= check("Shared bus close", i2cbus.open_buses() == {} and
+                    opened[0].closed)
+
+    user_bus = FakeSMBus(1, devices=[MCP23017(0x20)])
+    iopi3 = IOPi(0x20, bus=user_bus)
+    iopi3.close()
+    passed &= check("User bus", i2cbus.open_buses() == {} and
+                    not user_bus.closed)
+
+    os.environ[i2cbus.BUS_ENVIRONMENT_VARIABLE] = "5"
+    passed &= check("Bus detection override",
+                    i2cbus.detect_bus(refresh=True) == 5)
+    iopi4 = IOPi(0x20)
+    passed &= check("Bus detection cache", i2cbus.open_buses() == {5: 1})
+    iopi4.close()
+    del os.environ[i2cbus.BUS_ENVIRONMENT_VARIABLE]
+    i2cbus.detect_bus(refresh=True)
+
+    i2cbus.set_smbus_factory(None)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | simulator
+
+run with: python3 simulated_devices.py
+================================================
+
+This test runs the IO Pi, ADC Pi, RTC Pi and IO Zero 32 libraries against
+the simulated devices in abelectronics.simulator and checks the values
+seen by the simulated chips.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+IO Pi write_pin check: PASSED
+IO Pi read_pin check: PASSED
+IO Pi interrupt check: PASSED
+ADC Pi read_voltage check: PASSED
+ADC Pi negative input check: PASSED
+RTC Pi set_date check: PASSED
+RTC Pi memory check: PASSED
+IO Zero 32 write_bus check: PASSED
+Bus counter check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics.simulator import FakeSMBus, MCP23017, MCP3424, \
+        DS1307, PCA9535
+    from IOPi import IOPi
+    from ADCPi import ADCPi
+    from RTCPi import RTC
+    from IOZero32 import IOZero32
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    bus = FakeSMBus(1)
+
+    # IO Pi
+    chip = bus.add_device(MCP23017(0x20))
+    iopi = IOPi(0x20, bus=bus)
+    iopi.set_port_direction(0, 0x00)
+    iopi.write_pin(3, 1)
+    passed &= check("IO Pi write_pin", chip.pins() & 0xFF == 0x04)
+
+    chip.set_input(16, 1)
+    passed &= check("IO Pi read_pin", iopi.read_pin(16) == 1)
+
+    iopi.set_interrupt_on_pin(15, 1)
+    chip.set_input(15, 1)
+    passed &= check("IO Pi interrupt",
+                    iopi.read_interrupt_status(1) == 0x40 and
+                    iopi.read_interrupt_capture(1) & 0x40 == 0x40 and
+                    iopi.read_interrupt_status(1) == 0x00)
+
+    # ADC Pi
+    adc1 = bus.add_device(MCP3424(0x68, time_scale=0))
+    adc2 = bus.add_device(MCP3424(0x69, time_scale=0))
+    adc1.set_input(1, 1.0)
+    adc2.set_input(2, -0.5)
+    adc = ADCPi(0x68, 0x69, 18, bus=bus)
+    passed &= check("ADC Pi read_voltage",
+                    abs(adc.read_voltage(1) - 2.471) < 0.001)
+    passed &= check("ADC Pi negative input", adc.read_raw(6) < 0)
+
+    # RTC Pi
+    rtc_bus = FakeSMBus(1, devices=[DS1307(0x68)])
+    rtc = RTC(bus=rtc_bus)
+    rtc.set_date("2026-10-18T12:34:56")
+    passed &= check("RTC Pi set_date",
+                    rtc.read_date().startswith("2026-10-18T12:34"))
+    rtc.write_memory(0x08, [1, 2, 3])
+    passed &= check("RTC Pi memory", list(rtc.read_memory(0x08, 3)) ==
+                    [1, 2, 3])
+
+    # IO Zero 32
+    zero_bus = FakeSMBus(1, devices=[PCA9535(0x20)])
+    iozero = IOZero32(0x20, bus=zero_bus)
+    iozero.set_bus_direction(0xFF00)
+    iozero.write_bus(0x00AA)
+    passed &= check("IO Zero 32 write_bus",
+                    zero_bus.find(0x20).pins() & 0xFF == 0xAA)
+
+    counters = bus.get_counters()
+    passed &= check("Bus counter", counters["transactions"] > 0 and
+                    counters["bytes_written"] > 0)
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""
+================================================
+AB Electronics UK Library Tools Tests | writequeue
+
+run with: python3 write_queue.py
+================================================
+
+This test checks that abelectronics.writequeue.WriteQueue sends writes
+immediately outside a with block, merges deferred writes to consecutive
+registers on the same device into block writes, keeps writes to other
+registers and devices in order, flushes before a read and can be used as
+the bus for a board object.  Setting the Servo Pi PWM frequency in a with
+block must send the prescaler before waiting for the oscillator.  The bus
+is simulated with abelectronics.simulator.
+
+Hardware Required: None
+
+=== Expected Result ============================
+
+> Console Output:
+
+Pass through check: PASSED
+Merge check: PASSED
+Merged data check: PASSED
+Separate runs check: PASSED
+Block size check: PASSED
+Read flush check: PASSED
+Nested block check: PASSED
+Board check: PASSED
+Prescaler check: PASSED
+
+"""
+from __future__ import absolute_import, division, print_function, \
+                                                    unicode_literals
+
+import time
+
+try:
+    import sys
+    sys.path.append("../..")
+    from abelectronics.simulator import FakeSMBus, MCP23017, PCA9685
+    from abelectronics.writequeue import WriteQueue
+    from IOPi import IOPi
+    from ServoPi import PWM
+except ImportError:
+    raise ImportError("Failed to import the library")
+
+
+def check(name, result):
+    """
+    Print the result of a check
+
+    :param name: name of the check
+    :type name: str
+    :param result: True = passed
+    :type result: bool
+    :return: result
+    :rtype: bool
+    """
+    if result:
+        print(name + " check: PASSED")
+    else:
+        print(name + " check: FAILED")
+    return result
+
+
+def main():
+    """
+    Main program function
+    """
+
+    passed = True
+
+    pwm = PCA9685(0x40)
+    iochip = MCP23017(0x20)
+    smbus = FakeSMBus(1, devices=[pwm, iochip])
+    queue = WriteQueue(smbus)
+
+    queue.write_byte_data(0x40, 0x00, 0x20)  # MODE1 auto-increment
+    passed &= check("Pass through", smbus.transactions == 1)
+
+    smbus.reset_counters()
+    with queue:
+        for channel in range(4):
+            register = 0x06 + 4 * channel
+            queue.write_byte_data(0x40, register, 0)
+            queue.write_byte_data(0x40, register + 1, 0)
+            queue.write_word_data(0x40, register + 2, 1000 + channel)
+        deferred = smbus.transactions
+    passed &= check("Merge", deferred == 0 and smbus.transactions == 1)
+    passed &= check("Merged data",
+                    [pwm.get_channel(c) for c in range(1, 5)] ==
+                    [(0, 1000), (0, 1001), (0, 1002), (0, 1003)])
+
+    smbus.reset_counters()
+    with queue:
+        queue.write_byte_data(0x40, 0x06, 1)
+        queue.write_byte_data(0x20, 0x07, 2)  # another device
+        queue.write_byte_data(0x40, 0x07, 3)
+        queue.write_byte_data(0x40, 0x09, 4)  # not the next register
+    passed &= check("Separate runs", smbus.transactions == 4)
+
+    smbus.reset_counters()
+    with queue:
+        for register in range(0x06, 0x06 + 40):
+            queue.write_byte_data(0x40, register, 0)
+    passed &= check("Block size", smbus.transactions == 2)
+
+    smbus.reset_counters()
+    with queue:
+        queue.write_byte_data(0x40, 0x06, 0x12)
+        value = queue.read_byte_data(0x40, 0x06)
+    passed &= check("Read flush", value == 0x12 and smbus.transactions == 2)
+
+    smbus.reset_counters()
+    with queue:
+        queue.write_byte_data(0x40, 0x06, 0)
+        with queue:
+            queue.write_byte_data(0x40, 0x07, 0)
+        inner = smbus.transactions
+        queue.write_byte_data(0x40, 0x08, 0)
+    passed &= check("Nested block", inner == 0 and smbus.transactions == 1)
+
+    iopi = IOPi(0x20, bus=queue)
+    iopi.set_bus_direction(0x0000)
+    smbus.reset_counters()
+    with queue:
+        iopi.write_port(0, 0x55)
+        iopi.write_port(1, 0xAA)
+    passed &= check("Board", smbus.transactions == 1 and
+                    iochip.pins() == 0xAA55)
+    iopi.close()
+
+    # the prescaler and MODE1 writes must reach the device before the
+    # oscillator restart delay
+    servo = PWM(0x40, bus=queue)
+    states = []
+    sleep = time.sleep
+
+    def record_sleep(seconds):
+        states.append((pwm.registers[PCA9685.PRE_SCALE],
+                       pwm.registers[PCA9685.MODE1] & 0x10))
+        sleep(seconds)
+
+    time.sleep = record_sleep
+    try:
+        with queue:
+            servo.set_pwm_freq(50)
+    finally:
+        time.sleep = sleep
+    passed &= check("Prescaler", states == [(121, 0)] and
+                    pwm.registers[PCA9685.PRE_SCALE] == 121)
+    servo.close()
+    queue.close()
+
+    if passed is False:
+        print("Test Failed")
+
+
+if __name__ == "__main__":
+    main()
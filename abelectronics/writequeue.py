@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+================================================
+AB Electronics UK Write Queue
+
+Deferred I2C writes that merge consecutive register writes into block
+writes.
+================================================
+
+A WriteQueue wraps an SMBus compatible object and can be used by board
+objects in place of the I2C bus.  Writes pass straight through to the bus
+until a with block or begin() starts deferring them.  While writes are
+deferred, a write to the register that follows the last queued write on the
+same device is appended to it, and flush() sends each run of registers
+with one write_i2c_block_data.  Any read, or any other bus method, flushes
+the queue first so the device sees the transactions in the same order.
+
+Only use the queue with devices that have register auto-increment enabled,
+such as the MCP23017 on the IO Pi with IOCON.SEQOP cleared or the PCA9685
+on the Servo PWM Pi with MODE1.AI set.
+
+Example:
+
+    from abelectronics.writequeue import WriteQueue
+    from ServoPi import Servo
+
+    queue = WriteQueue(1)
+    servo = Servo(0x40, bus=queue)
+    with queue:
+        for channel in range(1, 17):
+            servo.move(channel, 125)  # sent as two block writes
+"""
+import threading
+
+# SMBus block writes are limited to 32 bytes
+MAX_BLOCK = 32
+
+_BYTE = 1
+_WORD = 2
+_BLOCK = 3
+
+
+class WriteQueue(object):
+    """
+    SMBus compatible wrapper that merges deferred writes to consecutive
+    registers on the same device.
+    """
+
+    def __init__(self, bus, max_block=MAX_BLOCK):
+        """
+        :param bus: I2C bus number or an SMBus compatible object.  A bus
+                    number is opened with abelectronics.i2cbus and released
+                    by close()
+        :type bus: int or SMBus
+        :param max_block: largest block write in bytes, defaults to 32
+        :type max_block: int, optional
+        """
+        if isinstance(bus, int):
+            from . import i2cbus
+            self.__release = i2cbus.release_smbus
+            bus = i2cbus.get_smbus(bus)
+        else:
+            self.__release = None
+        self.smbus = bus
+        self.bus = getattr(bus, "bus", None)
+        self.max_block = max_block
+        self.__pending = []
+        self.__depth = 0
+        self.__lock = threading.RLock()
+        self.reset_counters()
+
+    def __getattr__(self, name):
+        # reads and other bus methods flush the queued writes first
+        try:
+            smbus = self.__dict__["smbus"]
+        except KeyError:
+            raise AttributeError(name)
+        attribute = getattr(smbus, name)
+        if not callable(attribute):
+            return attribute
+
+        def flushed(*args, **kwargs):
+            self.flush()
+            return attribute(*args, **kwargs)
+        return flushed
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.end()
+
+    def begin(self):
+        """
+        Start deferring writes.  Calls can be nested and the writes are
+        sent when the outer block ends.
+        """
+        with self.__lock:
+            self.__depth += 1
+
+    def end(self):
+        """
+        Stop deferring writes and flush the queue when the outer block ends
+        """
+        with self.__lock:
+            if self.__depth > 0:
+                self.__depth -= 1
+            if self.__depth == 0:
+                self.flush()
+
+    @property
+    def deferred(self):
+        """
+        :return: True while writes are being deferred
+        :rtype: bool
+        """
+        return self.__depth > 0
+
+    @property
+    def pending(self):
+        """
+        :return: number of queued writes waiting for a flush, after merging
+        :rtype: int
+        """
+        return len(self.__pending)
+
+    def __queue(self, kind, address, register, data):
+        """
+        Internal method for queuing a write, or sending it immediately when
+        writes are not deferred
+
+        :param kind: _BYTE, _WORD or _BLOCK
+        :type kind: int
+        :param address: I2C address
+        :type address: int
+        :param register: first register
+        :type register: int
+        :param data: bytes to write
+        :type data: list
+        """
+        with self.__lock:
+            self.writes += 1
+            if self.__depth == 0:
+                self.__send(kind, address, register, data)
+                return
+            if self.__pending:
+                last = self.__pending[-1]
+                if (last[1] == address and
+                        last[2] + len(last[3]) == register and
+                        len(last[3]) + len(data) <= self.max_block):
+                    last[0] = _BLOCK
+                    last[3].extend(data)
+                    return
+            self.__pending.append([kind, address, register, list(data)])
+
+    def __send(self, kind, address, register, data):
+        """
+        Internal method for sending a write to the bus
+
+        :param kind: _BYTE, _WORD or _BLOCK
+        :type kind: int
+        :param address: I2C address
+        :type address: int
+        :param register: first register
+        :type register: int
+        :param data: bytes to write
+        :type data: list
+        """
+        self.transactions += 1
+        if kind == _BYTE:
+            self.smbus.write_byte_data(address, register, data[0])
+        elif kind == _WORD:
+            self.smbus.write_word_data(address, register,
+                                       data[0] | (data[1] << 8))
+        else:
+            self.smbus.write_i2c_block_data(address, register, data)
+
+    def flush(self):
+        """
+        Send the queued writes.  The queue is emptied before the writes are
+        sent so a failed write is not repeated by the next flush.
+        """
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = []
+            for kind, address, register, data in pending:
+                self.__send(kind, address, register, data)
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self.__queue(_BYTE, i2c_addr, register, [value & 0xFF])
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        self.__queue(_WORD, i2c_addr, register,
+                     [value & 0xFF, (value >> 8) & 0xFF])
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        if len(data) > self.max_block:
+            raise ValueError("Data length cannot exceed %d bytes" %
+                             self.max_block)
+        self.__queue(_BLOCK, i2c_addr, register, [b & 0xFF for b in data])
+
+    def reset_counters(self):
+        """
+        Reset the write counters to 0
+        """
+        self.writes = 0
+        self.transactions = 0
+
+    def get_counters(self):
+        """
+        Get the number of writes made to the queue and the number of write
+        transactions sent to the bus
+
+        :return: writes and transactions
+        :rtype: dict
+        """
+        return {"writes": self.writes,
+                "transactions": self.transactions}
+
+    def close(self):
+        """
+        Flush the queue and release the bus if the queue opened it
+        """
+        self.flush()
+        if self.__release is not None:
+            self.__release(self.smbus)
+            self.__release = None
@@ -10,5 +10,5 @@ setup(
     author_email='sales@abelectronics.co.uk',
     license='MIT',
     url='https://github.com/abelectronicsuk/ABElectronics_Python_Libraries',
-    packages=['ADCDACPi', 'ADCDifferentialPi', 'ADCPi', 'ExpanderPi', 'I2CSwitch', 'IOPi', 'IOZero32','RTCPi', 'ServoPi'],
+    packages=['abelectronics', 'ADCDACPi', 'ADCDifferentialPi', 'ADCPi', 'ExpanderPi', 'I2CSwitch', 'IOPi', 'IOZero32','RTCPi', 'ServoPi'],
 )